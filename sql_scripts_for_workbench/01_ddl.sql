@@ -83,6 +83,7 @@ CREATE TABLE locations (
     store_manager_id INT,
     opening_date DATE,
     close_date DATE,
+    INDEX idx_locations_region (region),
     CONSTRAINT fk_location_manager
         FOREIGN KEY (store_manager_id) REFERENCES employees(employee_id),
     CONSTRAINT chk_location_date
@@ -139,6 +140,11 @@ CREATE TABLE products (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
     last_modified DATETIME DEFAULT CURRENT_TIMESTAMP 
         ON UPDATE CURRENT_TIMESTAMP,
+    -- Folded name for the FULLTEXT product search (utils/search_index.py)
+    search_text VARCHAR(400) GENERATED ALWAYS AS (
+        REPLACE(REPLACE(product_name, 'đ', 'd'), 'Đ', 'D')
+    ) STORED,
+    FULLTEXT INDEX ft_products_search (search_text) WITH PARSER ngram,
     CONSTRAINT fk_product_class
         FOREIGN KEY (class_id) REFERENCES product_class(class_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -203,6 +209,7 @@ CREATE TABLE inventory_history (
     reference_table VARCHAR(50),
     reference_id INT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_inventory_history_created (created_at),
     CONSTRAINT fk_hist_product
         FOREIGN KEY (product_id) REFERENCES products(product_id),
     CONSTRAINT fk_hist_location
@@ -221,8 +228,16 @@ CREATE TABLE sales_orders (
     closed_reason VARCHAR(255),
     delivery_address VARCHAR(255) NULL,
     delivery_phone VARCHAR(20) NULL,
+    -- Denormalized header summary, maintained by triggers (see 04_triggers.sql)
+    item_count INT NOT NULL DEFAULT 0,
+    total_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    sale_id INT NULL,
+    invoice_status ENUM('PAID','UNPAID','REFUNDED') NULL,
+    latest_delivery_status ENUM('CREATED','PACKED','SHIPPED','DELIVERED','FAILED') NULL,
     last_modified DATETIME DEFAULT CURRENT_TIMESTAMP 
         ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_orders_status_date (order_status, order_date),
+    INDEX idx_orders_location_date (location_id, order_date),
     CONSTRAINT fk_order_customer FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
     CONSTRAINT fk_order_employee FOREIGN KEY (employee_id) REFERENCES employees(employee_id),
     CONSTRAINT fk_order_location FOREIGN KEY (location_id) REFERENCES locations(location_id)
@@ -286,6 +301,7 @@ CREATE TABLE sales (
     invoice_status ENUM('PAID','UNPAID','REFUNDED') NOT NULL,
     sale_date DATETIME DEFAULT CURRENT_TIMESTAMP,
     expected_delivery_date DATE,
+    INDEX idx_sales_type_date (sale_type, sale_date),
     CONSTRAINT fk_sale_order
         FOREIGN KEY (order_id) REFERENCES sales_orders(order_id),
     CONSTRAINT fk_sale_payment
@@ -309,6 +325,7 @@ CREATE TABLE sales_items (
     quantity INT NOT NULL,     -- Positive for INVOICE, negative for RETURN
     applied_promotion_id INT NULL,
     final_amount DECIMAL(12,2) NOT NULL,
+    sale_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,  -- Copied from sales by trigger (partition key)
     CONSTRAINT fk_saleitem_sale
         FOREIGN KEY (sale_id) REFERENCES sales(sale_id),
     CONSTRAINT fk_saleitem_product
@@ -362,6 +379,7 @@ CREATE TABLE deliveries (
     last_modified DATETIME DEFAULT CURRENT_TIMESTAMP 
         ON UPDATE CURRENT_TIMESTAMP,
     note VARCHAR(255),
+    INDEX idx_deliveries_created_status (created_at, delivery_status),
     CONSTRAINT fk_delivery_sale
         FOREIGN KEY (sale_id) REFERENCES sales(sale_id),
     CONSTRAINT fk_delivery_employee
@@ -480,21 +498,205 @@ CREATE TABLE role_permissions (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 
+-- audit_outbox
+-- Written by the trg_audit_* triggers inside the business transaction and
+-- drained into audit_logs in batches by utils/audit_writer.py.
+-- Kept narrow: no foreign keys and no secondary indexes.
+
+CREATE TABLE audit_outbox (
+    outbox_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    table_name VARCHAR(50) NOT NULL,
+    operation_type ENUM('INSERT','UPDATE','DELETE') NOT NULL,
+    old_value TEXT,
+    new_value TEXT,
+    record_id INT,
+    changed_by INT NULL,
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+
 -- audit_logs
+-- Append-only: rows arrive in outbox_id order, so inserts always go to
+-- the end of the clustered index. changed_by is not a foreign key.
 
 CREATE TABLE audit_logs (
-    log_id INT AUTO_INCREMENT PRIMARY KEY,
+    log_id BIGINT AUTO_INCREMENT PRIMARY KEY,
     table_name VARCHAR(50) NOT NULL,
     operation_type ENUM('INSERT','UPDATE','DELETE') NOT NULL,
     old_value TEXT,
     new_value TEXT,
     record_id INT,
     changed_by INT NULL,
-    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    CONSTRAINT fk_audit_user
-        FOREIGN KEY (changed_by) REFERENCES users(user_id)
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+
+-- entity_counters
+-- Row counts for dashboard / settings widgets, maintained by the
+-- trg_counter_* triggers. A counter is the SUM over its slots.
+
+CREATE TABLE entity_counters (
+    counter_name VARCHAR(50) NOT NULL,
+    slot TINYINT NOT NULL DEFAULT 0,
+    counter_value BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (counter_name, slot)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+
+-- bonus_ledger
+-- Bonus per pay period (month), employee and rule, written by
+-- utils/bonus_engine.py. basis is the sales volume (SALES rules)
+-- or the number of deliveries (DELIVERY rules) the rule applied to.
+
+CREATE TABLE bonus_ledger (
+    period_start DATE NOT NULL,
+    source ENUM('SALES','DELIVERY') NOT NULL,
+    employee_id INT NOT NULL,
+    rule_id INT NOT NULL,
+    basis DECIMAL(14,2) NOT NULL DEFAULT 0,
+    bonus_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+    computed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (period_start, source, employee_id, rule_id),
+    INDEX idx_bonus_ledger_employee (employee_id, period_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- bonus_dirty_periods
+-- Pay periods with new invoices / deliveries since the last
+-- computation (filled by the trg_bonus_* triggers).
+
+CREATE TABLE bonus_dirty_periods (
+    period_start DATE NOT NULL,
+    source ENUM('SALES','DELIVERY') NOT NULL,
+    PRIMARY KEY (source, period_start)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- bonus_engine_state
+-- rules_version is bumped by every bonus rule edit; when it differs
+-- from applied_version the engine recomputes all periods of the source.
+
+CREATE TABLE bonus_engine_state (
+    source ENUM('SALES','DELIVERY') PRIMARY KEY,
+    rules_version INT NOT NULL DEFAULT 0,
+    applied_version INT NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT INTO bonus_engine_state (source, rules_version, applied_version)
+VALUES ('SALES', 1, 0), ('DELIVERY', 1, 0);
+
+-- report_totals_daily
+-- Per-day grand totals used as contribution-percent denominators
+-- (invoice_amount = SUM(sales.total_amount) of invoices,
+--  item_amount = SUM(sales_items.final_amount)). Maintained by the
+-- trg_totals_* triggers; a day's value is the SUM over its slots.
+
+CREATE TABLE report_totals_daily (
+    total_day DATE NOT NULL,
+    metric VARCHAR(30) NOT NULL,
+    slot TINYINT NOT NULL DEFAULT 0,
+    total_value DECIMAL(18,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, total_day, slot)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- fulfillment_queue
+-- Paid invoices still waiting for a FULFILLMENT delivery. Filled by
+-- sp_confirm_sales_order, drained by sp_create_delivery_for_sale.
+-- A dispatcher claims rows for lease_until (utils/fulfillment_queue.py)
+-- so parallel dispatchers never see the same invoice.
+
+CREATE TABLE fulfillment_queue (
+    sale_id INT PRIMARY KEY,
+    location_id INT NOT NULL,
+    sale_date DATETIME NOT NULL,
+    claimed_by VARCHAR(100) NULL,
+    lease_until DATETIME NULL,
+    enqueued_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_fulfillment_queue_sale_date (sale_date),
+    INDEX idx_fulfillment_queue_claimed (claimed_by, lease_until)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- delivery_status_transitions
+-- Allowed delivery_status moves, checked set-wise by the bulk
+-- transition API (utils/delivery_dispatch.py). FAILED -> CREATED
+-- re-dispatches a parcel.
+
+CREATE TABLE delivery_status_transitions (
+    from_status ENUM('CREATED','PACKED','SHIPPED','DELIVERED','FAILED') NOT NULL,
+    to_status ENUM('CREATED','PACKED','SHIPPED','DELIVERED','FAILED') NOT NULL,
+    PRIMARY KEY (from_status, to_status)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+INSERT INTO delivery_status_transitions (from_status, to_status)
+VALUES
+    ('CREATED', 'PACKED'), ('CREATED', 'SHIPPED'), ('CREATED', 'FAILED'),
+    ('PACKED', 'SHIPPED'), ('PACKED', 'FAILED'),
+    ('SHIPPED', 'DELIVERED'), ('SHIPPED', 'FAILED'),
+    ('FAILED', 'CREATED');
+
+-- inventory_checkpoints
+-- Stock per product and store at the end of checkpoint_day, daily for
+-- recent days and weekly before that (utils/inventory_ledger.py). Stock
+-- at any instant is the nearest checkpoint plus the inventory_history
+-- rows in between. Pairs without stock are not stored.
+
+CREATE TABLE inventory_checkpoints (
+    checkpoint_day DATE NOT NULL,
+    product_id INT NOT NULL,
+    location_id INT NOT NULL,
+    quantity INT NOT NULL,
+    PRIMARY KEY (checkpoint_day, product_id, location_id),
+    INDEX idx_inventory_checkpoints_item (product_id, location_id, checkpoint_day)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- inventory_movement_daily
+-- inventory_history summed per day, product, store and change type for
+-- every closed day up to inventory_ledger_state.rolled_through; movement
+-- reports add the raw rows after that day.
+
+CREATE TABLE inventory_movement_daily (
+    movement_day DATE NOT NULL,
+    product_id INT NOT NULL,
+    location_id INT NOT NULL,
+    change_type ENUM('IN','OUT','TRANSFER','ADJUST') NOT NULL,
+    total_quantity INT NOT NULL,
+    movements INT NOT NULL,
+    PRIMARY KEY (movement_day, product_id, location_id, change_type),
+    INDEX idx_inventory_movement_daily_location (location_id, movement_day)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- inventory_ledger_state
+-- Single row; rolled_through is the last day in inventory_movement_daily.
+
+CREATE TABLE inventory_ledger_state (
+    ledger_id TINYINT PRIMARY KEY,
+    rolled_through DATE NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT INTO inventory_ledger_state (ledger_id, rolled_through)
+VALUES (1, NULL);
+
+-- inventory_reconcile_baseline
+-- Expected stock per product and location up to
+-- inventory_reconcile_state.watermark (a history_id); reconciliation
+-- adds the history rows above it. Set by the reconcile rebase.
+
+CREATE TABLE inventory_reconcile_baseline (
+    product_id INT NOT NULL,
+    location_id INT NOT NULL,
+    quantity INT NOT NULL,
+    PRIMARY KEY (product_id, location_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- inventory_reconcile_state
+-- Single row; watermark is NULL until a baseline was set.
+
+CREATE TABLE inventory_reconcile_state (
+    state_id TINYINT PRIMARY KEY,
+    watermark INT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT INTO inventory_reconcile_state (state_id, watermark)
+VALUES (1, NULL);
+
 -- =====================================================
 -- Verification
 -- =====================================================
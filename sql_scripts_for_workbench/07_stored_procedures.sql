@@ -74,6 +74,11 @@ END$$
 -- PROCEDURE 3: Confirm Sales Order & Generate Invoice
 -- FIXED: Initialize total_amount to 0, trigger will update it
 -- =========================================================
+-- Inventory rows of the order are locked up front in
+-- (product_id, location_id) order, so concurrent confirmations that
+-- share products wait on each other instead of deadlocking in the
+-- data-dependent order of trg_update_inventory_after_sale.
+-- Callers still retry 1213/1205 (utils/db_helper.run_transaction_with_retry).
 
 DROP PROCEDURE IF EXISTS sp_confirm_sales_order$$
 
@@ -83,6 +88,22 @@ CREATE PROCEDURE sp_confirm_sales_order (
 )
 BEGIN
     DECLARE v_sale_id INT;
+    DECLARE v_done INT DEFAULT 0;
+    DECLARE v_lock_product_id INT;
+    DECLARE v_lock_location_id INT;
+    DECLARE v_lock_quantity INT;
+
+    DECLARE cur_lock_inventory CURSOR FOR
+        SELECT i.product_id, i.location_id
+        FROM inventory i
+        JOIN (
+            SELECT DISTINCT product_id
+            FROM sales_order_items
+            WHERE order_id = p_order_id
+        ) oi ON oi.product_id = i.product_id
+        ORDER BY i.product_id, i.location_id;
+
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_done = 1;
 
     START TRANSACTION;
 
@@ -97,6 +118,25 @@ BEGIN
         SET MESSAGE_TEXT = 'Order not found or already confirmed';
     END IF;
 
+    -- Step 1b: Lock inventory rows one by one in (product_id, location_id) order
+    OPEN cur_lock_inventory;
+
+    lock_loop: LOOP
+        FETCH cur_lock_inventory INTO v_lock_product_id, v_lock_location_id;
+        IF v_done = 1 THEN
+            LEAVE lock_loop;
+        END IF;
+
+        SELECT quantity
+        INTO v_lock_quantity
+        FROM inventory
+        WHERE product_id = v_lock_product_id
+          AND location_id = v_lock_location_id
+        FOR UPDATE;
+    END LOOP;
+
+    CLOSE cur_lock_inventory;
+
     -- Step 2: Create invoice
     -- FIXED: Set total_amount = 0, trigger will update after inserting items
     INSERT INTO sales (
@@ -116,23 +156,38 @@ BEGIN
 
     SET v_sale_id = LAST_INSERT_ID();
 
-    -- Step 3: Copy order items into sales_items
-    -- This triggers: trg_calculate_sale_item_amount + trg_update_sales_total_after_insert
+    -- Step 3: Copy order items into sales_items at the amounts priced at
+    -- order entry (utils/promotion_engine, BUY_X_GET_Y included);
+    -- @priced_sale_id tells trg_calculate_sale_item_amount to keep them
+    SET @priced_sale_id = v_sale_id;
+
     INSERT INTO sales_items (
         sale_id,
         sale_type,
         product_id,
         quantity,
-        applied_promotion_id
+        applied_promotion_id,
+        final_amount
     )
     SELECT
         v_sale_id,
         'INVOICE',
         product_id,
         quantity,
-        applied_promotion_id
+        applied_promotion_id,
+        final_amount
     FROM sales_order_items
-    WHERE order_id = p_order_id;
+    WHERE order_id = p_order_id
+    ORDER BY product_id;
+
+    SET @priced_sale_id = NULL;
+
+    -- Step 4: Queue the invoice for delivery dispatch
+    INSERT INTO fulfillment_queue (sale_id, location_id, sale_date)
+    SELECT s.sale_id, so.location_id, s.sale_date
+    FROM sales s
+    JOIN sales_orders so ON s.order_id = so.order_id
+    WHERE s.sale_id = v_sale_id;
 
     COMMIT;
 END$$
@@ -151,6 +206,16 @@ CREATE PROCEDURE sp_create_delivery_for_sale (
     IN p_vendor_id INT
 )
 BEGIN
+    -- Take the invoice off the fulfillment queue; the row lock makes a
+    -- second dispatcher for the same invoice wait, then fail here
+    DELETE FROM fulfillment_queue
+    WHERE sale_id = p_sale_id;
+
+    IF ROW_COUNT() = 0 THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Invoice is not waiting for delivery';
+    END IF;
+
     INSERT INTO deliveries (
         delivery_type,
         sale_id,
@@ -239,6 +304,341 @@ BEGIN
     COMMIT;
 END$$
 
+-- =========================================================
+-- PROCEDURE 6: Rebuild Entity Counters
+-- Full recount into slot 0; run after bulk loads or when
+-- check_entity_counters.py reports drift
+-- =========================================================
+
+DROP PROCEDURE IF EXISTS sp_refresh_entity_counters$$
+
+CREATE PROCEDURE sp_refresh_entity_counters ()
+BEGIN
+    START TRANSACTION;
+
+    DELETE FROM entity_counters;
+
+    INSERT INTO entity_counters (counter_name, slot, counter_value)
+    SELECT 'users', 0, COUNT(*) FROM users
+    UNION ALL
+    SELECT 'employees', 0, COUNT(*) FROM employees
+    UNION ALL
+    SELECT 'active_employees', 0, COUNT(*) FROM employees WHERE is_inactive = FALSE
+    UNION ALL
+    SELECT 'products', 0, COUNT(*) FROM products
+    UNION ALL
+    SELECT 'active_products', 0, COUNT(*) FROM products WHERE status = 'ACTIVE'
+    UNION ALL
+    SELECT 'locations', 0, COUNT(*) FROM locations
+    UNION ALL
+    SELECT 'customers', 0, COUNT(*) FROM customers
+    UNION ALL
+    SELECT 'invoices', 0, COUNT(*) FROM sales WHERE sale_type = 'INVOICE'
+    UNION ALL
+    SELECT 'low_stock_items', 0, COUNT(*) FROM inventory WHERE quantity < 100;
+
+    COMMIT;
+END$$
+
+
+-- =========================================================
+-- PROCEDURE 7: Rebuild Report Totals
+-- Full recompute of report_totals_daily into slot 0; run after
+-- bulk loads or when the totals drift from the base tables
+-- =========================================================
+
+DROP PROCEDURE IF EXISTS sp_refresh_report_totals$$
+
+CREATE PROCEDURE sp_refresh_report_totals ()
+BEGIN
+    START TRANSACTION;
+
+    DELETE FROM report_totals_daily;
+
+    INSERT INTO report_totals_daily (metric, total_day, slot, total_value)
+    SELECT 'invoice_amount', DATE(sale_date), 0, SUM(total_amount)
+    FROM sales
+    WHERE sale_type = 'INVOICE'
+    GROUP BY DATE(sale_date)
+    UNION ALL
+    SELECT 'item_amount', DATE(sale_date), 0, SUM(final_amount)
+    FROM sales_items
+    GROUP BY DATE(sale_date);
+
+    COMMIT;
+END$$
+
+-- =========================================================
+-- PROCEDURE 8: Rebuild Fulfillment Queue
+-- Re-queues every paid invoice without a FULFILLMENT delivery;
+-- run after bulk loads (existing claims are kept)
+-- =========================================================
+
+DROP PROCEDURE IF EXISTS sp_refresh_fulfillment_queue$$
+
+CREATE PROCEDURE sp_refresh_fulfillment_queue ()
+BEGIN
+    START TRANSACTION;
+
+    DELETE q
+    FROM fulfillment_queue q
+    JOIN deliveries d
+        ON d.sale_id = q.sale_id
+       AND d.delivery_type = 'FULFILLMENT';
+
+    INSERT IGNORE INTO fulfillment_queue (sale_id, location_id, sale_date)
+    SELECT s.sale_id, so.location_id, s.sale_date
+    FROM sales s
+    JOIN sales_orders so ON s.order_id = so.order_id
+    WHERE s.sale_type = 'INVOICE'
+      AND s.invoice_status = 'PAID'
+      AND NOT EXISTS (
+          SELECT 1
+          FROM deliveries d
+          WHERE d.sale_id = s.sale_id
+            AND d.delivery_type = 'FULFILLMENT'
+      );
+
+    COMMIT;
+END$$
+
+-- =========================================================
+-- PROCEDURE 9: Process Multi-Line Return
+-- p_lines = [{"product_id": .., "quantity": ..}, ...] for one invoice:
+-- one RETURN sale, one RETURN delivery, set-wise restock and total
+-- =========================================================
+
+DROP PROCEDURE IF EXISTS sp_process_return_lines$$
+
+CREATE PROCEDURE sp_process_return_lines (
+    IN p_original_sale_id INT,
+    IN p_lines JSON,
+    IN p_payment_method_id INT,
+    IN p_return_location_id INT
+)
+BEGIN
+    DECLARE v_sale_date DATETIME;
+    DECLARE v_location_id INT;
+    DECLARE v_line_count INT;
+    DECLARE v_invalid INT;
+    DECLARE v_return_sale_id INT;
+    DECLARE v_return_date DATETIME;
+
+    START TRANSACTION;
+
+    -- Step 1: Lock the original invoice (serializes returns against it)
+    SELECT s.sale_date, COALESCE(p_return_location_id, so.location_id)
+    INTO v_sale_date, v_location_id
+    FROM sales s
+    JOIN sales_orders so ON s.order_id = so.order_id
+    WHERE s.sale_id = p_original_sale_id
+      AND s.sale_type = 'INVOICE'
+    FOR UPDATE;
+
+    IF v_sale_date IS NULL THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Original invoice not found';
+    END IF;
+
+    -- Step 2: Validate every line in one query: the product was sold on
+    -- the invoice and quantity <= sold - already returned
+    SELECT COUNT(*), COALESCE(SUM(
+        r.product_id IS NULL
+        OR r.min_quantity IS NULL
+        OR r.min_quantity <= 0
+        OR s.sold IS NULL
+        OR r.quantity > s.sold - COALESCE(pr.returned, 0)
+    ), 0)
+    INTO v_line_count, v_invalid
+    FROM (
+        SELECT jt.product_id, SUM(jt.quantity) AS quantity, MIN(jt.quantity) AS min_quantity
+        FROM JSON_TABLE(p_lines, '$[*]' COLUMNS (
+            product_id INT PATH '$.product_id',
+            quantity INT PATH '$.quantity'
+        )) jt
+        GROUP BY jt.product_id
+    ) r
+    LEFT JOIN (
+        SELECT product_id, SUM(quantity) AS sold
+        FROM sales_items
+        WHERE sale_id = p_original_sale_id
+          AND sale_date = v_sale_date
+          AND sale_type = 'INVOICE'
+        GROUP BY product_id
+    ) s ON s.product_id = r.product_id
+    LEFT JOIN (
+        SELECT si.product_id, -SUM(si.quantity) AS returned
+        FROM sales rs
+        JOIN sales_items si
+            ON si.sale_id = rs.sale_id
+           AND si.sale_date = rs.sale_date
+        WHERE rs.parent_sale_id = p_original_sale_id
+          AND rs.sale_type = 'RETURN'
+        GROUP BY si.product_id
+    ) pr ON pr.product_id = r.product_id;
+
+    IF v_line_count = 0 THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'No return lines';
+    END IF;
+
+    IF v_invalid > 0 THEN
+        SIGNAL SQLSTATE '45000'
+        SET MESSAGE_TEXT = 'Return lines exceed the quantities left on the invoice';
+    END IF;
+
+    -- Step 3: One return sale for all lines
+    INSERT INTO sales (
+        sale_type,
+        parent_sale_id,
+        payment_method_id,
+        invoice_status,
+        total_amount
+    )
+    VALUES (
+        'RETURN',
+        p_original_sale_id,
+        p_payment_method_id,
+        'REFUNDED',
+        0
+    );
+
+    SET v_return_sale_id = LAST_INSERT_ID();
+
+    SELECT sale_date
+    INTO v_return_date
+    FROM sales
+    WHERE sale_id = v_return_sale_id;
+
+    -- Step 4: All lines in one insert, refunded pro rata of what was paid.
+    -- The refund is rounded on the cumulative returned quantity minus what
+    -- earlier returns refunded, and the return that brings the line up to
+    -- the sold quantity refunds exactly the rest, so partial returns never
+    -- add up to more than was paid.
+    -- @priced_sale_id / @return_sale_id switch off the per-row pricing,
+    -- total and restock triggers for this return
+    SET @priced_sale_id = v_return_sale_id;
+    SET @return_sale_id = v_return_sale_id;
+
+    INSERT INTO sales_items (
+        sale_id,
+        sale_type,
+        product_id,
+        quantity,
+        applied_promotion_id,
+        final_amount
+    )
+    SELECT
+        v_return_sale_id,
+        'RETURN',
+        r.product_id,
+        -r.quantity,
+        s.promotion_id,
+        -GREATEST(
+            CASE
+                WHEN COALESCE(pr.returned, 0) + r.quantity >= s.sold
+                    THEN s.paid - COALESCE(pr.refunded, 0)
+                ELSE ROUND(s.paid * (COALESCE(pr.returned, 0) + r.quantity) / s.sold, 0)
+                     - COALESCE(pr.refunded, 0)
+            END,
+            0
+        )
+    FROM (
+        SELECT jt.product_id, SUM(jt.quantity) AS quantity
+        FROM JSON_TABLE(p_lines, '$[*]' COLUMNS (
+            product_id INT PATH '$.product_id',
+            quantity INT PATH '$.quantity'
+        )) jt
+        GROUP BY jt.product_id
+    ) r
+    JOIN (
+        SELECT
+            product_id,
+            SUM(quantity) AS sold,
+            SUM(final_amount) AS paid,
+            MAX(applied_promotion_id) AS promotion_id
+        FROM sales_items
+        WHERE sale_id = p_original_sale_id
+          AND sale_date = v_sale_date
+          AND sale_type = 'INVOICE'
+        GROUP BY product_id
+    ) s ON s.product_id = r.product_id
+    LEFT JOIN (
+        SELECT
+            si.product_id,
+            -SUM(si.quantity) AS returned,
+            -SUM(si.final_amount) AS refunded
+        FROM sales rs
+        JOIN sales_items si
+            ON si.sale_id = rs.sale_id
+           AND si.sale_date = rs.sale_date
+        WHERE rs.parent_sale_id = p_original_sale_id
+          AND rs.sale_type = 'RETURN'
+          AND rs.sale_id <> v_return_sale_id
+        GROUP BY si.product_id
+    ) pr ON pr.product_id = r.product_id
+    ORDER BY r.product_id;
+
+    SET @priced_sale_id = NULL;
+    SET @return_sale_id = NULL;
+
+    -- Step 5: Total once
+    UPDATE sales
+    SET total_amount = (
+        SELECT COALESCE(SUM(final_amount), 0)
+        FROM sales_items
+        WHERE sale_id = v_return_sale_id
+          AND sale_date = v_return_date
+    )
+    WHERE sale_id = v_return_sale_id;
+
+    -- Step 6: Restock the return location set-wise
+    INSERT INTO inventory (product_id, location_id, quantity)
+    SELECT product_id, v_location_id, -quantity
+    FROM sales_items
+    WHERE sale_id = v_return_sale_id
+      AND sale_date = v_return_date
+    ON DUPLICATE KEY UPDATE quantity = inventory.quantity + VALUES(quantity);
+
+    INSERT INTO inventory_history (
+        product_id,
+        location_id,
+        change_type,
+        quantity_change,
+        reference_table,
+        reference_id
+    )
+    SELECT
+        product_id,
+        v_location_id,
+        'IN',
+        -quantity,
+        'sales_items',
+        sale_item_id
+    FROM sales_items
+    WHERE sale_id = v_return_sale_id
+      AND sale_date = v_return_date
+    ORDER BY sale_item_id;
+
+    -- Step 7: One return delivery
+    INSERT INTO deliveries (
+        delivery_type,
+        sale_id,
+        to_location_id,
+        delivery_status
+    )
+    VALUES (
+        'RETURN',
+        v_return_sale_id,
+        v_location_id,
+        'CREATED'
+    );
+
+    COMMIT;
+
+    SELECT v_return_sale_id AS return_sale_id;
+END$$
+
 DELIMITER ;
 
 -- Verify procedures
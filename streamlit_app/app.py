@@ -1,7 +1,11 @@
 import streamlit as st
 import os
 from pathlib import Path
+from utils.startup import mark
 from utils.auth import authenticate_user, is_authenticated, logout
+from utils.query_metrics import measure, show_query_metrics
+
+mark("app imports")
 
 # ============================================================
 # DATABASE INITIALIZATION WITH SMART LOADING SCREEN
@@ -44,7 +48,7 @@ def check_database_exists():
 def check_database_exists_cached():
     return check_database_exists()
 
-def show_init_loading_screen():
+def show_init_loading_screen(step=None):
     """Display full-screen loading overlay during database initialization"""
     st.markdown("""
         <style>
@@ -142,7 +146,7 @@ def show_init_loading_screen():
             </div>
             <div class="init-details">
                 Setting up database for the first time.<br>
-                This process may take 10-30 seconds.
+                """ + (step or "This process may take 10-30 seconds.") + """
             </div>
         </div>
     """, unsafe_allow_html=True)
@@ -293,74 +297,71 @@ def show_error_screen(error_message):
 
 
 def initialize_database():
-    """Initialize database with full-screen loading UI"""
+    """Initialize database in a background job while showing the full-screen loading UI"""
     
-    from config.init_db import init_db
-    if st.session_state.get("db_initializing", False):
-        show_init_loading_screen()
-        st.stop()
-
-    st.session_state["db_initializing"] = True
-
-    # Show loading screen
-    loading_placeholder = st.empty()
+    from utils.job_runner import ACTIVE_STATUSES, get_job, submit_job
     
-    with loading_placeholder.container():
-        show_init_loading_screen()
+    # unique=True: sessions opened during the init attach to the same job
+    if "db_init_job" not in st.session_state:
+        st.session_state["db_init_job"] = submit_job(
+            "init_db", label="Database initialization", unique=True
+        )
     
-    # Perform initialization
-    try:
-
-        success, msg = init_db()
-
-        if success:
-            # Clear loading screen
-            loading_placeholder.empty()
-            
-            # Show success screen
-            success_placeholder = st.empty()
-            with success_placeholder.container():
-                show_success_screen()
-            
-            # Mark as initialized
-            st.session_state.db_initialized = True
-            st.session_state.init_success = True
-            
-            # Show balloons
-            st.balloons()
-            
-            # Wait briefly then reload
-            import time
-            time.sleep(2)
-            
-            # Clear success screen and reload
-            success_placeholder.empty()
-            st.rerun()
-            
-        else:
-            loading_placeholder.empty()
-            # show_error_screen("Database initialization returned False. Check console logs for details.")
-            show_error_screen(msg)
-            print(msg)
-    except Exception as e:
-        loading_placeholder.empty()
-        error_msg = f"Exception: {str(e)}\n\nType: {type(e).__name__}"
-        show_error_screen(error_msg)
+    job = get_job(st.session_state["db_init_job"])
+    
+    if job is None:
+        show_error_screen("Initialization job not found")
+        return
+    
+    if job["status"] in ACTIVE_STATUSES:
+        # Poll the job; the work continues even if this tab is closed
+        show_init_loading_screen(job["message"])
+        import time
+        time.sleep(1)
+        st.rerun()
+    
+    if job["status"] == "succeeded":
+        # Show success screen
+        success_placeholder = st.empty()
+        with success_placeholder.container():
+            show_success_screen()
+        
+        # Mark as initialized
+        st.session_state.db_initialized = True
+        st.session_state.init_success = True
+        
+        # Show balloons
+        st.balloons()
+        
+        # Wait briefly then reload
+        import time
+        time.sleep(2)
+        
+        # Clear success screen and reload
+        success_placeholder.empty()
+        st.rerun()
+    
+    error_msg = job["error"] or "Initialization was cancelled"
+    print(error_msg)
+    show_error_screen(error_msg)
 
 
 # ============================================================
 # SMART DATABASE CHECK
 # ============================================================
 
-if 'db_initialized' not in st.session_state:
-    # Quick check: if database already exists, skip loading screen
-    if check_database_exists_cached():
-        # Database already exists - skip loading, go straight to login
-        st.session_state.db_initialized = True
-        st.session_state.db_skip_init = True
-    else:
-        # Database doesn't exist - show loading screen and initialize
-        initialize_database()
+def ensure_database_initialized():
+    """Check the database once per session; runs after the login header is painted"""
+    if 'db_initialized' not in st.session_state:
+        # Quick check: if database already exists, skip loading screen
+        if check_database_exists_cached():
+            # Database already exists - skip loading, go straight to login
+            st.session_state.db_initialized = True
+            st.session_state.db_skip_init = True
+        else:
+            # Database doesn't exist - show loading screen and initialize
+            initialize_database()
+        mark("database check")
 
 # ============================================================
 # MAIN APP (Only accessible after database check)
@@ -403,6 +404,10 @@ def login_page():
             </div>
         </div>
     """, unsafe_allow_html=True)
+    mark("login header painted")
+    
+    # The header is already on screen; the DB round-trip happens behind it
+    ensure_database_initialized()
     
     col1, col2, col3 = st.columns([1, 2, 1])
     
@@ -484,37 +489,51 @@ def main_app():
         if st.button("🚪 Logout", use_container_width=True):
             logout()
     
-    # Main content
-    if page == "🏠 Dashboard":
-        import pages.dashboard as dashboard
-        dashboard.show()
-    elif page == "👥 Users":
-        import pages.users as users
-        users.show()
-    elif page == "🛒 Sales Operations":
-        import pages.sales_operations as sales_operations
-        sales_operations.show()
-    elif page == "👨‍💼 Employees":
-        import pages.employees as employees
-        employees.show()
-    elif page == "📍 Locations":
-        import pages.locations as locations
-        locations.show()
-    elif page == "📦 Products":
-        import pages.products as products
-        products.show()
-    elif page == "📊 Reports":
-        import pages.reports as reports
-        reports.show()
-    elif page == "⚙️ Settings":
-        import pages.settings as settings
-        settings.show()
+    # Main content (queries counted per interaction, see utils/query_metrics)
+    with measure(f"page {page}"):
+        if page == "🏠 Dashboard":
+            import pages.dashboard as dashboard
+            dashboard.show()
+        elif page == "👥 Users":
+            import pages.users as users
+            users.show()
+        elif page == "🛒 Sales Operations":
+            import pages.sales_operations as sales_operations
+            sales_operations.show()
+        elif page == "👨‍💼 Employees":
+            import pages.employees as employees
+            employees.show()
+        elif page == "📍 Locations":
+            import pages.locations as locations
+            locations.show()
+        elif page == "📦 Products":
+            import pages.products as products
+            products.show()
+        elif page == "📊 Reports":
+            import pages.reports as reports
+            reports.show()
+        elif page == "⚙️ Settings":
+            import pages.settings as settings
+            settings.show()
+    
+    show_query_metrics()
 
 # Main execution
 def main():
     if not is_authenticated():
         login_page()
     else:
+        ensure_database_initialized()
+
+        # Audit events are drained from audit_outbox off the request path
+        from utils.audit_writer import start_audit_writer
+        start_audit_writer()
+
+        # Queued, retrying and stale jobs left by a restart are picked up
+        # without waiting for the next submit_job()
+        from utils.job_runner import start_job_workers
+        start_job_workers()
+
         main_app()
 if __name__ == "__main__":
     main()
\ No newline at end of file
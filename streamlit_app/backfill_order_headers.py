@@ -0,0 +1,165 @@
+import argparse
+import time
+from sqlalchemy import text
+from config.session import engine, ensure_database_ready
+from config.init_db import SQL_DIR, run_missing_triggers
+
+BATCH_SIZE = 5000
+
+# Header columns added to sales_orders (kept current by triggers 11-14)
+HEADER_COLUMNS = {
+    "item_count": "INT NOT NULL DEFAULT 0",
+    "total_amount": "DECIMAL(14,2) NOT NULL DEFAULT 0",
+    "sale_id": "INT NULL",
+    "invoice_status": "ENUM('PAID','UNPAID','REFUNDED') NULL",
+    "latest_delivery_status": "ENUM('CREATED','PACKED','SHIPPED','DELIVERED','FAILED') NULL",
+}
+
+HEADER_INDEX = "idx_orders_status_date"
+
+HEADER_TRIGGERS = [
+    "trg_order_header_after_item_insert",
+    "trg_order_header_after_sale_insert",
+    "trg_order_header_after_delivery_insert",
+    "trg_order_header_after_delivery_update",
+]
+
+# Recompute the header summary for one order_id range from the detail tables
+BACKFILL_SQL = """
+    UPDATE sales_orders so
+    LEFT JOIN (
+        SELECT order_id, COUNT(*) AS item_count, SUM(final_amount) AS total_amount
+        FROM sales_order_items
+        WHERE order_id BETWEEN :lo AND :hi
+        GROUP BY order_id
+    ) i ON i.order_id = so.order_id
+    LEFT JOIN (
+        SELECT order_id, MAX(sale_id) AS sale_id
+        FROM sales
+        WHERE sale_type = 'INVOICE'
+          AND order_id BETWEEN :lo AND :hi
+        GROUP BY order_id
+    ) inv ON inv.order_id = so.order_id
+    LEFT JOIN sales s ON s.sale_id = inv.sale_id
+    LEFT JOIN (
+        SELECT sale_id, MAX(delivery_id) AS delivery_id
+        FROM deliveries
+        WHERE delivery_type = 'FULFILLMENT'
+        GROUP BY sale_id
+    ) ld ON ld.sale_id = inv.sale_id
+    LEFT JOIN deliveries d ON d.delivery_id = ld.delivery_id
+    SET so.item_count = COALESCE(i.item_count, 0),
+        so.total_amount = COALESCE(i.total_amount, 0),
+        so.sale_id = inv.sale_id,
+        so.invoice_status = s.invoice_status,
+        so.latest_delivery_status = d.delivery_status
+    WHERE so.order_id BETWEEN :lo AND :hi
+"""
+
+# Orders whose stored item totals disagree with sales_order_items
+VERIFY_SQL = """
+    SELECT COUNT(*)
+    FROM sales_orders so
+    LEFT JOIN (
+        SELECT order_id, COUNT(*) AS item_count, SUM(final_amount) AS total_amount
+        FROM sales_order_items
+        GROUP BY order_id
+    ) i ON i.order_id = so.order_id
+    WHERE so.item_count <> COALESCE(i.item_count, 0)
+       OR so.total_amount <> COALESCE(i.total_amount, 0)
+"""
+
+
+def ensure_header_schema(conn):
+    """Add missing header columns and index to an existing database"""
+    existing = {
+        row[0] for row in conn.execute(text("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = 'sales_orders'
+        """))
+    }
+
+    for column, definition in HEADER_COLUMNS.items():
+        if column not in existing:
+            conn.execute(text(f"ALTER TABLE sales_orders ADD COLUMN {column} {definition}"))
+            print(f"➕ Added column sales_orders.{column}")
+
+    has_index = conn.execute(text("""
+        SELECT COUNT(*)
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+          AND table_name = 'sales_orders'
+          AND index_name = :idx
+    """), {"idx": HEADER_INDEX}).scalar()
+
+    if not has_index:
+        conn.execute(text(f"CREATE INDEX {HEADER_INDEX} ON sales_orders (order_status, order_date)"))
+        print(f"➕ Added index {HEADER_INDEX}")
+
+
+def ensure_header_triggers():
+    """Create the header triggers from 04_triggers.sql if they are missing"""
+    for name in run_missing_triggers(SQL_DIR / "04_triggers.sql", HEADER_TRIGGERS):
+        print(f"➕ Created trigger {name}")
+
+
+def backfill(batch_size=BATCH_SIZE):
+    """Recompute header columns for every order in order_id batches"""
+    with engine.connect() as conn:
+        bounds = conn.execute(text("SELECT MIN(order_id), MAX(order_id) FROM sales_orders")).fetchone()
+
+    if bounds[0] is None:
+        print("ℹ️ No orders to backfill")
+        return 0
+
+    lo, max_id = bounds
+    updated = 0
+
+    while lo <= max_id:
+        hi = lo + batch_size - 1
+
+        # One short transaction per batch keeps row locks brief
+        with engine.begin() as conn:
+            result = conn.execute(text(BACKFILL_SQL), {"lo": lo, "hi": hi})
+            updated += result.rowcount
+
+        print(f"🟢 Orders {lo}-{hi} done")
+        lo = hi + 1
+
+    return updated
+
+
+def count_drift():
+    """Number of orders whose header totals disagree with their items"""
+    with engine.connect() as conn:
+        return conn.execute(text(VERIFY_SQL)).scalar() or 0
+
+
+# =========================
+# Run backfill
+# =========================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill denormalized sales_orders header columns")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--verify", action="store_true", help="only report orders with drifted totals")
+    args = parser.parse_args()
+
+    ensure_database_ready()
+
+    if args.verify:
+        print(f"📊 Orders with drifted totals: {count_drift()}")
+    else:
+        start_time = time.time()
+
+        with engine.begin() as conn:
+            ensure_header_schema(conn)
+        ensure_header_triggers()
+
+        updated = backfill(args.batch_size)
+
+        print("===================================")
+        print(f"Rows updated: {updated}")
+        print(f"Orders with drifted totals: {count_drift()}")
+        print(f"Total time: {time.time() - start_time:.2f} seconds")
+        print("===================================")
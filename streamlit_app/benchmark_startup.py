@@ -0,0 +1,111 @@
+import ast
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent
+
+# Modules imported before the login page can paint
+LOGIN_PATH_MODULES = ["utils.startup", "config.session", "utils.auth", "utils.query_metrics"]
+
+# Must stay off the login path: loaded only when actually needed
+DEFERRED_MODULES = ["passlib", "argon2", "plotly", "plotly.express", "plotly.graph_objects"]
+
+# Cold-start import budget for the login path, in milliseconds
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1500"))
+
+RUNS = int(os.getenv("STARTUP_BENCH_RUNS", "5"))
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_importtime(probe):
+    """Run `probe` in a fresh interpreter with -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", probe],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+    )
+
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Only top-level entries are counted, nested ones are already included
+        if match and match.group(3) == " ":
+            cumulative[match.group(4)] = int(match.group(2))
+
+    return cumulative, result.stdout
+
+
+def measure_once(interpreter_modules):
+    """
+    Import the login-path modules in a fresh interpreter
+    Returns (cumulative_us per top-level module, set of loaded deferred modules)
+    """
+    probe = (
+        "".join(f"import {m}\n" for m in LOGIN_PATH_MODULES)
+        + "import sys\n"
+        + f"print([m for m in {DEFERRED_MODULES!r} if m in sys.modules])\n"
+    )
+
+    cumulative, stdout = run_importtime(probe)
+
+    # Drop what the bare interpreter imports on its own (site, encodings, ...)
+    cumulative = {name: us for name, us in cumulative.items() if name not in interpreter_modules}
+
+    loaded = set(ast.literal_eval(stdout.strip().splitlines()[-1]))
+    return cumulative, loaded
+
+
+# =========================
+# Run benchmark
+# =========================
+if __name__ == "__main__":
+    totals = []
+    slowest = {}
+    leaked = set()
+
+    interpreter_modules, _ = run_importtime("pass")
+
+    for run in range(RUNS):
+        cumulative, loaded = measure_once(interpreter_modules)
+        total_ms = sum(cumulative.values()) / 1000
+        totals.append(total_ms)
+        leaked |= loaded
+
+        for name, us in cumulative.items():
+            slowest[name] = max(slowest.get(name, 0), us)
+
+        print(f"🟡 Run {run + 1}: {total_ms:.1f} ms")
+
+    best_ms = min(totals)
+    median_ms = sorted(totals)[len(totals) // 2]
+
+    print("===================================")
+    print(f"Login-path modules: {', '.join(LOGIN_PATH_MODULES)}")
+    print(f"Best: {best_ms:.1f} ms | Median: {median_ms:.1f} ms | Budget: {IMPORT_BUDGET_MS:.0f} ms")
+    print("Slowest top-level imports:")
+    for name, us in sorted(slowest.items(), key=lambda x: x[1], reverse=True)[:10]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+    print("===================================")
+
+    failed = False
+
+    if leaked:
+        print(f"❌ Deferred modules loaded on the login path: {', '.join(sorted(leaked))}")
+        failed = True
+
+    if median_ms > IMPORT_BUDGET_MS:
+        print(f"❌ Import time {median_ms:.1f} ms exceeds budget {IMPORT_BUDGET_MS:.0f} ms")
+        failed = True
+
+    if not failed:
+        print("✅ Startup import budget OK")
+
+    sys.exit(1 if failed else 0)
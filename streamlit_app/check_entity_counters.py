@@ -0,0 +1,31 @@
+import argparse
+from utils.entity_counters import check_counters, ensure_counter_schema, refresh_counters
+
+
+# =========================
+# Run consistency check
+# =========================
+#   python check_entity_counters.py            report drift (exit 1 if any)
+#   python check_entity_counters.py --repair   recount after reporting
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare entity_counters with the base tables")
+    parser.add_argument("--repair", action="store_true", help="rebuild counters with sp_refresh_entity_counters")
+    args = parser.parse_args()
+
+    ensure_counter_schema()
+
+    drift = check_counters()
+
+    print("===================================")
+    if not drift:
+        print("✅ All entity counters match")
+    for name, (stored, actual) in drift.items():
+        print(f"❌ {name}: stored {stored:,} | actual {actual:,}")
+    print("===================================")
+
+    if drift and args.repair:
+        refresh_counters()
+        drift = check_counters()
+        print("✅ Counters rebuilt" if not drift else f"⚠️ Still drifting: {', '.join(drift)}")
+
+    raise SystemExit(1 if drift else 0)
@@ -0,0 +1,129 @@
+import argparse
+import random
+import uuid
+from decimal import Decimal
+
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+from utils.order_pricing import OrderLine, ensure_pricing_triggers, insert_order_lines, price_lines
+
+
+def random_promotions(conn, rng, count):
+    """Temporary promotions with random percent / fixed discounts and statuses (rolled back)"""
+    campaign_id = conn.execute(text("SELECT MIN(campaign_id) FROM promotions_campaigns")).scalar()
+    ids = []
+
+    for _ in range(count):
+        percent = rng.choice([None, Decimal(rng.randint(1, 9999)) / 100])
+        value = None if percent else rng.choice([None, Decimal(rng.randint(1, 5_000_000)) / 100])
+        result = conn.execute(text("""
+            INSERT INTO promotions (promotion_code, rule_type, discount_value, discount_percent, status, campaign_id)
+            VALUES (:code, :rule, :value, :percent, :status, :campaign)
+        """), {
+            "code": f"PARITY-{uuid.uuid4().hex[:12]}",
+            "rule": "PERCENT" if percent else "FIXED",
+            "value": value,
+            "percent": percent,
+            "status": rng.choice(["ACTIVE", "ACTIVE", "EXPIRED"]),
+            "campaign": campaign_id,
+        })
+        ids.append(result.lastrowid)
+
+    return ids
+
+
+def new_order(conn, customer_id, employee_id, location_id):
+    return conn.execute(text("""
+        INSERT INTO sales_orders (customer_id, employee_id, location_id, order_status)
+        VALUES (:c, :e, :l, 'OPEN')
+    """), {"c": customer_id, "e": employee_id, "l": location_id}).lastrowid
+
+
+def order_snapshot(conn, order_id):
+    items = conn.execute(text("""
+        SELECT product_id, quantity, applied_promotion_id, final_amount
+        FROM sales_order_items
+        WHERE order_id = :oid
+        ORDER BY product_id
+    """), {"oid": order_id}).fetchall()
+    header = conn.execute(text("""
+        SELECT item_count, total_amount FROM sales_orders WHERE order_id = :oid
+    """), {"oid": order_id}).fetchone()
+    return [tuple(row) for row in items], tuple(header)
+
+
+# =========================
+# Run parity check
+# =========================
+#   python check_order_pricing_parity.py                  200 random orders
+#   python check_order_pricing_parity.py --orders 1000 --seed 7
+# Every row is written inside one transaction that is rolled back.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare batch order pricing with trg_calculate_order_item_amount")
+    parser.add_argument("--orders", type=int, default=200, help="random orders to price")
+    parser.add_argument("--promotions", type=int, default=40, help="temporary random promotions")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    ensure_database_ready()
+    ensure_pricing_triggers()
+
+    mismatches = []
+    lines_checked = 0
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            product_ids = [row[0] for row in conn.execute(text("SELECT product_id FROM products"))]
+            customer_id = conn.execute(text("SELECT MIN(customer_id) FROM customers")).scalar()
+            employee_id = conn.execute(text("SELECT MIN(employee_id) FROM employees")).scalar()
+            location_id = conn.execute(text("SELECT MIN(location_id) FROM locations")).scalar()
+
+            promotion_ids = [row[0] for row in conn.execute(text("SELECT promotion_id FROM promotions"))]
+            promotion_ids += random_promotions(conn, rng, args.promotions)
+
+            for _ in range(args.orders):
+                products = rng.sample(product_ids, rng.randint(1, min(5, len(product_ids))))
+                specs = [
+                    (product_id, rng.choice([1, 1, 2, 3, rng.randint(1, 500)]), rng.choice([None] + promotion_ids))
+                    for product_id in products
+                ]
+
+                # Reference: one INSERT per line through the trigger
+                trigger_order = new_order(conn, customer_id, employee_id, location_id)
+                for product_id, quantity, promotion_id in specs:
+                    conn.execute(text("""
+                        INSERT INTO sales_order_items (order_id, product_id, quantity, applied_promotion_id, final_amount)
+                        VALUES (:o, :p, :q, :promo, 0)
+                    """), {"o": trigger_order, "p": product_id, "q": quantity, "promo": promotion_id})
+
+                # Candidate: batch pricing + multi-row insert
+                batch_order = new_order(conn, customer_id, employee_id, location_id)
+                lines = [OrderLine(batch_order, *spec) for spec in specs]
+                priced = dict(zip((line.product_id for line in lines), price_lines(conn, lines)))
+                insert_order_lines(conn, lines)
+
+                expected = order_snapshot(conn, trigger_order)
+                actual = order_snapshot(conn, batch_order)
+                lines_checked += len(specs)
+
+                for row in expected[0]:
+                    if priced[row[0]] != row[3]:
+                        mismatches.append((row, priced[row[0]]))
+                if expected != actual:
+                    mismatches.append((expected, actual))
+        finally:
+            trans.rollback()
+
+    print("===================================")
+    print(f"Orders: {args.orders:,} | Lines: {lines_checked:,}")
+    if not mismatches:
+        print("✅ Batch pricing matches the trigger exactly")
+    for expected, actual in mismatches[:20]:
+        print(f"❌ trigger {expected} | batch {actual}")
+    print("===================================")
+
+    raise SystemExit(1 if mismatches else 0)
@@ -1,8 +1,13 @@
 from pathlib import Path
 import re
 from sqlalchemy import text
-from config.session import engine
+from config.session import engine, ensure_database_ready
 from config.seed_admin import create_admin_if_not_exists
+from utils.entity_counters import refresh_counters
+from utils.report_totals import refresh_report_totals
+from utils.fulfillment_queue import refresh_fulfillment_queue
+from utils.inventory_ledger import update_inventory_ledger
+from utils.inventory_reconcile import rebase as rebase_inventory_reconcile
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 SQL_DIR = BASE_DIR / "sql"
@@ -61,6 +66,116 @@ def run_triggers(path: Path):
 
             sql = part + "\nEND;"
             conn.exec_driver_sql(sql)
+
+def run_missing_triggers(path: Path, names=None):
+    """Create triggers from `path` that do not exist yet (optionally only `names`)"""
+    raw = path.read_text(encoding="utf-8")
+    raw = re.sub(r"/\*.*?\*/", "", raw, flags=re.S)
+    raw = re.sub(r"^\s*--.*$", "", raw, flags=re.M)
+
+    parts = re.split(r"\bEND\s*;\s*", raw, flags=re.I)
+    created = []
+
+    with engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("""
+                SELECT trigger_name
+                FROM information_schema.triggers
+                WHERE trigger_schema = DATABASE()
+            """))
+        }
+
+        for part in parts:
+            match = re.search(r"CREATE TRIGGER\s+(\w+)", part, flags=re.I)
+            if not match:
+                continue
+
+            name = match.group(1)
+            if name in existing or (names is not None and name not in names):
+                continue
+
+            conn.exec_driver_sql(part.strip() + "\nEND;")
+            created.append(name)
+
+    return created
+
+def replace_triggers(path: Path, names):
+    """Drop and recreate the triggers `names` from `path` (for changed definitions)"""
+    raw = path.read_text(encoding="utf-8")
+    raw = re.sub(r"/\*.*?\*/", "", raw, flags=re.S)
+    raw = re.sub(r"^\s*--.*$", "", raw, flags=re.M)
+
+    parts = re.split(r"\bEND\s*;\s*", raw, flags=re.I)
+    replaced = []
+
+    with engine.begin() as conn:
+        for part in parts:
+            match = re.search(r"CREATE TRIGGER\s+(\w+)", part, flags=re.I)
+            if not match or match.group(1) not in names:
+                continue
+
+            name = match.group(1)
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+            conn.exec_driver_sql(part.strip() + "\nEND;")
+            replaced.append(name)
+
+    return replaced
+
+def run_missing_procedures(path: Path, names=None):
+    """Create procedures from `path` that do not exist yet (optionally only `names`)"""
+    raw = path.read_text(encoding="utf-8")
+    raw = re.sub(r"/\*.*?\*/", "", raw, flags=re.S)
+    raw = re.sub(r"^\s*--.*$", "", raw, flags=re.M)
+
+    parts = re.split(r"\bEND\s*;\s*", raw, flags=re.I)
+    created = []
+
+    with engine.begin() as conn:
+        existing = {
+            row[0] for row in conn.execute(text("""
+                SELECT routine_name
+                FROM information_schema.routines
+                WHERE routine_schema = DATABASE()
+                  AND routine_type = 'PROCEDURE'
+            """))
+        }
+
+        for part in parts:
+            match = re.search(r"CREATE PROCEDURE\s+(\w+)", part, flags=re.I)
+            if not match:
+                continue
+
+            name = match.group(1)
+            if name in existing or (names is not None and name not in names):
+                continue
+
+            conn.exec_driver_sql(part.strip() + "\nEND;")
+            created.append(name)
+
+    return created
+
+def replace_procedures(path: Path, names):
+    """Drop and recreate the procedures `names` from `path` (for changed definitions)"""
+    raw = path.read_text(encoding="utf-8")
+    raw = re.sub(r"/\*.*?\*/", "", raw, flags=re.S)
+    raw = re.sub(r"^\s*--.*$", "", raw, flags=re.M)
+
+    parts = re.split(r"\bEND\s*;\s*", raw, flags=re.I)
+    replaced = []
+
+    with engine.begin() as conn:
+        for part in parts:
+            match = re.search(r"CREATE PROCEDURE\s+(\w+)", part, flags=re.I)
+            if not match or match.group(1) not in names:
+                continue
+
+            name = match.group(1)
+            conn.exec_driver_sql(f"DROP PROCEDURE IF EXISTS {name}")
+            conn.exec_driver_sql(part.strip() + "\nEND;")
+            replaced.append(name)
+
+    return replaced
+
 def run_procedures(path: Path):
     raw = path.read_text(encoding="utf-8")
 
@@ -87,31 +202,56 @@ def run_procedures(path: Path):
 # INIT DB
 # =========================
 
-def init_db():
+def install_partition_integrity():
+    """Trigger-based FK checks of sql/09 while any fact table is partitioned"""
+    # partition_manager imports this module
+    from utils.partition_manager import install_integrity_triggers
+
+    install_integrity_triggers()
+
+
+def init_db(progress=None):
+    """
+    Create the schema, sample data, triggers, views and procedures
+
+    progress: optional callable(done, total, message) called before each step
+    """
     try:
+        ensure_database_ready()
+
         if database_is_initialized():
             print("⏭️ DB already initialized")
-            return     
+            return True, "Already initialized"
 
 
         print("🚀 Initializing DB...")
 
-        run_plain_sql(SQL_DIR / "01_ddl.sql")
-        run_plain_sql(SQL_DIR / "02_rbac.sql")
-        run_plain_sql(SQL_DIR / "03_sample_data.sql")
-
-        run_triggers(SQL_DIR / "04_triggers.sql")
-
-        run_plain_sql(SQL_DIR / "05_generate_tran_data.sql")
-        run_plain_sql(SQL_DIR / "06_views.sql")
-
-        run_procedures(SQL_DIR / "07_stored_procedures.sql")
+        steps = [
+            ("Creating tables", lambda: run_plain_sql(SQL_DIR / "01_ddl.sql")),
+            ("Creating roles and permissions", lambda: run_plain_sql(SQL_DIR / "02_rbac.sql")),
+            ("Loading sample data", lambda: run_plain_sql(SQL_DIR / "03_sample_data.sql")),
+            ("Creating triggers", lambda: run_triggers(SQL_DIR / "04_triggers.sql")),
+            ("Generating transactions", lambda: run_plain_sql(SQL_DIR / "05_generate_tran_data.sql")),
+            ("Creating views", lambda: run_plain_sql(SQL_DIR / "06_views.sql")),
+            ("Creating stored procedures", lambda: run_procedures(SQL_DIR / "07_stored_procedures.sql")),
+            ("Checking partition integrity triggers", install_partition_integrity),
+            # Sample data was loaded before the counter triggers existed
+            ("Refreshing counters", refresh_counters),
+            ("Refreshing report totals", refresh_report_totals),
+            ("Refreshing fulfillment queue", refresh_fulfillment_queue),
+            ("Building inventory checkpoints", update_inventory_ledger),
+            # Sample stock is seeded without inventory_history rows
+            ("Setting inventory reconcile baseline", rebase_inventory_reconcile),
+            ("Creating admin user", create_admin_if_not_exists),
+        ]
 
-        create_admin_if_not_exists()
+        for done, (label, step) in enumerate(steps):
+            if progress:
+                progress(done, len(steps), label)
+            step()
 
         print("🎉 DB INIT DONE")
 
         return True, "OK"
     except Exception as e:
         return False, str(e)
-    
\ No newline at end of file
@@ -1,16 +1,10 @@
 import os
 from sqlalchemy import text
-from passlib.context import CryptContext
 from config.session import engine
 from dotenv import load_dotenv
 
 load_dotenv()
 
-pwd_context = CryptContext(
-    schemes=["argon2"],
-    deprecated="auto"
-)
-
 def create_admin_if_not_exists():
     username = os.getenv("ADMIN_USERNAME")
     email = os.getenv("ADMIN_EMAIL")
@@ -20,6 +14,10 @@ def create_admin_if_not_exists():
         print("⚠️ ADMIN credentials not set — skipping admin creation")
         return
 
+    # Imported here so seeding does not pull passlib into the app's import path
+    from passlib.context import CryptContext
+    pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+
     password = password.strip()
     hashed_password = pwd_context.hash(password)
 
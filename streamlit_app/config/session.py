@@ -2,17 +2,20 @@
 Database Session Management - STREAMLIT SAFE
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 import atexit
+import threading
 
 from config.config import DATABASE_URL, ensure_database_exists
 
-# Ensure DB exists
-ensure_database_exists()
+# Database existence is checked on first use, not at import, so that
+# importing this module never blocks on a MySQL round-trip
+_database_ready = False
+_database_ready_lock = threading.Lock()
 
-# Engine (NO POOLING)
+# Engine (NO POOLING) - creating it does not open a connection
 engine = create_engine(
     DATABASE_URL,
     echo=False,
@@ -24,6 +27,25 @@ engine = create_engine(
     }
 )
 
+# Connections currently checked out of the engine (for the connection monitors)
+_checked_out = 0
+_checked_out_lock = threading.Lock()
+
+
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    global _checked_out
+    with _checked_out_lock:
+        _checked_out += 1
+
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    global _checked_out
+    with _checked_out_lock:
+        _checked_out = max(0, _checked_out - 1)
+
+
 SessionLocal = sessionmaker(
     bind=engine,
     autocommit=False,
@@ -31,7 +53,20 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+def ensure_database_ready():
+    """Create the database on first use. Runs once per process."""
+    global _database_ready
+
+    if _database_ready:
+        return
+
+    with _database_ready_lock:
+        if not _database_ready:
+            ensure_database_exists()
+            _database_ready = True
+
 def get_db():
+    ensure_database_ready()
     db = SessionLocal()
     try:
         yield db
@@ -39,6 +74,7 @@ def get_db():
         db.close()
 
 def get_db_connection():
+    ensure_database_ready()
     return SessionLocal()
 
 def dispose_all_connections():
@@ -48,6 +84,23 @@ def dispose_all_connections():
     except Exception as e:
         print(f"⚠️ Dispose error: {e}")
 
+def get_connection_stats():
+    """Connection counters; NullPool keeps no idle connections, so only checked-out ones exist"""
+    try:
+        return {
+            "pool_size": 0,
+            "checked_in": 0,
+            "checked_out": _checked_out,
+            "overflow": 0,
+            "total": _checked_out,
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+def force_cleanup():
+    """Dispose the engine (NullPool has nothing else to reclaim)"""
+    dispose_all_connections()
+
 atexit.register(dispose_all_connections)
 
 print("✅ Streamlit DB session initialized (NullPool)")
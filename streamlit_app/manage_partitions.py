@@ -0,0 +1,40 @@
+import argparse
+from utils.partition_manager import PARTITION_POLICIES, convert_all, maintain, status
+
+
+# =========================
+# Partition maintenance CLI
+# =========================
+#   python manage_partitions.py status
+#   python manage_partitions.py convert [--table sales ...]
+#   python manage_partitions.py maintain [--dry-run]   (schedule daily)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monthly partition management for VinRetail fact tables")
+    parser.add_argument("command", choices=["status", "convert", "maintain"])
+    parser.add_argument("--table", action="append", choices=list(PARTITION_POLICIES),
+                        help="limit to one table (repeatable); default: all")
+    parser.add_argument("--dry-run", action="store_true", help="maintain: only list expired partitions")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        for table, partitions in status(args.table).items():
+            print("===================================")
+            if not partitions:
+                print(f"{table}: not partitioned")
+                continue
+            print(f"{table}: {len(partitions)} partitions")
+            for name, rows in partitions:
+                print(f"  {name:<10} ~{rows or 0:,} rows")
+
+    elif args.command == "convert":
+        for table, converted in convert_all(args.table).items():
+            print(f"{'✅' if converted else '⏭️'} {table}")
+
+    else:
+        for table, result in maintain(args.table, dry_run=args.dry_run).items():
+            if not result["partitioned"]:
+                print(f"⏭️ {table}: not partitioned")
+                continue
+            print(f"✅ {table}: created {len(result['created'])}, expired {len(result['expired'])}")
+            for name in result["expired"]:
+                print(f"  {'would expire' if args.dry_run else 'expired'} {name}")
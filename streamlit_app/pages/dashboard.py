@@ -1,9 +1,24 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-from sqlalchemy import text
-from datetime import datetime, timedelta
-from config.session import get_db_connection
+from utils.dashboard_data import get_regions, load_dashboard_bundle
+from utils.entity_counters import get_counts
+from utils.startup import lazy_module
+
+# plotly is only imported once a chart is actually drawn
+px = lazy_module("plotly.express")
+
+ALL_REGIONS = "All regions"
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def cached_dashboard_bundle(days_back, region):
+    """Whole dashboard for one (days_back, region) scope, one query per minute"""
+    return load_dashboard_bundle(days_back, region)
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def cached_regions():
+    return get_regions()
+
 
 def show():
     """Display lightweight dashboard with essential KPIs"""
@@ -15,20 +30,19 @@ def show():
         </div>
     """, unsafe_allow_html=True)
     
-    db = get_db_connection()
-    
     try:
         # Quick date filter
         col1, col2, col3 = st.columns([2, 2, 1])
         with col1:
             days_back = st.selectbox("Time Period", [7, 30, 90, 365], index=1, format_func=lambda x: f"Last {x} days")
         with col2:
-            st.write("")  # Spacer
+            region = st.selectbox("Region", [ALL_REGIONS] + cached_regions())
         with col3:
             if st.button("🔄 Refresh"):
+                cached_dashboard_bundle.clear()
                 st.rerun()
         
-        start_date = datetime.now() - timedelta(days=days_back)
+        data = cached_dashboard_bundle(days_back, None if region == ALL_REGIONS else region)
         
         st.markdown("---")
         
@@ -36,44 +50,32 @@ def show():
         # KPI CARDS - Simple metrics
         # =====================================================
         
-        kpi_query = text("""
-            SELECT 
-                COUNT(DISTINCT s.sale_id) as total_orders,
-                COALESCE(SUM(s.total_amount), 0) as total_revenue,
-                COUNT(DISTINCT so.customer_id) as total_customers,
-                COALESCE(AVG(s.total_amount), 0) as avg_order_value
-            FROM sales s
-            JOIN sales_orders so ON s.order_id = so.order_id
-            WHERE s.sale_type = 'INVOICE'
-                AND s.sale_date >= :start_date
-        """)
-        
-        kpi = db.execute(kpi_query, {"start_date": start_date}).fetchone()
+        kpi = data["kpi"]
         
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
             st.metric(
                 label="💰 Total Revenue",
-                value=f"{kpi.total_revenue:,.0f} VND"
+                value=f"{kpi['total_revenue']:,.0f} VND"
             )
         
         with col2:
             st.metric(
                 label="🛒 Total Orders",
-                value=f"{kpi.total_orders:,}"
+                value=f"{kpi['total_orders']:,}"
             )
         
         with col3:
             st.metric(
                 label="👥 Customers",
-                value=f"{kpi.total_customers:,}"
+                value=f"{kpi['total_customers']:,}"
             )
         
         with col4:
             st.metric(
                 label="📊 Avg Order",
-                value=f"{kpi.avg_order_value:,.0f} VND"
+                value=f"{kpi['avg_order_value']:,.0f} VND"
             )
         
         st.markdown("---")
@@ -88,24 +90,9 @@ def show():
         with col1:
             st.markdown("### 📈 Daily Sales")
             
-            trend_query = text("""
-                SELECT 
-                    DATE(sale_date) as date,
-                    COUNT(*) as orders,
-                    SUM(total_amount) as revenue
-                FROM sales
-                WHERE sale_type = 'INVOICE'
-                    AND sale_date >= :start_date
-                GROUP BY DATE(sale_date)
-                ORDER BY date
-            """)
-            
-            result = db.execute(trend_query, {"start_date": start_date}).fetchall()
-            df = pd.DataFrame(result, columns=['date', 'orders', 'revenue'])
+            df = data["trend"]
             
             if not df.empty:
-                df['revenue'] = pd.to_numeric(df['revenue'], errors='coerce')
-                
                 fig = px.line(
                     df,
                     x='date',
@@ -122,26 +109,9 @@ def show():
         with col2:
             st.markdown("### 🔥 Top 5 Products")
             
-            products_query = text("""
-                SELECT 
-                    p.product_name,
-                    SUM(si.final_amount) as revenue
-                FROM sales_items si
-                JOIN products p ON si.product_id = p.product_id
-                JOIN sales s ON si.sale_id = s.sale_id
-                WHERE s.sale_type = 'INVOICE'
-                    AND s.sale_date >= :start_date
-                GROUP BY p.product_id, p.product_name
-                ORDER BY revenue DESC
-                LIMIT 5
-            """)
-            
-            result = db.execute(products_query, {"start_date": start_date}).fetchall()
-            df = pd.DataFrame(result, columns=['product_name', 'revenue'])
+            df = data["top_products"]
             
             if not df.empty:
-                df['revenue'] = pd.to_numeric(df['revenue'], errors='coerce')
-                
                 fig = px.bar(
                     df,
                     y='product_name',
@@ -160,26 +130,9 @@ def show():
         with col1:
             st.markdown("### 🌍 Sales by Region")
             
-            region_query = text("""
-                SELECT 
-                    l.region,
-                    COUNT(s.sale_id) as orders,
-                    SUM(s.total_amount) as revenue
-                FROM sales s
-                JOIN sales_orders so ON s.order_id = so.order_id
-                JOIN locations l ON so.location_id = l.location_id
-                WHERE s.sale_type = 'INVOICE'
-                    AND s.sale_date >= :start_date
-                    AND l.region IS NOT NULL
-                GROUP BY l.region
-            """)
-            
-            result = db.execute(region_query, {"start_date": start_date}).fetchall()
-            df = pd.DataFrame(result, columns=['region', 'orders', 'revenue'])
+            df = data["regions"]
             
             if not df.empty:
-                df['revenue'] = pd.to_numeric(df['revenue'], errors='coerce')
-                
                 fig = px.pie(
                     df,
                     values='revenue',
@@ -196,21 +149,9 @@ def show():
         with col2:
             st.markdown("### 🚚 Delivery Status")
             
-            delivery_query = text("""
-                SELECT 
-                    delivery_status,
-                    COUNT(*) as count
-                FROM deliveries
-                WHERE created_at >= :start_date
-                GROUP BY delivery_status
-            """)
-            
-            result = db.execute(delivery_query, {"start_date": start_date}).fetchall()
-            df = pd.DataFrame(result, columns=['delivery_status', 'count'])
+            df = data["delivery_status"].copy()
             
             if not df.empty:
-                df['count'] = pd.to_numeric(df['count'], errors='coerce')
-                
                 # Color mapping
                 color_map = {
                     'DELIVERED': '#28a745',
@@ -242,31 +183,9 @@ def show():
         
         st.markdown("### 📋 Recent Orders (Last 10)")
         
-        recent_query = text("""
-            SELECT 
-                s.sale_id,
-                DATE_FORMAT(s.sale_date, '%Y-%m-%d %H:%i') as sale_date,
-                CONCAT(c.first_name, ' ', c.last_name) as customer,
-                l.location_name,
-                s.total_amount,
-                pm.method_name
-            FROM sales s
-            JOIN sales_orders so ON s.order_id = so.order_id
-            JOIN customers c ON so.customer_id = c.customer_id
-            JOIN locations l ON so.location_id = l.location_id
-            LEFT JOIN payment_methods pm ON s.payment_method_id = pm.payment_method_id
-            WHERE s.sale_type = 'INVOICE'
-            ORDER BY s.sale_date DESC
-            LIMIT 10
-        """)
-        
-        result = db.execute(recent_query).fetchall()
-        df = pd.DataFrame(result, columns=[
-            'sale_id', 'sale_date', 'customer', 'location_name', 'total_amount', 'method_name'
-        ])
+        df = data["recent"].copy()
         
         if not df.empty:
-            df['total_amount'] = pd.to_numeric(df['total_amount'], errors='coerce')
             df['amount_display'] = df['total_amount'].apply(lambda x: f"{x:,.0f} VND")
             
             st.dataframe(
@@ -289,36 +208,21 @@ def show():
         st.markdown("---")
         st.markdown("### 📊 Quick Stats")
         
-        stats_query = text("""
-            SELECT 
-                COUNT(DISTINCT p.product_id) as products,
-                COUNT(DISTINCT l.location_id) as locations,
-                COUNT(DISTINCT e.employee_id) as employees,
-                (SELECT COUNT(*) FROM inventory WHERE quantity < 100) as low_stock
-            FROM products p
-            CROSS JOIN locations l
-            CROSS JOIN employees e
-            WHERE p.status = 'ACTIVE'
-                AND e.is_inactive = FALSE
-        """)
-        
-        stats = db.execute(stats_query).fetchone()
+        # Maintained by the trg_counter_* triggers, no table scans
+        stats = get_counts()
         
         col1, col2, col3, col4 = st.columns(4)
         
         with col1:
-            st.metric("📦 Active Products", f"{stats.products:,}")
+            st.metric("📦 Active Products", f"{stats['active_products']:,}")
         with col2:
-            st.metric("🏪 Locations", f"{stats.locations:,}")
+            st.metric("🏪 Locations", f"{stats['locations']:,}")
         with col3:
-            st.metric("👨‍💼 Employees", f"{stats.employees:,}")
+            st.metric("👨‍💼 Employees", f"{stats['active_employees']:,}")
         with col4:
-            st.metric("⚠️ Low Stock Items", f"{stats.low_stock:,}")
+            st.metric("⚠️ Low Stock Items", f"{stats['low_stock_items']:,}")
     
     except Exception as e:
         st.error(f"❌ Error loading dashboard: {str(e)}")
         import traceback
-        st.code(traceback.format_exc())
-    
-    finally:
-        db.close()
\ No newline at end of file
+        st.code(traceback.format_exc())
\ No newline at end of file
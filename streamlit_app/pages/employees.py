@@ -2,9 +2,15 @@ import streamlit as st
 import pandas as pd
 import io
 from datetime import datetime
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from config.session import get_db_connection
 from utils.auth import check_permission
+from utils.reference_data import invalidate_reference
+from utils.query_metrics import metered_fragment
+from utils.search_index import filter_values, invalidate_search
+from utils.search_panel import order_by_ids, paged_search, pager
+from utils.job_runner import submit_job
+from utils.job_panel import records_for_job, show_job
 
 def show():
     """Display employees management page"""
@@ -51,6 +57,7 @@ def show():
             st.warning("⚠️ You don't have permission to delete employees")
 
 
+@metered_fragment("employee_list")
 def show_employee_list():
     """Display list of employees"""
     st.markdown("### 📋 All Employees")
@@ -58,28 +65,49 @@ def show_employee_list():
     db = get_db_connection()
     
     try:
-        query = text("""
-            SELECT 
-                e.employee_id,
-                e.first_name,
-                e.last_name,
-                e.email,
-                e.gender,
-                e.phone,
-                e.role,
-                d.department_name,
-                e.job_description,
-                e.hire_date,
-                e.is_inactive,
-                CONCAT(s.first_name, ' ', s.last_name) as supervisor_name
-            FROM employees e
-            LEFT JOIN departments d ON e.department_id = d.department_id
-            LEFT JOIN employees s ON e.supervisor_id = s.employee_id
-            ORDER BY e.employee_id DESC
-        """)
+        # Filters
+        col1, col2, col3 = st.columns(3)
         
-        result = db.execute(query).fetchall()
-        df = pd.DataFrame(result, columns=[
+        with col1:
+            search = st.text_input("🔍 Search", placeholder="Name, email, phone")
+        
+        with col2:
+            role_filter = st.selectbox("Role", ["All"] + filter_values("employees", "role"))
+        
+        with col3:
+            status_filter = st.selectbox("Status", ["All", "Active", "Inactive"])
+        
+        # Search the index, then load only the rows of the current page
+        result = paged_search("employee_list", "employees", search, {
+            "role": None if role_filter == "All" else role_filter,
+            "is_inactive": {"All": None, "Active": 0, "Inactive": 1}[status_filter]
+        })
+        
+        rows = []
+        if result.ids:
+            query = text("""
+                SELECT 
+                    e.employee_id,
+                    e.first_name,
+                    e.last_name,
+                    e.email,
+                    e.gender,
+                    e.phone,
+                    e.role,
+                    d.department_name,
+                    e.job_description,
+                    e.hire_date,
+                    e.is_inactive,
+                    CONCAT(s.first_name, ' ', s.last_name) as supervisor_name
+                FROM employees e
+                LEFT JOIN departments d ON e.department_id = d.department_id
+                LEFT JOIN employees s ON e.supervisor_id = s.employee_id
+                WHERE e.employee_id IN :ids
+            """).bindparams(bindparam("ids", expanding=True))
+            
+            rows = db.execute(query, {"ids": result.ids}).fetchall()
+        
+        df = pd.DataFrame(rows, columns=[
             'employee_id', 'first_name', 'last_name', 'email', 'gender',
             'phone', 'role', 'department_name', 'job_description', 'hire_date',
             'is_inactive', 'supervisor_name'
@@ -87,42 +115,13 @@ def show_employee_list():
         
         if not df.empty:
             # Format data
+            df = order_by_ids(df, result.ids, 'employee_id')
             df['status'] = df['is_inactive'].apply(lambda x: '❌ Inactive' if x else '✅ Active')
             df['full_name'] = df['first_name'] + ' ' + df['last_name']
             
-            # Filters
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                search = st.text_input("🔍 Search", placeholder="Name, email, phone")
-            
-            with col2:
-                role_filter = st.selectbox("Role", ["All"] + sorted(df['role'].dropna().unique().tolist()))
-            
-            with col3:
-                status_filter = st.selectbox("Status", ["All", "Active", "Inactive"])
-            
-            # Apply filters
-            filtered_df = df.copy()
-            
-            if search:
-                filtered_df = filtered_df[
-                    filtered_df['full_name'].str.contains(search, case=False, na=False) |
-                    filtered_df['email'].str.contains(search, case=False, na=False) |
-                    filtered_df['phone'].str.contains(search, case=False, na=False)
-                ]
-            
-            if role_filter != "All":
-                filtered_df = filtered_df[filtered_df['role'] == role_filter]
-            
-            if status_filter == "Active":
-                filtered_df = filtered_df[filtered_df['is_inactive'] == 0]
-            elif status_filter == "Inactive":
-                filtered_df = filtered_df[filtered_df['is_inactive'] == 1]
-            
             # Display table
             st.dataframe(
-                filtered_df[[
+                df[[
                     'employee_id', 'full_name', 'email', 'phone', 
                     'role', 'department_name', 'supervisor_name', 'hire_date', 'status'
                 ]],
@@ -141,21 +140,30 @@ def show_employee_list():
                 }
             )
             
-            st.info(f"📊 Showing {len(filtered_df)} of {len(df)} employees")
-            
-            # Statistics
-            col1, col2, col3, col4 = st.columns(4)
-            with col1:
-                st.metric("Total", len(df))
-            with col2:
-                st.metric("Active", len(df[df['is_inactive'] == 0]))
-            with col3:
-                st.metric("Inactive", len(df[df['is_inactive'] == 1]))
-            with col4:
-                st.metric("Managers", len(df[df['role'] == 'Manager']))
+            pager("employee_list", result, "employees")
         
         else:
             st.info("No employees found")
+        
+        # Statistics (all employees)
+        stats = db.execute(text("""
+            SELECT
+                COUNT(*) AS total,
+                COALESCE(SUM(is_inactive = 0), 0) AS active,
+                COALESCE(SUM(is_inactive = 1), 0) AS inactive,
+                COALESCE(SUM(role = 'Manager'), 0) AS managers
+            FROM employees
+        """)).fetchone()
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total", stats.total)
+        with col2:
+            st.metric("Active", int(stats.active))
+        with col3:
+            st.metric("Inactive", int(stats.inactive))
+        with col4:
+            st.metric("Managers", int(stats.managers))
     
     except Exception as e:
         st.error(f"❌ Error loading employees: {str(e)}")
@@ -254,6 +262,8 @@ def show_create_employee():
                         })
                         
                         db.commit()
+                        invalidate_reference("employees")
+                        invalidate_search("employees")
                         st.success(f"✅ Employee '{first_name} {last_name}' created successfully!")
                         st.balloons()
                     
@@ -379,74 +389,32 @@ def show_bulk_upload():
                     st.dataframe(upload_df.head(10), use_container_width=True)
                     
                     # Upload button
+                    # Runs as a background job so closing the tab does not lose the upload
                     if st.button("✅ Upload Employees", type="primary", use_container_width=True):
-                        db = get_db_connection()
-                        try:
-                            success_count = 0
-                            error_count = 0
-                            errors = []
-                            
-                            for idx, row in upload_df.iterrows():
-                                try:
-                                    # Get department_id if specified
-                                    dept_id = None
-                                    if 'department_name' in row and pd.notna(row['department_name']):
-                                        dept_query = text("""
-                                            SELECT department_id FROM departments 
-                                            WHERE department_name = :name
-                                        """)
-                                        dept_result = db.execute(dept_query, {"name": row['department_name']}).fetchone()
-                                        if dept_result:
-                                            dept_id = dept_result[0]
-                                    
-                                    # Insert employee
-                                    insert_query = text("""
-                                        INSERT INTO employees (
-                                            first_name, last_name, email, phone, gender,
-                                            role, department_id, job_description, hire_date
-                                        )
-                                        VALUES (:fn, :ln, :email, :phone, :gender, :role, :dept, :job, :hire)
-                                    """)
-                                    
-                                    db.execute(insert_query, {
-                                        "fn": row['first_name'],
-                                        "ln": row['last_name'],
-                                        "email": row['email'],
-                                        "phone": row['phone'],
-                                        "gender": row['gender'],
-                                        "role": row['role'],
-                                        "dept": dept_id,
-                                        "job": row.get('job_description', None),
-                                        "hire": row.get('hire_date', datetime.now().date())
-                                    })
-                                    
-                                    success_count += 1
-                                
-                                except Exception as e:
-                                    error_count += 1
-                                    errors.append(f"Row {idx + 2}: {str(e)}")
-                            
-                            db.commit()
-                            
-                            st.success(f"✅ Successfully uploaded {success_count} employees")
-                            
-                            if error_count > 0:
-                                st.warning(f"⚠️ {error_count} rows failed")
-                                with st.expander("View Errors"):
-                                    for error in errors[:20]:  # Show first 20 errors
-                                        st.error(error)
-                            
-                            st.balloons()
-                        
-                        except Exception as e:
-                            db.rollback()
-                            st.error(f"❌ Upload failed: {str(e)}")
-                        
-                        finally:
-                            db.close()
+                        st.session_state["employee_upload_job"] = submit_job(
+                            "upload_employees",
+                            {"records": records_for_job(upload_df)},
+                            label=f"Employee upload ({len(upload_df)} rows)"
+                        )
             
             except Exception as e:
                 st.error(f"❌ Error reading file: {str(e)}")
+        
+        if "employee_upload_job" in st.session_state:
+            show_job(st.session_state["employee_upload_job"], render_result=show_upload_result)
+
+
+def show_upload_result(job):
+    """Summary of a finished upload job"""
+    result = job["result"] or {}
+    
+    st.success(f"✅ Successfully uploaded {result.get('success_count', 0)} employees")
+    
+    if result.get("error_count", 0) > 0:
+        st.warning(f"⚠️ {result['error_count']} rows failed")
+        with st.expander("View Errors"):
+            for error in result.get("errors", []):  # First 20 errors
+                st.error(error)
 
 
 def show_bulk_delete():
@@ -527,6 +495,8 @@ def show_bulk_delete():
                         employee_ids = tuple(selected['employee_id'].tolist())
                         db.execute(delete_query, {"ids": employee_ids})
                         db.commit()
+                        invalidate_reference("employees")
+                        invalidate_search("employees")
                         
                         st.success(f"✅ Successfully deleted {len(selected)} employees")
                         st.balloons()
@@ -581,6 +551,8 @@ def show_bulk_delete():
                                 
                                 db.execute(delete_query, {"ids": tuple(ids_to_delete)})
                                 db.commit()
+                                invalidate_reference("employees")
+                                invalidate_search("employees")
                                 
                                 st.success(f"✅ Successfully deleted {len(ids_to_delete)} employees")
                                 st.balloons()
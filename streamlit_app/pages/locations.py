@@ -5,6 +5,9 @@ from datetime import datetime
 from sqlalchemy import text
 from config.session import get_db_connection
 from utils.auth import check_permission
+from utils.reference_data import invalidate_reference
+from utils.job_runner import submit_job
+from utils.job_panel import records_for_job, show_job
 
 def show():
     """Display locations management page"""
@@ -239,6 +242,7 @@ def show_create_location():
                         })
                         
                         db.commit()
+                        invalidate_reference("stores")
                         st.success(f"✅ Location '{location_name}' created successfully!")
                         st.balloons()
                     
@@ -342,59 +346,30 @@ def show_bulk_upload():
                     st.dataframe(upload_df.head(10), use_container_width=True)
                     
                     if st.button("✅ Upload Locations", type="primary", use_container_width=True):
-                        db = get_db_connection()
-                        try:
-                            success_count = 0
-                            error_count = 0
-                            errors = []
-                            
-                            for idx, row in upload_df.iterrows():
-                                try:
-                                    insert_query = text("""
-                                        INSERT INTO locations (
-                                            location_name, location_type, address, city, region,
-                                            channel, email, opening_date
-                                        )
-                                        VALUES (:name, :type, :addr, :city, :region, :channel, :email, :open)
-                                    """)
-                                    
-                                    db.execute(insert_query, {
-                                        "name": row['location_name'],
-                                        "type": row['location_type'],
-                                        "addr": row.get('address', None),
-                                        "city": row['city'],
-                                        "region": row['region'],
-                                        "channel": row.get('channel', 'Offline'),
-                                        "email": row.get('email', None),
-                                        "open": row.get('opening_date', datetime.now().date())
-                                    })
-                                    
-                                    success_count += 1
-                                
-                                except Exception as e:
-                                    error_count += 1
-                                    errors.append(f"Row {idx + 2}: {str(e)}")
-                            
-                            db.commit()
-                            st.success(f"✅ Uploaded {success_count} locations")
-                            
-                            if error_count > 0:
-                                st.warning(f"⚠️ {error_count} failed")
-                                with st.expander("Errors"):
-                                    for error in errors[:20]:
-                                        st.error(error)
-                            
-                            st.balloons()
-                        
-                        except Exception as e:
-                            db.rollback()
-                            st.error(f"❌ Upload failed: {str(e)}")
-                        
-                        finally:
-                            db.close()
+                        st.session_state["location_upload_job"] = submit_job(
+                            "upload_locations",
+                            {"records": records_for_job(upload_df)},
+                            label=f"Location upload ({len(upload_df)} rows)"
+                        )
             
             except Exception as e:
                 st.error(f"❌ Error reading file: {str(e)}")
+        
+        if "location_upload_job" in st.session_state:
+            show_job(st.session_state["location_upload_job"], render_result=show_upload_result)
+
+
+def show_upload_result(job):
+    """Summary of a finished upload job"""
+    result = job["result"] or {}
+    
+    st.success(f"✅ Uploaded {result.get('success_count', 0)} locations")
+    
+    if result.get("error_count", 0) > 0:
+        st.warning(f"⚠️ {result['error_count']} failed")
+        with st.expander("Errors"):
+            for error in result.get("errors", []):
+                st.error(error)
 
 
 def show_bulk_delete():
@@ -465,6 +440,7 @@ def show_bulk_delete():
                         location_ids = tuple(selected['location_id'].tolist())
                         db.execute(close_query, {"ids": location_ids})
                         db.commit()
+                        invalidate_reference("stores")
                         
                         st.success(f"✅ Closed {len(selected)} locations")
                         st.balloons()
@@ -516,6 +492,7 @@ def show_bulk_delete():
                                 
                                 db.execute(close_query, {"ids": tuple(ids_to_delete)})
                                 db.commit()
+                                invalidate_reference("stores")
                                 
                                 st.success(f"✅ Closed {len(ids_to_delete)} locations")
                                 st.balloons()
@@ -1,8 +1,12 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from config.session import get_db_connection
 from utils.auth import check_permission
+from utils.query_metrics import metered_fragment
+from utils.reference_data import invalidate_reference
+from utils.search_index import SEARCH_PAGE_SIZE, SearchPage, invalidate_search, search_condition
+from utils.search_panel import current_page, order_by_ids, paged_search, pager, set_page
 
 def show():
     """Display products management page"""
@@ -34,6 +38,7 @@ def show():
     with tab3:
         show_inventory()
 
+@metered_fragment("product_list")
 def show_product_list():
     """Display list of products"""
     st.markdown("### 📋 All Products")
@@ -41,31 +46,59 @@ def show_product_list():
     db = get_db_connection()
     
     try:
-        query = text("""
-            SELECT 
-                p.product_id,
-                p.product_name,
-                p.unit_price,
-                p.cost,
-                p.status,
-                pc.class_name,
-                pc.product_group,
-                COALESCE(SUM(i.quantity), 0) as total_inventory
-            FROM products p
-            JOIN product_class pc ON p.class_id = pc.class_id
-            LEFT JOIN inventory i ON p.product_id = i.product_id
-            GROUP BY p.product_id
-            ORDER BY p.product_id DESC
-        """)
+        classes = db.execute(text("""
+            SELECT product_group, class_name
+            FROM product_class
+            ORDER BY product_group, class_name
+        """)).fetchall()
         
-        result = db.execute(query).fetchall()
-        products_df = pd.DataFrame(result, columns=[
-            'product_id', 'product_name', 'unit_price', 'cost', 'status',
-            'class_name', 'product_group', 'total_inventory'
-        ])
+        # Filters
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            search = st.text_input("🔍 Search", placeholder="Product name")
+        
+        with col2:
+            group_filter = st.selectbox("Group", ["All"] + sorted({row[0] for row in classes}))
+        
+        with col3:
+            class_filter = st.selectbox("Class", ["All"] + [row[1] for row in classes])
+        
+        with col4:
+            status_filter = st.selectbox("Status", ["All", "ACTIVE", "INACTIVE", "DISCONTINUED"])
         
+        # Indexed search returns one page of product ids; only those rows are loaded
+        result = paged_search("product_list", "products", search, {
+            "product_group": None if group_filter == "All" else group_filter,
+            "class_name": None if class_filter == "All" else class_filter,
+            "status": None if status_filter == "All" else status_filter,
+        })
         
-        if not products_df.empty:
+        if result.ids:
+            query = text("""
+                SELECT 
+                    p.product_id,
+                    p.product_name,
+                    p.unit_price,
+                    p.cost,
+                    p.status,
+                    pc.class_name,
+                    pc.product_group,
+                    COALESCE(SUM(i.quantity), 0) as total_inventory
+                FROM products p
+                JOIN product_class pc ON p.class_id = pc.class_id
+                LEFT JOIN inventory i ON p.product_id = i.product_id
+                WHERE p.product_id IN :ids
+                GROUP BY p.product_id
+            """).bindparams(bindparam("ids", expanding=True))
+            
+            rows = db.execute(query, {"ids": result.ids}).fetchall()
+            products_df = pd.DataFrame(rows, columns=[
+                'product_id', 'product_name', 'unit_price', 'cost', 'status',
+                'class_name', 'product_group', 'total_inventory'
+            ])
+            products_df = order_by_ids(products_df, result.ids, 'product_id')
+            
             # Convert numeric columns
             products_df['product_id'] = pd.to_numeric(products_df['product_id'], errors='coerce')
             products_df['unit_price'] = pd.to_numeric(products_df['unit_price'], errors='coerce')
@@ -80,41 +113,9 @@ def show_product_list():
                 lambda x: '✅ Active' if x == 'ACTIVE' else ('❌ Inactive' if x == 'INACTIVE' else '⚠️ Discontinued')
             )
             
-            # Filters
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                search = st.text_input("🔍 Search", placeholder="Product name")
-            
-            with col2:
-                group_filter = st.selectbox("Group", ["All"] + products_df['product_group'].unique().tolist())
-            
-            with col3:
-                class_filter = st.selectbox("Class", ["All"] + products_df['class_name'].unique().tolist())
-            
-            with col4:
-                status_filter = st.selectbox("Status", ["All", "ACTIVE", "INACTIVE", "DISCONTINUED"])
-            
-            # Apply filters
-            filtered_df = products_df.copy()
-            
-            if search:
-                filtered_df = filtered_df[
-                    filtered_df['product_name'].str.contains(search, case=False, na=False)
-                ]
-            
-            if group_filter != "All":
-                filtered_df = filtered_df[filtered_df['product_group'] == group_filter]
-            
-            if class_filter != "All":
-                filtered_df = filtered_df[filtered_df['class_name'] == class_filter]
-            
-            if status_filter != "All":
-                filtered_df = filtered_df[filtered_df['status'] == status_filter]
-            
             # Display table
             st.dataframe(
-                filtered_df[[
+                products_df[[
                     'product_id', 'product_name', 'product_group', 'class_name',
                     'price_display', 'cost_display', 'margin', 'total_inventory', 'status_display'
                 ]],
@@ -135,25 +136,32 @@ def show_product_list():
                     "status_display": "Status"
                 }
             )
-            
-            st.info(f"📊 Showing {len(filtered_df)} of {len(products_df)} products")
-            
-            # Statistics
-            col1, col2, col3, col4 = st.columns(4)
-            
-            with col1:
-                st.metric("Total Products", len(products_df))
-            with col2:
-                st.metric("Active", len(products_df[products_df['status'] == 'ACTIVE']))
-            with col3:
-                avg_margin = products_df['margin'].mean()
-                st.metric("Avg Margin", f"{avg_margin:.1f}%")
-            with col4:
-                total_stock = products_df['total_inventory'].sum()
-                st.metric("Total Stock", f"{total_stock:,.0f}")
         
         else:
             st.info("No products found")
+        
+        pager("product_list", result, "products")
+        
+        # Statistics (whole catalog)
+        stats = db.execute(text("""
+            SELECT
+                COUNT(*) AS total_products,
+                SUM(p.status = 'ACTIVE') AS active_products,
+                AVG((p.unit_price - p.cost) / NULLIF(p.cost, 0) * 100) AS avg_margin,
+                (SELECT COALESCE(SUM(quantity), 0) FROM inventory) AS total_stock
+            FROM products p
+        """)).fetchone()
+        
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.metric("Total Products", f"{stats.total_products:,}")
+        with col2:
+            st.metric("Active", f"{int(stats.active_products or 0):,}")
+        with col3:
+            st.metric("Avg Margin", f"{float(stats.avg_margin or 0):.1f}%")
+        with col4:
+            st.metric("Total Stock", f"{int(stats.total_stock):,}")
     
     except Exception as e:
         st.error(f"❌ Error loading products: {str(e)}")
@@ -237,6 +245,8 @@ def show_create_product():
                         })
                         
                         db.commit()
+                        invalidate_reference("products")
+                        invalidate_search("products")
                         st.success(f"✅ Product '{product_name}' created successfully!")
                         st.balloons()
                     
@@ -254,10 +264,74 @@ def show_inventory():
     """Display inventory across locations"""
     st.markdown("### 📊 Inventory Overview")
     
+    # Separate fragments: the filters only rerun the table's queries
+    show_inventory_table()
+    
+    st.markdown("---")
+    st.markdown("### ⚠️ Low Stock Alert")
+    show_low_stock()
+
+@metered_fragment("inventory_table")
+def show_inventory_table():
+    """Inventory rows matching the search and location filters, one page at a time"""
     db = get_db_connection()
     
     try:
-        query = text("""
+        locations = [row[0] for row in db.execute(text("SELECT location_name FROM locations ORDER BY location_name"))]
+        
+        # Filters
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            search = st.text_input("🔍 Search Product", placeholder="Product name")
+        
+        with col2:
+            location_filter = st.selectbox("Location", ["All"] + locations)
+        
+        with col3:
+            type_filter = st.selectbox("Location Type", ["All", "STORE", "WAREHOUSE"])
+        
+        # Filters are applied in SQL; the product search goes through the search index
+        conditions = ["i.quantity > 0"]
+        params = {}
+        expanding = []
+        
+        # Matched in the same statement, so every matching product counts
+        match = search_condition("products", search, "i.product_id")
+        if match:
+            match_sql, match_params, match_expanding = match
+            conditions.append(match_sql)
+            params.update(match_params)
+            expanding.extend(match_expanding)
+        
+        if location_filter != "All":
+            conditions.append("l.location_name = :location_name")
+            params["location_name"] = location_filter
+        
+        if type_filter != "All":
+            conditions.append("l.location_type = :location_type")
+            params["location_type"] = type_filter
+        
+        where = "WHERE " + " AND ".join(conditions)
+        
+        summary = db.execute(text(f"""
+            SELECT
+                COUNT(*) AS stock_rows,
+                COALESCE(SUM(i.quantity), 0) AS total_items,
+                COALESCE(SUM(i.quantity * p.unit_price), 0) AS total_value,
+                COUNT(DISTINCT i.product_id) AS unique_products,
+                COUNT(DISTINCT i.location_id) AS location_count
+            FROM inventory i
+            JOIN products p ON i.product_id = p.product_id
+            JOIN locations l ON i.location_id = l.location_id
+            {where}
+        """).bindparams(*expanding), params).fetchone()
+        
+        page = current_page("inventory", search, location_filter, type_filter)
+        page = min(page, max(1, -(-summary.stock_rows // SEARCH_PAGE_SIZE)))
+        set_page("inventory", page)
+        
+        query = text(f"""
             SELECT 
                 p.product_id,
                 p.product_name,
@@ -269,11 +343,12 @@ def show_inventory():
             FROM inventory i
             JOIN products p ON i.product_id = p.product_id
             JOIN locations l ON i.location_id = l.location_id
-            WHERE i.quantity > 0
+            {where}
             ORDER BY inventory_value DESC
-        """)
+            LIMIT :limit OFFSET :offset
+        """).bindparams(*expanding)
         
-        result = db.execute(query).fetchall()
+        result = db.execute(query, {**params, "limit": SEARCH_PAGE_SIZE, "offset": (page - 1) * SEARCH_PAGE_SIZE}).fetchall()
         inventory_df = pd.DataFrame(result, columns=[
             'product_id', 'product_name', 'location_name', 'location_type',
             'quantity', 'unit_price', 'inventory_value'
@@ -287,43 +362,17 @@ def show_inventory():
             inventory_df['unit_price'] = pd.to_numeric(inventory_df['unit_price'], errors='coerce')
             inventory_df['inventory_value'] = pd.to_numeric(inventory_df['inventory_value'], errors='coerce')
             
-            # Filters
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                search = st.text_input("🔍 Search Product", placeholder="Product name")
-            
-            with col2:
-                location_filter = st.selectbox("Location", ["All"] + inventory_df['location_name'].unique().tolist())
-            
-            with col3:
-                type_filter = st.selectbox("Location Type", ["All", "STORE", "WAREHOUSE"])
-            
-            # Apply filters
-            filtered_df = inventory_df.copy()
-            
-            if search:
-                filtered_df = filtered_df[
-                    filtered_df['product_name'].str.contains(search, case=False, na=False)
-                ]
-            
-            if location_filter != "All":
-                filtered_df = filtered_df[filtered_df['location_name'] == location_filter]
-            
-            if type_filter != "All":
-                filtered_df = filtered_df[filtered_df['location_type'] == type_filter]
-            
             # Format display
-            filtered_df['unit_price_display'] = filtered_df['unit_price'].apply(
+            inventory_df['unit_price_display'] = inventory_df['unit_price'].apply(
                 lambda x: f"{x:,.0f} VND" if pd.notna(x) else "0 VND"
             )
-            filtered_df['inventory_value_display'] = filtered_df['inventory_value'].apply(
+            inventory_df['inventory_value_display'] = inventory_df['inventory_value'].apply(
                 lambda x: f"{x:,.0f} VND" if pd.notna(x) else "0 VND"
             )
             
             # Display table
             st.dataframe(
-                filtered_df[[
+                inventory_df[[
                     'product_id', 'product_name', 'location_name', 'location_type',
                     'quantity', 'unit_price_display', 'inventory_value_display'
                 ]],
@@ -340,47 +389,22 @@ def show_inventory():
                 }
             )
             
-            # Summary statistics
+            pager("inventory", SearchPage(
+                inventory_df['product_id'].tolist(), summary.stock_rows, page, SEARCH_PAGE_SIZE, "sql"
+            ), "stock rows")
+            
+            # Summary statistics (every row matching the filters)
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                st.metric("Total Items", f"{filtered_df['quantity'].sum():,.0f}")
+                st.metric("Total Items", f"{int(summary.total_items):,.0f}")
             with col2:
-                st.metric("Total Value", f"{filtered_df['inventory_value'].sum():,.0f} VND")
+                st.metric("Total Value", f"{float(summary.total_value):,.0f} VND")
             with col3:
-                st.metric("Unique Products", filtered_df['product_id'].nunique())
+                st.metric("Unique Products", summary.unique_products)
             with col4:
-                st.metric("Locations", filtered_df['location_name'].nunique())
-            
-            # Low stock alert
-            st.markdown("---")
-            st.markdown("### ⚠️ Low Stock Alert")
+                st.metric("Locations", summary.location_count)
             
-            low_stock_query = text("""
-                SELECT 
-                    p.product_name,
-                    l.location_name,
-                    i.quantity
-                FROM inventory i
-                JOIN products p ON i.product_id = p.product_id
-                JOIN locations l ON i.location_id = l.location_id
-                WHERE i.quantity < 100 AND i.quantity > 0
-                ORDER BY i.quantity ASC
-                LIMIT 10
-            """)
-            
-            result = db.execute(low_stock_query).fetchall()
-            low_stock = pd.DataFrame(result, columns=['product_name', 'location_name', 'quantity'])
-            
-            if not low_stock.empty:
-                low_stock['quantity'] = pd.to_numeric(low_stock['quantity'], errors='coerce').fillna(0).astype(int)
-            
-            if not low_stock.empty:
-                st.warning(f"⚠️ {len(low_stock)} products with low stock (< 100 units)")
-                st.dataframe(low_stock, use_container_width=True, hide_index=True)
-            else:
-                st.success("✅ All products have adequate stock levels")
-        
         else:
             st.info("No inventory data available")
     
@@ -388,4 +412,41 @@ def show_inventory():
         st.error(f"❌ Error loading inventory: {str(e)}")
     
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@metered_fragment("low_stock")
+def show_low_stock():
+    """Lowest stocked items across all locations (independent of the inventory filters)"""
+    db = get_db_connection()
+    
+    try:
+        low_stock_query = text("""
+            SELECT 
+                p.product_name,
+                l.location_name,
+                i.quantity
+            FROM inventory i
+            JOIN products p ON i.product_id = p.product_id
+            JOIN locations l ON i.location_id = l.location_id
+            WHERE i.quantity < 100 AND i.quantity > 0
+            ORDER BY i.quantity ASC
+            LIMIT 10
+        """)
+        
+        result = db.execute(low_stock_query).fetchall()
+        low_stock = pd.DataFrame(result, columns=['product_name', 'location_name', 'quantity'])
+        
+        if not low_stock.empty:
+            low_stock['quantity'] = pd.to_numeric(low_stock['quantity'], errors='coerce').fillna(0).astype(int)
+        
+        if not low_stock.empty:
+            st.warning(f"⚠️ {len(low_stock)} products with low stock (< 100 units)")
+            st.dataframe(low_stock, use_container_width=True, hide_index=True)
+        else:
+            st.success("✅ All products have adequate stock levels")
+    
+    except Exception as e:
+        st.error(f"❌ Error loading low stock: {str(e)}")
+    
+    finally:
+        db.close()
@@ -1,45 +1,125 @@
+import os
+import time
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from sqlalchemy import text
 from datetime import datetime, timedelta
-from config.session import get_db_connection
 from utils.auth import check_permission
+from pathlib import Path
+from utils.report_engine import ReportSpec, run_report_specs
+from utils.report_export import EXPORT_FORMATS
+from utils.job_runner import find_active_job, submit_job
+from utils.job_panel import show_job
+from utils.sales_cube import get_sales_cube
+from utils.bonus_engine import ensure_bonus_schema, ledger_periods
+from utils.inventory_ledger import stock_at
+from utils.reference_data import get_reference
+from utils.dashboard_data import get_regions
+from utils.report_totals import PROMOTION_SQL, ensure_report_totals_schema, window_params
+from utils import report_queries as rq
+from utils.startup import lazy_module
+from utils.query_metrics import metered_fragment
 
-def execute_query_to_df(db, query, params=None):
-    """Helper function to execute query and return DataFrame with proper types"""
-    if params:
-        result = db.execute(query, params).fetchall()
-    else:
-        result = db.execute(query).fetchall()
+# plotly is only imported once a chart is actually drawn
+px = lazy_module("plotly.express")
+go = lazy_module("plotly.graph_objects")
+
+ALL_REGIONS = "All regions"
+
+# A tab queues its ledger job at most this often per session
+LEDGER_REFRESH_SECONDS = int(os.getenv("LEDGER_REFRESH_SECONDS", "60"))
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def cached_regions():
+    return get_regions()
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def cached_stores(region):
+    return rq.get_report_stores(region)
+
+
+def refresh_in_background(kind, label):
+    """Queue the ledger job behind a tab instead of updating the ledger during the render"""
+    key = f"{kind}_submitted_at"
     
-    if not result:
-        return pd.DataFrame()
+    if time.time() - st.session_state.get(key, 0) >= LEDGER_REFRESH_SECONDS:
+        st.session_state[key] = time.time()
+        submit_job(kind, label=label, unique=True)
     
-    # Get column names from result keys
-    columns = result[0]._fields if hasattr(result[0], '_fields') else result[0].keys()
-    df = pd.DataFrame(result, columns=columns)
+    if find_active_job(kind) is not None:
+        st.caption(f"⏳ {label} running in the background; figures may lag until it finishes")
+
+
+def report_filter_bar():
+    """Date range, region and store shared by the report tabs"""
+    default_start, default_end = rq.default_window(30)
     
-    # Convert numeric columns
-    numeric_cols = ['count', 'total_sales', 'revenue', 'total_spent', 'total_orders', 
-                    'loyalty_points', 'units_sold', 'total_quantity', 'total_revenue',
-                    'unit_margin', 'total_margin', 'total_deliveries', 'successful_deliveries',
-                    'success_rate', 'costs', 'gross_profit', 'customer_count', 'quantity_sold',
-                    'contribution_percent', 'gross_margin', 'gross_margin_percent', 'bonus_amount',
-                    'deliveries_count', 'success_count', 'failure_count', 'utilization_rate_percent',
-                    'number_of_orders', 'number_of_returns', 'return_value', 'return_rate_percent',
-                    'orders_handled', 'avg_order_value', 'deliveries_handled', 'delivery_success_rate',
-                    'deliveries_per_vehicle', 'current_stock_quantity', 'total_movement', 'sales_volume',
-                    'bonus_earned', 'deliveries_completed', 'net_sales', 'margin', 'order_count',
-                    'total_order_value', 'total_value', 'usage_count', 'revenue_contribution',
-                    'success_rate_percent', 'points_balance']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        start_date = st.date_input("Start Date", default_start, key="report_start")
+    with col2:
+        end_date = st.date_input("End Date", default_end, key="report_end")
+    with col3:
+        region = st.selectbox("Region", [ALL_REGIONS] + cached_regions(), key="report_region")
+        region = None if region == ALL_REGIONS else region
+    with col4:
+        stores = dict(cached_stores(region))
+        location_id = st.selectbox(
+            "Store",
+            [None] + list(stores),
+            format_func=lambda lid: "All stores" if lid is None else stores[lid],
+            key="report_store"
+        )
     
-    for col in df.columns:
-        if col in numeric_cols or any(x in col.lower() for x in ['amount', 'price', 'cost', 'revenue', 'total', 'count', 'percent', 'rate', 'margin', 'bonus', 'value', 'points', 'quantity']):
-            df[col] = pd.to_numeric(df[col], errors='coerce')
+    return rq.ReportFilters(start_date, end_date, region, location_id)
+
+
+@metered_fragment("export_panel")
+def export_panel(specs, key):
+    """Full export of any dataset of a tab, generated in chunks on the server"""
+    with st.expander("⬇️ Export data", expanded=False):
+        names = [spec.name for spec in specs]
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            name = st.selectbox("Dataset", names, key=f"{key}_export_dataset")
+        with col2:
+            fmt = st.selectbox("Format", list(EXPORT_FORMATS), key=f"{key}_export_format")
+        
+        spec = specs[names.index(name)]
+        
+        # Generated by a background job; the panel polls it
+        if st.button("Prepare export", key=f"{key}_export_prepare"):
+            st.session_state[f"{key}_export_job"] = submit_job(
+                "export_report",
+                {"name": spec.name, "sql": spec.sql, "params": spec.params, "fmt": fmt},
+                label=f"Export {spec.name}.{EXPORT_FORMATS[fmt][0]}"
+            )
+        
+        if f"{key}_export_job" in st.session_state:
+            show_job(st.session_state[f"{key}_export_job"], render_result=export_download_button)
+
+
+def export_download_button(job):
+    """Download button for a finished export job"""
+    result = job["result"]
+    path = Path(result["path"])
     
-    return df
+    if not path.exists():
+        st.warning("⚠️ Export file expired, prepare it again")
+        return
+    
+    extension, mime = EXPORT_FORMATS[result["fmt"]]
+    with open(path, "rb") as f:
+        st.download_button(
+            label=f"📥 Download {result['name']}.{extension}",
+            data=f,
+            file_name=f"{result['name']}.{extension}",
+            mime=mime,
+            key=f"export_download_{job['job_id']}"
+        )
+
 
 def format_currency(value):
     """Format number as VND currency"""
@@ -106,48 +186,59 @@ def show():
         st.info("Contact your administrator to grant dashboard permissions")
         return
     
-    # Create tabs
-    tabs = st.tabs(available_tabs)
+    # Only the selected tab is evaluated; st.tabs would run every tab's
+    # queries on each rerun even though a single one is visible
+    active_tab = st.radio(
+        "Report",
+        available_tabs,
+        horizontal=True,
+        key="reports_active_tab",
+        label_visibility="collapsed"
+    )
+    
+    st.markdown("---")
     
-    for i, tab_name in enumerate(available_tabs):
-        with tabs[i]:
-            tab_functions[tab_name]()
+    # Contribution denominators for older databases; their missing filter
+    # indexes are added by a background job, the reports work without them
+    try:
+        ensure_report_totals_schema()
+        rq.queue_report_indexes()
+    except Exception as e:
+        st.error(f"❌ Error preparing report tables: {str(e)}")
+        return
+    
+    show_report_tab(tab_functions[active_tab])
+
+
+@metered_fragment("report_tab")
+def show_report_tab(tab_function):
+    """Filter bar and the selected tab; changing a filter reruns only this fragment"""
+    filters = report_filter_bar()
+    st.markdown("---")
+    
+    tab_function(filters)
 
 # =====================================================
 # SALES ANALYSIS (DASHBOARD_SALES_VIEW)
 # =====================================================
 
-def show_sales_analysis():
+def show_sales_analysis(filters):
     """Sales analysis report"""
     st.markdown("### 📈 Sales Analysis")
     
-    db = get_db_connection()
-    
     try:
-        # Date range selector
-        col1, col2 = st.columns(2)
-        with col1:
-            start_date = st.date_input("Start Date", datetime.now() - timedelta(days=90))
-        with col2:
-            end_date = st.date_input("End Date", datetime.now())
-        
-        # Sales trend
-        sales_trend_query = text("""
-            SELECT 
-                DATE(sale_date) as date,
-                COUNT(*) as transactions,
-                SUM(total_amount) as revenue
-            FROM sales
-            WHERE sale_type = 'INVOICE'
-                AND sale_date BETWEEN :start AND :end
-            GROUP BY DATE(sale_date)
-            ORDER BY date
-        """)
-        
-        sales_trend = execute_query_to_df(db, sales_trend_query, params={
-            "start": start_date,
-            "end": end_date
-        })
+        start_date, end_date = filters.start_date, filters.end_date
+        
+        trend_spec = rq.sales_trend_spec(filters)
+        section_specs = [
+            # Contribution % relative to the selected scope
+            rq.payment_mix_spec(filters),
+            rq.employee_performance_spec(filters, limit=10),
+        ]
+        export_panel([trend_spec] + section_specs + [rq.sales_lines_spec(filters)], "sales")
+        
+        # The other sections are only queried when the period has sales
+        sales_trend = run_report_specs([trend_spec])["sales_trend"]
         
         if not sales_trend.empty:
             # Line chart for revenue
@@ -178,18 +269,23 @@ def show_sales_analysis():
                 st.metric("Avg Order Value", format_currency(avg_order))
             
             with col4:
-                days = (end_date - start_date).days + 1
+                days = (end_date - start_date).days + 1 if start_date and end_date else len(sales_trend)
                 daily_avg = total_revenue / days if days > 0 else 0
                 st.metric("Daily Avg", format_currency(daily_avg))
             
+            # A failing section query is reported in its section only
+            errors = {}
+            data = run_report_specs(section_specs, errors=errors)
+            
             # Sales by payment method
             st.markdown("---")
             st.markdown("#### 💳 Sales by Payment Method")
             
-            payment_query = text("SELECT * FROM vw_sales_by_payment_method")
-            payment_data = execute_query_to_df(db, payment_query)
+            payment_data = data.get("payment")
             
-            if not payment_data.empty:
+            if "payment" in errors:
+                st.error(f"❌ Error loading payment methods: {str(errors['payment'])}")
+            elif not payment_data.empty:
                 col1, col2 = st.columns(2)
                 
                 with col1:
@@ -218,14 +314,11 @@ def show_sales_analysis():
             st.markdown("---")
             st.markdown("#### 👨‍💼 Employee Performance")
             
-            emp_perf_query = text("""
-                SELECT * FROM vw_sales_employee_location_performance
-                ORDER BY total_sales DESC
-                LIMIT 10
-            """)
-            emp_perf = execute_query_to_df(db, emp_perf_query)
+            emp_perf = data.get("emp_perf")
             
-            if not emp_perf.empty:
+            if "emp_perf" in errors:
+                st.error(f"❌ Error loading employee performance: {str(errors['emp_perf'])}")
+            elif not emp_perf.empty:
                 fig = px.bar(
                     emp_perf,
                     x='total_sales',
@@ -243,31 +336,35 @@ def show_sales_analysis():
             st.markdown("---")
             st.markdown("#### 💹 Revenue & Gross Margin by Product")
             
-            gm_query = text("""
-                SELECT 
-                    product_name,
-                    class_name,
-                    total_revenue,
-                    gross_margin,
-                    gross_margin_percent
-                FROM vw_sales_revenue_gm
-                ORDER BY total_revenue DESC
-                LIMIT 20
-            """)
-            gm_data = execute_query_to_df(db, gm_query)
+            # Same grain as vw_sales_revenue_gm (store x employee x product),
+            # aggregated from the sales cube
+            try:
+                gm_data = (
+                    get_sales_cube().group_by(
+                        ["region", "city", "store", "employee", "product", "class"],
+                        **filters.cube_args()
+                    )
+                    .nlargest(20, "revenue")
+                    .rename(columns={"revenue": "total_revenue"})
+                )
+            except Exception as e:
+                st.error(f"❌ Error loading gross margin: {str(e)}")
+                gm_data = None
             
-            if not gm_data.empty:
+            if gm_data is not None and not gm_data.empty:
                 gm_data['revenue_display'] = gm_data['total_revenue'].apply(format_currency)
                 gm_data['margin_display'] = gm_data['gross_margin'].apply(format_currency)
                 
                 st.dataframe(
                     gm_data[[
-                        'product_name', 'class_name', 'revenue_display',
-                        'margin_display', 'gross_margin_percent'
+                        'store_name', 'employee_name', 'product_name', 'class_name',
+                        'revenue_display', 'margin_display', 'gross_margin_percent'
                     ]],
                     use_container_width=True,
                     hide_index=True,
                     column_config={
+                        "store_name": "Store",
+                        "employee_name": "Employee",
                         "product_name": "Product",
                         "class_name": "Category",
                         "revenue_display": "Revenue",
@@ -283,26 +380,28 @@ def show_sales_analysis():
     
     except Exception as e:
         st.error(f"❌ Error loading sales analysis: {str(e)}")
-    
-    finally:
-        db.close()
 
 # =====================================================
 # CUSTOMER ANALYTICS (DASHBOARD_SALES_VIEW)
 # =====================================================
 
-def show_customer_analytics():
+def show_customer_analytics(filters):
     """Customer analytics report"""
     st.markdown("### 👥 Customer Analytics")
     
-    db = get_db_connection()
-    
     try:
+        specs = [
+            rq.loyalty_distribution_spec(filters),
+            rq.top_customers_spec(filters, limit=20),
+            ReportSpec("promo", PROMOTION_SQL, window_params(filters.start_date, filters.end_date)),
+        ]
+        data = run_report_specs(specs)
+        export_panel(specs, "customers")
+        
         # Loyalty level distribution
         st.markdown("#### 🏆 Loyalty Level Distribution")
         
-        loyalty_query = text("SELECT * FROM vw_loyalty_level_distribution")
-        loyalty_data = execute_query_to_df(db, loyalty_query)
+        loyalty_data = data["loyalty"]
         
         if not loyalty_data.empty:
             col1, col2 = st.columns(2)
@@ -335,26 +434,7 @@ def show_customer_analytics():
         st.markdown("---")
         st.markdown("#### 💎 Top Customers")
         
-        top_customers_query = text("""
-            SELECT 
-                c.customer_id,
-                CONCAT(c.first_name, ' ', c.last_name) as name,
-                c.email,
-                cl.loyalty_points,
-                ll.level_name,
-                COUNT(DISTINCT so.order_id) as total_orders,
-                COALESCE(SUM(s.total_amount), 0) as total_spent
-            FROM customers c
-            LEFT JOIN customer_loyalty cl ON c.customer_id = cl.customer_id
-            LEFT JOIN loyalty_levels ll ON cl.loyalty_id = ll.loyalty_id
-            LEFT JOIN sales_orders so ON c.customer_id = so.customer_id
-            LEFT JOIN sales s ON so.order_id = s.order_id AND s.sale_type = 'INVOICE'
-            GROUP BY c.customer_id
-            ORDER BY total_spent DESC
-            LIMIT 20
-        """)
-        
-        top_customers = execute_query_to_df(db, top_customers_query)
+        top_customers = data["top_customers"]
         
         if not top_customers.empty:
             top_customers['total_spent_display'] = top_customers['total_spent'].apply(format_currency)
@@ -381,8 +461,7 @@ def show_customer_analytics():
         st.markdown("---")
         st.markdown("#### 🎁 Promotion Effectiveness")
         
-        promo_query = text("SELECT * FROM vw_promotion_effectiveness ORDER BY revenue_contribution DESC")
-        promo_data = execute_query_to_df(db, promo_query)
+        promo_data = data["promo"]
         
         if not promo_data.empty:
             col1, col2 = st.columns(2)
@@ -421,29 +500,26 @@ def show_customer_analytics():
     
     except Exception as e:
         st.error(f"❌ Error loading customer analytics: {str(e)}")
-    
-    finally:
-        db.close()
 
 # =====================================================
 # PRODUCT PERFORMANCE (DASHBOARD_SALES_VIEW)
 # =====================================================
 
-def show_product_performance():
+def show_product_performance(filters):
     """Product performance report"""
     st.markdown("### 📦 Product Performance")
     
-    db = get_db_connection()
-    
     try:
-        # Product sales performance
-        product_query = text("""
-            SELECT * FROM vw_product_sales_performance
-            ORDER BY revenue DESC
-            LIMIT 20
-        """)
+        cube = get_sales_cube()
+        cube_args = filters.cube_args()
         
-        product_data = execute_query_to_df(db, product_query)
+        # Product sales performance (vw_product_sales_performance)
+        product_data = (
+            cube.group_by(["product"], **cube_args)
+            .nlargest(20, "revenue")
+            .rename(columns={"quantity": "quantity_sold"})
+        )
+        product_data['quantity_sold'] = product_data['quantity_sold'].astype(int)
         
         if not product_data.empty:
             col1, col2 = st.columns(2)
@@ -480,8 +556,11 @@ def show_product_performance():
             st.markdown("---")
             st.markdown("#### 📊 Performance by Product Category")
             
-            class_query = text("SELECT * FROM vw_product_class_performance ORDER BY revenue DESC")
-            class_data = execute_query_to_df(db, class_query)
+            # Class performance (vw_product_class_performance)
+            class_data = cube.group_by(["class"], **cube_args).sort_values("revenue", ascending=False)
+            class_data['contribution_percent'] = (
+                class_data['revenue'] / class_data['revenue'].sum() * 100
+            ).round(2)
             
             if not class_data.empty:
                 col1, col2 = st.columns(2)
@@ -534,15 +613,12 @@ def show_product_performance():
     
     except Exception as e:
         st.error(f"❌ Error loading product performance: {str(e)}")
-    
-    finally:
-        db.close()
 
 # =====================================================
 # DELIVERY ANALYTICS (DASHBOARD_DELIVERY_VIEW)
 # =====================================================
 
-def show_delivery_analytics():
+def show_delivery_analytics(filters):
     """Delivery analytics report"""
     st.markdown("### 🚚 Delivery Analytics")
     
@@ -550,14 +626,20 @@ def show_delivery_analytics():
         st.error("⛔ You don't have permission to view delivery analytics")
         return
     
-    db = get_db_connection()
-    
     try:
+        specs = [
+            rq.delivery_volume_spec(filters),
+            rq.delivery_vendor_spec(filters),
+            rq.delivery_staff_spec(filters, limit=15),
+            rq.delivery_vehicle_spec(filters),
+        ]
+        data = run_report_specs(specs)
+        export_panel(specs, "delivery")
+        
         # Delivery volume by type
         st.markdown("#### 📦 Delivery Volume by Type")
         
-        volume_query = text("SELECT * FROM vw_delivery_volume_by_type")
-        volume_data = execute_query_to_df(db, volume_query)
+        volume_data = data["volume"]
         
         if not volume_data.empty:
             col1, col2 = st.columns(2)
@@ -588,8 +670,7 @@ def show_delivery_analytics():
         st.markdown("---")
         st.markdown("#### 🏢 Delivery Vendor Performance")
         
-        vendor_query = text("SELECT * FROM vw_delivery_vendor_performance ORDER BY success_rate_percent DESC")
-        vendor_data = execute_query_to_df(db, vendor_query)
+        vendor_data = data["vendor"]
         
         if not vendor_data.empty:
             fig = go.Figure()
@@ -637,12 +718,7 @@ def show_delivery_analytics():
         st.markdown("---")
         st.markdown("#### 👨‍💼 Delivery Staff Performance")
         
-        emp_query = text("""
-            SELECT * FROM vw_delivery_employee_performance 
-            ORDER BY deliveries_handled DESC
-            LIMIT 15
-        """)
-        emp_data = execute_query_to_df(db, emp_query)
+        emp_data = data["staff"]
         
         if not emp_data.empty:
             fig = px.bar(
@@ -662,8 +738,7 @@ def show_delivery_analytics():
         st.markdown("---")
         st.markdown("#### 🚗 Vehicle Utilization")
         
-        vehicle_query = text("SELECT * FROM vw_delivery_vehicle_utilization ORDER BY deliveries_per_vehicle DESC")
-        vehicle_data = execute_query_to_df(db, vehicle_query)
+        vehicle_data = data["vehicle"]
         
         if not vehicle_data.empty:
             col1, col2 = st.columns(2)
@@ -700,15 +775,12 @@ def show_delivery_analytics():
     
     except Exception as e:
         st.error(f"❌ Error loading delivery analytics: {str(e)}")
-    
-    finally:
-        db.close()
 
 # =====================================================
 # FINANCIAL REPORTS (DASHBOARD_EXECUTIVE_VIEW)
 # =====================================================
 
-def show_financial_reports():
+def show_financial_reports(filters):
     """Financial reports"""
     st.markdown("### 💰 Financial Reports")
     
@@ -716,26 +788,19 @@ def show_financial_reports():
         st.error("⛔ You don't have permission to view financial reports")
         return
     
-    db = get_db_connection()
-    
     try:
-        # Revenue and costs
-        financial_query = text("""
-            SELECT 
-                DATE_FORMAT(s.sale_date, '%Y-%m') as month,
-                SUM(s.total_amount) as revenue,
-                SUM(ABS(si.quantity) * p.cost) as costs,
-                SUM(s.total_amount - ABS(si.quantity) * p.cost) as gross_profit
-            FROM sales s
-            JOIN sales_items si ON s.sale_id = si.sale_id
-            JOIN products p ON si.product_id = p.product_id
-            WHERE s.sale_type = 'INVOICE'
-            GROUP BY DATE_FORMAT(s.sale_date, '%Y-%m')
-            ORDER BY month DESC
-            LIMIT 12
-        """)
-        
-        financial_data = execute_query_to_df(db, financial_query)
+        specs = [
+            # Revenue and costs: always the last 12 months, scoped by region / store
+            rq.financial_monthly_spec(
+                filters,
+                since=(datetime.now().replace(day=1) - timedelta(days=335)).replace(day=1)
+            ),
+            rq.returns_spec(filters, limit=20),
+        ]
+        data = run_report_specs(specs)
+        export_panel(specs, "financial")
+        
+        financial_data = data["financial"]
         
         if not financial_data.empty:
             financial_data['revenue_display'] = financial_data['revenue'].apply(lambda x: f"{x:,.0f}")
@@ -815,8 +880,7 @@ def show_financial_reports():
         st.markdown("---")
         st.markdown("#### 🔄 Sales Returns Analysis")
         
-        returns_query = text("SELECT * FROM vw_sales_returns_analysis ORDER BY return_value DESC LIMIT 20")
-        returns_data = execute_query_to_df(db, returns_query)
+        returns_data = data["returns"]
         
         if not returns_data.empty:
             returns_data['return_value_display'] = returns_data['return_value'].apply(format_currency)
@@ -839,15 +903,12 @@ def show_financial_reports():
     
     except Exception as e:
         st.error(f"❌ Error loading financial reports: {str(e)}")
-    
-    finally:
-        db.close()
 
 # =====================================================
 # INVENTORY REPORTS (DASHBOARD_INVENTORY_VIEW)
 # =====================================================
 
-def show_inventory_reports():
+def show_inventory_reports(filters):
     """Inventory reports"""
     st.markdown("### 📊 Inventory Reports")
     
@@ -855,18 +916,23 @@ def show_inventory_reports():
         st.error("⛔ You don't have permission to view inventory reports")
         return
     
-    db = get_db_connection()
-    
     try:
+        # Days closed since the last run are rolled up and checkpointed by a
+        # job; the tab reads the checkpoints and rollups that already exist
+        refresh_in_background("inventory_checkpoints", "Inventory checkpoints")
+        
+        specs = [
+            rq.inventory_status_spec(filters, limit=50),
+            # Rolled-up days plus raw created_at rows after them (pruned to their partitions)
+            rq.inventory_movement_spec(filters),
+        ]
+        data = run_report_specs(specs)
+        export_panel(specs, "inventory")
+        
         # Current inventory status
         st.markdown("#### 📦 Current Inventory Status")
         
-        inventory_query = text("""
-            SELECT * FROM vw_inventory_current_status
-            ORDER BY current_stock_quantity ASC
-            LIMIT 50
-        """)
-        inventory_data = execute_query_to_df(db, inventory_query)
+        inventory_data = data["inventory"]
         
         if not inventory_data.empty:
             # Low stock items
@@ -906,17 +972,7 @@ def show_inventory_reports():
         st.markdown("---")
         st.markdown("#### 📈 Inventory Movement Summary")
         
-        movement_query = text("""
-            SELECT 
-                change_type,
-                period,
-                SUM(total_quantity) as total_movement
-            FROM vw_inventory_movement_summary
-            WHERE period >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-            GROUP BY change_type, period
-            ORDER BY period DESC
-        """)
-        movement_data = execute_query_to_df(db, movement_query)
+        movement_data = data["movement"]
         
         if not movement_data.empty:
             # Pivot for better visualization
@@ -937,25 +993,72 @@ def show_inventory_reports():
                 ))
             
             fig.update_layout(
-                title='Inventory Movement by Type (Last 30 Days)',
+                title='Inventory Movement by Type',
                 xaxis_title='Date',
                 yaxis_title='Quantity',
                 height=400,
                 hovermode='x unified'
             )
             st.plotly_chart(fig, use_container_width=True)
+        
+        # Point-in-time stock from the nearest checkpoint
+        st.markdown("---")
+        st.markdown("#### 📅 Stock on Date")
+        show_stock_on_date(filters)
     
     except Exception as e:
         st.error(f"❌ Error loading inventory reports: {str(e)}")
+
+
+@metered_fragment("stock_on_date")
+def show_stock_on_date(filters):
+    """Stock per product and store at the end of the chosen day; the date only reruns this fragment"""
+    try:
+        as_of = st.date_input("End of day", filters.end_date or datetime.now().date(), key="inventory_as_of")
+        
+        if filters.location_id is not None:
+            location_ids = [filters.location_id]
+        elif filters.region is not None:
+            location_ids = [store_id for store_id, _ in cached_stores(filters.region)]
+        else:
+            location_ids = None
+        
+        stock_df = stock_at(as_of, location_ids=location_ids)
+        
+        if not stock_df.empty:
+            products_df = get_reference("products").frame()[['product_id', 'product_name']]
+            stores_df = get_reference("stores").frame()[['location_id', 'location_name']]
+            
+            stock_df = (
+                stock_df
+                .merge(products_df, on='product_id', how='left')
+                .merge(stores_df, on='location_id', how='left')
+            )
+            stock_df['product_name'] = stock_df['product_name'].fillna('#' + stock_df['product_id'].astype(str))
+            stock_df['location_name'] = stock_df['location_name'].fillna('#' + stock_df['location_id'].astype(str))
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Units in Stock", f"{int(stock_df['quantity'].sum()):,}")
+            with col2:
+                st.metric("Products Stocked", f"{int((stock_df['quantity'] > 0).sum()):,}")
+            
+            st.dataframe(
+                stock_df[['product_name', 'location_name', 'quantity']].sort_values('quantity'),
+                use_container_width=True,
+                hide_index=True
+            )
+        else:
+            st.info(f"No stock on {as_of}")
     
-    finally:
-        db.close()
+    except Exception as e:
+        st.error(f"❌ Error loading stock on date: {str(e)}")
 
 # =====================================================
 # HR & BONUS REPORTS (DASHBOARD_HR_VIEW)
 # =====================================================
 
-def show_hr_bonus_reports():
+def show_hr_bonus_reports(filters):
     """HR and bonus reports"""
     st.markdown("### 👨‍💼 HR & Bonus Reports")
     
@@ -963,18 +1066,61 @@ def show_hr_bonus_reports():
         st.error("⛔ You don't have permission to view HR reports")
         return
     
-    db = get_db_connection()
-    
     try:
+        # Pay periods touched since the last run are recomputed by a job;
+        # the tab shows the ledger as it stands
+        ensure_bonus_schema()
+        refresh_in_background("update_bonuses", "Bonus ledger update")
+        
+        periods = ledger_periods()
+        period = st.selectbox(
+            "Pay Period",
+            [None] + periods,
+            format_func=lambda p: "All periods" if p is None else p.strftime("%Y-%m"),
+            key="hr_bonus_period"
+        )
+        
+        specs = [
+            ReportSpec("sales_bonus", """
+                SELECT
+                    bl.employee_id,
+                    CONCAT(e.first_name, ' ', e.last_name) AS employee_name,
+                    SUM(bl.basis) AS sales_volume,
+                    r.bonus_type,
+                    SUM(bl.bonus_amount) AS bonus_amount
+                FROM bonus_ledger bl
+                JOIN employees e ON bl.employee_id = e.employee_id
+                JOIN employee_bonus_rules r ON bl.rule_id = r.rule_id
+                WHERE bl.source = 'SALES'
+                    AND (:period IS NULL OR bl.period_start = :period)
+                GROUP BY bl.employee_id, employee_name, bl.rule_id, r.bonus_type
+                ORDER BY bonus_amount DESC
+                LIMIT 20
+            """, {"period": period}),
+            ReportSpec("delivery_bonus", """
+                SELECT
+                    bl.employee_id,
+                    CONCAT(e.first_name, ' ', e.last_name) AS delivery_staff,
+                    SUM(bl.basis) AS deliveries_completed,
+                    r.rule_type,
+                    SUM(bl.bonus_amount) AS bonus_earned
+                FROM bonus_ledger bl
+                JOIN employees e ON bl.employee_id = e.employee_id
+                JOIN delivery_bonus_rules r ON bl.rule_id = r.rule_id
+                WHERE bl.source = 'DELIVERY'
+                    AND (:period IS NULL OR bl.period_start = :period)
+                GROUP BY bl.employee_id, delivery_staff, bl.rule_id, r.rule_type
+                ORDER BY bonus_earned DESC
+                LIMIT 20
+            """, {"period": period}),
+        ]
+        data = run_report_specs(specs)
+        export_panel(specs, "hr")
+        
         # Employee sales bonus
         st.markdown("#### 💰 Employee Sales Bonus")
         
-        sales_bonus_query = text("""
-            SELECT * FROM vw_employee_sales_bonus
-            ORDER BY bonus_amount DESC
-            LIMIT 20
-        """)
-        sales_bonus_data = execute_query_to_df(db, sales_bonus_query)
+        sales_bonus_data = data["sales_bonus"]
         
         if not sales_bonus_data.empty:
             col1, col2 = st.columns(2)
@@ -1013,12 +1159,7 @@ def show_hr_bonus_reports():
         st.markdown("---")
         st.markdown("#### 🚚 Delivery Staff Bonus")
         
-        delivery_bonus_query = text("""
-            SELECT * FROM vw_delivery_bonus_summary
-            ORDER BY bonus_earned DESC
-            LIMIT 20
-        """)
-        delivery_bonus_data = execute_query_to_df(db, delivery_bonus_query)
+        delivery_bonus_data = data["delivery_bonus"]
         
         if not delivery_bonus_data.empty:
             col1, col2 = st.columns(2)
@@ -1072,15 +1213,12 @@ def show_hr_bonus_reports():
     
     except Exception as e:
         st.error(f"❌ Error loading HR & bonus reports: {str(e)}")
-    
-    finally:
-        db.close()
 
 # =====================================================
 # EXECUTIVE DASHBOARD (DASHBOARD_EXECUTIVE_VIEW)
 # =====================================================
 
-def show_executive_dashboard():
+def show_executive_dashboard(filters):
     """Executive dashboard"""
     st.markdown("### 🎯 Executive Dashboard")
     
@@ -1088,18 +1226,18 @@ def show_executive_dashboard():
         st.error("⛔ You don't have permission to view executive dashboard")
         return
     
-    db = get_db_connection()
-    
     try:
+        specs = [
+            rq.executive_kpi_spec(filters),
+            rq.order_status_spec(filters),
+        ]
+        data = run_report_specs(specs)
+        export_panel(specs, "executive")
+        
         # Executive KPI overview
         st.markdown("#### 📊 Key Performance Indicators")
         
-        kpi_query = text("""
-            SELECT * FROM vw_executive_kpi_overview
-            WHERE period >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-            ORDER BY period DESC
-        """)
-        kpi_data = execute_query_to_df(db, kpi_query)
+        kpi_data = data["kpi"]
         
         if not kpi_data.empty:
             # Latest KPIs
@@ -1141,7 +1279,7 @@ def show_executive_dashboard():
             ))
             
             fig.update_layout(
-                title='Executive KPI Trends (Last 30 Days)',
+                title='Executive KPI Trends',
                 xaxis_title='Date',
                 yaxis=dict(title='Net Sales (VND)', side='left'),
                 yaxis2=dict(title='Gross Margin %', side='right', overlaying='y'),
@@ -1154,11 +1292,11 @@ def show_executive_dashboard():
         st.markdown("---")
         st.markdown("#### 🌍 Regional Performance")
         
-        regional_query = text("""
-            SELECT * FROM vw_regional_performance_summary
-            ORDER BY revenue DESC
-        """)
-        regional_data = execute_query_to_df(db, regional_query)
+        # Store revenue per region (vw_regional_performance_summary)
+        regional_data = (
+            get_sales_cube().group_by(["region", "store"], **filters.cube_args())
+            .sort_values("revenue", ascending=False)
+        )
         
         if not regional_data.empty:
             col1, col2 = st.columns(2)
@@ -1192,15 +1330,7 @@ def show_executive_dashboard():
         st.markdown("---")
         st.markdown("#### 📋 Order Status Overview")
         
-        order_query = text("""
-            SELECT 
-                order_status,
-                COUNT(*) as order_count,
-                SUM(total_order_value) as total_value
-            FROM vw_sales_order_overview
-            GROUP BY order_status
-        """)
-        order_data = execute_query_to_df(db, order_query)
+        order_data = data["orders"]
         
         if not order_data.empty:
             col1, col2 = st.columns(2)
@@ -1230,7 +1360,4 @@ def show_executive_dashboard():
                 )
     
     except Exception as e:
-        st.error(f"❌ Error loading executive dashboard: {str(e)}")
-    
-    finally:
-        db.close()
\ No newline at end of file
+        st.error(f"❌ Error loading executive dashboard: {str(e)}")
\ No newline at end of file
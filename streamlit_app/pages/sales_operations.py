@@ -1,9 +1,22 @@
 import streamlit as st
 import pandas as pd
+import re
+import uuid
 from sqlalchemy import text
 from datetime import datetime
 from config.session import get_db_connection
 from utils.auth import check_permission
+from utils.inventory_service import get_inventory_service
+from utils.order_confirmation import confirm_sales_order
+from utils.sales_returns import process_return
+from utils.order_pricing import OrderLine, insert_order_lines
+from utils.promotion_engine import get_promotion_catalog
+from utils.reference_data import get_reference
+from utils.entity_counters import get_counts
+from utils.fulfillment_queue import claim_sales, queue_depth, release_sales
+from utils.delivery_dispatch import (
+    DELIVERY_STATUSES, DeliveryTransitionError, dispatch_sales, transition_deliveries
+)
 
 def show():
     """Display sales operations page with full workflow"""
@@ -20,6 +33,7 @@ def show():
         "📝 Create Order",
         "✅ Confirm Order", 
         "🚚 Create Delivery",
+        "📦 Delivery Status",
         "↩️ Process Return",
         "📋 Order History"
     ])
@@ -34,9 +48,12 @@ def show():
         show_create_delivery()
     
     with tabs[3]:
-        show_process_return()
+        show_delivery_status()
     
     with tabs[4]:
+        show_process_return()
+    
+    with tabs[5]:
         show_order_history()
 
 
@@ -56,68 +73,25 @@ def show_create_order():
     db = get_db_connection()
     
     try:
-        # Get customers
-        customers_query = text("""
-            SELECT customer_id, CONCAT(first_name, ' ', last_name, ' (', email, ')') as customer_name
-            FROM customers
-            ORDER BY first_name, last_name
-            LIMIT 100
-        """)
-        customers = db.execute(customers_query).fetchall()
-        customers_df = pd.DataFrame(customers, columns=['customer_id', 'customer_name'])
-        
-        # Get employees
-        employees_query = text("""
-            SELECT employee_id, CONCAT(first_name, ' ', last_name) as employee_name
-            FROM employees
-            WHERE role IN ('Staff', 'Manager') AND is_inactive = 0
-            ORDER BY first_name, last_name
-        """)
-        employees = db.execute(employees_query).fetchall()
-        employees_df = pd.DataFrame(employees, columns=['employee_id', 'employee_name'])
+        # Dropdown data comes from the process-wide reference snapshots (no queries on rerun)
+        employees = get_reference("employees")
+        stores = get_reference("stores")
         
-        # Get locations
-        locations_query = text("""
-            SELECT location_id, location_name
-            FROM locations
-            WHERE location_type = 'STORE' AND close_date IS NULL
-            ORDER BY location_name
-        """)
-        locations = db.execute(locations_query).fetchall()
-        locations_df = pd.DataFrame(locations, columns=['location_id', 'location_name'])
+        employees_df = employees.frame(role=("Staff", "Manager"))
+        locations_df = stores.frame()
         
-        if customers_df.empty or employees_df.empty or locations_df.empty:
+        if get_counts()["customers"] == 0 or employees_df.empty or locations_df.empty:
             st.warning("⚠️ Missing required data (customers, employees, or locations)")
             return
         
-        # Get products
-        products_query = text("""
-            SELECT product_id, product_name, unit_price,
-                   (SELECT COALESCE(SUM(quantity), 0) FROM inventory WHERE product_id = p.product_id) as stock
-            FROM products p
-            WHERE status = 'ACTIVE'
-            ORDER BY product_name
-        """)
-        products = db.execute(products_query).fetchall()
-        products_df = pd.DataFrame(products, columns=['product_id', 'product_name', 'unit_price', 'stock'])
+        # Get products (stock = on hand minus OPEN-order reservations, from memory)
+        inventory = get_inventory_service()
+        products_df = get_reference("products").frame()
+        products_df['stock'] = inventory.available_many(products_df['product_id'])
         
-        # Get promotions - FIXED: use correct column names
-        promotions_query = text("""
-            SELECT 
-                p.promotion_id, 
-                p.promotion_code,
-                p.discount_percent, 
-                p.discount_value,
-                pc.campaign_name
-            FROM promotions p
-            LEFT JOIN promotions_campaigns pc ON p.campaign_id = pc.campaign_id
-            WHERE p.status = 'ACTIVE' 
-              AND (pc.start_date IS NULL OR pc.start_date <= CURDATE())
-              AND (pc.end_date IS NULL OR pc.end_date >= CURDATE())
-            ORDER BY p.promotion_code
-        """)
-        promotions = db.execute(promotions_query).fetchall()
-        promotions_df = pd.DataFrame(promotions, columns=['promotion_id', 'promotion_code', 'discount_percent', 'discount_value', 'campaign_name'])
+        # Promotions live today and basket pricing (BUY_X_GET_Y included) from the promotion catalog
+        promotions = get_promotion_catalog()
+        promotions_df = promotions.active_promotions()
         
         # Customer lookup section - OUTSIDE form for real-time search
         st.markdown("#### 👤 Customer Information")
@@ -292,16 +266,26 @@ def show_create_order():
         if items:
             st.markdown("---")
             st.markdown("#### 📋 Order Summary")
+            amounts = promotions.price_lines([
+                OrderLine(0, item['product_id'], item['quantity'], item['promotion_id'])
+                for item in items
+            ])
             summary_data = []
-            for item in items:
+            for item, amount in zip(items, amounts):
                 summary_data.append({
                     'Product': item['product_name'],
                     'Quantity': item['quantity'],
                     'Unit Price': f"{item['unit_price']:,.0f} VND",
+                    'Amount': f"{amount:,.0f} VND",
                     'Stock': item['stock']
                 })
             st.dataframe(pd.DataFrame(summary_data), use_container_width=True, hide_index=True)
-            st.metric("📦 Total Items", len(items))
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("📦 Total Items", len(items))
+            with col2:
+                st.metric("💰 Total (incl. VAT)", f"{sum(amounts):,.0f} VND")
         
         if clear:
             st.rerun()
@@ -330,6 +314,19 @@ def show_create_order():
                     if item['quantity'] > item['stock']:
                         errors.append(f"Insufficient stock for {item['product_name']} (Available: {item['stock']})")
                 
+                # Hold the stock until the order is confirmed so concurrent orders cannot oversell it
+                reservation = None
+                if not errors:
+                    # Repeated product lines add up
+                    requested = {}
+                    for item in items:
+                        requested[item['product_id']] = requested.get(item['product_id'], 0) + item['quantity']
+                    
+                    reservation, shortfalls = inventory.reserve(requested)
+                    names = {item['product_id']: item['product_name'] for item in items}
+                    for product_id, available in shortfalls:
+                        errors.append(f"Insufficient stock for {names[product_id]} (Available: {available})")
+                
                 if errors:
                     for error in errors:
                         st.error(f"❌ {error}")
@@ -396,20 +393,15 @@ def show_create_order():
                         order_id_query = text("SELECT LAST_INSERT_ID() as order_id")
                         order_id = db.execute(order_id_query).fetchone().order_id
                         
-                        # Add items using sp_add_sales_order_item
-                        for item in items:
-                            add_item_query = text("""
-                                CALL sp_add_sales_order_item(:oid, :pid, :qty, :promo)
-                            """)
-                            
-                            db.execute(add_item_query, {
-                                "oid": order_id,
-                                "pid": item['product_id'],
-                                "qty": item['quantity'],
-                                "promo": item['promotion_id']
-                            })
+                        # Price the whole basket in memory and insert all items in one statement
+                        lines = [
+                            OrderLine(order_id, item['product_id'], item['quantity'], item['promotion_id'])
+                            for item in items
+                        ]
+                        insert_order_lines(db, lines, amounts=promotions.price_lines(lines))
                         
                         db.commit()
+                        inventory.assign(reservation, order_id)
                         
                         st.success(f"✅ Order #{order_id} created successfully!")
                         st.balloons()
@@ -429,6 +421,7 @@ def show_create_order():
                         
                     except Exception as e:
                         db.rollback()
+                        inventory.release(reservation)
                         st.error(f"❌ Error creating order: {str(e)}")
     
     except Exception as e:
@@ -454,21 +447,19 @@ def show_confirm_order():
     db = get_db_connection()
     
     try:
-        # Get open orders
+        # Get open orders (header totals, range scan on idx_orders_status_date)
         orders_query = text("""
             SELECT 
                 so.order_id,
                 so.order_date,
                 CONCAT(c.first_name, ' ', c.last_name) as customer_name,
                 l.location_name,
-                COUNT(soi.order_item_id) as item_count,
-                COALESCE(SUM(soi.final_amount), 0) as total_amount
+                so.item_count,
+                so.total_amount
             FROM sales_orders so
             JOIN customers c ON so.customer_id = c.customer_id
             JOIN locations l ON so.location_id = l.location_id
-            LEFT JOIN sales_order_items soi ON so.order_id = soi.order_id
             WHERE so.order_status = 'OPEN'
-            GROUP BY so.order_id, so.order_date, c.first_name, c.last_name, l.location_name
             ORDER BY so.order_date DESC
             LIMIT 50
         """)
@@ -502,13 +493,7 @@ def show_confirm_order():
         st.markdown("---")
         
         # Get payment methods
-        payment_methods_query = text("""
-            SELECT payment_method_id, method_name
-            FROM payment_methods
-            ORDER BY method_name
-        """)
-        payment_methods = db.execute(payment_methods_query).fetchall()
-        payment_methods_df = pd.DataFrame(payment_methods, columns=['payment_method_id', 'method_name'])
+        payment_methods_df = get_reference("payment_methods").frame()
         
         # Confirm form
         with st.form("confirm_order_form"):
@@ -537,6 +522,7 @@ def show_confirm_order():
                 # FIXED: Remove promotion_name reference
                 order_items_query = text("""
                     SELECT 
+                        soi.product_id,
                         p.product_name,
                         soi.quantity,
                         p.unit_price,
@@ -550,7 +536,7 @@ def show_confirm_order():
                 
                 items = db.execute(order_items_query, {"oid": selected_order}).fetchall()
                 items_df = pd.DataFrame(items, columns=[
-                    'product_name', 'quantity', 'unit_price', 'final_amount', 'promotion_code'
+                    'product_id', 'product_name', 'quantity', 'unit_price', 'final_amount', 'promotion_code'
                 ])
                 
                 if not items_df.empty:
@@ -559,6 +545,7 @@ def show_confirm_order():
                         use_container_width=True,
                         hide_index=True,
                         column_config={
+                            "product_id": None,
                             "product_name": "Product",
                             "quantity": "Qty",
                             "unit_price": st.column_config.NumberColumn("Unit Price", format="%.0f VND"),
@@ -589,30 +576,30 @@ def show_confirm_order():
                     try:
                         payment_method_id = payment_methods_df[payment_methods_df['method_name'] == payment_method]['payment_method_id'].values[0]
                         
-                        # Call stored procedure: sp_confirm_sales_order
-                        confirm_query = text("""
-                            CALL sp_confirm_sales_order(:oid, :pmid)
-                        """)
+                        # Fail fast from memory instead of inside the invoice transaction
+                        inventory = get_inventory_service()
+                        # Repeated product lines add up
+                        shortfalls = inventory.physical_shortfalls(
+                            items_df.groupby('product_id')['quantity'].sum().to_dict()
+                        )
+                        if shortfalls:
+                            names = dict(zip(items_df['product_id'], items_df['product_name']))
+                            details = ", ".join(f"{names[pid]} (Available: {qty})" for pid, qty in shortfalls)
+                            raise ValueError(f"Insufficient stock for {details}")
                         
-                        db.execute(confirm_query, {
-                            "oid": selected_order,
-                            "pmid": payment_method_id
-                        })
+                        # sp_confirm_sales_order, retried on deadlock / lock wait timeout
+                        sale_id = confirm_sales_order(selected_order, payment_method_id)
                         
-                        db.commit()
+                        # Reservation becomes a real deduction (picked up from inventory_history)
+                        inventory.release(int(selected_order))
+                        inventory.refresh(force=True)
                         
                         st.success(f"✅ Order #{selected_order} confirmed successfully!")
                         st.info("📄 Invoice generated and inventory updated")
                         st.balloons()
                         
-                        # Get sale_id
-                        sale_query = text("""
-                            SELECT sale_id FROM sales WHERE order_id = :oid AND sale_type = 'INVOICE'
-                        """)
-                        sale_result = db.execute(sale_query, {"oid": selected_order}).fetchone()
-                        
-                        if sale_result:
-                            st.success(f"📝 Invoice ID: {sale_result.sale_id}")
+                        if sale_id:
+                            st.success(f"📝 Invoice ID: {sale_id}")
                         
                     except Exception as e:
                         db.rollback()
@@ -638,39 +625,43 @@ def show_create_delivery():
         st.error("⛔ You don't have permission to create deliveries")
         return
     
-    db = get_db_connection()
-    
     try:
-        # Get confirmed sales without delivery
-        sales_query = text("""
-            SELECT 
-                s.sale_id,
-                s.sale_date,
-                CONCAT(c.first_name, ' ', c.last_name) as customer_name,
-                so.delivery_phone,
-                so.delivery_address,
-                l.location_name,
-                l.location_id,
-                s.total_amount
-            FROM sales s
-            JOIN sales_orders so ON s.order_id = so.order_id
-            JOIN customers c ON so.customer_id = c.customer_id
-            JOIN locations l ON so.location_id = l.location_id
-            LEFT JOIN deliveries d ON s.sale_id = d.sale_id
-            WHERE s.sale_type = 'INVOICE' 
-              AND s.invoice_status = 'PAID'
-              AND d.delivery_id IS NULL
-            ORDER BY s.sale_date DESC
-            LIMIT 50
-        """)
+        # Claim invoices from the fulfillment queue (leased to this session, renewed on rerun)
+        if "dispatcher_id" not in st.session_state:
+            user = st.session_state.get("user") or {}
+            st.session_state.dispatcher_id = f"{user.get('username', 'dispatcher')}:{uuid.uuid4().hex[:8]}"
+        dispatcher_id = st.session_state.dispatcher_id
         
-        sales = db.execute(sales_query).fetchall()
-        sales_df = pd.DataFrame(sales, columns=[
-            'sale_id', 'sale_date', 'customer_name', 'delivery_phone', 'delivery_address', 'location_name', 'location_id', 'total_amount'
-        ])
+        stores = get_reference("stores")
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            store_filter = st.selectbox(
+                "📍 Dispatch From",
+                options=["All Stores"] + stores.labels(),
+                key="dispatch_store_filter"
+            )
+        with col2:
+            st.write("")
+            release = st.button("↩️ Release My Invoices", use_container_width=True)
+        
+        if release:
+            released = release_sales(dispatcher_id)
+            st.success(f"✅ {released} invoices released back to the queue")
+            return
+        
+        sales_df = claim_sales(
+            dispatcher_id,
+            location_id=None if store_filter == "All Stores" else stores.id_for(store_filter)
+        )
+        
+        depth = queue_depth()
+        st.caption(
+            f"🗂️ {depth['waiting']:,} invoices waiting for delivery | "
+            f"{depth['claimed']:,} claimed by dispatchers | {len(sales_df):,} held by you"
+        )
         
         if sales_df.empty:
-            st.info("ℹ️ No invoices available for delivery")
+            st.info("ℹ️ No invoices available for delivery (other dispatchers may hold the rest)")
             return
         
         # Display sales
@@ -694,40 +685,26 @@ def show_create_delivery():
         
         st.markdown("---")
         
-        # Get delivery persons
-        delivery_persons_query = text("""
-            SELECT employee_id, CONCAT(first_name, ' ', last_name) as employee_name
-            FROM employees
-            WHERE role = 'Delivery' AND is_inactive = 0
-            ORDER BY first_name, last_name
-        """)
-        delivery_persons = db.execute(delivery_persons_query).fetchall()
-        delivery_persons_df = pd.DataFrame(delivery_persons, columns=['employee_id', 'employee_name'])
+        # Get delivery persons, vendors and vehicles
+        delivery_persons_df = get_reference("employees").frame(role="Delivery")
+        vendors_df = get_reference("delivery_vendors").frame()
+        vehicles_df = get_reference("delivery_vehicles").frame()
         
-        # Get vendors
-        vendors_query = text("""
-            SELECT vendor_id, vendor_name
-            FROM delivery_vendors
-            ORDER BY vendor_name
-        """)
-        vendors = db.execute(vendors_query).fetchall()
-        vendors_df = pd.DataFrame(vendors, columns=['vendor_id', 'vendor_name'])
-        
-        # Create delivery form
+        # Create delivery form (one wave: many invoices, one driver / vendor / vehicle)
         with st.form("create_delivery_form"):
-            st.markdown("#### Create Delivery")
+            st.markdown("#### Create Deliveries")
             
             col1, col2 = st.columns(2)
             
-            from_location_id = None
-            
             with col1:
-                selected_sale = st.selectbox(
-                    "📦 Select Invoice *",
+                selected_sales = st.multiselect(
+                    "📦 Select Invoices *",
                     options=sales_df['sale_id'].tolist(),
                     format_func=lambda x: f"Invoice #{x} - {sales_df[sales_df['sale_id']==x]['customer_name'].values[0]}"
                 )
                 
+                select_all = st.checkbox(f"Dispatch all {len(sales_df)} claimed invoices")
+                
                 delivery_person = st.selectbox(
                     "🚴 Delivery Person *",
                     options=delivery_persons_df['employee_name'].tolist() if not delivery_persons_df.empty else []
@@ -739,17 +716,18 @@ def show_create_delivery():
                     options=["None"] + vendors_df['vendor_name'].tolist() if not vendors_df.empty else ["None"]
                 )
                 
-                # Get from_location
-                if selected_sale:
-                    from_location_id = sales_df[sales_df['sale_id'] == selected_sale]['location_id'].values[0]
-                    from_location_name = sales_df[sales_df['sale_id'] == selected_sale]['location_name'].values[0]
-                    st.info(f"📍 From Location: {from_location_name}")
+                vehicle = st.selectbox(
+                    "🚚 Vehicle",
+                    options=["None"] + vehicles_df['plate_number'].tolist() if not vehicles_df.empty else ["None"]
+                )
+                
+                st.info("📍 Each delivery leaves from its invoice's store")
             
             st.markdown("---")
             
             col1, col2 = st.columns(2)
             with col1:
-                create = st.form_submit_button("✅ Create Delivery", use_container_width=True)
+                create = st.form_submit_button("✅ Create Deliveries", use_container_width=True)
             with col2:
                 refresh = st.form_submit_button("🔄 Refresh", use_container_width=True)
             
@@ -757,8 +735,11 @@ def show_create_delivery():
                 st.rerun()
             
             if create:
-                if not selected_sale or not delivery_person:
-                    st.error("❌ Please select invoice and delivery person")
+                if select_all:
+                    selected_sales = sales_df['sale_id'].tolist()
+                
+                if not selected_sales or not delivery_person:
+                    st.error("❌ Please select invoices and delivery person")
                 else:
                     try:
                         delivery_person_id = delivery_persons_df[delivery_persons_df['employee_name'] == delivery_person]['employee_id'].values[0]
@@ -767,36 +748,92 @@ def show_create_delivery():
                         if vendor != "None" and not vendors_df.empty:
                             vendor_id = vendors_df[vendors_df['vendor_name'] == vendor]['vendor_id'].values[0]
                         
-                        # Call stored procedure: sp_create_delivery_for_sale
-                        delivery_query = text("""
-                            CALL sp_create_delivery_for_sale(:sid, :flid, :dpid, :vid)
-                        """)
-                        
-                        db.execute(delivery_query, {
-                            "sid": selected_sale,
-                            "flid": from_location_id,
-                            "dpid": delivery_person_id,
-                            "vid": vendor_id
-                        })
+                        vehicle_id = None
+                        if vehicle != "None" and not vehicles_df.empty:
+                            vehicle_id = vehicles_df[vehicles_df['plate_number'] == vehicle]['vehicle_id'].values[0]
                         
-                        db.commit()
+                        # One INSERT ... SELECT for the whole wave
+                        delivery_ids = dispatch_sales(
+                            selected_sales,
+                            delivery_person_id,
+                            vendor_id=vendor_id,
+                            vehicle_id=vehicle_id,
+                            dispatcher=dispatcher_id
+                        )
                         
-                        st.success(f"✅ Delivery created for Invoice #{selected_sale}")
+                        st.success(f"✅ {len(delivery_ids)} deliveries created for {len(selected_sales)} invoices")
                         st.balloons()
                         
                     except Exception as e:
-                        db.rollback()
-                        st.error(f"❌ Error creating delivery: {str(e)}")
+                        st.error(f"❌ Error creating deliveries: {str(e)}")
     
     except Exception as e:
         st.error(f"❌ Error: {str(e)}")
+
+
+# ============================================================
+# TAB 4: DELIVERY STATUS (BULK)
+# ============================================================
+
+def show_delivery_status():
+    """Move a scanned wave of deliveries to a new status"""
+    st.markdown("### 📦 Delivery Status")
     
-    finally:
-        db.close()
+    # Check permission
+    if not check_permission("DELIVERY_UPDATE_STATUS"):
+        st.error("⛔ You don't have permission to update delivery status")
+        return
+    
+    try:
+        with st.form("delivery_status_form"):
+            scanned = st.text_area(
+                "📷 Delivery IDs *",
+                placeholder="Scan or paste delivery IDs (one per line, or separated by commas / spaces)",
+                height=150
+            )
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                new_status = st.selectbox("🔄 New Status *", options=DELIVERY_STATUSES, index=2)
+            with col2:
+                st.write("")
+                skip_invalid = st.checkbox(
+                    "Skip deliveries that cannot make this move",
+                    help="Otherwise one invalid delivery rejects the whole wave"
+                )
+            
+            submit = st.form_submit_button("✅ Update Status", use_container_width=True)
+        
+        if submit:
+            delivery_ids = [int(token) for token in re.findall(r"\d+", scanned or "")]
+            
+            if not delivery_ids:
+                st.error("❌ Please scan at least one delivery ID")
+                return
+            
+            try:
+                result = transition_deliveries(delivery_ids, new_status, skip_invalid=skip_invalid)
+                
+                st.success(f"✅ {result['updated']} deliveries moved to {new_status}")
+                
+                if result["rejected"]:
+                    st.warning(f"⚠️ {len(result['rejected'])} deliveries skipped")
+                    st.dataframe(
+                        pd.DataFrame(result["rejected"], columns=["Delivery ID", "Current Status"]).fillna("Not found"),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+            
+            except DeliveryTransitionError as e:
+                st.error(f"❌ {str(e)}")
+                st.info("ℹ️ Nothing was changed. Fix the wave or tick 'Skip deliveries that cannot make this move'.")
+    
+    except Exception as e:
+        st.error(f"❌ Error: {str(e)}")
 
 
 # ============================================================
-# TAB 4: PROCESS RETURN
+# TAB 5: PROCESS RETURN
 # ============================================================
 
 def show_process_return():
@@ -859,13 +896,7 @@ def show_process_return():
         st.markdown("---")
         
         # Get payment methods
-        payment_methods_query = text("""
-            SELECT payment_method_id, method_name
-            FROM payment_methods
-            ORDER BY method_name
-        """)
-        payment_methods = db.execute(payment_methods_query).fetchall()
-        payment_methods_df = pd.DataFrame(payment_methods, columns=['payment_method_id', 'method_name'])
+        payment_methods_df = get_reference("payment_methods").frame()
         
         # Return form
         with st.form("process_return_form"):
@@ -887,9 +918,7 @@ def show_process_return():
                 )
             
             # Show sale items and get return location
-            return_product = None
-            return_quantity = 1
-            product_id = None
+            return_lines = []
             return_location_id = None
             
             if selected_sale:
@@ -898,44 +927,53 @@ def show_process_return():
                 
                 items_query = text("""
                     SELECT 
-                        si.sale_item_id,
                         p.product_id,
                         p.product_name,
-                        si.quantity,
-                        si.final_amount
+                        SUM(si.quantity) AS quantity,
+                        SUM(si.final_amount) AS final_amount,
+                        COALESCE(MAX(r.returned), 0) AS returned
                     FROM sales_items si
                     JOIN products p ON si.product_id = p.product_id
+                    LEFT JOIN (
+                        SELECT ri.product_id, -SUM(ri.quantity) AS returned
+                        FROM sales rs
+                        JOIN sales_items ri ON ri.sale_id = rs.sale_id
+                        WHERE rs.parent_sale_id = :sid AND rs.sale_type = 'RETURN'
+                        GROUP BY ri.product_id
+                    ) r ON r.product_id = si.product_id
                     WHERE si.sale_id = :sid AND si.sale_type = 'INVOICE'
+                    GROUP BY p.product_id, p.product_name
                 """)
                 
                 items = db.execute(items_query, {"sid": selected_sale}).fetchall()
                 items_df = pd.DataFrame(items, columns=[
-                    'sale_item_id', 'product_id', 'product_name', 'quantity', 'final_amount'
+                    'product_id', 'product_name', 'quantity', 'final_amount', 'returned'
                 ])
                 
                 if not items_df.empty:
-                    st.dataframe(
-                        items_df[['product_name', 'quantity', 'final_amount']],
+                    # Select every item to return in one go (0 = keep)
+                    items_df['return_quantity'] = 0
+                    edited_df = st.data_editor(
+                        items_df[['product_id', 'product_name', 'quantity', 'returned', 'final_amount', 'return_quantity']],
                         use_container_width=True,
-                        hide_index=True
-                    )
-                    
-                    # Select item to return
-                    return_product = st.selectbox(
-                        "📦 Product to Return *",
-                        options=items_df['product_name'].tolist()
+                        hide_index=True,
+                        disabled=['product_id', 'product_name', 'quantity', 'returned', 'final_amount'],
+                        column_config={
+                            "product_id": None,
+                            "product_name": "Product",
+                            "quantity": "Sold",
+                            "returned": "Already Returned",
+                            "final_amount": st.column_config.NumberColumn("Paid", format="%.0f VND"),
+                            "return_quantity": st.column_config.NumberColumn("Return Qty *", min_value=0, step=1)
+                        },
+                        key=f"return_lines_{selected_sale}"
                     )
                     
-                    if return_product:
-                        max_qty = items_df[items_df['product_name'] == return_product]['quantity'].values[0]
-                        return_quantity = st.number_input(
-                            "Return Quantity *",
-                            min_value=1,
-                            max_value=int(max_qty),
-                            value=int(max_qty)
-                        )
-                        
-                        product_id = items_df[items_df['product_name'] == return_product]['product_id'].values[0]
+                    return_lines = [
+                        (row.product_id, int(row.return_quantity))
+                        for row in edited_df.itertuples(index=False)
+                        if row.return_quantity and row.return_quantity > 0
+                    ]
                 
                 # Get return location
                 return_location_id = sales_df[sales_df['sale_id'] == selected_sale]['location_id'].values[0]
@@ -954,33 +992,25 @@ def show_process_return():
                 st.rerun()
             
             if process:
-                if not selected_sale or not return_product or not refund_method:
-                    st.error("❌ Please fill all required fields")
+                if not selected_sale or not return_lines or not refund_method:
+                    st.error("❌ Please select the invoice, a refund method and at least one return quantity")
                 else:
                     try:
                         payment_method_id = payment_methods_df[payment_methods_df['method_name'] == refund_method]['payment_method_id'].values[0]
                         
-                        # Call stored procedure: sp_process_return
-                        return_query = text("""
-                            CALL sp_process_return(:osid, :pid, :rqty, :pmid, :rlid)
-                        """)
-                        
-                        db.execute(return_query, {
-                            "osid": selected_sale,
-                            "pid": product_id,
-                            "rqty": return_quantity,
-                            "pmid": payment_method_id,
-                            "rlid": return_location_id
-                        })
-                        
-                        db.commit()
+                        # One RETURN sale and one RETURN delivery for all lines
+                        return_sale_id = process_return(
+                            selected_sale,
+                            return_lines,
+                            payment_method_id,
+                            return_location_id=return_location_id
+                        )
                         
-                        st.success(f"✅ Return processed successfully!")
+                        st.success(f"✅ Return #{return_sale_id} processed: {len(return_lines)} products")
                         st.info("📦 Inventory restored and refund initiated")
                         st.balloons()
                         
                     except Exception as e:
-                        db.rollback()
                         st.error(f"❌ Error processing return: {str(e)}")
     
     except Exception as e:
@@ -991,7 +1021,7 @@ def show_process_return():
 
 
 # ============================================================
-# TAB 5: ORDER HISTORY
+# TAB 6: ORDER HISTORY
 # ============================================================
 
 def show_order_history():
@@ -1019,18 +1049,17 @@ def show_order_history():
             date_to = st.date_input("To Date", value=pd.to_datetime("today"))
         
         # Build query
-        where_clause = "WHERE 1=1"
-        params = {}
-        
-        if status_filter != "All":
-            where_clause += " AND so.order_status = :status"
-            params["status"] = status_filter
+        # "All" is an explicit status list so the filter stays a range
+        # scan on idx_orders_status_date (order_status, order_date)
+        statuses = ["OPEN", "CONFIRMED", "CANCELLED"] if status_filter == "All" else [status_filter]
+        params = {f"status{i}": status for i, status in enumerate(statuses)}
+        status_list = ", ".join(f":status{i}" for i in range(len(statuses)))
         
-        where_clause += " AND so.order_date >= :date_from AND so.order_date <= :date_to"
         params["date_from"] = date_from
         params["date_to"] = date_to
         
-        # FIXED: Add all non-aggregated columns to GROUP BY
+        # Item totals, invoice and delivery status are read from the order
+        # header (kept current by triggers), so no detail joins or GROUP BY
         orders_query = text(f"""
             SELECT 
                 so.order_id,
@@ -1039,21 +1068,17 @@ def show_order_history():
                 CONCAT(e.first_name, ' ', e.last_name) as employee_name,
                 l.location_name,
                 so.order_status,
-                COUNT(soi.order_item_id) as item_count,
-                COALESCE(SUM(soi.final_amount), 0) as total_amount,
-                MAX(s.sale_id) as sale_id,
-                MAX(s.invoice_status) as invoice_status,
-                MAX(d.delivery_status) as delivery_status
+                so.item_count,
+                so.total_amount,
+                so.sale_id,
+                so.invoice_status,
+                so.latest_delivery_status as delivery_status
             FROM sales_orders so
             JOIN customers c ON so.customer_id = c.customer_id
             JOIN employees e ON so.employee_id = e.employee_id
             JOIN locations l ON so.location_id = l.location_id
-            LEFT JOIN sales_order_items soi ON so.order_id = soi.order_id
-            LEFT JOIN sales s ON so.order_id = s.order_id AND s.sale_type = 'INVOICE'
-            LEFT JOIN deliveries d ON s.sale_id = d.sale_id
-            {where_clause}
-            GROUP BY so.order_id, so.order_date, c.first_name, c.last_name, 
-                     e.first_name, e.last_name, l.location_name, so.order_status
+            WHERE so.order_status IN ({status_list})
+              AND so.order_date >= :date_from AND so.order_date <= :date_to
             ORDER BY so.order_date DESC
             LIMIT 100
         """)
@@ -1070,7 +1095,6 @@ def show_order_history():
         
         # Format data
         orders_df['total_amount'] = orders_df['total_amount'].fillna(0)
-        # FIXED: Keep sale_id as is (already has NULL/0 handled by MAX() in query)
         # Don't convert to int then back to string - this causes PyArrow error
         orders_df['sale_id'] = orders_df['sale_id'].apply(lambda x: str(int(x)) if x and x > 0 else '-')
         orders_df['invoice_status'] = orders_df['invoice_status'].fillna('-')
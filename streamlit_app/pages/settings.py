@@ -1,10 +1,8 @@
 import streamlit as st
-from passlib.context import CryptContext
 from sqlalchemy import text
 from config.session import get_db_connection
-from utils.auth import logout
-
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+from utils.auth import logout, get_pwd_context, check_permission
+from utils.entity_counters import get_counts
 
 def show():
     """Display settings page"""
@@ -17,7 +15,7 @@ def show():
     """, unsafe_allow_html=True)
     
     # Tabs
-    tab1, tab2, tab3 = st.tabs(["👤 Profile", "🔐 Security", "ℹ️ About"])
+    tab1, tab2, tab3, tab4 = st.tabs(["👤 Profile", "🔐 Security", "ℹ️ About", "🧰 Jobs"])
     
     with tab1:
         show_profile()
@@ -27,6 +25,12 @@ def show():
     
     with tab3:
         show_about()
+    
+    with tab4:
+        if check_permission("SYSTEM_CONFIG"):
+            show_jobs()
+        else:
+            st.warning("⚠️ You don't have permission to manage background jobs")
 
 def show_profile():
     """Display user profile settings"""
@@ -125,11 +129,11 @@ def show_security():
                     
                     result = db.execute(check_query, {"uid": user['user_id']}).fetchone()
                     
-                    if not result or not pwd_context.verify(current_password, result.password_hash):
+                    if not result or not get_pwd_context().verify(current_password, result.password_hash):
                         st.error("❌ Current password is incorrect")
                     else:
                         # Update password
-                        new_hash = pwd_context.hash(new_password)
+                        new_hash = get_pwd_context().hash(new_password)
                         
                         update_query = text("""
                             UPDATE users
@@ -225,42 +229,27 @@ def show_about():
     # Database statistics
     st.markdown("### 📊 System Statistics")
     
-    db = get_db_connection()
-    
     try:
-        stats_query = text("""
-            SELECT 
-                (SELECT COUNT(*) FROM users) as total_users,
-                (SELECT COUNT(*) FROM employees) as total_employees,
-                (SELECT COUNT(*) FROM products) as total_products,
-                (SELECT COUNT(*) FROM locations) as total_locations,
-                (SELECT COUNT(*) FROM sales WHERE sale_type = 'INVOICE') as total_sales,
-                (SELECT COUNT(*) FROM customers) as total_customers
-        """)
-        
-        stats = db.execute(stats_query).fetchone()
+        stats = get_counts()
         
         col1, col2, col3, col4, col5, col6 = st.columns(6)
         
         with col1:
-            st.metric("Users", stats.total_users)
+            st.metric("Users", stats['users'])
         with col2:
-            st.metric("Employees", stats.total_employees)
+            st.metric("Employees", stats['employees'])
         with col3:
-            st.metric("Products", stats.total_products)
+            st.metric("Products", stats['products'])
         with col4:
-            st.metric("Locations", stats.total_locations)
+            st.metric("Locations", stats['locations'])
         with col5:
-            st.metric("Sales", stats.total_sales)
+            st.metric("Sales", stats['invoices'])
         with col6:
-            st.metric("Customers", stats.total_customers)
+            st.metric("Customers", stats['customers'])
     
     except Exception as e:
         st.error(f"❌ Error loading statistics: {str(e)}")
     
-    finally:
-        db.close()
-    
     st.markdown("---")
     
     # Support information
@@ -279,3 +268,68 @@ def show_about():
         <p>Made with ❤️ using Streamlit</p>
     </div>
     """, unsafe_allow_html=True)
+
+
+def show_jobs():
+    """Queue maintenance jobs and list recent background jobs"""
+    import pandas as pd
+    from datetime import datetime
+    from utils.job_runner import ACTIVE_STATUSES, cancel_job, list_jobs, submit_job
+    
+    st.markdown("### 🧰 Background Jobs")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        if st.button("🔄 Refresh Report Totals", use_container_width=True):
+            submit_job("refresh_report_totals", label="Refresh report totals", unique=True)
+            st.success("✅ Job queued")
+    with col2:
+        if st.button("💰 Recompute Bonus Ledger", use_container_width=True):
+            submit_job("recompute_bonuses", label="Recompute bonus ledger", unique=True)
+            st.success("✅ Job queued")
+    with col3:
+        if st.button("🏷️ Re-price Open Orders", use_container_width=True):
+            submit_job("reprice_open_orders", label="Re-price open orders", unique=True)
+            st.success("✅ Job queued")
+    with col4:
+        if st.button("📦 Inventory Checkpoints", use_container_width=True):
+            submit_job("inventory_checkpoints", label="Inventory checkpoints", unique=True)
+            st.success("✅ Job queued")
+    
+    jobs = list_jobs(limit=50)
+    
+    if not jobs:
+        st.info("No jobs yet")
+        return
+    
+    def fmt_time(ts):
+        return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else ""
+    
+    st.dataframe(pd.DataFrame([
+        {
+            "ID": job["job_id"],
+            "Job": job["label"],
+            "Status": job["status"],
+            "Progress": f"{job['progress'] * 100:.0f}%",
+            "Message": job["message"] or "",
+            "Attempts": f"{job['attempts']}/{job['max_attempts']}",
+            "Created": fmt_time(job["created_at"]),
+            "Finished": fmt_time(job["finished_at"]),
+        }
+        for job in jobs
+    ]), use_container_width=True, hide_index=True)
+    
+    active = [job for job in jobs if job["status"] in ACTIVE_STATUSES and not job["cancel_requested"]]
+    if active:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            job_id = st.selectbox(
+                "Active job",
+                [job["job_id"] for job in active],
+                format_func=lambda i: next(f"#{j['job_id']} {j['label']}" for j in active if j["job_id"] == i)
+            )
+        with col2:
+            st.write("")
+            if st.button("✖️ Cancel Job", use_container_width=True):
+                cancel_job(job_id)
+                st.rerun()
@@ -1,11 +1,11 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import text
-from passlib.context import CryptContext
+from sqlalchemy import bindparam, text
 from config.session import get_db_connection
-from utils.auth import check_permission
-
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+from utils.auth import check_permission, get_pwd_context
+from utils.query_metrics import metered_fragment
+from utils.search_index import invalidate_search
+from utils.search_panel import order_by_ids, paged_search, pager
 
 def show():
     """Display users management page"""
@@ -37,6 +37,7 @@ def show():
     with tab3:
         show_user_details()
 
+@metered_fragment("user_list")
 def show_user_list():
     """Display list of users"""
     st.markdown("### 📋 All Users")
@@ -44,59 +45,54 @@ def show_user_list():
     db = get_db_connection()
     
     try:
-        query = text("""
-            SELECT 
-                u.user_id,
-                u.username,
-                u.email,
-                u.is_active,
-                u.created_at,
-                GROUP_CONCAT(r.role_name) as roles
-            FROM users u
-            LEFT JOIN user_roles ur ON u.user_id = ur.user_id
-            LEFT JOIN roles r ON ur.role_id = r.role_id
-            GROUP BY u.user_id
-            ORDER BY u.user_id DESC
-        """)
+        # Search filter
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            search = st.text_input("🔍 Search by username or email", "")
+        with col2:
+            status_filter = st.selectbox("Filter by status", ["All", "Active", "Inactive"])
+        with col3:
+            st.write("")
+            st.write("")
+            if st.button("🔄 Refresh", use_container_width=True):
+                st.rerun(scope="fragment")
         
-        result = db.execute(query).fetchall()
-        users_df = pd.DataFrame(result, columns=['user_id', 'username', 'email', 'is_active', 'created_at', 'roles'])
+        # Search the index, then load only the rows of the current page
+        result = paged_search("user_list", "users", search, {
+            "is_active": {"All": None, "Active": 1, "Inactive": 0}[status_filter]
+        })
+        
+        rows = []
+        if result.ids:
+            query = text("""
+                SELECT 
+                    u.user_id,
+                    u.username,
+                    u.email,
+                    u.is_active,
+                    u.created_at,
+                    GROUP_CONCAT(r.role_name) as roles
+                FROM users u
+                LEFT JOIN user_roles ur ON u.user_id = ur.user_id
+                LEFT JOIN roles r ON ur.role_id = r.role_id
+                WHERE u.user_id IN :ids
+                GROUP BY u.user_id
+            """).bindparams(bindparam("ids", expanding=True))
+            
+            rows = db.execute(query, {"ids": result.ids}).fetchall()
+        
+        users_df = pd.DataFrame(rows, columns=['user_id', 'username', 'email', 'is_active', 'created_at', 'roles'])
         
         if not users_df.empty:
             # Format data
+            users_df = order_by_ids(users_df, result.ids, 'user_id')
             users_df['status'] = users_df['is_active'].apply(
                 lambda x: '✅ Active' if x else '❌ Inactive'
             )
             
-            # Search filter
-            col1, col2, col3 = st.columns([2, 2, 1])
-            with col1:
-                search = st.text_input("🔍 Search by username or email", "")
-            with col2:
-                status_filter = st.selectbox("Filter by status", ["All", "Active", "Inactive"])
-            with col3:
-                st.write("")
-                st.write("")
-                if st.button("🔄 Refresh", use_container_width=True):
-                    st.rerun()
-            
-            # Apply filters
-            filtered_df = users_df.copy()
-            
-            if search:
-                filtered_df = filtered_df[
-                    filtered_df['username'].str.contains(search, case=False, na=False) |
-                    filtered_df['email'].str.contains(search, case=False, na=False)
-                ]
-            
-            if status_filter == "Active":
-                filtered_df = filtered_df[filtered_df['is_active'] == 1]
-            elif status_filter == "Inactive":
-                filtered_df = filtered_df[filtered_df['is_active'] == 0]
-            
             # Display table
             st.dataframe(
-                filtered_df[['user_id', 'username', 'email', 'roles', 'status', 'created_at']],
+                users_df[['user_id', 'username', 'email', 'roles', 'status', 'created_at']],
                 use_container_width=True,
                 hide_index=True,
                 column_config={
@@ -112,7 +108,7 @@ def show_user_list():
                 }
             )
             
-            st.info(f"📊 Total users: {len(filtered_df)} / {len(users_df)}")
+            pager("user_list", result, "users")
             
         else:
             st.info("No users found in the system")
@@ -190,7 +186,7 @@ def show_create_user():
                     else:
                         try:
                             # Hash password
-                            hashed = pwd_context.hash(password)
+                            hashed = get_pwd_context().hash(password)
                             
                             # Create user
                             create_query = text("""
@@ -214,6 +210,7 @@ def show_create_user():
                             
                             db.execute(role_query, {"uid": user_id, "r": role})
                             db.commit()
+                            invalidate_search("users")
                             
                             st.success(f"✅ User '{username}' created successfully!")
                             st.balloons()
@@ -336,6 +333,7 @@ def show_user_details():
                                 db.execute(insert_role, {"uid": user_id, "r": new_role})
                                 
                                 db.commit()
+                                invalidate_search("users")
                                 st.success("✅ User updated successfully!")
                                 st.rerun()
                             
@@ -349,6 +347,7 @@ def show_user_details():
                                 status_query = text("UPDATE users SET is_active = :s WHERE user_id = :uid")
                                 db.execute(status_query, {"s": new_status, "uid": user_id})
                                 db.commit()
+                                invalidate_search("users")
                                 
                                 st.success(f"✅ User {'disabled' if user.is_active else 'enabled'} successfully!")
                                 st.rerun()
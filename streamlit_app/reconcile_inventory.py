@@ -0,0 +1,58 @@
+import argparse
+from utils.inventory_ledger import rebuild_inventory_ledger
+from utils.inventory_reconcile import rebase, reconcile
+
+
+# =========================
+# Run reconciliation
+# =========================
+#   python reconcile_inventory.py              check from the stored watermark (exit 1 on drift)
+#   python reconcile_inventory.py --full       ignore the baseline, sum the whole history (report only)
+#   python reconcile_inventory.py --repair     set drifted inventory rows to the ledger's stock
+#   python reconcile_inventory.py --rebase     accept current inventory as the baseline
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare inventory with the inventory_history ledger")
+    parser.add_argument("--full", action="store_true", help="ignore the stored baseline and sum the whole history (report only)")
+    parser.add_argument("--repair", action="store_true", help="set drifted inventory rows to the ledger's stock")
+    parser.add_argument("--rebase", action="store_true", help="accept current inventory as the baseline and exit")
+    parser.add_argument("--show", type=int, default=20, help="drifted rows to print")
+    args = parser.parse_args()
+
+    if args.rebase:
+        print(f"✅ Baseline set at history_id {rebase():,}")
+        raise SystemExit(0)
+
+    def on_progress(done, total):
+        print(f"   {done:,} / {total:,} history ids", end="\r")
+
+    try:
+        result = reconcile(repair=args.repair, full=args.full, progress=on_progress)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        raise SystemExit(2)
+
+    print("===================================")
+    if not result.has_baseline:
+        print("⚠️ No stored baseline: history summed from zero (run --rebase to set one)")
+    print(f"History ids {result.watermark_from:,} -> {result.watermark_to:,} | "
+          f"{result.history_rows:,} movements | {result.pairs_checked:,} stock rows | {result.seconds:.1f}s")
+    if result.drift.empty:
+        print("✅ Inventory matches the ledger")
+    else:
+        print(f"❌ {len(result.drift):,} rows drift, {int(result.drift['drift'].abs().sum()):,} units in total")
+        worst = result.drift.reindex(result.drift["drift"].abs().sort_values(ascending=False).index)
+        for row in worst.head(args.show).itertuples(index=False):
+            print(f"   product {row.product_id} @ location {row.location_id}: "
+                  f"inventory {row.inventory_quantity:,} | ledger {row.ledger_quantity:,} | drift {row.drift:+,}")
+    print("===================================")
+
+    if result.repaired:
+        print(f"🔧 {result.repaired:,} inventory rows set to the ledger's stock")
+        # Checkpoints were derived from the drifted stock
+        rebuild_inventory_ledger()
+        print("🔁 Inventory checkpoints rebuilt")
+    if result.unrepairable:
+        print(f"⚠️ {result.unrepairable:,} rows left: the ledger puts them below zero")
+
+    remaining = result.unrepairable if args.repair else len(result.drift)
+    raise SystemExit(1 if remaining else 0)
@@ -3,9 +3,13 @@ import random
 import time
 from sqlalchemy import text
 from config.session import SessionLocal
+from utils.db_helper import retry_metrics
+from utils.order_confirmation import confirm_sales_order, ensure_confirm_procedure
 
 NUM_USERS = 100
 ORDERS_PER_USER = 1
+# Confirm every order right away (sp_confirm_sales_order + inventory triggers)
+CONFIRM_ORDERS = True
 
 
 def simulate_user(user_no: int):
@@ -81,6 +85,13 @@ def simulate_user(user_no: int):
         db.commit()
         print(f"✅ User {user_no}: Order {order_id} created")
 
+        # ----------------------------
+        # 3. Confirm (retried on deadlock / lock wait timeout)
+        # ----------------------------
+        if CONFIRM_ORDERS:
+            sale_id = confirm_sales_order(order_id, random.randint(1, 5))
+            print(f"🧾 User {user_no}: Order {order_id} confirmed as sale {sale_id}")
+
     except Exception as e:
         db.rollback()
         print(f"❌ User {user_no} FAILED: {e}")
@@ -93,6 +104,9 @@ def simulate_user(user_no: int):
 # Run concurrent workload
 # =========================
 if __name__ == "__main__":
+    if CONFIRM_ORDERS:
+        ensure_confirm_procedure()
+
     threads = []
     start_time = time.time()
 
@@ -109,4 +123,9 @@ if __name__ == "__main__":
     print("===================================")
     print(f"Simulated {NUM_USERS} concurrent users")
     print(f"Total time: {end_time - start_time:.2f} seconds")
+    if CONFIRM_ORDERS:
+        metrics = retry_metrics.snapshot()
+        print(f"Confirmations committed: {metrics['committed']} / {metrics['transactions']}")
+        print(f"Attempts: {metrics['attempts']}  Retries: {metrics['retries']}")
+        print(f"Gave up: {metrics['gave_up']}  Backoff: {metrics['backoff_seconds']:.2f}s")
     print("===================================")
@@ -19,37 +19,41 @@ BEGIN
     DECLARE v_base_amount DECIMAL(12,2);
     DECLARE v_discount_amount DECIMAL(12,2) DEFAULT 0;
 
-    SELECT unit_price INTO v_unit_price
-    FROM products
-    WHERE product_id = NEW.product_id;
+    -- utils/order_pricing.insert_order_lines prices whole batches in one
+    -- join and sets @order_items_priced = 1 around its multi-row insert
+    IF COALESCE(@order_items_priced, 0) = 0 THEN
+        SELECT unit_price INTO v_unit_price
+        FROM products
+        WHERE product_id = NEW.product_id;
 
-    IF v_unit_price IS NULL THEN
-        SIGNAL SQLSTATE '45000'
-        SET MESSAGE_TEXT = 'Product not found or has no price';
-    END IF;
+        IF v_unit_price IS NULL THEN
+            SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'Product not found or has no price';
+        END IF;
 
-    SET v_base_amount = v_unit_price * NEW.quantity;
-
-    IF NEW.applied_promotion_id IS NOT NULL THEN
-        SELECT
-            COALESCE(discount_percent, 0),
-            COALESCE(discount_value, 0)
-        INTO v_discount_percent, v_discount_value
-        FROM promotions
-        WHERE promotion_id = NEW.applied_promotion_id
-          AND status = 'ACTIVE';
-
-        IF v_discount_percent > 0 THEN
-            SET v_discount_amount = v_base_amount * v_discount_percent / 100;
-        ELSEIF v_discount_value > 0 THEN
-            SET v_discount_amount = v_discount_value;
+        SET v_base_amount = v_unit_price * NEW.quantity;
+
+        IF NEW.applied_promotion_id IS NOT NULL THEN
+            SELECT
+                COALESCE(discount_percent, 0),
+                COALESCE(discount_value, 0)
+            INTO v_discount_percent, v_discount_value
+            FROM promotions
+            WHERE promotion_id = NEW.applied_promotion_id
+              AND status = 'ACTIVE';
+
+            IF v_discount_percent > 0 THEN
+                SET v_discount_amount = v_base_amount * v_discount_percent / 100;
+            ELSEIF v_discount_value > 0 THEN
+                SET v_discount_amount = v_discount_value;
+            END IF;
         END IF;
-    END IF;
 
-    SET NEW.final_amount = ROUND((v_base_amount - v_discount_amount) * 1.10, 0);
+        SET NEW.final_amount = ROUND((v_base_amount - v_discount_amount) * 1.10, 0);
 
-    IF NEW.final_amount < 0 THEN
-        SET NEW.final_amount = 0;
+        IF NEW.final_amount < 0 THEN
+            SET NEW.final_amount = 0;
+        END IF;
     END IF;
 END;
 
@@ -69,52 +73,65 @@ BEGIN
     DECLARE v_discount_amount DECIMAL(12,2) DEFAULT 0;
     DECLARE v_abs_quantity INT;
     DECLARE v_final_amount DECIMAL(12,2);
+    DECLARE v_sale_date DATETIME;
+
+    -- sp_confirm_sales_order copies the order lines' final_amount (priced
+    -- at order entry, BUY_X_GET_Y included) and sets @priced_sale_id
+    -- to the invoice it is filling
+    IF NOT (NEW.sale_id <=> @priced_sale_id) THEN
+        -- 1. Get unit price
+        SELECT unit_price INTO v_unit_price
+        FROM products
+        WHERE product_id = NEW.product_id;
 
-    -- 1. Get unit price
-    SELECT unit_price INTO v_unit_price
-    FROM products
-    WHERE product_id = NEW.product_id;
-
-    IF v_unit_price IS NULL THEN
-        SIGNAL SQLSTATE '45000'
-        SET MESSAGE_TEXT = 'Product not found or has no price';
-    END IF;
+        IF v_unit_price IS NULL THEN
+            SIGNAL SQLSTATE '45000'
+            SET MESSAGE_TEXT = 'Product not found or has no price';
+        END IF;
 
-    -- 2. Base amount (absolute quantity)
-    SET v_abs_quantity = ABS(NEW.quantity);
-    SET v_base_amount = v_unit_price * v_abs_quantity;
-
-    -- 3. Apply promotion (same logic as sales_order_items)
-    IF NEW.applied_promotion_id IS NOT NULL THEN
-        SELECT
-            COALESCE(discount_percent, 0),
-            COALESCE(discount_value, 0)
-        INTO v_discount_percent, v_discount_value
-        FROM promotions
-        WHERE promotion_id = NEW.applied_promotion_id
-          AND status = 'ACTIVE';
-
-        IF v_discount_percent > 0 THEN
-            SET v_discount_amount = v_base_amount * v_discount_percent / 100;
-        ELSEIF v_discount_value > 0 THEN
-            SET v_discount_amount = v_discount_value;
+        -- 2. Base amount (absolute quantity)
+        SET v_abs_quantity = ABS(NEW.quantity);
+        SET v_base_amount = v_unit_price * v_abs_quantity;
+
+        -- 3. Apply promotion (same logic as sales_order_items)
+        IF NEW.applied_promotion_id IS NOT NULL THEN
+            SELECT
+                COALESCE(discount_percent, 0),
+                COALESCE(discount_value, 0)
+            INTO v_discount_percent, v_discount_value
+            FROM promotions
+            WHERE promotion_id = NEW.applied_promotion_id
+              AND status = 'ACTIVE';
+
+            IF v_discount_percent > 0 THEN
+                SET v_discount_amount = v_base_amount * v_discount_percent / 100;
+            ELSEIF v_discount_value > 0 THEN
+                SET v_discount_amount = v_discount_value;
+            END IF;
         END IF;
-    END IF;
 
-    -- 4. Apply VAT 10%
-    SET v_final_amount = ROUND((v_base_amount - v_discount_amount) * 1.10, 0);
+        -- 4. Apply VAT 10%
+        SET v_final_amount = ROUND((v_base_amount - v_discount_amount) * 1.10, 0);
 
-    -- 5. Prevent negative magnitude
-    IF v_final_amount < 0 THEN
-        SET v_final_amount = 0;
-    END IF;
+        -- 5. Prevent negative magnitude
+        IF v_final_amount < 0 THEN
+            SET v_final_amount = 0;
+        END IF;
 
-    -- 6. Handle RETURN vs INVOICE
-    IF NEW.sale_type = 'RETURN' THEN
-        SET NEW.final_amount = -v_final_amount;
-    ELSE
-        SET NEW.final_amount = v_final_amount;
+        -- 6. Handle RETURN vs INVOICE
+        IF NEW.sale_type = 'RETURN' THEN
+            SET NEW.final_amount = -v_final_amount;
+        ELSE
+            SET NEW.final_amount = v_final_amount;
+        END IF;
     END IF;
+
+    -- Copy the header date so sales_items can be partitioned by sale_date
+    SELECT sale_date INTO v_sale_date
+    FROM sales
+    WHERE sale_id = NEW.sale_id;
+
+    SET NEW.sale_date = COALESCE(v_sale_date, CURRENT_TIMESTAMP);
 END;
 
 -- =====================================================
@@ -125,13 +142,16 @@ CREATE TRIGGER trg_update_sales_total_after_insert
 AFTER INSERT ON sales_items
 FOR EACH ROW
 BEGIN
-    UPDATE sales
-    SET total_amount = (
-        SELECT COALESCE(SUM(final_amount), 0)
-        FROM sales_items
-        WHERE sale_id = NEW.sale_id
-    )
-    WHERE sale_id = NEW.sale_id;
+    -- sp_process_return_lines sets the total of its return once (@return_sale_id)
+    IF NOT (NEW.sale_id <=> @return_sale_id) THEN
+        UPDATE sales
+        SET total_amount = (
+            SELECT COALESCE(SUM(final_amount), 0)
+            FROM sales_items
+            WHERE sale_id = NEW.sale_id
+        )
+        WHERE sale_id = NEW.sale_id;
+    END IF;
 END;
 
 -- =====================================================
@@ -197,11 +217,14 @@ BEGIN
     -- ==========================
     -- RETURN: back to selling store
     -- ==========================
-    IF NEW.sale_type = 'RETURN' THEN
+    -- (sp_process_return_lines restocks its return set-wise: @return_sale_id)
+    IF NEW.sale_type = 'RETURN' AND NOT (NEW.sale_id <=> @return_sale_id) THEN
+        -- Returns carry no order_id: the store is the original invoice's
         SELECT so.location_id
         INTO v_location_id
         FROM sales s
-        JOIN sales_orders so ON s.order_id = so.order_id
+        LEFT JOIN sales ps ON ps.sale_id = s.parent_sale_id
+        JOIN sales_orders so ON so.order_id = COALESCE(s.order_id, ps.order_id)
         WHERE s.sale_id = NEW.sale_id;
 
         IF v_location_id IS NOT NULL THEN
@@ -322,26 +345,30 @@ CREATE TRIGGER trg_audit_order_item_insert
 AFTER INSERT ON sales_order_items
 FOR EACH ROW
 BEGIN
-    INSERT INTO audit_logs (
-        table_name,
-        operation_type,
-        new_value,
-        record_id,
-        changed_at
-    ) VALUES (
-        'sales_order_items',
-        'INSERT',
-        JSON_OBJECT(
-            'order_item_id', NEW.order_item_id,
-            'order_id', NEW.order_id,
-            'product_id', NEW.product_id,
-            'quantity', NEW.quantity,
-            'applied_promotion_id', NEW.applied_promotion_id,
-            'final_amount', NEW.final_amount
-        ),
-        NEW.order_item_id,
-        CURRENT_TIMESTAMP
-    );
+    -- Bulk imports set @audit_suppress = 1 and enqueue their audit
+    -- rows in one multi-row insert (utils/audit_writer.enqueue_audit)
+    IF COALESCE(@audit_suppress, 0) = 0 THEN
+        INSERT INTO audit_outbox (
+            table_name,
+            operation_type,
+            new_value,
+            record_id,
+            changed_at
+        ) VALUES (
+            'sales_order_items',
+            'INSERT',
+            JSON_OBJECT(
+                'order_item_id', NEW.order_item_id,
+                'order_id', NEW.order_id,
+                'product_id', NEW.product_id,
+                'quantity', NEW.quantity,
+                'applied_promotion_id', NEW.applied_promotion_id,
+                'final_amount', NEW.final_amount
+            ),
+            NEW.order_item_id,
+            CURRENT_TIMESTAMP
+        );
+    END IF;
 END;
 
 -- =====================================================
@@ -352,26 +379,28 @@ CREATE TRIGGER trg_audit_product_insert
 AFTER INSERT ON products
 FOR EACH ROW
 BEGIN
-    INSERT INTO audit_logs (
-        table_name,
-        operation_type,
-        new_value,
-        record_id,
-        changed_at
-    ) VALUES (
-        'products',
-        'INSERT',
-        JSON_OBJECT(
-            'product_id', NEW.product_id,
-            'product_name', NEW.product_name,
-            'class_id', NEW.class_id,
-            'unit_price', NEW.unit_price,
-            'cost', NEW.cost,
-            'status', NEW.status
-        ),
-        NEW.product_id,
-        CURRENT_TIMESTAMP
-    );
+    IF COALESCE(@audit_suppress, 0) = 0 THEN
+        INSERT INTO audit_outbox (
+            table_name,
+            operation_type,
+            new_value,
+            record_id,
+            changed_at
+        ) VALUES (
+            'products',
+            'INSERT',
+            JSON_OBJECT(
+                'product_id', NEW.product_id,
+                'product_name', NEW.product_name,
+                'class_id', NEW.class_id,
+                'unit_price', NEW.unit_price,
+                'cost', NEW.cost,
+                'status', NEW.status
+            ),
+            NEW.product_id,
+            CURRENT_TIMESTAMP
+        );
+    END IF;
 END;
 
 -- =====================================================
@@ -382,26 +411,28 @@ CREATE TRIGGER trg_audit_employee_insert
 AFTER INSERT ON employees
 FOR EACH ROW
 BEGIN
-    INSERT INTO audit_logs (
-        table_name,
-        operation_type,
-        new_value,
-        record_id,
-        changed_at
-    ) VALUES (
-        'employees',
-        'INSERT',
-        JSON_OBJECT(
-            'employee_id', NEW.employee_id,
-            'first_name', NEW.first_name,
-            'last_name', NEW.last_name,
-            'email', NEW.email,
-            'role', NEW.role,
-            'department_id', NEW.department_id
-        ),
-        NEW.employee_id,
-        CURRENT_TIMESTAMP
-    );
+    IF COALESCE(@audit_suppress, 0) = 0 THEN
+        INSERT INTO audit_outbox (
+            table_name,
+            operation_type,
+            new_value,
+            record_id,
+            changed_at
+        ) VALUES (
+            'employees',
+            'INSERT',
+            JSON_OBJECT(
+                'employee_id', NEW.employee_id,
+                'first_name', NEW.first_name,
+                'last_name', NEW.last_name,
+                'email', NEW.email,
+                'role', NEW.role,
+                'department_id', NEW.department_id
+            ),
+            NEW.employee_id,
+            CURRENT_TIMESTAMP
+        );
+    END IF;
 END;
 
 -- =====================================================
@@ -412,7 +443,10 @@ CREATE TRIGGER trg_track_delivery_status
 AFTER UPDATE ON deliveries
 FOR EACH ROW
 BEGIN
-    IF OLD.delivery_status != NEW.delivery_status THEN
+    -- utils/delivery_dispatch.transition_deliveries writes the history of
+    -- a whole wave in one INSERT and sets @delivery_history_written = 1
+    IF OLD.delivery_status != NEW.delivery_status
+       AND COALESCE(@delivery_history_written, 0) = 0 THEN
         INSERT INTO delivery_status_history (
             delivery_id,
             old_status,
@@ -427,6 +461,429 @@ BEGIN
     END IF;
 END;
 
+-- =====================================================
+-- TRIGGER 11: Order Header Totals After Item Insert
+-- Keeps sales_orders.item_count / total_amount current
+-- so order lists never aggregate sales_order_items
+-- =====================================================
+
+CREATE TRIGGER trg_order_header_after_item_insert
+AFTER INSERT ON sales_order_items
+FOR EACH ROW
+BEGIN
+    -- Batched inserts (@order_items_priced = 1) update the header once per order
+    IF COALESCE(@order_items_priced, 0) = 0 THEN
+        UPDATE sales_orders
+        SET item_count = item_count + 1,
+            total_amount = total_amount + NEW.final_amount
+        WHERE order_id = NEW.order_id;
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 12: Order Header Invoice After Sale Insert
+-- =====================================================
+
+CREATE TRIGGER trg_order_header_after_sale_insert
+AFTER INSERT ON sales
+FOR EACH ROW
+BEGIN
+    IF NEW.sale_type = 'INVOICE' AND NEW.order_id IS NOT NULL THEN
+        UPDATE sales_orders
+        SET sale_id = NEW.sale_id,
+            invoice_status = NEW.invoice_status
+        WHERE order_id = NEW.order_id;
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 13: Order Header Delivery Status After Delivery Insert
+-- =====================================================
+
+CREATE TRIGGER trg_order_header_after_delivery_insert
+AFTER INSERT ON deliveries
+FOR EACH ROW
+BEGIN
+    IF NEW.delivery_type = 'FULFILLMENT' AND NEW.sale_id IS NOT NULL THEN
+        UPDATE sales_orders
+        SET latest_delivery_status = NEW.delivery_status
+        WHERE order_id = (
+            SELECT order_id
+            FROM sales
+            WHERE sale_id = NEW.sale_id
+        );
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 14: Order Header Delivery Status After Status Change
+-- =====================================================
+
+CREATE TRIGGER trg_order_header_after_delivery_update
+AFTER UPDATE ON deliveries
+FOR EACH ROW
+BEGIN
+    IF NEW.delivery_type = 'FULFILLMENT'
+       AND NEW.sale_id IS NOT NULL
+       AND OLD.delivery_status <> NEW.delivery_status THEN
+        UPDATE sales_orders
+        SET latest_delivery_status = NEW.delivery_status
+        WHERE order_id = (
+            SELECT order_id
+            FROM sales
+            WHERE sale_id = NEW.sale_id
+        );
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 15: Entity Counters: Users
+-- Counters live in entity_counters (summed over 8 slots so concurrent
+-- writers rarely touch the same row). Rebuilt by sp_refresh_entity_counters
+-- =====================================================
+
+CREATE TRIGGER trg_counter_users_after_insert
+AFTER INSERT ON users
+FOR EACH ROW
+BEGIN
+    INSERT INTO entity_counters (counter_name, slot, counter_value)
+    VALUES ('users', MOD(CONNECTION_ID(), 8), 1)
+    ON DUPLICATE KEY UPDATE counter_value = counter_value + 1;
+END;
+
+-- =====================================================
+-- TRIGGER 16: Entity Counters: Employees Insert
+-- =====================================================
+
+CREATE TRIGGER trg_counter_employees_after_insert
+AFTER INSERT ON employees
+FOR EACH ROW
+BEGIN
+    INSERT INTO entity_counters (counter_name, slot, counter_value)
+    VALUES ('employees', MOD(CONNECTION_ID(), 8), 1)
+    ON DUPLICATE KEY UPDATE counter_value = counter_value + 1;
+
+    IF NEW.is_inactive = FALSE THEN
+        INSERT INTO entity_counters (counter_name, slot, counter_value)
+        VALUES ('active_employees', MOD(CONNECTION_ID(), 8), 1)
+        ON DUPLICATE KEY UPDATE counter_value = counter_value + 1;
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 17: Entity Counters: Employees Soft Delete / Reactivate
+-- =====================================================
+
+CREATE TRIGGER trg_counter_employees_after_update
+AFTER UPDATE ON employees
+FOR EACH ROW
+BEGIN
+    IF COALESCE(OLD.is_inactive = FALSE, FALSE) <> COALESCE(NEW.is_inactive = FALSE, FALSE) THEN
+        INSERT INTO entity_counters (counter_name, slot, counter_value)
+        VALUES ('active_employees', MOD(CONNECTION_ID(), 8), IF(NEW.is_inactive = FALSE, 1, -1))
+        ON DUPLICATE KEY UPDATE counter_value = counter_value + IF(NEW.is_inactive = FALSE, 1, -1);
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 18: Entity Counters: Products Insert
+-- =====================================================
+
+CREATE TRIGGER trg_counter_products_after_insert
+AFTER INSERT ON products
+FOR EACH ROW
+BEGIN
+    INSERT INTO entity_counters (counter_name, slot, counter_value)
+    VALUES ('products', MOD(CONNECTION_ID(), 8), 1)
+    ON DUPLICATE KEY UPDATE counter_value = counter_value + 1;
+
+    IF NEW.status = 'ACTIVE' THEN
+        INSERT INTO entity_counters (counter_name, slot, counter_value)
+        VALUES ('active_products', MOD(CONNECTION_ID(), 8), 1)
+        ON DUPLICATE KEY UPDATE counter_value = counter_value + 1;
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 19: Entity Counters: Products Status Change
+-- =====================================================
+
+CREATE TRIGGER trg_counter_products_after_update
+AFTER UPDATE ON products
+FOR EACH ROW
+BEGIN
+    IF COALESCE(OLD.status = 'ACTIVE', FALSE) <> COALESCE(NEW.status = 'ACTIVE', FALSE) THEN
+        INSERT INTO entity_counters (counter_name, slot, counter_value)
+        VALUES ('active_products', MOD(CONNECTION_ID(), 8), IF(NEW.status = 'ACTIVE', 1, -1))
+        ON DUPLICATE KEY UPDATE counter_value = counter_value + IF(NEW.status = 'ACTIVE', 1, -1);
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 20: Entity Counters: Locations
+-- =====================================================
+
+CREATE TRIGGER trg_counter_locations_after_insert
+AFTER INSERT ON locations
+FOR EACH ROW
+BEGIN
+    INSERT INTO entity_counters (counter_name, slot, counter_value)
+    VALUES ('locations', MOD(CONNECTION_ID(), 8), 1)
+    ON DUPLICATE KEY UPDATE counter_value = counter_value + 1;
+END;
+
+-- =====================================================
+-- TRIGGER 21: Entity Counters: Customers
+-- =====================================================
+
+CREATE TRIGGER trg_counter_customers_after_insert
+AFTER INSERT ON customers
+FOR EACH ROW
+BEGIN
+    INSERT INTO entity_counters (counter_name, slot, counter_value)
+    VALUES ('customers', MOD(CONNECTION_ID(), 8), 1)
+    ON DUPLICATE KEY UPDATE counter_value = counter_value + 1;
+END;
+
+-- =====================================================
+-- TRIGGER 22: Entity Counters: Invoices
+-- =====================================================
+
+CREATE TRIGGER trg_counter_sales_after_insert
+AFTER INSERT ON sales
+FOR EACH ROW
+BEGIN
+    IF NEW.sale_type = 'INVOICE' THEN
+        INSERT INTO entity_counters (counter_name, slot, counter_value)
+        VALUES ('invoices', MOD(CONNECTION_ID(), 8), 1)
+        ON DUPLICATE KEY UPDATE counter_value = counter_value + 1;
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 23: Entity Counters: Low Stock Insert (quantity < 100)
+-- =====================================================
+
+CREATE TRIGGER trg_counter_inventory_after_insert
+AFTER INSERT ON inventory
+FOR EACH ROW
+BEGIN
+    IF NEW.quantity < 100 THEN
+        INSERT INTO entity_counters (counter_name, slot, counter_value)
+        VALUES ('low_stock_items', MOD(CONNECTION_ID(), 8), 1)
+        ON DUPLICATE KEY UPDATE counter_value = counter_value + 1;
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 24: Entity Counters: Low Stock Threshold Crossing
+-- =====================================================
+
+CREATE TRIGGER trg_counter_inventory_after_update
+AFTER UPDATE ON inventory
+FOR EACH ROW
+BEGIN
+    -- Only writes when a row crosses the threshold, not on every deduction
+    IF (OLD.quantity < 100) <> (NEW.quantity < 100) THEN
+        INSERT INTO entity_counters (counter_name, slot, counter_value)
+        VALUES ('low_stock_items', MOD(CONNECTION_ID(), 8), IF(NEW.quantity < 100, 1, -1))
+        ON DUPLICATE KEY UPDATE counter_value = counter_value + IF(NEW.quantity < 100, 1, -1);
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 25: Bonus Engine: Invoice Marks Its Pay Period
+-- =====================================================
+
+CREATE TRIGGER trg_bonus_sales_after_insert
+AFTER INSERT ON sales
+FOR EACH ROW
+BEGIN
+    -- Only the month is recorded; utils/bonus_engine.py recomputes it later
+    IF NEW.sale_type = 'INVOICE' THEN
+        INSERT IGNORE INTO bonus_dirty_periods (period_start, source)
+        VALUES (DATE_SUB(DATE(NEW.sale_date), INTERVAL DAYOFMONTH(NEW.sale_date) - 1 DAY), 'SALES');
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 26: Bonus Engine: Delivered Insert Marks Its Pay Period
+-- =====================================================
+
+CREATE TRIGGER trg_bonus_deliveries_after_insert
+AFTER INSERT ON deliveries
+FOR EACH ROW
+BEGIN
+    IF NEW.delivery_status = 'DELIVERED' THEN
+        INSERT IGNORE INTO bonus_dirty_periods (period_start, source)
+        VALUES (DATE_SUB(DATE(NEW.created_at), INTERVAL DAYOFMONTH(NEW.created_at) - 1 DAY), 'DELIVERY');
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 27: Bonus Engine: Delivery Status Change Marks Its Pay Period
+-- =====================================================
+
+CREATE TRIGGER trg_bonus_deliveries_after_update
+AFTER UPDATE ON deliveries
+FOR EACH ROW
+BEGIN
+    IF NEW.delivery_status = 'DELIVERED' OR OLD.delivery_status = 'DELIVERED' THEN
+        INSERT IGNORE INTO bonus_dirty_periods (period_start, source)
+        VALUES (DATE_SUB(DATE(NEW.created_at), INTERVAL DAYOFMONTH(NEW.created_at) - 1 DAY), 'DELIVERY');
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 28: Bonus Engine: Sales Rule Insert
+-- =====================================================
+
+CREATE TRIGGER trg_bonus_employee_rules_after_insert
+AFTER INSERT ON employee_bonus_rules
+FOR EACH ROW
+BEGIN
+    -- A rule edit can change any period: the engine recomputes all of them
+    UPDATE bonus_engine_state
+    SET rules_version = rules_version + 1
+    WHERE source = 'SALES';
+END;
+
+-- =====================================================
+-- TRIGGER 29: Bonus Engine: Sales Rule Update
+-- =====================================================
+
+CREATE TRIGGER trg_bonus_employee_rules_after_update
+AFTER UPDATE ON employee_bonus_rules
+FOR EACH ROW
+BEGIN
+    UPDATE bonus_engine_state
+    SET rules_version = rules_version + 1
+    WHERE source = 'SALES';
+END;
+
+-- =====================================================
+-- TRIGGER 30: Bonus Engine: Sales Rule Delete
+-- =====================================================
+
+CREATE TRIGGER trg_bonus_employee_rules_after_delete
+AFTER DELETE ON employee_bonus_rules
+FOR EACH ROW
+BEGIN
+    UPDATE bonus_engine_state
+    SET rules_version = rules_version + 1
+    WHERE source = 'SALES';
+END;
+
+-- =====================================================
+-- TRIGGER 31: Bonus Engine: Delivery Rule Insert
+-- =====================================================
+
+CREATE TRIGGER trg_bonus_delivery_rules_after_insert
+AFTER INSERT ON delivery_bonus_rules
+FOR EACH ROW
+BEGIN
+    UPDATE bonus_engine_state
+    SET rules_version = rules_version + 1
+    WHERE source = 'DELIVERY';
+END;
+
+-- =====================================================
+-- TRIGGER 32: Bonus Engine: Delivery Rule Update
+-- =====================================================
+
+CREATE TRIGGER trg_bonus_delivery_rules_after_update
+AFTER UPDATE ON delivery_bonus_rules
+FOR EACH ROW
+BEGIN
+    UPDATE bonus_engine_state
+    SET rules_version = rules_version + 1
+    WHERE source = 'DELIVERY';
+END;
+
+-- =====================================================
+-- TRIGGER 33: Bonus Engine: Delivery Rule Delete
+-- =====================================================
+
+CREATE TRIGGER trg_bonus_delivery_rules_after_delete
+AFTER DELETE ON delivery_bonus_rules
+FOR EACH ROW
+BEGIN
+    UPDATE bonus_engine_state
+    SET rules_version = rules_version + 1
+    WHERE source = 'DELIVERY';
+END;
+
+-- =====================================================
+-- TRIGGER 34: Report Totals: Invoice Insert
+-- =====================================================
+
+CREATE TRIGGER trg_totals_sales_after_insert
+AFTER INSERT ON sales
+FOR EACH ROW
+BEGIN
+    -- Invoices are usually inserted with total 0; trg_update_sales_total_after_insert
+    -- then moves the total, which trg_totals_sales_after_update picks up
+    IF NEW.sale_type = 'INVOICE' AND NEW.total_amount <> 0 THEN
+        INSERT INTO report_totals_daily (metric, total_day, slot, total_value)
+        VALUES ('invoice_amount', DATE(NEW.sale_date), MOD(CONNECTION_ID(), 8), NEW.total_amount)
+        ON DUPLICATE KEY UPDATE total_value = total_value + NEW.total_amount;
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 35: Report Totals: Invoice Total Change
+-- =====================================================
+
+CREATE TRIGGER trg_totals_sales_after_update
+AFTER UPDATE ON sales
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.total_amount <=> NEW.total_amount
+            AND OLD.sale_type <=> NEW.sale_type
+            AND OLD.sale_date <=> NEW.sale_date) THEN
+        IF OLD.sale_type = 'INVOICE' THEN
+            INSERT INTO report_totals_daily (metric, total_day, slot, total_value)
+            VALUES ('invoice_amount', DATE(OLD.sale_date), MOD(CONNECTION_ID(), 8), -OLD.total_amount)
+            ON DUPLICATE KEY UPDATE total_value = total_value + -OLD.total_amount;
+        END IF;
+        IF NEW.sale_type = 'INVOICE' THEN
+            INSERT INTO report_totals_daily (metric, total_day, slot, total_value)
+            VALUES ('invoice_amount', DATE(NEW.sale_date), MOD(CONNECTION_ID(), 8), NEW.total_amount)
+            ON DUPLICATE KEY UPDATE total_value = total_value + NEW.total_amount;
+        END IF;
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER 36: Report Totals: Sales Item Insert
+-- =====================================================
+
+CREATE TRIGGER trg_totals_items_after_insert
+AFTER INSERT ON sales_items
+FOR EACH ROW
+BEGIN
+    INSERT INTO report_totals_daily (metric, total_day, slot, total_value)
+    VALUES ('item_amount', DATE(NEW.sale_date), MOD(CONNECTION_ID(), 8), NEW.final_amount)
+    ON DUPLICATE KEY UPDATE total_value = total_value + NEW.final_amount;
+END;
+
+-- =====================================================
+-- TRIGGER 37: Report Totals: Sales Item Update
+-- =====================================================
+
+CREATE TRIGGER trg_totals_items_after_update
+AFTER UPDATE ON sales_items
+FOR EACH ROW
+BEGIN
+    IF NOT (OLD.final_amount <=> NEW.final_amount AND OLD.sale_date <=> NEW.sale_date) THEN
+        INSERT INTO report_totals_daily (metric, total_day, slot, total_value)
+        VALUES ('item_amount', DATE(OLD.sale_date), MOD(CONNECTION_ID(), 8), -OLD.final_amount)
+        ON DUPLICATE KEY UPDATE total_value = total_value + -OLD.final_amount;
+        INSERT INTO report_totals_daily (metric, total_day, slot, total_value)
+        VALUES ('item_amount', DATE(NEW.sale_date), MOD(CONNECTION_ID(), 8), NEW.final_amount)
+        ON DUPLICATE KEY UPDATE total_value = total_value + NEW.final_amount;
+    END IF;
+END;
 
 
 -- =====================================================
@@ -61,6 +61,13 @@ CROSS JOIN
 JOIN
     (SELECT date_value FROM temp_dates ORDER BY RAND() LIMIT 200) d;
 
+-- Order ids snapshot: the header triggers update sales_orders, so inserts
+-- below must not read sales_orders directly (MySQL error 1442)
+DROP TEMPORARY TABLE IF EXISTS tmp_orders;
+CREATE TEMPORARY TABLE tmp_orders AS
+SELECT order_id
+FROM sales_orders;
+
 -- =====================================================
 -- STEP 2: SALES ORDER ITEMS (NO DUPLICATE)
 -- =====================================================
@@ -79,7 +86,7 @@ SELECT
     FLOOR(1 + RAND()*3),
     NULL,
     0
-FROM sales_orders so;
+FROM tmp_orders so;
 
 -- ITEM 2 (70%)
 INSERT INTO sales_order_items (
@@ -105,7 +112,7 @@ SELECT
     FLOOR(1 + RAND()*3),
     NULL,
     0
-FROM sales_orders so
+FROM tmp_orders so
 WHERE RAND() < 0.7;
 
 -- ITEM 3 (30%)
@@ -132,7 +139,7 @@ SELECT
     FLOOR(1 + RAND()*2),
     NULL,
     0
-FROM sales_orders so
+FROM tmp_orders so
 WHERE RAND() < 0.3;
 
 -- =====================================================
@@ -147,6 +154,12 @@ SET order_status = 'CANCELLED',
     closed_reason = 'Customer cancelled'
 WHERE order_status = 'OPEN';
 
+DROP TEMPORARY TABLE IF EXISTS tmp_confirmed_orders;
+CREATE TEMPORARY TABLE tmp_confirmed_orders AS
+SELECT order_id, order_date, location_id
+FROM sales_orders
+WHERE order_status = 'CONFIRMED';
+
 
 -- =====================================================
 -- STEP 5: SEED INVENTORY (FIXED)
@@ -198,8 +211,7 @@ SELECT
     'PAID',
     order_date,
     0
-FROM sales_orders
-WHERE order_status = 'CONFIRMED';
+FROM tmp_confirmed_orders;
 
 -- =====================================================
 -- STEP 6: TEMP MAP (ORDER → SALE)
@@ -255,13 +267,15 @@ SELECT
     IF(RAND() < 0.85, 'DELIVERED', 'SHIPPED'),
     CURRENT_TIMESTAMP
 FROM tmp_order_sale m
-JOIN sales_orders so
+JOIN tmp_confirmed_orders so
     ON m.order_id = so.order_id;
 
 -- =====================================================
 -- CLEANUP
 -- =====================================================
 DROP TEMPORARY TABLE temp_dates;
+DROP TEMPORARY TABLE tmp_orders;
+DROP TEMPORARY TABLE tmp_confirmed_orders;
 DROP TEMPORARY TABLE tmp_order_sale;
 
 SET SQL_SAFE_UPDATES = 1;
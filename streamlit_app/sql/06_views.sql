@@ -94,14 +94,16 @@ SELECT
     COUNT(DISTINCT s.sale_id) AS number_of_orders,
     SUM(s.total_amount) AS revenue,
     ROUND(
-        SUM(s.total_amount)
-        / NULLIF((SELECT SUM(total_amount)
-                  FROM sales
-                  WHERE sale_type='INVOICE'),0) * 100,
+        SUM(s.total_amount) / NULLIF(MAX(t.grand_total),0) * 100,
         2
     ) AS contribution_percent
 FROM sales s
 JOIN payment_methods pm ON s.payment_method_id = pm.payment_method_id
+CROSS JOIN (
+    SELECT SUM(total_value) AS grand_total
+    FROM report_totals_daily
+    WHERE metric='invoice_amount'
+) t
 WHERE s.sale_type='INVOICE'
 GROUP BY pm.method_name;
 
@@ -117,10 +119,7 @@ SELECT
     SUM(s.total_amount) AS total_sales,
     ROUND(AVG(s.total_amount),0) AS avg_order_value,
     ROUND(
-        SUM(s.total_amount)
-        / NULLIF((SELECT SUM(total_amount)
-                  FROM sales
-                  WHERE sale_type='INVOICE'),0) * 100,
+        SUM(s.total_amount) / NULLIF(MAX(t.grand_total),0) * 100,
         2
     ) AS contribution_percent
 FROM sales s
@@ -128,6 +127,11 @@ JOIN sales_orders so ON s.order_id = so.order_id
 JOIN employees e ON so.employee_id = e.employee_id
 JOIN locations l ON so.location_id = l.location_id
 LEFT JOIN employees m ON l.store_manager_id = m.employee_id
+CROSS JOIN (
+    SELECT SUM(total_value) AS grand_total
+    FROM report_totals_daily
+    WHERE metric='invoice_amount'
+) t
 WHERE s.sale_type='INVOICE'
 GROUP BY store_name, store_manager, employee_name;
 
@@ -219,14 +223,35 @@ JOIN locations l ON i.location_id = l.location_id;
 -- -----------------------------------------------------
 -- vw_inventory_movement_summary
 -- -----------------------------------------------------
+-- Rolled-up days from inventory_movement_daily, only the days after
+-- inventory_ledger_state.rolled_through from inventory_history
 CREATE OR REPLACE VIEW vw_inventory_movement_summary AS
 SELECT
     product_id,
     change_type,
-    DATE(created_at) AS period,
-    SUM(quantity_change) AS total_quantity
-FROM inventory_history
-GROUP BY product_id, change_type, DATE(created_at);
+    period,
+    SUM(total_quantity) AS total_quantity
+FROM (
+    SELECT
+        product_id,
+        change_type,
+        movement_day AS period,
+        total_quantity
+    FROM inventory_movement_daily
+    UNION ALL
+    SELECT
+        product_id,
+        change_type,
+        DATE(created_at),
+        quantity_change
+    FROM inventory_history
+    WHERE created_at >= (
+        SELECT COALESCE(rolled_through + INTERVAL 1 DAY, '1000-01-01')
+        FROM inventory_ledger_state
+        WHERE ledger_id = 1
+    )
+) m
+GROUP BY product_id, change_type, period;
 
 -- =====================================================
 -- 4. HR & BONUS REPORTS
@@ -314,12 +339,16 @@ SELECT
     COUNT(si.sale_item_id) AS usage_count,
     SUM(si.final_amount) AS revenue_contribution,
     ROUND(
-        SUM(si.final_amount)
-        / NULLIF((SELECT SUM(final_amount) FROM sales_items),0) * 100,
+        SUM(si.final_amount) / NULLIF(MAX(t.grand_total),0) * 100,
         2
     ) AS contribution_percent
 FROM promotions p
 JOIN sales_items si ON p.promotion_id = si.applied_promotion_id
+CROSS JOIN (
+    SELECT SUM(total_value) AS grand_total
+    FROM report_totals_daily
+    WHERE metric='item_amount'
+) t
 GROUP BY p.promotion_code, p.rule_type;
 
 -- =====================================================
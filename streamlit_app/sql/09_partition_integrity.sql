@@ -0,0 +1,124 @@
+-- =====================================================
+-- VinRetail Partition Integrity Triggers
+-- File: 09_partition_integrity.sql
+-- Description: Trigger-based replacements for the foreign keys
+--              that MySQL forbids on partitioned tables
+-- Run BY: utils/partition_manager.py (convert, maintain) and init_db
+--         whenever a fact table is partitioned
+-- =====================================================
+--
+-- InnoDB partitioned tables can neither declare foreign keys nor be
+-- referenced by them. Converting sales, sales_items and inventory_history
+-- therefore drops these constraints (audit_logs declares none):
+--
+--   sales.fk_sale_order / fk_sale_payment / fk_sale_parent
+--   sales_items.fk_saleitem_sale / fk_saleitem_product / fk_saleitem_promo
+--   deliveries.fk_delivery_sale
+--   inventory_history.fk_hist_product / fk_hist_location
+--
+-- The triggers below re-check the same references on INSERT, and block
+-- deleting a sale that is still referenced (RESTRICT). Master data
+-- (products, locations, users, payment_methods, promotions) is never
+-- hard-deleted by the application, so parent-side checks are only
+-- needed for sales. Partition DROP/EXCHANGE bypasses triggers, so
+-- retention only expires a sales partition no delivery, queue row,
+-- order or later return still references, and a sales_items partition
+-- once its invoice headers are gone.
+-- =====================================================
+
+-- =====================================================
+-- TRIGGER P1: sales -> sales_orders / payment_methods / sales (parent)
+-- =====================================================
+
+CREATE TRIGGER trg_fk_sales_before_insert
+BEFORE INSERT ON sales
+FOR EACH ROW
+BEGIN
+    IF NEW.order_id IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM sales_orders WHERE order_id = NEW.order_id) THEN
+        SIGNAL SQLSTATE '23000'
+        SET MESSAGE_TEXT = 'Foreign key check failed: sales.order_id not found in sales_orders';
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM payment_methods WHERE payment_method_id = NEW.payment_method_id) THEN
+        SIGNAL SQLSTATE '23000'
+        SET MESSAGE_TEXT = 'Foreign key check failed: sales.payment_method_id not found in payment_methods';
+    END IF;
+
+    IF NEW.parent_sale_id IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM sales WHERE sale_id = NEW.parent_sale_id) THEN
+        SIGNAL SQLSTATE '23000'
+        SET MESSAGE_TEXT = 'Foreign key check failed: sales.parent_sale_id not found in sales';
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER P2: sales (RESTRICT delete while referenced)
+-- =====================================================
+
+CREATE TRIGGER trg_fk_sales_before_delete
+BEFORE DELETE ON sales
+FOR EACH ROW
+BEGIN
+    IF EXISTS (SELECT 1 FROM sales_items WHERE sale_id = OLD.sale_id)
+       OR EXISTS (SELECT 1 FROM deliveries WHERE sale_id = OLD.sale_id)
+       OR EXISTS (SELECT 1 FROM sales WHERE parent_sale_id = OLD.sale_id) THEN
+        SIGNAL SQLSTATE '23000'
+        SET MESSAGE_TEXT = 'Foreign key check failed: sale is still referenced';
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER P3: sales_items -> sales / promotions
+-- (product existence is already enforced by trg_calculate_sale_item_amount)
+-- =====================================================
+
+CREATE TRIGGER trg_fk_sales_items_before_insert
+BEFORE INSERT ON sales_items
+FOR EACH ROW
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM sales WHERE sale_id = NEW.sale_id) THEN
+        SIGNAL SQLSTATE '23000'
+        SET MESSAGE_TEXT = 'Foreign key check failed: sales_items.sale_id not found in sales';
+    END IF;
+
+    IF NEW.applied_promotion_id IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM promotions WHERE promotion_id = NEW.applied_promotion_id) THEN
+        SIGNAL SQLSTATE '23000'
+        SET MESSAGE_TEXT = 'Foreign key check failed: sales_items.applied_promotion_id not found in promotions';
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER P4: deliveries -> sales
+-- =====================================================
+
+CREATE TRIGGER trg_fk_deliveries_before_insert
+BEFORE INSERT ON deliveries
+FOR EACH ROW
+BEGIN
+    IF NEW.sale_id IS NOT NULL
+       AND NOT EXISTS (SELECT 1 FROM sales WHERE sale_id = NEW.sale_id) THEN
+        SIGNAL SQLSTATE '23000'
+        SET MESSAGE_TEXT = 'Foreign key check failed: deliveries.sale_id not found in sales';
+    END IF;
+END;
+
+-- =====================================================
+-- TRIGGER P5: inventory_history -> products / locations
+-- =====================================================
+
+CREATE TRIGGER trg_fk_inventory_history_before_insert
+BEFORE INSERT ON inventory_history
+FOR EACH ROW
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM products WHERE product_id = NEW.product_id) THEN
+        SIGNAL SQLSTATE '23000'
+        SET MESSAGE_TEXT = 'Foreign key check failed: inventory_history.product_id not found in products';
+    END IF;
+
+    IF NOT EXISTS (SELECT 1 FROM locations WHERE location_id = NEW.location_id) THEN
+        SIGNAL SQLSTATE '23000'
+        SET MESSAGE_TEXT = 'Foreign key check failed: inventory_history.location_id not found in locations';
+    END IF;
+END;
@@ -0,0 +1,236 @@
+"""
+Audit Writer
+Moves audit events from audit_outbox into audit_logs in batches,
+off the business transaction, on a background thread
+
+    trg_audit_* (in-transaction)  ->  audit_outbox  ->  drain_batch()  ->  audit_logs
+
+Bulk imports skip the per-row triggers with audit_suppressed() and write
+their events with a single enqueue_audit() call instead.
+"""
+
+import os
+import json
+import atexit
+import threading
+from contextlib import contextmanager
+from sqlalchemy import text, bindparam
+
+from config.session import engine, ensure_database_ready
+
+AUDIT_BATCH_SIZE = max(1, int(os.getenv("AUDIT_BATCH_SIZE", "1000")))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "2"))
+
+AUDIT_TRIGGERS = [
+    "trg_audit_order_item_insert",
+    "trg_audit_product_insert",
+    "trg_audit_employee_insert",
+]
+
+# Same definition as sql/01_ddl.sql, for databases created before the outbox
+OUTBOX_DDL = """
+    CREATE TABLE IF NOT EXISTS audit_outbox (
+        outbox_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        table_name VARCHAR(50) NOT NULL,
+        operation_type ENUM('INSERT','UPDATE','DELETE') NOT NULL,
+        old_value TEXT,
+        new_value TEXT,
+        record_id INT,
+        changed_by INT NULL,
+        changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+ENQUEUE_SQL = text("""
+    INSERT INTO audit_outbox (
+        table_name, operation_type, old_value, new_value, record_id, changed_by
+    )
+    VALUES (:table_name, :operation_type, :old_value, :new_value, :record_id, :changed_by)
+""")
+
+# Rows still being written by an open transaction are locked and skipped,
+# so a drain never waits on (or reorders) in-flight business work
+CLAIM_SQL = text("""
+    SELECT outbox_id
+    FROM audit_outbox
+    ORDER BY outbox_id
+    LIMIT :n
+    FOR UPDATE SKIP LOCKED
+""")
+
+COPY_SQL = text("""
+    INSERT INTO audit_logs (
+        table_name, operation_type, old_value, new_value, record_id, changed_by, changed_at
+    )
+    SELECT table_name, operation_type, old_value, new_value, record_id, changed_by, changed_at
+    FROM audit_outbox
+    WHERE outbox_id IN :ids
+    ORDER BY outbox_id
+""").bindparams(bindparam("ids", expanding=True))
+
+DELETE_SQL = text("""
+    DELETE FROM audit_outbox
+    WHERE outbox_id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+_writer_thread = None
+_writer_lock = threading.Lock()
+_stop_event = threading.Event()
+
+
+# =====================================================
+# PRODUCERS
+# =====================================================
+
+@contextmanager
+def audit_suppressed(db):
+    """Disable the trg_audit_* triggers for statements run on `db`"""
+    db.execute(text("SET @audit_suppress = 1"))
+    try:
+        yield
+    finally:
+        db.execute(text("SET @audit_suppress = 0"))
+
+
+def enqueue_audit(db, table_name, operation_type, records, changed_by=None):
+    """
+    Queue audit events in one multi-row insert on the caller's transaction
+
+    records: iterable of (record_id, new_value dict)
+    """
+    rows = [
+        {
+            "table_name": table_name,
+            "operation_type": operation_type,
+            "old_value": None,
+            "new_value": json.dumps(new_value, default=str),
+            "record_id": record_id,
+            "changed_by": changed_by,
+        }
+        for record_id, new_value in records
+    ]
+
+    if rows:
+        db.execute(ENQUEUE_SQL, rows)
+
+    return len(rows)
+
+
+# =====================================================
+# DRAIN
+# =====================================================
+
+def drain_batch(batch_size=AUDIT_BATCH_SIZE):
+    """Move up to batch_size events from the outbox into audit_logs"""
+    with engine.begin() as conn:
+        ids = [row[0] for row in conn.execute(CLAIM_SQL, {"n": batch_size})]
+
+        if not ids:
+            return 0
+
+        conn.execute(COPY_SQL, {"ids": ids})
+        conn.execute(DELETE_SQL, {"ids": ids})
+
+    return len(ids)
+
+
+def drain_all(batch_size=AUDIT_BATCH_SIZE):
+    """Drain until the outbox has no unlocked rows left"""
+    moved = 0
+
+    while True:
+        count = drain_batch(batch_size)
+        moved += count
+        if count < batch_size:
+            return moved
+
+
+# =====================================================
+# SCHEMA UPGRADE
+# =====================================================
+
+def ensure_audit_schema():
+    """Create audit_outbox and point old trg_audit_* triggers at it"""
+    from config.init_db import SQL_DIR, replace_triggers, run_missing_triggers
+
+    ensure_database_ready()
+
+    with engine.begin() as conn:
+        conn.execute(text(OUTBOX_DDL))
+
+        stale = [
+            row[0] for row in conn.execute(text("""
+                SELECT trigger_name
+                FROM information_schema.triggers
+                WHERE trigger_schema = DATABASE()
+                  AND trigger_name IN :names
+                  AND action_statement NOT LIKE '%audit_outbox%'
+            """).bindparams(bindparam("names", expanding=True)), {"names": AUDIT_TRIGGERS})
+        ]
+
+    # Each trigger is dropped and recreated back to back, so at most one
+    # of them is missing at any time
+    if stale:
+        for name in replace_triggers(SQL_DIR / "04_triggers.sql", stale):
+            print(f"🔁 Replaced trigger {name}")
+
+    for name in run_missing_triggers(SQL_DIR / "04_triggers.sql", AUDIT_TRIGGERS):
+        print(f"➕ Created trigger {name}")
+
+
+# =====================================================
+# BACKGROUND WRITER
+# =====================================================
+
+def _writer_loop():
+    while not _stop_event.wait(AUDIT_FLUSH_INTERVAL):
+        try:
+            drain_all()
+        except Exception as e:
+            print(f"⚠️ Audit drain error: {e}")
+
+
+def start_audit_writer():
+    """Start the background drain thread once per process"""
+    global _writer_thread
+
+    if _writer_thread is not None:
+        return
+
+    with _writer_lock:
+        if _writer_thread is None:
+            try:
+                ensure_audit_schema()
+            except Exception as e:
+                # Retried on the next call; events stay queued meanwhile
+                print(f"⚠️ Audit writer not started: {e}")
+                return
+
+            _stop_event.clear()
+            _writer_thread = threading.Thread(
+                target=_writer_loop,
+                name="audit-writer",
+                daemon=True
+            )
+            _writer_thread.start()
+
+
+def stop_audit_writer():
+    """Stop the drain thread and flush what is left in the outbox"""
+    global _writer_thread
+
+    with _writer_lock:
+        if _writer_thread is None:
+            return
+
+        _stop_event.set()
+        _writer_thread.join(timeout=AUDIT_FLUSH_INTERVAL + 5)
+        _writer_thread = None
+
+    try:
+        drain_all()
+    except Exception as e:
+        print(f"⚠️ Audit drain error: {e}")
+
+
+atexit.register(stop_audit_writer)
@@ -1,13 +1,21 @@
 import streamlit as st
-from passlib.context import CryptContext
+from functools import lru_cache
 from sqlalchemy import text
 from config.session import get_db_connection
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    """Build the argon2 password context on first use.
+
+    passlib and argon2 are only imported when a password is actually
+    hashed or verified, keeping them off the login page's first paint.
+    """
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["argon2"], deprecated="auto")
 
 def verify_password(plain_password, hashed_password):
     """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def authenticate_user(username: str, password: str):
     """Authenticate user and return user data"""
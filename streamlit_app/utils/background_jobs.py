@@ -0,0 +1,257 @@
+"""
+Background Jobs
+Handlers for the long operations that pages submit to the job runner
+
+Each handler takes the JobContext plus the job's JSON payload, reports
+progress through ctx.progress() (which also raises JobCancelled once the
+job is cancelled) and returns a small JSON-serializable result.
+
+Usage:
+    job_id = submit_job("upload_employees", {"records": df_records}, label="Employee upload")
+"""
+
+from datetime import date
+
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+from utils.job_runner import job_handler
+from utils.reference_data import invalidate_reference
+from utils.search_index import invalidate_search
+
+# Rows between progress updates for bulk uploads
+UPLOAD_PROGRESS_EVERY = 100
+
+
+# =====================================================
+# DATABASE
+# =====================================================
+
+@job_handler("init_db")
+def init_database(ctx):
+    """First-time schema and sample data load"""
+    from config.init_db import init_db
+
+    success, msg = init_db(progress=ctx.progress)
+    if not success:
+        # init_db reports cancellation as a failure; surface it as such
+        ctx.check_cancelled()
+        raise RuntimeError(msg)
+
+    return {"message": msg}
+
+
+@job_handler("refresh_report_totals")
+def refresh_totals(ctx):
+    from utils.report_totals import refresh_report_totals
+
+    ctx.progress(0, 1, "Recomputing report totals")
+    refresh_report_totals()
+    return {"message": "Report totals refreshed"}
+
+
+@job_handler("update_bonuses")
+def update_bonuses(ctx):
+    """Recompute the pay periods touched since the last run"""
+    from utils.bonus_engine import update_bonus_ledger
+
+    ctx.progress(0, 1, "Updating bonus ledger")
+    periods = update_bonus_ledger()
+    return {
+        "message": ", ".join(f"{source}: {count} periods" for source, count in periods.items()),
+        "periods": periods,
+    }
+
+
+@job_handler("recompute_bonuses")
+def recompute_bonuses(ctx):
+    from utils.bonus_engine import recompute_all
+
+    ctx.progress(0, 1, "Recomputing bonus ledger")
+    recompute_all()
+    return {"message": "Bonus ledger recomputed"}
+
+
+@job_handler("reprice_open_orders")
+def reprice_orders(ctx):
+    """Re-price OPEN orders against today's promotions"""
+    from utils.promotion_engine import reprice_open_orders
+
+    def on_progress(done, total):
+        ctx.progress(done, total, f"{done:,} / {total:,} orders")
+
+    result = reprice_open_orders(progress=on_progress)
+    result["message"] = f"{result['lines_changed']:,} lines in {result['orders_changed']:,} orders re-priced"
+    return result
+
+
+@job_handler("report_indexes")
+def report_indexes(ctx):
+    """Add the report filter indexes to an older database"""
+    from utils.report_queries import ensure_report_indexes
+
+    ctx.progress(0, 1, "Building report indexes")
+    ensure_report_indexes()
+    return {"message": "Report indexes ready"}
+
+
+@job_handler("search_indexes")
+def search_indexes(ctx):
+    """Add the search_text columns and FULLTEXT indexes to an older database"""
+    from utils.search_index import ensure_search_schema
+
+    ctx.progress(0, 1, "Building search indexes")
+    ensure_search_schema()
+    return {"message": "Search indexes ready"}
+
+
+@job_handler("inventory_checkpoints")
+def inventory_checkpoints(ctx, rebuild=False):
+    """Roll up closed days and write missing inventory checkpoints"""
+    from utils.inventory_ledger import rebuild_inventory_ledger, update_inventory_ledger
+
+    ctx.progress(0, 1, "Rebuilding inventory ledger" if rebuild else "Updating inventory ledger")
+    result = rebuild_inventory_ledger() if rebuild else update_inventory_ledger()
+    return {
+        "message": f"{result['checkpoints']:,} checkpoints written, movements rolled up through {result['rolled_through']}",
+        "checkpoints": result["checkpoints"],
+        "rolled_through": str(result["rolled_through"]),
+    }
+
+
+# =====================================================
+# BULK UPLOADS
+# =====================================================
+
+@job_handler("upload_employees")
+def upload_employees(ctx, records):
+    """Insert employee rows in one transaction; bad rows are skipped and reported"""
+    from utils.audit_writer import audit_suppressed, enqueue_audit
+
+    ensure_database_ready()
+
+    success_count = 0
+    errors = []
+    audit_records = []
+    departments = {}
+
+    insert_query = text("""
+        INSERT INTO employees (
+            first_name, last_name, email, phone, gender,
+            role, department_id, job_description, hire_date
+        )
+        VALUES (:fn, :ln, :email, :phone, :gender, :role, :dept, :job, :hire)
+    """)
+
+    with engine.begin() as conn:
+        # One audit insert for the whole upload instead of one trigger row per employee
+        with audit_suppressed(conn):
+            for idx, row in enumerate(records):
+                if idx % UPLOAD_PROGRESS_EVERY == 0:
+                    ctx.progress(idx, len(records), f"{idx:,} / {len(records):,} rows")
+
+                try:
+                    dept_id = None
+                    dept_name = row.get('department_name')
+                    if dept_name:
+                        if dept_name not in departments:
+                            departments[dept_name] = conn.execute(text("""
+                                SELECT department_id FROM departments
+                                WHERE department_name = :name
+                            """), {"name": dept_name}).scalar()
+                        dept_id = departments[dept_name]
+
+                    # Savepoint so a bad row does not abort the rows before it
+                    with conn.begin_nested():
+                        result = conn.execute(insert_query, {
+                            "fn": row['first_name'],
+                            "ln": row['last_name'],
+                            "email": row['email'],
+                            "phone": row['phone'],
+                            "gender": row['gender'],
+                            "role": row['role'],
+                            "dept": dept_id,
+                            "job": row.get('job_description'),
+                            "hire": row.get('hire_date') or date.today()
+                        })
+
+                    audit_records.append((result.lastrowid, {
+                        "employee_id": result.lastrowid,
+                        "first_name": row['first_name'],
+                        "last_name": row['last_name'],
+                        "email": row['email'],
+                        "role": row['role'],
+                        "department_id": dept_id
+                    }))
+
+                    success_count += 1
+
+                except Exception as e:
+                    errors.append(f"Row {idx + 2}: {str(e)}")
+
+        enqueue_audit(conn, "employees", "INSERT", audit_records)
+
+    invalidate_reference("employees")
+    invalidate_search("employees")
+    return {"success_count": success_count, "error_count": len(errors), "errors": errors[:20]}
+
+
+@job_handler("upload_locations")
+def upload_locations(ctx, records):
+    """Insert location rows in one transaction; bad rows are skipped and reported"""
+    ensure_database_ready()
+
+    success_count = 0
+    errors = []
+
+    insert_query = text("""
+        INSERT INTO locations (
+            location_name, location_type, address, city, region,
+            channel, email, opening_date
+        )
+        VALUES (:name, :type, :addr, :city, :region, :channel, :email, :open)
+    """)
+
+    with engine.begin() as conn:
+        for idx, row in enumerate(records):
+            if idx % UPLOAD_PROGRESS_EVERY == 0:
+                ctx.progress(idx, len(records), f"{idx:,} / {len(records):,} rows")
+
+            try:
+                with conn.begin_nested():
+                    conn.execute(insert_query, {
+                        "name": row['location_name'],
+                        "type": row['location_type'],
+                        "addr": row.get('address'),
+                        "city": row['city'],
+                        "region": row['region'],
+                        "channel": row.get('channel') or 'Offline',
+                        "email": row.get('email'),
+                        "open": row.get('opening_date') or date.today()
+                    })
+
+                success_count += 1
+
+            except Exception as e:
+                errors.append(f"Row {idx + 2}: {str(e)}")
+
+    invalidate_reference("stores")
+    return {"success_count": success_count, "error_count": len(errors), "errors": errors[:20]}
+
+
+# =====================================================
+# EXPORTS
+# =====================================================
+
+@job_handler("export_report")
+def export_report_job(ctx, name, sql, params, fmt):
+    """Write one report dataset to a cached export file"""
+    from utils.report_engine import ReportSpec
+    from utils.report_export import export_report
+
+    # Row total unknown (not counted up front): the message carries the progress
+    def on_progress(rows):
+        ctx.progress(0, 0, f"{rows:,} rows written")
+
+    path = export_report(ReportSpec(name, sql, params), fmt, progress=on_progress)
+    return {"path": str(path), "name": name, "fmt": fmt}
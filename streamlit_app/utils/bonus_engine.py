@@ -0,0 +1,515 @@
+"""
+Bonus Engine
+Computes sales and delivery bonuses per pay period (calendar month) into
+bonus_ledger, replacing the rule cross-joins of vw_employee_sales_bonus
+and vw_delivery_bonus_summary
+
+    trg_bonus_* (new invoice / delivery)  ->  bonus_dirty_periods
+    trg_bonus_*_rules_* (rule edit)        ->  bonus_engine_state.rules_version
+    update_bonuses job                     ->  update_bonus_ledger(): recompute dirty periods only
+
+Rules are matched through an elementary-interval index over their
+validity dates: events are pre-aggregated per (employee, interval) and
+each interval only meets the rules active in it.
+
+Rule semantics (per employee and period):
+    PERCENT           ROUND(volume * bonus_percentage / 100) if volume >= min_sales
+    FIXED             fixed_bonus_class if volume >= min_sales
+    KPI               no formula defined yet, recorded with bonus 0
+    delivery rules    deliveries * bonus_amount if deliveries >= min_deliveries
+A rule's class_id limits the volume to that product class; BY_CLASS
+delivery rules only count deliveries carrying that class.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text, bindparam
+
+from config.session import engine, ensure_database_ready
+
+BONUS_SOURCES = ("SALES", "DELIVERY")
+
+# Seconds to wait for another worker updating the same source
+BONUS_LOCK_TIMEOUT = int(os.getenv("BONUS_LOCK_TIMEOUT", "300"))
+
+# Open rule bounds; far enough apart that end + 1 cannot overflow
+OPEN_START = -(2 ** 40)
+OPEN_END = 2 ** 40
+
+BONUS_TRIGGERS = [
+    "trg_bonus_sales_after_insert",
+    "trg_bonus_deliveries_after_insert",
+    "trg_bonus_deliveries_after_update",
+    "trg_bonus_employee_rules_after_insert",
+    "trg_bonus_employee_rules_after_update",
+    "trg_bonus_employee_rules_after_delete",
+    "trg_bonus_delivery_rules_after_insert",
+    "trg_bonus_delivery_rules_after_update",
+    "trg_bonus_delivery_rules_after_delete",
+]
+
+# Same definitions as sql/01_ddl.sql, for databases created before the ledger
+BONUS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS bonus_ledger (
+        period_start DATE NOT NULL,
+        source ENUM('SALES','DELIVERY') NOT NULL,
+        employee_id INT NOT NULL,
+        rule_id INT NOT NULL,
+        basis DECIMAL(14,2) NOT NULL DEFAULT 0,
+        bonus_amount DECIMAL(14,2) NOT NULL DEFAULT 0,
+        computed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (period_start, source, employee_id, rule_id),
+        INDEX idx_bonus_ledger_employee (employee_id, period_start)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bonus_dirty_periods (
+        period_start DATE NOT NULL,
+        source ENUM('SALES','DELIVERY') NOT NULL,
+        PRIMARY KEY (source, period_start)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bonus_engine_state (
+        source ENUM('SALES','DELIVERY') PRIMARY KEY,
+        rules_version INT NOT NULL DEFAULT 0,
+        applied_version INT NOT NULL DEFAULT 0
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    INSERT IGNORE INTO bonus_engine_state (source, rules_version, applied_version)
+    VALUES ('SALES', 1, 0), ('DELIVERY', 1, 0)
+    """,
+]
+
+SALES_RULES_SQL = text("""
+    SELECT rule_id, bonus_type, min_sales, bonus_percentage, fixed_bonus_class,
+           class_id AS rule_class_id, start_date, end_date
+    FROM employee_bonus_rules
+""")
+
+DELIVERY_RULES_SQL = text("""
+    SELECT rule_id, rule_type, min_deliveries, bonus_amount AS rate,
+           delivery_type AS rule_delivery_type, class_id AS rule_class_id,
+           start_date, end_date
+    FROM delivery_bonus_rules
+""")
+
+# Invoice volume per employee, day and product class for one period
+SALES_EVENTS_SQL = text("""
+    SELECT so.employee_id, DATE(s.sale_date) AS sale_day, p.class_id, SUM(si.final_amount)
+    FROM sales s
+    JOIN sales_orders so ON s.order_id = so.order_id
+    JOIN sales_items si ON si.sale_id = s.sale_id
+    JOIN products p ON si.product_id = p.product_id
+    WHERE s.sale_type = 'INVOICE'
+      AND so.employee_id IS NOT NULL
+      AND s.sale_date >= :start AND s.sale_date < :end
+      AND si.sale_date >= :start AND si.sale_date < :end
+    GROUP BY so.employee_id, DATE(s.sale_date), p.class_id
+""")
+
+DELIVERY_EVENTS_SQL = text("""
+    SELECT d.delivery_id, d.delivery_person_id, DATE(d.created_at), d.delivery_type
+    FROM deliveries d
+    WHERE d.delivery_status = 'DELIVERED'
+      AND d.delivery_person_id IS NOT NULL
+      AND d.created_at >= :start AND d.created_at < :end
+""")
+
+DELIVERY_CLASSES_SQL = text("""
+    SELECT DISTINCT d.delivery_id, p.class_id
+    FROM deliveries d
+    JOIN sales_items si ON si.sale_id = d.sale_id
+    JOIN products p ON si.product_id = p.product_id
+    WHERE d.delivery_status = 'DELIVERED'
+      AND d.created_at >= :start AND d.created_at < :end
+""")
+
+EVENT_PERIODS_SQL = {
+    "SALES": text("""
+        SELECT DISTINCT DATE_SUB(DATE(sale_date), INTERVAL DAYOFMONTH(sale_date) - 1 DAY)
+        FROM sales
+        WHERE sale_type = 'INVOICE'
+    """),
+    "DELIVERY": text("""
+        SELECT DISTINCT DATE_SUB(DATE(created_at), INTERVAL DAYOFMONTH(created_at) - 1 DAY)
+        FROM deliveries
+        WHERE delivery_status = 'DELIVERED'
+    """),
+}
+
+LEDGER_COLUMNS = ["employee_id", "rule_id", "basis", "bonus_amount"]
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+class RuleIntervals:
+    """
+    Elementary-interval index over rule validity ranges
+
+    The sorted start / end+1 boundaries of all rules cut the day axis into
+    segments inside which the set of active rules is constant; an event's
+    segment is one searchsorted() away.
+    """
+
+    def __init__(self, rules):
+        starts = rules["start_day"].to_numpy(dtype=np.int64)
+        ends = rules["end_day"].to_numpy(dtype=np.int64)
+        rule_ids = rules["rule_id"].to_numpy()
+
+        self.bounds = np.unique(np.concatenate([starts, ends + 1]))
+
+        # Segment i covers [bounds[i-1], bounds[i]); segment 0 precedes every rule
+        lows = np.concatenate([[OPEN_START - 1], self.bounds])
+        pairs = [
+            (segment, rule_id)
+            for segment, low in enumerate(lows)
+            for rule_id in rule_ids[(starts <= low) & (ends >= low)]
+        ]
+        self.pairs = pd.DataFrame(pairs, columns=["segment", "rule_id"])
+
+    def segments(self, days):
+        return np.searchsorted(self.bounds, np.asarray(days, dtype=np.int64), side="right")
+
+
+# =====================================================
+# LOADING
+# =====================================================
+
+def _period_bounds(period_start):
+    start = pd.Timestamp(period_start)
+    return {"start": start.to_pydatetime(), "end": (start + pd.offsets.MonthBegin(1)).to_pydatetime()}
+
+
+def _day_numbers(values):
+    return np.array([d.toordinal() for d in values], dtype=np.int64)
+
+
+def load_rules(conn, source):
+    """Bonus rules of a source with validity as inclusive day numbers"""
+    result = conn.execute(SALES_RULES_SQL if source == "SALES" else DELIVERY_RULES_SQL)
+    rules = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+    for col in ("min_sales", "bonus_percentage", "fixed_bonus_class", "min_deliveries", "rate"):
+        if col in rules:
+            rules[col] = pd.to_numeric(rules[col], errors="coerce")
+
+    rules["start_day"] = [d.toordinal() if pd.notna(d) else OPEN_START for d in rules["start_date"]]
+    rules["end_day"] = [d.toordinal() if pd.notna(d) else OPEN_END for d in rules["end_date"]]
+    return rules.drop(columns=["start_date", "end_date"])
+
+
+# =====================================================
+# COMPUTATION
+# =====================================================
+
+def compute_sales_bonus(events, rules):
+    """
+    Ledger rows for one period
+
+    events: employee_id, day (day number), class_id, amount
+    """
+    if events.empty or rules.empty:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+
+    index = RuleIntervals(rules)
+    events = events.assign(segment=index.segments(events["day"]))
+    agg = events.groupby(["employee_id", "segment", "class_id"], as_index=False)["amount"].sum()
+
+    hits = agg.merge(index.pairs, on="segment").merge(rules, on="rule_id")
+    hits = hits[hits["rule_class_id"].isna() | (hits["rule_class_id"] == hits["class_id"])]
+
+    ledger = (
+        hits.groupby(["employee_id", "rule_id"], as_index=False)["amount"].sum()
+        .rename(columns={"amount": "basis"})
+        .merge(rules, on="rule_id")
+    )
+
+    qualifies = ledger["min_sales"].isna() | (ledger["basis"] >= ledger["min_sales"])
+    bonus = np.select(
+        [ledger["bonus_type"] == "PERCENT", ledger["bonus_type"] == "FIXED"],
+        [
+            (ledger["basis"] * ledger["bonus_percentage"].fillna(0) / 100).round(0),
+            ledger["fixed_bonus_class"].fillna(0),
+        ],
+        0,
+    )
+    ledger["bonus_amount"] = np.where(qualifies, bonus, 0)
+    return ledger[LEDGER_COLUMNS]
+
+
+def compute_delivery_bonus(deliveries, classes, rules):
+    """
+    Ledger rows for one period
+
+    deliveries: delivery_id, employee_id, day (day number), delivery_type
+    classes: delivery_id, class_id (distinct product classes per delivery)
+    """
+    if deliveries.empty or rules.empty:
+        return pd.DataFrame(columns=LEDGER_COLUMNS)
+
+    index = RuleIntervals(rules)
+    deliveries = deliveries.assign(segment=index.segments(deliveries["day"]))
+    pairs = index.pairs.merge(rules, on="rule_id")
+    by_class = (pairs["rule_type"] == "BY_CLASS") & pairs["rule_class_id"].notna()
+
+    counts = deliveries.groupby(["employee_id", "segment", "delivery_type"]).size().reset_index(name="count")
+    hits = [counts.merge(pairs[~by_class], on="segment")]
+
+    if by_class.any() and not classes.empty:
+        class_counts = (
+            deliveries.merge(classes, on="delivery_id")
+            .groupby(["employee_id", "segment", "delivery_type", "class_id"]).size()
+            .reset_index(name="count")
+        )
+        class_hits = class_counts.merge(pairs[by_class], on="segment")
+        hits.append(class_hits[class_hits["class_id"] == class_hits["rule_class_id"]])
+
+    hits = pd.concat(hits, ignore_index=True)
+    hits = hits[hits["rule_delivery_type"].isna() | (hits["rule_delivery_type"] == hits["delivery_type"])]
+
+    ledger = (
+        hits.groupby(["employee_id", "rule_id"], as_index=False)["count"].sum()
+        .rename(columns={"count": "basis"})
+        .merge(rules, on="rule_id")
+    )
+
+    qualifies = ledger["min_deliveries"].isna() | (ledger["basis"] >= ledger["min_deliveries"])
+    ledger["bonus_amount"] = np.where(qualifies, ledger["basis"] * ledger["rate"].fillna(0), 0)
+    return ledger[LEDGER_COLUMNS]
+
+
+def compute_period(conn, source, period_start, rules):
+    """Ledger rows of one source for the month starting at period_start"""
+    bounds = _period_bounds(period_start)
+
+    if source == "SALES":
+        rows = conn.execute(SALES_EVENTS_SQL, bounds).fetchall()
+        events = pd.DataFrame(rows, columns=["employee_id", "day", "class_id", "amount"])
+        events["day"] = _day_numbers(events["day"])
+        events["amount"] = pd.to_numeric(events["amount"], errors="coerce").fillna(0)
+        return compute_sales_bonus(events, rules)
+
+    rows = conn.execute(DELIVERY_EVENTS_SQL, bounds).fetchall()
+    deliveries = pd.DataFrame(rows, columns=["delivery_id", "employee_id", "day", "delivery_type"])
+    deliveries["day"] = _day_numbers(deliveries["day"])
+
+    classes = pd.DataFrame(columns=["delivery_id", "class_id"])
+    if not deliveries.empty and (rules["rule_type"] == "BY_CLASS").any():
+        classes = pd.DataFrame(conn.execute(DELIVERY_CLASSES_SQL, bounds).fetchall(), columns=["delivery_id", "class_id"])
+
+    return compute_delivery_bonus(deliveries, classes, rules)
+
+
+def write_period(conn, source, period_start, ledger):
+    """Replace the ledger rows of one period and source"""
+    conn.execute(text("""
+        DELETE FROM bonus_ledger
+        WHERE period_start = :period AND source = :source
+    """), {"period": period_start, "source": source})
+
+    if ledger.empty:
+        return
+
+    conn.execute(text("""
+        INSERT INTO bonus_ledger (period_start, source, employee_id, rule_id, basis, bonus_amount)
+        VALUES (:period, :source, :employee_id, :rule_id, :basis, :bonus_amount)
+    """), [
+        {
+            "period": period_start,
+            "source": source,
+            "employee_id": int(row.employee_id),
+            "rule_id": int(row.rule_id),
+            "basis": round(float(row.basis), 2),
+            "bonus_amount": round(float(row.bonus_amount), 2),
+        }
+        for row in ledger.itertuples(index=False)
+    ])
+
+
+# =====================================================
+# LEDGER MAINTENANCE
+# =====================================================
+
+def claim_dirty_periods(source):
+    """
+    Take the dirty periods of one source in a short transaction of its own
+
+    The rows are deleted at once, so the trg_bonus_* inserts only wait
+    for this transaction, not for the recomputation; a period marked
+    again while it is recomputed stays dirty for the next run.
+    """
+    with engine.begin() as conn:
+        dirty = [
+            row[0] for row in conn.execute(text("""
+                SELECT period_start
+                FROM bonus_dirty_periods
+                WHERE source = :source
+                FOR UPDATE
+            """), {"source": source})
+        ]
+
+        if dirty:
+            conn.execute(text("""
+                DELETE FROM bonus_dirty_periods
+                WHERE source = :source AND period_start IN :periods
+            """).bindparams(bindparam("periods", expanding=True)), {"source": source, "periods": dirty})
+
+    return dirty
+
+
+def mark_dirty_periods(source, periods):
+    """Put claimed periods back (their recomputation failed)"""
+    if not periods:
+        return
+
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT IGNORE INTO bonus_dirty_periods (source, period_start)
+            VALUES (:source, :period)
+        """), [{"source": source, "period": period} for period in periods])
+
+
+def update_source(source):
+    """Recompute the dirty periods of one source (all periods after a rule edit)"""
+    # Serialises concurrent engines per source without locking any row
+    # the triggers write (bonus_dirty_periods, bonus_engine_state)
+    lock_name = f"bonus_engine.{source}"
+
+    with engine.connect() as lock_conn:
+        acquired = lock_conn.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": lock_name, "timeout": BONUS_LOCK_TIMEOUT}
+        ).scalar()
+        if not acquired:
+            raise RuntimeError(f"Bonus ledger for {source} is being updated by another worker")
+
+        try:
+            return _recompute_source(source)
+        finally:
+            lock_conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": lock_name})
+
+
+def _recompute_source(source):
+    with engine.connect() as conn:
+        state = conn.execute(text("""
+            SELECT rules_version, applied_version
+            FROM bonus_engine_state
+            WHERE source = :source
+        """), {"source": source}).fetchone()
+
+    dirty = claim_dirty_periods(source)
+
+    try:
+        with engine.begin() as conn:
+            full = state is None or state.rules_version != state.applied_version
+            periods = set(dirty)
+
+            if full:
+                periods.update(row[0] for row in conn.execute(EVENT_PERIODS_SQL[source]))
+                periods.update(row[0] for row in conn.execute(text("""
+                    SELECT DISTINCT period_start
+                    FROM bonus_ledger
+                    WHERE source = :source
+                """), {"source": source}))
+
+            if not periods:
+                return 0
+
+            rules = load_rules(conn, source)
+            for period_start in sorted(periods):
+                write_period(conn, source, period_start, compute_period(conn, source, period_start, rules))
+
+            # A rule edited meanwhile bumped rules_version past the version read above
+            if full and state is not None:
+                conn.execute(text("""
+                    UPDATE bonus_engine_state
+                    SET applied_version = :version
+                    WHERE source = :source
+                """), {"source": source, "version": state.rules_version})
+
+    except Exception:
+        mark_dirty_periods(source, dirty)
+        raise
+
+    return len(periods)
+
+
+def update_bonus_ledger():
+    """Bring bonus_ledger up to date; returns {source: periods recomputed}"""
+    ensure_bonus_schema()
+    return {source: update_source(source) for source in BONUS_SOURCES}
+
+
+def recompute_all():
+    """Force a full recomputation of every period on the next update"""
+    ensure_bonus_schema()
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE bonus_engine_state SET rules_version = rules_version + 1"))
+
+    return update_bonus_ledger()
+
+
+def ledger_periods():
+    """Pay periods present in the ledger, newest first"""
+    with engine.connect() as conn:
+        return [
+            row[0] for row in conn.execute(text("""
+                SELECT DISTINCT period_start
+                FROM bonus_ledger
+                ORDER BY period_start DESC
+            """))
+        ]
+
+
+# =====================================================
+# SCHEMA UPGRADE
+# =====================================================
+
+def ensure_bonus_schema():
+    """Create the ledger tables and trg_bonus_* triggers once per process"""
+    global _schema_ready
+
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        from config.init_db import SQL_DIR, run_missing_triggers
+
+        ensure_database_ready()
+
+        with engine.begin() as conn:
+            for ddl in BONUS_DDL:
+                conn.execute(text(ddl))
+
+            # Older databases keyed the dirty periods (period_start, source),
+            # so a per-source claim locked the whole table
+            key = [row[0] for row in conn.execute(text("""
+                SELECT COLUMN_NAME
+                FROM information_schema.KEY_COLUMN_USAGE
+                WHERE TABLE_SCHEMA = DATABASE()
+                  AND TABLE_NAME = 'bonus_dirty_periods'
+                  AND CONSTRAINT_NAME = 'PRIMARY'
+                ORDER BY ORDINAL_POSITION
+            """))]
+            if key and key[0] != "source":
+                conn.execute(text("""
+                    ALTER TABLE bonus_dirty_periods
+                    DROP PRIMARY KEY,
+                    ADD PRIMARY KEY (source, period_start)
+                """))
+
+        for name in run_missing_triggers(SQL_DIR / "04_triggers.sql", BONUS_TRIGGERS):
+            print(f"➕ Created trigger {name}")
+
+        _schema_ready = True
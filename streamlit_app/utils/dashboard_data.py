@@ -0,0 +1,169 @@
+"""
+Dashboard Data Layer
+Fetches the dashboard's date window in one round-trip and derives every
+widget (KPI cards, daily trend, top products, regions, deliveries,
+recent orders) from it with pandas
+"""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import text
+
+from config.session import get_db_connection
+
+# One statement, three row kinds:
+#   INVOICE   one row per invoice in the window (trend, KPI, region, recent)
+#   PRODUCT   revenue per product, pre-grouped (top products)
+#   DELIVERY  count per delivery status (delivery chart)
+# :region NULL means all regions; otherwise the order's store region.
+BUNDLE_SQL = text("""
+    SELECT
+        'INVOICE' AS kind,
+        s.sale_id,
+        s.sale_date AS ts,
+        s.total_amount AS amount,
+        so.customer_id,
+        l.region,
+        NULL AS label,
+        CONCAT(c.first_name, ' ', c.last_name) AS customer,
+        l.location_name,
+        pm.method_name
+    FROM sales s
+    JOIN sales_orders so ON s.order_id = so.order_id
+    JOIN customers c ON so.customer_id = c.customer_id
+    JOIN locations l ON so.location_id = l.location_id
+    LEFT JOIN payment_methods pm ON s.payment_method_id = pm.payment_method_id
+    WHERE s.sale_type = 'INVOICE'
+        AND s.sale_date >= :start_date
+        AND (:region IS NULL OR l.region = :region)
+
+    UNION ALL
+
+    SELECT
+        'PRODUCT', NULL, NULL, SUM(si.final_amount), NULL, NULL,
+        p.product_name, NULL, NULL, NULL
+    FROM sales_items si
+    JOIN sales s ON si.sale_id = s.sale_id
+    JOIN products p ON si.product_id = p.product_id
+    WHERE s.sale_type = 'INVOICE'
+        AND s.sale_date >= :start_date
+        AND si.sale_date >= :start_date
+        AND (:region IS NULL OR s.order_id IN (
+            SELECT so.order_id
+            FROM sales_orders so
+            JOIN locations l ON so.location_id = l.location_id
+            WHERE l.region = :region
+        ))
+    GROUP BY p.product_id, p.product_name
+
+    UNION ALL
+
+    SELECT
+        'DELIVERY', NULL, NULL, COUNT(*), NULL, NULL,
+        d.delivery_status, NULL, NULL, NULL
+    FROM deliveries d
+    WHERE d.created_at >= :start_date
+        AND (:region IS NULL OR d.sale_id IN (
+            SELECT s.sale_id
+            FROM sales s
+            JOIN sales_orders so ON s.order_id = so.order_id
+            JOIN locations l ON so.location_id = l.location_id
+            WHERE l.region = :region
+        ))
+    GROUP BY d.delivery_status
+""")
+
+BUNDLE_COLUMNS = [
+    'kind', 'sale_id', 'ts', 'amount', 'customer_id', 'region',
+    'label', 'customer', 'location_name', 'method_name'
+]
+
+
+def fetch_dashboard_rows(days_back, region=None):
+    """The windowed fact rows behind every dashboard widget (one query)"""
+    start_date = datetime.now() - timedelta(days=days_back)
+
+    db = get_db_connection()
+    try:
+        result = db.execute(BUNDLE_SQL, {"start_date": start_date, "region": region}).fetchall()
+    finally:
+        db.close()
+
+    rows = pd.DataFrame(result, columns=BUNDLE_COLUMNS)
+    rows['amount'] = pd.to_numeric(rows['amount'], errors='coerce').fillna(0)
+    rows['ts'] = pd.to_datetime(rows['ts'])
+    return rows
+
+
+def build_dashboard_bundle(rows):
+    """Derive every dashboard widget from fetch_dashboard_rows() output"""
+    invoices = rows[rows['kind'] == 'INVOICE']
+    products = rows[rows['kind'] == 'PRODUCT']
+    deliveries = rows[rows['kind'] == 'DELIVERY']
+
+    kpi = {
+        "total_orders": int(invoices['sale_id'].nunique()),
+        "total_revenue": float(invoices['amount'].sum()),
+        "total_customers": int(invoices['customer_id'].nunique()),
+        "avg_order_value": float(invoices['amount'].mean()) if not invoices.empty else 0.0,
+    }
+
+    trend = (
+        invoices.groupby(invoices['ts'].dt.date)['amount']
+        .agg(orders='size', revenue='sum')
+        .rename_axis('date')
+        .reset_index()
+    )
+
+    regions = (
+        invoices.dropna(subset=['region'])
+        .groupby('region')['amount']
+        .agg(orders='size', revenue='sum')
+        .reset_index()
+    )
+
+    top_products = (
+        products.nlargest(5, 'amount')[['label', 'amount']]
+        .rename(columns={'label': 'product_name', 'amount': 'revenue'})
+    )
+
+    delivery_status = (
+        deliveries[['label', 'amount']]
+        .rename(columns={'label': 'delivery_status', 'amount': 'count'})
+    )
+
+    recent = invoices.nlargest(10, 'ts')[
+        ['sale_id', 'ts', 'customer', 'location_name', 'amount', 'method_name']
+    ].rename(columns={'ts': 'sale_date', 'amount': 'total_amount'})
+    recent['sale_id'] = recent['sale_id'].astype(int)
+    recent['sale_date'] = recent['sale_date'].dt.strftime('%Y-%m-%d %H:%M')
+
+    return {
+        "kpi": kpi,
+        "trend": trend,
+        "regions": regions,
+        "top_products": top_products,
+        "delivery_status": delivery_status,
+        "recent": recent,
+    }
+
+
+def load_dashboard_bundle(days_back, region=None):
+    """One DB round-trip for the whole dashboard; callers cache the result"""
+    return build_dashboard_bundle(fetch_dashboard_rows(days_back, region))
+
+
+def get_regions():
+    """Regions available for the dashboard scope selector"""
+    db = get_db_connection()
+    try:
+        result = db.execute(text("""
+            SELECT DISTINCT region
+            FROM locations
+            WHERE region IS NOT NULL
+            ORDER BY region
+        """)).fetchall()
+        return [row[0] for row in result]
+    finally:
+        db.close()
@@ -3,10 +3,26 @@ Database Helper Functions
 Provides safe database access patterns with guaranteed cleanup
 """
 
+import os
+import random
+import threading
+import time
 from contextlib import contextmanager
 from config.session import get_db_connection, dispose_all_connections, get_connection_stats
 import streamlit as st
 
+# MySQL errors after which the whole transaction can simply be run again
+MYSQL_DEADLOCK = 1213
+MYSQL_LOCK_WAIT_TIMEOUT = 1205
+RETRYABLE_ERRORS = {
+    MYSQL_DEADLOCK: "deadlock",
+    MYSQL_LOCK_WAIT_TIMEOUT: "lock_wait_timeout",
+}
+
+TXN_MAX_ATTEMPTS = max(1, int(os.getenv("TXN_MAX_ATTEMPTS", "5")))
+TXN_RETRY_BASE_DELAY = float(os.getenv("TXN_RETRY_BASE_DELAY", "0.05"))
+TXN_RETRY_MAX_DELAY = float(os.getenv("TXN_RETRY_MAX_DELAY", "2"))
+
 @contextmanager
 def get_db_context():
     """
@@ -88,6 +104,105 @@ def execute_transaction(func):
             db.rollback()
             raise e
 
+# =====================================================
+# DEADLOCK-AWARE RETRY
+# =====================================================
+
+class RetryMetrics:
+    """Process-wide counters for run_transaction_with_retry (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.transactions = 0
+            self.attempts = 0
+            self.committed = 0
+            self.gave_up = 0
+            self.retries = {reason: 0 for reason in RETRYABLE_ERRORS.values()}
+            self.backoff_seconds = 0.0
+
+    def record(self, attempts=0, committed=0, gave_up=0, reason=None, delay=0.0):
+        with self._lock:
+            self.attempts += attempts
+            self.committed += committed
+            self.gave_up += gave_up
+            self.backoff_seconds += delay
+            if reason is not None:
+                self.retries[reason] += 1
+
+    def start(self):
+        with self._lock:
+            self.transactions += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "transactions": self.transactions,
+                "attempts": self.attempts,
+                "committed": self.committed,
+                "gave_up": self.gave_up,
+                "retries": dict(self.retries),
+                "backoff_seconds": round(self.backoff_seconds, 3),
+            }
+
+
+retry_metrics = RetryMetrics()
+
+
+def classify_db_error(error):
+    """'deadlock' / 'lock_wait_timeout' for retryable MySQL errors, else None"""
+    orig = getattr(error, "orig", None) or error
+    args = getattr(orig, "args", ())
+    code = args[0] if args and isinstance(args[0], int) else None
+    return RETRYABLE_ERRORS.get(code)
+
+
+def retry_delay(attempt, base_delay=TXN_RETRY_BASE_DELAY, max_delay=TXN_RETRY_MAX_DELAY):
+    """Exponential backoff with full jitter, so retried transactions do not collide again"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** (attempt - 1))))
+
+
+def run_transaction_with_retry(func, max_attempts=TXN_MAX_ATTEMPTS):
+    """
+    Run func(db) in a transaction, retrying on deadlock (1213) and
+    lock wait timeout (1205)
+    
+    Each attempt gets a fresh connection; the failed one is rolled back
+    by get_db_context(). func must be safe to run again from the start
+    (no side effects outside the transaction). Commits on success and
+    returns func's result; other errors, or the last retryable one,
+    are raised.
+    
+    Usage:
+        def confirm(db):
+            db.execute(text("CALL sp_confirm_sales_order(:oid, :pmid)"), params)
+        
+        run_transaction_with_retry(confirm)
+    """
+    retry_metrics.start()
+    
+    for attempt in range(1, max_attempts + 1):
+        try:
+            with get_db_context() as db:
+                result = func(db)
+                db.commit()
+            retry_metrics.record(attempts=1, committed=1)
+            return result
+        except Exception as e:
+            reason = classify_db_error(e)
+            
+            if reason is None or attempt == max_attempts:
+                retry_metrics.record(attempts=1, gave_up=1 if reason else 0)
+                raise
+            
+            delay = retry_delay(attempt)
+            retry_metrics.record(attempts=1, reason=reason, delay=delay)
+            print(f"🔁 {reason} on attempt {attempt}/{max_attempts}, retrying in {delay:.3f}s")
+            time.sleep(delay)
+
 @st.cache_data(ttl=60)  # Cache for 60 seconds
 def cached_query(query_str, params_tuple=()):
     """
@@ -0,0 +1,267 @@
+"""
+Delivery Dispatch
+Set-wise delivery creation and status transitions for warehouse waves
+
+dispatch_sales() turns many queued invoices into FULFILLMENT deliveries
+for one driver / vendor / vehicle with a single INSERT ... SELECT from
+fulfillment_queue. transition_deliveries() moves many deliveries to a
+new status: the whole set is checked against delivery_status_transitions
+in one join, delivery_status_history is written with one INSERT ...
+SELECT and the status with one UPDATE, with trg_track_delivery_status
+switched off for the wave (@delivery_history_written).
+
+Usage:
+    delivery_ids = dispatch_sales(sale_ids, delivery_person_id, vendor_id, vehicle_id)
+    result = transition_deliveries(scanned_ids, "SHIPPED", skip_invalid=True)
+"""
+
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import bindparam, text
+
+from config.session import engine, ensure_database_ready
+
+DELIVERY_STATUSES = ["CREATED", "PACKED", "SHIPPED", "DELIVERED", "FAILED"]
+
+# Same definition and rows as sql/01_ddl.sql, for databases created before the state machine
+TRANSITIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS delivery_status_transitions (
+        from_status ENUM('CREATED','PACKED','SHIPPED','DELIVERED','FAILED') NOT NULL,
+        to_status ENUM('CREATED','PACKED','SHIPPED','DELIVERED','FAILED') NOT NULL,
+        PRIMARY KEY (from_status, to_status)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+TRANSITIONS_SEED = """
+    INSERT IGNORE INTO delivery_status_transitions (from_status, to_status)
+    VALUES
+        ('CREATED', 'PACKED'), ('CREATED', 'SHIPPED'), ('CREATED', 'FAILED'),
+        ('PACKED', 'SHIPPED'), ('PACKED', 'FAILED'),
+        ('SHIPPED', 'DELIVERED'), ('SHIPPED', 'FAILED'),
+        ('FAILED', 'CREATED')
+"""
+
+# Present only in the trigger version that honours bulk-written history
+HISTORY_MARKER = "delivery_history_written"
+
+LOCK_QUEUE_SQL = text("""
+    SELECT sale_id, claimed_by, lease_until >= NOW() AS leased
+    FROM fulfillment_queue
+    WHERE sale_id IN :ids
+    ORDER BY sale_id
+    FOR UPDATE
+""").bindparams(bindparam("ids", expanding=True))
+
+DISPATCH_SQL = text("""
+    INSERT INTO deliveries (
+        delivery_type,
+        sale_id,
+        from_location_id,
+        delivery_person_id,
+        vendor_id,
+        vehicle_id,
+        delivery_status
+    )
+    SELECT
+        'FULFILLMENT',
+        sale_id,
+        location_id,
+        :person,
+        :vendor,
+        :vehicle,
+        'CREATED'
+    FROM fulfillment_queue
+    WHERE sale_id IN :ids
+    ORDER BY sale_id
+""").bindparams(bindparam("ids", expanding=True))
+
+DEQUEUE_SQL = text("""
+    DELETE FROM fulfillment_queue
+    WHERE sale_id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+CREATED_SQL = text("""
+    SELECT delivery_id
+    FROM deliveries
+    WHERE sale_id IN :ids
+      AND delivery_type = 'FULFILLMENT'
+    ORDER BY delivery_id
+""").bindparams(bindparam("ids", expanding=True))
+
+# Every requested delivery with its status and whether the move is allowed
+CHECK_SQL = text("""
+    SELECT
+        d.delivery_id,
+        d.delivery_status,
+        t.to_status IS NOT NULL AS allowed
+    FROM deliveries d
+    LEFT JOIN delivery_status_transitions t
+        ON t.from_status = d.delivery_status
+       AND t.to_status = :status
+    WHERE d.delivery_id IN :ids
+    ORDER BY d.delivery_id
+    FOR UPDATE OF d
+""").bindparams(bindparam("ids", expanding=True))
+
+HISTORY_SQL = text("""
+    INSERT INTO delivery_status_history (delivery_id, old_status, new_status, changed_at)
+    SELECT delivery_id, delivery_status, :status, CURRENT_TIMESTAMP
+    FROM deliveries
+    WHERE delivery_id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+STATUS_SQL = text("""
+    UPDATE deliveries
+    SET delivery_status = :status
+    WHERE delivery_id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+class DeliveryTransitionError(ValueError):
+    """Some deliveries of a wave cannot make the requested move"""
+
+    def __init__(self, status, rejected):
+        self.status = status
+        # [(delivery_id, current status or None when the delivery does not exist)]
+        self.rejected = rejected
+
+        missing = [str(i) for i, current in rejected if current is None]
+        by_status = {}
+        for delivery_id, current in rejected:
+            if current is not None:
+                by_status.setdefault(current, []).append(str(delivery_id))
+
+        parts = [f"{len(ids)} {current} -> {status} (#{', #'.join(ids[:10])})" for current, ids in by_status.items()]
+        if missing:
+            parts.append(f"{len(missing)} not found (#{', #'.join(missing[:10])})")
+        super().__init__("Invalid delivery status change: " + "; ".join(parts))
+
+
+def _ids(values):
+    return sorted({int(v) for v in values})
+
+
+def ensure_dispatch_schema():
+    """Create the transition table and replace the history trigger, once per process"""
+    global _schema_ready
+
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        from config.init_db import SQL_DIR, replace_triggers
+        from utils.fulfillment_queue import ensure_fulfillment_schema
+
+        ensure_database_ready()
+        ensure_fulfillment_schema()
+
+        with engine.begin() as conn:
+            conn.execute(text(TRANSITIONS_DDL))
+            conn.execute(text(TRANSITIONS_SEED))
+
+            statement = conn.execute(text("""
+                SELECT action_statement
+                FROM information_schema.triggers
+                WHERE trigger_schema = DATABASE()
+                  AND trigger_name = 'trg_track_delivery_status'
+            """)).scalar()
+
+        if statement is not None and HISTORY_MARKER not in statement:
+            for name in replace_triggers(SQL_DIR / "04_triggers.sql", ["trg_track_delivery_status"]):
+                print(f"🔁 Replaced trigger {name}")
+
+        _schema_ready = True
+
+
+@contextmanager
+def delivery_history_written(conn):
+    """Skip trg_track_delivery_status for statements run on `conn`"""
+    conn.execute(text("SET @delivery_history_written = 1"))
+    try:
+        yield
+    finally:
+        conn.execute(text("SET @delivery_history_written = 0"))
+
+
+def dispatch_sales(sale_ids, delivery_person_id, vendor_id=None, vehicle_id=None, dispatcher=None):
+    """
+    Create one FULFILLMENT delivery per queued invoice, all for the same
+    driver / vendor / vehicle, in one transaction
+
+    Every invoice must still be in fulfillment_queue and, when
+    `dispatcher` is given, not leased to another dispatcher; otherwise
+    nothing is created. Returns the new delivery_ids.
+    """
+    ids = _ids(sale_ids)
+    if not ids:
+        return []
+
+    ensure_dispatch_schema()
+
+    with engine.begin() as conn:
+        queued = conn.execute(LOCK_QUEUE_SQL, {"ids": ids}).fetchall()
+
+        missing = sorted(set(ids) - {row.sale_id for row in queued})
+        if missing:
+            raise ValueError(f"Invoices not waiting for delivery: #{', #'.join(map(str, missing))}")
+
+        if dispatcher is not None:
+            taken = [row.sale_id for row in queued if row.leased and row.claimed_by != dispatcher]
+            if taken:
+                raise ValueError(f"Invoices claimed by another dispatcher: #{', #'.join(map(str, taken))}")
+
+        conn.execute(DISPATCH_SQL, {
+            "ids": ids,
+            "person": int(delivery_person_id),
+            "vendor": int(vendor_id) if vendor_id is not None else None,
+            "vehicle": int(vehicle_id) if vehicle_id is not None else None,
+        })
+        conn.execute(DEQUEUE_SQL, {"ids": ids})
+
+        return [row[0] for row in conn.execute(CREATED_SQL, {"ids": ids})]
+
+
+def transition_deliveries(delivery_ids, new_status, skip_invalid=False):
+    """
+    Move many deliveries to `new_status` in one transaction
+
+    The requested set is validated against delivery_status_transitions
+    in one query. With skip_invalid=False any rejected delivery raises
+    DeliveryTransitionError and nothing changes; with skip_invalid=True
+    the valid ones move and the rest are returned.
+
+    Returns {"updated": n, "rejected": [(delivery_id, current status)]}
+    """
+    if new_status not in DELIVERY_STATUSES:
+        raise ValueError(f"Unknown delivery status: {new_status}")
+
+    ids = _ids(delivery_ids)
+    if not ids:
+        return {"updated": 0, "rejected": []}
+
+    ensure_dispatch_schema()
+
+    with engine.begin() as conn:
+        rows = conn.execute(CHECK_SQL, {"ids": ids, "status": new_status}).fetchall()
+
+        found = {row.delivery_id for row in rows}
+        valid = [row.delivery_id for row in rows if row.allowed]
+        rejected = [(row.delivery_id, row.delivery_status) for row in rows if not row.allowed]
+        rejected += [(delivery_id, None) for delivery_id in ids if delivery_id not in found]
+
+        if rejected and not skip_invalid:
+            raise DeliveryTransitionError(new_status, sorted(rejected, key=lambda r: r[0]))
+
+        if valid:
+            with delivery_history_written(conn):
+                conn.execute(HISTORY_SQL, {"ids": valid, "status": new_status})
+                conn.execute(STATUS_SQL, {"ids": valid, "status": new_status})
+
+    return {"updated": len(valid), "rejected": sorted(rejected, key=lambda r: r[0])}
@@ -0,0 +1,141 @@
+"""
+Entity Counters
+Row counts for the Quick Stats / System Statistics widgets, read from
+entity_counters (kept current by the trg_counter_* triggers) instead of
+COUNT(*) scans over the base tables
+"""
+
+import os
+import threading
+import time
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+
+ENTITY_COUNTS_TTL = float(os.getenv("ENTITY_COUNTS_TTL", "30"))
+
+# Ground truth per counter; must match sp_refresh_entity_counters
+COUNTER_QUERIES = {
+    "users": "SELECT COUNT(*) FROM users",
+    "employees": "SELECT COUNT(*) FROM employees",
+    "active_employees": "SELECT COUNT(*) FROM employees WHERE is_inactive = FALSE",
+    "products": "SELECT COUNT(*) FROM products",
+    "active_products": "SELECT COUNT(*) FROM products WHERE status = 'ACTIVE'",
+    "locations": "SELECT COUNT(*) FROM locations",
+    "customers": "SELECT COUNT(*) FROM customers",
+    "invoices": "SELECT COUNT(*) FROM sales WHERE sale_type = 'INVOICE'",
+    "low_stock_items": "SELECT COUNT(*) FROM inventory WHERE quantity < 100",
+}
+
+COUNTER_TRIGGERS = [
+    "trg_counter_users_after_insert",
+    "trg_counter_employees_after_insert",
+    "trg_counter_employees_after_update",
+    "trg_counter_products_after_insert",
+    "trg_counter_products_after_update",
+    "trg_counter_locations_after_insert",
+    "trg_counter_customers_after_insert",
+    "trg_counter_sales_after_insert",
+    "trg_counter_inventory_after_insert",
+    "trg_counter_inventory_after_update",
+]
+
+# Same definition as sql/01_ddl.sql, for databases created before the counters
+COUNTERS_DDL = """
+    CREATE TABLE IF NOT EXISTS entity_counters (
+        counter_name VARCHAR(50) NOT NULL,
+        slot TINYINT NOT NULL DEFAULT 0,
+        counter_value BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (counter_name, slot)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+_cache = None
+_cache_expires = 0.0
+_cache_lock = threading.Lock()
+
+
+def read_counts(conn):
+    """Current counter values (missing counters read as 0)"""
+    rows = conn.execute(text("""
+        SELECT counter_name, SUM(counter_value)
+        FROM entity_counters
+        GROUP BY counter_name
+    """)).fetchall()
+
+    counts = dict.fromkeys(COUNTER_QUERIES, 0)
+    counts.update({name: int(value) for name, value in rows})
+    return counts
+
+
+def get_counts():
+    """Counter values, cached for ENTITY_COUNTS_TTL seconds per process"""
+    global _cache, _cache_expires
+
+    with _cache_lock:
+        if _cache is not None and time.monotonic() < _cache_expires:
+            return dict(_cache)
+
+    ensure_database_ready()
+
+    with engine.connect() as conn:
+        counts = read_counts(conn)
+
+    with _cache_lock:
+        _cache = counts
+        _cache_expires = time.monotonic() + ENTITY_COUNTS_TTL
+
+    return dict(counts)
+
+
+def invalidate_counts():
+    """Drop the cached values so the next get_counts() reads the table"""
+    global _cache
+
+    with _cache_lock:
+        _cache = None
+
+
+def refresh_counters():
+    """Recount everything with sp_refresh_entity_counters"""
+    ensure_database_ready()
+
+    with engine.begin() as conn:
+        conn.execute(text("CALL sp_refresh_entity_counters()"))
+
+    invalidate_counts()
+
+
+def check_counters():
+    """Counters that disagree with the base tables: {name: (stored, actual)}"""
+    ensure_database_ready()
+
+    with engine.connect() as conn:
+        stored = read_counts(conn)
+        actual = {name: conn.execute(text(sql)).scalar() or 0 for name, sql in COUNTER_QUERIES.items()}
+
+    return {
+        name: (stored[name], actual[name])
+        for name in COUNTER_QUERIES
+        if stored[name] != actual[name]
+    }
+
+
+def ensure_counter_schema():
+    """Create entity_counters, its triggers, procedure and initial values if missing"""
+    from config.init_db import SQL_DIR, run_missing_procedures, run_missing_triggers
+
+    ensure_database_ready()
+
+    with engine.begin() as conn:
+        conn.execute(text(COUNTERS_DDL))
+        empty = conn.execute(text("SELECT COUNT(*) FROM entity_counters")).scalar() == 0
+
+    for name in run_missing_triggers(SQL_DIR / "04_triggers.sql", COUNTER_TRIGGERS):
+        print(f"➕ Created trigger {name}")
+
+    for name in run_missing_procedures(SQL_DIR / "07_stored_procedures.sql", ["sp_refresh_entity_counters"]):
+        print(f"➕ Created procedure {name}")
+
+    if empty:
+        refresh_counters()
@@ -0,0 +1,218 @@
+"""
+Fulfillment Queue
+Work queue of paid invoices waiting for a FULFILLMENT delivery
+
+sp_confirm_sales_order enqueues each new invoice and
+sp_create_delivery_for_sale removes it, so the dispatcher page reads the
+queue (size = undelivered backlog) instead of anti-joining all of sales
+against deliveries on every rerun.
+
+Dispatchers claim up to FULFILLMENT_CLAIM_LIMIT invoices for
+FULFILLMENT_LEASE_SECONDS with SELECT ... FOR UPDATE SKIP LOCKED: rows
+another dispatcher is claiming or holds an unexpired lease on are
+skipped, each rerun renews the caller's own leases, and invoices of a
+dispatcher who walks away return to the pool when the lease runs out.
+sp_create_delivery_for_sale fails for an invoice that already left the
+queue, so two dispatchers can never both deliver one invoice.
+
+Usage:
+    claimed_df = claim_sales(dispatcher_id, location_id=None)
+    release_sales(dispatcher_id)
+"""
+
+import os
+import threading
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from config.session import engine, ensure_database_ready
+
+FULFILLMENT_LEASE_SECONDS = int(os.getenv("FULFILLMENT_LEASE_SECONDS", "300"))
+FULFILLMENT_CLAIM_LIMIT = int(os.getenv("FULFILLMENT_CLAIM_LIMIT", "50"))
+
+# Same definition as sql/01_ddl.sql, for databases created before the queue
+QUEUE_DDL = """
+    CREATE TABLE IF NOT EXISTS fulfillment_queue (
+        sale_id INT PRIMARY KEY,
+        location_id INT NOT NULL,
+        sale_date DATETIME NOT NULL,
+        claimed_by VARCHAR(100) NULL,
+        lease_until DATETIME NULL,
+        enqueued_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_fulfillment_queue_sale_date (sale_date),
+        INDEX idx_fulfillment_queue_claimed (claimed_by, lease_until)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# Present only in the procedure versions that maintain the queue
+QUEUE_MARKER = "fulfillment_queue"
+
+CLAIM_SQL = text("""
+    SELECT sale_id
+    FROM fulfillment_queue
+    WHERE (claimed_by = :who OR lease_until IS NULL OR lease_until < NOW())
+      AND (:location_id IS NULL OR location_id = :location_id)
+    ORDER BY sale_date DESC
+    LIMIT :limit
+    FOR UPDATE SKIP LOCKED
+""")
+
+LEASE_SQL = text("""
+    UPDATE fulfillment_queue
+    SET claimed_by = :who,
+        lease_until = NOW() + INTERVAL :lease SECOND
+    WHERE sale_id IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+# Drop leases held beyond the claim (e.g. after a smaller limit or a location change)
+TRIM_SQL = text("""
+    UPDATE fulfillment_queue
+    SET claimed_by = NULL,
+        lease_until = NULL
+    WHERE claimed_by = :who
+      AND sale_id NOT IN :ids
+""").bindparams(bindparam("ids", expanding=True))
+
+DETAILS_SQL = text("""
+    SELECT
+        q.sale_id,
+        q.sale_date,
+        CONCAT(c.first_name, ' ', c.last_name) AS customer_name,
+        so.delivery_phone,
+        so.delivery_address,
+        l.location_name,
+        q.location_id,
+        s.total_amount
+    FROM fulfillment_queue q
+    JOIN sales s ON s.sale_id = q.sale_id
+    JOIN sales_orders so ON s.order_id = so.order_id
+    JOIN customers c ON so.customer_id = c.customer_id
+    JOIN locations l ON q.location_id = l.location_id
+    WHERE q.sale_id IN :ids
+    ORDER BY q.sale_date DESC
+""").bindparams(bindparam("ids", expanding=True))
+
+DETAIL_COLUMNS = [
+    'sale_id', 'sale_date', 'customer_name', 'delivery_phone',
+    'delivery_address', 'location_name', 'location_id', 'total_amount'
+]
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def refresh_fulfillment_queue():
+    """Re-queue paid invoices without a delivery with sp_refresh_fulfillment_queue"""
+    ensure_database_ready()
+
+    with engine.begin() as conn:
+        conn.execute(text("CALL sp_refresh_fulfillment_queue()"))
+
+
+def ensure_fulfillment_schema():
+    """Create fulfillment_queue and its procedures, filling the queue once, once per process"""
+    global _schema_ready
+
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        from config.init_db import SQL_DIR, replace_procedures, run_missing_procedures
+
+        ensure_database_ready()
+
+        with engine.begin() as conn:
+            created = conn.execute(text("""
+                SELECT COUNT(*) = 0
+                FROM information_schema.tables
+                WHERE table_schema = DATABASE()
+                  AND table_name = 'fulfillment_queue'
+            """)).scalar()
+            conn.execute(text(QUEUE_DDL))
+
+            definition = conn.execute(text("""
+                SELECT routine_definition
+                FROM information_schema.routines
+                WHERE routine_schema = DATABASE()
+                  AND routine_type = 'PROCEDURE'
+                  AND routine_name = 'sp_create_delivery_for_sale'
+            """)).scalar()
+
+        if definition is None or QUEUE_MARKER not in definition:
+            for name in replace_procedures(SQL_DIR / "07_stored_procedures.sql", ["sp_create_delivery_for_sale"]):
+                print(f"🔁 Replaced procedure {name}")
+
+        for name in run_missing_procedures(SQL_DIR / "07_stored_procedures.sql", ["sp_refresh_fulfillment_queue"]):
+            print(f"➕ Created procedure {name}")
+
+        if created:
+            refresh_fulfillment_queue()
+
+        _schema_ready = True
+
+
+def claim_sales(dispatcher, location_id=None, limit=FULFILLMENT_CLAIM_LIMIT):
+    """
+    Claim (or renew) up to `limit` queued invoices for `dispatcher`,
+    newest first; returns their details as a DataFrame
+    """
+    ensure_fulfillment_schema()
+
+    with engine.begin() as conn:
+        ids = [row[0] for row in conn.execute(CLAIM_SQL, {
+            "who": dispatcher,
+            "location_id": location_id,
+            "limit": int(limit)
+        })]
+
+        conn.execute(TRIM_SQL, {"who": dispatcher, "ids": ids or [0]})
+        if not ids:
+            return pd.DataFrame(columns=DETAIL_COLUMNS)
+
+        conn.execute(LEASE_SQL, {"who": dispatcher, "lease": FULFILLMENT_LEASE_SECONDS, "ids": ids})
+        rows = conn.execute(DETAILS_SQL, {"ids": ids}).fetchall()
+
+    return pd.DataFrame(rows, columns=DETAIL_COLUMNS)
+
+
+def release_sales(dispatcher, sale_ids=None):
+    """Hand a dispatcher's claimed invoices (all, or `sale_ids`) back to the queue"""
+    ensure_fulfillment_schema()
+
+    sql = """
+        UPDATE fulfillment_queue
+        SET claimed_by = NULL,
+            lease_until = NULL
+        WHERE claimed_by = :who
+    """
+    params = {"who": dispatcher}
+
+    if sale_ids is not None:
+        sql += " AND sale_id IN :ids"
+        params["ids"] = [int(i) for i in sale_ids] or [0]
+
+    query = text(sql)
+    if sale_ids is not None:
+        query = query.bindparams(bindparam("ids", expanding=True))
+
+    with engine.begin() as conn:
+        return conn.execute(query, params).rowcount
+
+
+def queue_depth():
+    """Invoices waiting for delivery and how many of them are under lease"""
+    ensure_fulfillment_schema()
+
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT
+                COUNT(*) AS waiting,
+                COALESCE(SUM(lease_until >= NOW()), 0) AS claimed
+            FROM fulfillment_queue
+        """)).fetchone()
+
+    return {"waiting": int(row.waiting), "claimed": int(row.claimed)}
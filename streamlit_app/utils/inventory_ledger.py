@@ -0,0 +1,396 @@
+"""
+Inventory Ledger
+Checkpoints of inventory_history for point-in-time stock and movement
+reports that do not rescan the whole log
+
+    inventory_checkpoints     stock per product and store at the end of a day
+    inventory_movement_daily  inventory_history summed per day, product,
+                              store and change type, for every closed day
+                              up to inventory_ledger_state.rolled_through
+
+update_inventory_ledger() rolls up the days closed since the last run
+and writes the missing checkpoints: one per day for the last
+CHECKPOINT_DAILY_DAYS days, one per week (Sunday) before that. Stock at
+any instant is the nearest anchor - a checkpoint or the live inventory
+table - plus or minus the inventory_history rows between the anchor and
+that instant, so only a short tail of the log is read. Movement reports
+read the rollup plus the raw rows after rolled_through.
+
+Checkpoints are derived backwards from the live inventory, so stock that
+was loaded without an inventory_history row (sample data, manual fixes)
+counts as present from the start of the log.
+
+Usage:
+    update_inventory_ledger()
+    stock_df = stock_at(date(2025, 3, 31), location_ids=[store_id])
+"""
+
+import os
+import threading
+from datetime import datetime, time, timedelta
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from config.session import engine, ensure_database_ready
+
+# Days before yesterday that keep a daily checkpoint; older ones are weekly
+CHECKPOINT_DAILY_DAYS = int(os.getenv("INVENTORY_CHECKPOINT_DAILY_DAYS", "35"))
+
+# date.weekday() of the day whose checkpoint is kept past the daily window
+WEEKLY_CHECKPOINT_WEEKDAY = 6
+
+STOCK_COLUMNS = ["product_id", "location_id", "quantity"]
+
+# Same definitions as sql/01_ddl.sql, for databases created before the ledger
+LEDGER_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS inventory_checkpoints (
+        checkpoint_day DATE NOT NULL,
+        product_id INT NOT NULL,
+        location_id INT NOT NULL,
+        quantity INT NOT NULL,
+        PRIMARY KEY (checkpoint_day, product_id, location_id),
+        INDEX idx_inventory_checkpoints_item (product_id, location_id, checkpoint_day)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inventory_movement_daily (
+        movement_day DATE NOT NULL,
+        product_id INT NOT NULL,
+        location_id INT NOT NULL,
+        change_type ENUM('IN','OUT','TRANSFER','ADJUST') NOT NULL,
+        total_quantity INT NOT NULL,
+        movements INT NOT NULL,
+        PRIMARY KEY (movement_day, product_id, location_id, change_type),
+        INDEX idx_inventory_movement_daily_location (location_id, movement_day)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inventory_ledger_state (
+        ledger_id TINYINT PRIMARY KEY,
+        rolled_through DATE NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    INSERT IGNORE INTO inventory_ledger_state (ledger_id, rolled_through)
+    VALUES (1, NULL)
+    """,
+]
+
+# Same definition as sql/01_ddl.sql; every tail read is a created_at range
+HISTORY_INDEX = ("idx_inventory_history_created", "created_at")
+
+# Present only in the view version that reads the rollup
+VIEW_MARKER = "inventory_movement_daily"
+
+# Nearest checkpoints ending at or before / after the instant whose
+# previous day is :day, with the database clock for the live anchor
+ANCHORS_SQL = text("""
+    SELECT
+        (SELECT MAX(checkpoint_day) FROM inventory_checkpoints WHERE checkpoint_day <= :day) AS before_day,
+        (SELECT MIN(checkpoint_day) FROM inventory_checkpoints WHERE checkpoint_day > :day) AS after_day,
+        NOW() AS now
+""")
+
+ROLLUP_SQL = """
+    INSERT INTO inventory_movement_daily (
+        movement_day,
+        product_id,
+        location_id,
+        change_type,
+        total_quantity,
+        movements
+    )
+    SELECT
+        DATE(created_at),
+        product_id,
+        location_id,
+        change_type,
+        SUM(quantity_change),
+        COUNT(*)
+    FROM inventory_history
+    {where}
+    GROUP BY DATE(created_at), product_id, location_id, change_type
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_ledger_schema():
+    """Create the ledger tables, history index and movement view once per process"""
+    global _schema_ready
+
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        from config.init_db import SQL_DIR, run_plain_sql
+
+        ensure_database_ready()
+
+        with engine.begin() as conn:
+            for ddl in LEDGER_DDL:
+                conn.execute(text(ddl))
+
+            name, columns = HISTORY_INDEX
+            has_index = conn.execute(text("""
+                SELECT COUNT(*)
+                FROM information_schema.statistics
+                WHERE table_schema = DATABASE()
+                  AND table_name = 'inventory_history'
+                  AND index_name = :name
+            """), {"name": name}).scalar()
+            if not has_index:
+                conn.execute(text(f"ALTER TABLE inventory_history ADD INDEX {name} ({columns})"))
+                print(f"➕ Created index {name}")
+
+            view = conn.execute(text("""
+                SELECT view_definition
+                FROM information_schema.views
+                WHERE table_schema = DATABASE()
+                  AND table_name = 'vw_inventory_movement_summary'
+            """)).scalar()
+
+        if view is not None and VIEW_MARKER not in view:
+            run_plain_sql(SQL_DIR / "06_views.sql")
+            print("🔁 Replaced view vw_inventory_movement_summary")
+
+        _schema_ready = True
+
+
+# =====================================================
+# POINT-IN-TIME STOCK
+# =====================================================
+
+def _where(conditions):
+    return "WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+def _end_of_day(day):
+    return datetime.combine(day + timedelta(days=1), time())
+
+
+def _choose_anchor(at, before_day, after_day, now):
+    """
+    (anchor_day, sign, start, end) for the anchor closest to `at`
+
+    anchor_day None is the live inventory table. The history rows in
+    [start, end) are added (sign '') or taken away (sign '-').
+    """
+    at = min(at, now)
+    candidates = [(now - at, None, "-", at, None)]
+
+    if before_day is not None:
+        instant = _end_of_day(before_day)
+        candidates.append((at - instant, before_day, "", instant, at))
+    if after_day is not None:
+        instant = _end_of_day(after_day)
+        candidates.append((instant - at, after_day, "-", at, instant))
+
+    return min(candidates, key=lambda c: c[0])[1:]
+
+
+def _stock_query(anchor_day, sign, start, end, product_ids=None, location_ids=None):
+    """SQL text and parameters of the stock per product and store at one instant"""
+    params = {"start": start, "end": end, "anchor_day": anchor_day}
+    item_filters = []
+
+    if product_ids is not None:
+        item_filters.append("product_id IN :product_ids")
+        params["product_ids"] = sorted({int(i) for i in product_ids}) or [None]
+    if location_ids is not None:
+        item_filters.append("location_id IN :location_ids")
+        params["location_ids"] = sorted({int(i) for i in location_ids}) or [None]
+
+    if anchor_day is not None:
+        anchor = f"FROM inventory_checkpoints {_where(['checkpoint_day = :anchor_day'] + item_filters)}"
+    else:
+        anchor = f"FROM inventory {_where(item_filters)}"
+
+    tail = ["created_at >= :start"] + (["created_at < :end"] if end is not None else []) + item_filters
+
+    sql = f"""
+        SELECT product_id, location_id, SUM(quantity) AS quantity
+        FROM (
+            SELECT product_id, location_id, quantity
+            {anchor}
+            UNION ALL
+            SELECT product_id, location_id, {sign}quantity_change
+            FROM inventory_history
+            {_where(tail)}
+        ) m
+        GROUP BY product_id, location_id
+    """
+    return sql, params
+
+
+def _bind(sql, params):
+    statement = text(sql)
+    expanding = [bindparam(name, expanding=True) for name in ("product_ids", "location_ids") if name in params]
+    return statement.bindparams(*expanding) if expanding else statement
+
+
+def stock_at(at, product_ids=None, location_ids=None):
+    """
+    Stock per product and store at an instant, from the nearest checkpoint
+
+    `at` is a datetime, or a date meaning the end of that day. Movements
+    at or after `at` are not counted; an instant in the future is now.
+    Returns a DataFrame of STOCK_COLUMNS (pairs without stock and
+    without movements since the anchor are absent).
+    """
+    if not isinstance(at, datetime):
+        at = _end_of_day(at)
+
+    ensure_ledger_schema()
+
+    with engine.connect() as conn:
+        anchors = conn.execute(ANCHORS_SQL, {"day": (at - timedelta(days=1)).date()}).fetchone()
+        sql, params = _stock_query(
+            *_choose_anchor(at, anchors.before_day, anchors.after_day, anchors.now),
+            product_ids=product_ids,
+            location_ids=location_ids
+        )
+        rows = conn.execute(_bind(sql, params), params).fetchall()
+
+    return pd.DataFrame(rows, columns=STOCK_COLUMNS)
+
+
+# =====================================================
+# CHECKPOINTS & ROLLUP
+# =====================================================
+
+def _wanted_days(first_day, through):
+    """Checkpoint days to keep: daily in the recent window, weekly before it"""
+    daily_from = through - timedelta(days=CHECKPOINT_DAILY_DAYS)
+    days = set()
+
+    day = through
+    while day >= first_day:
+        if day >= daily_from or day.weekday() == WEEKLY_CHECKPOINT_WEEKDAY:
+            days.add(day)
+        day -= timedelta(days=1)
+
+    return days
+
+
+def _write_checkpoint(conn, day):
+    """Insert the stock at the end of `day`, anchored on the nearest checkpoint"""
+    anchors = conn.execute(ANCHORS_SQL, {"day": day}).fetchone()
+    sql, params = _stock_query(*_choose_anchor(_end_of_day(day), anchors.before_day, anchors.after_day, anchors.now))
+
+    conn.execute(text(f"""
+        INSERT INTO inventory_checkpoints (checkpoint_day, product_id, location_id, quantity)
+        SELECT :checkpoint_day, product_id, location_id, quantity
+        FROM ({sql}) s
+        WHERE quantity <> 0
+    """), {**params, "checkpoint_day": day})
+
+
+def update_inventory_ledger(through=None):
+    """
+    Roll up closed days and write missing checkpoints up to `through`
+    (default yesterday); returns {"rolled_through", "checkpoints"}
+
+    Runs under READ COMMITTED so the INSERT ... SELECTs read the log
+    without locking it; concurrent updates queue on the state row.
+    """
+    ensure_ledger_schema()
+
+    with engine.connect().execution_options(isolation_level="READ COMMITTED") as conn:
+        with conn.begin():
+            today = conn.execute(text("SELECT CURRENT_DATE")).scalar()
+            through = min(through or today - timedelta(days=1), today - timedelta(days=1))
+
+            rolled = conn.execute(text("""
+                SELECT rolled_through
+                FROM inventory_ledger_state
+                WHERE ledger_id = 1
+                FOR UPDATE
+            """)).scalar()
+
+            if rolled is None or rolled < through:
+                conditions = ["created_at < :end"]
+                if rolled is not None:
+                    conditions.insert(0, "created_at >= :start")
+
+                conn.execute(text(ROLLUP_SQL.format(where=_where(conditions))), {
+                    "start": rolled + timedelta(days=1) if rolled is not None else None,
+                    "end": through + timedelta(days=1),
+                })
+                conn.execute(text("""
+                    UPDATE inventory_ledger_state
+                    SET rolled_through = :through
+                    WHERE ledger_id = 1
+                """), {"through": through})
+
+            existing = {row[0] for row in conn.execute(text("SELECT DISTINCT checkpoint_day FROM inventory_checkpoints"))}
+
+            # Backfill only once: later runs start from the oldest checkpoint
+            first_day = min(existing) if existing else conn.execute(text("""
+                SELECT DATE(MIN(created_at)) FROM inventory_history
+            """)).scalar()
+            if first_day is None or first_day > through:
+                first_day = through
+
+            wanted = _wanted_days(first_day, through)
+
+            # Newest first, so each backfilled day is anchored on the one after it
+            missing = sorted(wanted - existing, reverse=True)
+            for day in missing:
+                _write_checkpoint(conn, day)
+
+            stale = sorted(day for day in existing - wanted if day < through)
+            if stale:
+                conn.execute(text("""
+                    DELETE FROM inventory_checkpoints
+                    WHERE checkpoint_day IN :days
+                """).bindparams(bindparam("days", expanding=True)), {"days": stale})
+
+    return {"rolled_through": through, "checkpoints": len(missing)}
+
+
+def rebuild_inventory_ledger():
+    """Drop every checkpoint and rollup row and build them again from the log"""
+    ensure_ledger_schema()
+
+    with engine.begin() as conn:
+        conn.execute(text("SELECT ledger_id FROM inventory_ledger_state WHERE ledger_id = 1 FOR UPDATE"))
+        conn.execute(text("DELETE FROM inventory_checkpoints"))
+        conn.execute(text("DELETE FROM inventory_movement_daily"))
+        conn.execute(text("UPDATE inventory_ledger_state SET rolled_through = NULL WHERE ledger_id = 1"))
+
+    return update_inventory_ledger()
+
+
+def movement_tail_start():
+    """First day not covered by inventory_movement_daily (None: nothing rolled up yet)"""
+    ensure_ledger_schema()
+
+    with engine.connect() as conn:
+        rolled = conn.execute(text("""
+            SELECT rolled_through
+            FROM inventory_ledger_state
+            WHERE ledger_id = 1
+        """)).scalar()
+
+    return rolled + timedelta(days=1) if rolled is not None else None
+
+
+def checkpoint_days():
+    """Days with a checkpoint, newest first"""
+    ensure_ledger_schema()
+
+    with engine.connect() as conn:
+        return [
+            row[0] for row in conn.execute(text("""
+                SELECT DISTINCT checkpoint_day
+                FROM inventory_checkpoints
+                ORDER BY checkpoint_day DESC
+            """))
+        ]
@@ -0,0 +1,455 @@
+"""
+Inventory Reconciliation
+Checks inventory.quantity against the movements recorded in inventory_history
+
+    expected[p, l] = baseline[p, l] + SUM(quantity_change above the watermark)
+    drift[p, l]    = inventory.quantity - expected[p, l]
+
+The baseline (expected stock per product and location up to a
+history_id watermark) lives in inventory_reconcile_baseline and
+inventory_reconcile_state, so every host reconciling the database sees
+the same one and a run only reads the history rows above the watermark.
+Stock, baseline and history are read in one consistent snapshot.
+History is summed per (product, location) on the server in history_id
+ranges of RECONCILE_CHUNK_IDS and the partial sums are merged, aligned
+and compared as NumPy arrays keyed by (product_id << 32 | location_id).
+
+The watermark only advances over rows older than
+RECONCILE_SETTLE_SECONDS, so a movement that took its history_id before
+the snapshot but committed after it is still counted by the next run.
+
+The baseline is set by rebase() (init_db, or after stock was loaded
+without history rows). Without one, history is summed from zero and the
+result is only reported: repair refuses to run, as the sample data seed
+has stock without history rows and would be wiped.
+
+Usage:
+    result = reconcile()                # result.drift is a DataFrame
+    result = reconcile(repair=True)     # set drifted rows to the ledger's stock
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from config.session import engine, ensure_database_ready
+
+RECONCILE_CHUNK_IDS = int(os.getenv("RECONCILE_CHUNK_IDS", "2000000"))
+RECONCILE_SETTLE_SECONDS = int(os.getenv("RECONCILE_SETTLE_SECONDS", "60"))
+# Baseline rows per INSERT batch
+RECONCILE_WRITE_ROWS = int(os.getenv("RECONCILE_WRITE_ROWS", "5000"))
+
+KEY_SHIFT = 32
+LOCATION_MASK = (1 << KEY_SHIFT) - 1
+
+DRIFT_COLUMNS = ["product_id", "location_id", "inventory_quantity", "ledger_quantity", "drift"]
+
+# Same definitions as sql/01_ddl.sql, for databases created before the baseline table
+RECONCILE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS inventory_reconcile_baseline (
+        product_id INT NOT NULL,
+        location_id INT NOT NULL,
+        quantity INT NOT NULL,
+        PRIMARY KEY (product_id, location_id)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inventory_reconcile_state (
+        state_id TINYINT PRIMARY KEY,
+        watermark INT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """,
+    """
+    INSERT IGNORE INTO inventory_reconcile_state (state_id, watermark)
+    VALUES (1, NULL)
+    """,
+]
+
+HISTORY_SUMS_SQL = text("""
+    SELECT
+        product_id,
+        location_id,
+        CAST(SUM(quantity_change) AS SIGNED) AS quantity_change,
+        COUNT(*) AS movements
+    FROM inventory_history
+    WHERE history_id > :lo AND history_id <= :hi
+    GROUP BY product_id, location_id
+""")
+
+# First history_id that may still have uncommitted neighbours below it
+UNSETTLED_SQL = text("""
+    SELECT MIN(history_id)
+    FROM inventory_history
+    WHERE created_at >= NOW() - INTERVAL :settle SECOND
+""")
+
+LOCK_SQL = text("""
+    SELECT product_id, location_id, quantity
+    FROM inventory
+    WHERE (product_id, location_id) IN :pairs
+    FOR UPDATE
+""").bindparams(bindparam("pairs", expanding=True))
+
+# Movements above the settled watermark for the locked pairs, read under the lock
+LATER_SQL = text("""
+    SELECT product_id, location_id, CAST(SUM(quantity_change) AS SIGNED)
+    FROM inventory_history
+    WHERE history_id > :settled
+      AND (product_id, location_id) IN :pairs
+    GROUP BY product_id, location_id
+""").bindparams(bindparam("pairs", expanding=True))
+
+REPAIR_SQL = text("""
+    INSERT INTO inventory (product_id, location_id, quantity)
+    VALUES (:product_id, :location_id, :quantity)
+    ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+""")
+
+# Moves the watermark only if no other run moved it since the snapshot
+ADVANCE_SQL = text("""
+    UPDATE inventory_reconcile_state
+    SET watermark = :to
+    WHERE state_id = 1 AND watermark = :from
+""")
+
+BASELINE_DELTA_SQL = text("""
+    INSERT INTO inventory_reconcile_baseline (product_id, location_id, quantity)
+    VALUES (:product_id, :location_id, :quantity)
+    ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity)
+""")
+
+BASELINE_INSERT_SQL = text("""
+    INSERT INTO inventory_reconcile_baseline (product_id, location_id, quantity)
+    VALUES (:product_id, :location_id, :quantity)
+""")
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+# =====================================================
+# KEYED ARRAYS
+# =====================================================
+
+def _keys(product_ids, location_ids):
+    return (np.asarray(product_ids, dtype=np.int64) << KEY_SHIFT) | np.asarray(location_ids, dtype=np.int64)
+
+
+def _sum_by_key(*parts):
+    """Merge (keys, values) pairs into (sorted unique keys, summed values)"""
+    parts = [(k, v) for k, v in parts if len(k)]
+    if not parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    keys = np.concatenate([k for k, _ in parts])
+    values = np.concatenate([v for _, v in parts])
+
+    unique, inverse = np.unique(keys, return_inverse=True)
+    sums = np.zeros(len(unique), dtype=np.int64)
+    np.add.at(sums, inverse, values)
+    return unique, sums
+
+
+def _align(keys, values, universe):
+    """Values of sorted unique `keys` spread over the sorted `universe` (0 where absent)"""
+    out = np.zeros(len(universe), dtype=np.int64)
+    out[np.searchsorted(universe, keys)] = values
+    return out
+
+
+def _rows_to_keyed(rows):
+    """(keys, values, counts) of (product_id, location_id, value[, count]) rows"""
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+
+    arr = np.array(rows, dtype=np.int64)
+    counts = arr[:, 3] if arr.shape[1] > 3 else np.ones(len(arr), dtype=np.int64)
+    return _keys(arr[:, 0], arr[:, 1]), arr[:, 2], counts
+
+
+def _lookup(keys, values, wanted):
+    """Values of sorted unique `keys` at the `wanted` keys (0 where absent)"""
+    out = np.zeros(len(wanted), dtype=np.int64)
+    if len(keys):
+        pos = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        found = keys[pos] == wanted
+        out[found] = values[pos[found]]
+    return out
+
+
+def _keyed_params(keys, values):
+    """INSERT parameters of the nonzero keyed values"""
+    nonzero = values != 0
+    return [
+        {"product_id": int(k >> KEY_SHIFT), "location_id": int(k & LOCATION_MASK), "quantity": int(v)}
+        for k, v in zip(keys[nonzero], values[nonzero])
+    ]
+
+
+def _write_batches(conn, sql, params):
+    for start in range(0, len(params), RECONCILE_WRITE_ROWS):
+        conn.execute(sql, params[start:start + RECONCILE_WRITE_ROWS])
+
+
+@dataclass
+class Snapshot:
+    """Stock, stored baseline and history sums read in one consistent snapshot"""
+    watermark: object         # history_id of the stored baseline, None without one
+    settled: int
+    top: int
+    stock: tuple              # (keys, quantity)
+    baseline: tuple           # (keys, quantity) at the watermark
+    settled_sums: tuple       # (keys, sums, rows) of (watermark, settled]
+    tail_sums: tuple          # (keys, sums, rows) of (settled, top]
+
+
+@dataclass(frozen=True)
+class ReconcileResult:
+    """Outcome of one reconcile() run"""
+    watermark_from: int
+    watermark_to: int
+    has_baseline: bool
+    history_rows: int
+    pairs_checked: int
+    drift: pd.DataFrame
+    repaired: int = 0
+    unrepairable: int = 0
+    seconds: float = 0.0
+
+
+# =====================================================
+# SNAPSHOT
+# =====================================================
+
+def _history_sums(conn, lo, hi, progress=None):
+    """Per-pair sums of the history rows with lo < history_id <= hi; (keys, sums, rows)"""
+    parts = []
+    rows = 0
+
+    start = lo
+    while start < hi:
+        end = min(start + RECONCILE_CHUNK_IDS, hi)
+        keys, sums, counts = _rows_to_keyed(conn.execute(HISTORY_SUMS_SQL, {"lo": start, "hi": end}).fetchall())
+        parts.append((keys, sums))
+        rows += int(counts.sum())
+        start = end
+
+        if progress:
+            progress(end - lo, hi - lo)
+
+    keys, sums = _sum_by_key(*parts)
+    return keys, sums, rows
+
+
+def _read_snapshot(use_baseline=True, sum_settled=True, progress=None):
+    """
+    Stock, baseline and history sums from one consistent snapshot
+
+    Rows in (watermark, settled] may move the baseline, rows in
+    (settled, top] only count for this run. use_baseline=False (or no
+    stored baseline, or one above the newest history row after the
+    history was truncated) sums from history_id 0. sum_settled=False
+    skips the rows up to the settled watermark (rebase).
+    """
+    ensure_reconcile_schema()
+    empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), 0)
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+
+        top = conn.execute(text("SELECT COALESCE(MAX(history_id), 0) FROM inventory_history")).scalar()
+
+        watermark = None
+        if use_baseline:
+            watermark = conn.execute(text(
+                "SELECT watermark FROM inventory_reconcile_state WHERE state_id = 1"
+            )).scalar()
+            if watermark is not None and watermark > top:
+                watermark = None
+
+        baseline = empty[:2]
+        if watermark is not None:
+            baseline = _sum_by_key(_rows_to_keyed(conn.execute(text(
+                "SELECT product_id, location_id, quantity FROM inventory_reconcile_baseline"
+            )).fetchall())[:2])
+
+        start = watermark or 0
+        unsettled = conn.execute(UNSETTLED_SQL, {"settle": RECONCILE_SETTLE_SECONDS}).scalar()
+        settled = top if unsettled is None else min(max(unsettled - 1, start), top)
+
+        stock = _rows_to_keyed(conn.execute(text(
+            "SELECT product_id, location_id, quantity FROM inventory"
+        )).fetchall())[:2]
+
+        settled_sums = _history_sums(conn, start, settled, progress) if sum_settled else empty
+        tail_sums = _history_sums(conn, settled, top)
+
+        conn.rollback()
+
+    return Snapshot(watermark, settled, top, stock, baseline, settled_sums, tail_sums)
+
+
+# =====================================================
+# RECONCILE
+# =====================================================
+
+def reconcile(repair=False, full=False, progress=None):
+    """
+    Compare inventory with the ledger and move the baseline forward
+
+    full=True ignores the stored baseline and sums the whole history
+    (report only). repair=True sets every drifted inventory row to the
+    ledger's stock (rows the ledger puts below zero are left and counted
+    as unrepairable); it needs the stored baseline. progress: optional
+    callable(done, total) over history_ids.
+    """
+    if repair and full:
+        raise ValueError("Repair needs the stored baseline; it cannot be combined with a full run")
+
+    started = time.monotonic()
+    snap = _read_snapshot(use_baseline=not full, progress=progress)
+    has_baseline = snap.watermark is not None
+
+    if repair and not has_baseline:
+        raise RuntimeError(
+            "No reconcile baseline stored: history summed from zero misses stock loaded "
+            "without history rows. Run a rebase first."
+        )
+
+    settled_keys, settled_quantity = _sum_by_key(snap.baseline, snap.settled_sums[:2])
+    ledger_keys, ledger_quantity = _sum_by_key((settled_keys, settled_quantity), snap.tail_sums[:2])
+    stock_keys, stock_quantity = _sum_by_key(snap.stock)
+
+    universe = np.union1d(ledger_keys, stock_keys)
+    ledger = _align(ledger_keys, ledger_quantity, universe)
+    actual = _align(stock_keys, stock_quantity, universe)
+
+    drifted = ledger != actual
+    drift = pd.DataFrame({
+        "product_id": universe[drifted] >> KEY_SHIFT,
+        "location_id": universe[drifted] & LOCATION_MASK,
+        "inventory_quantity": actual[drifted],
+        "ledger_quantity": ledger[drifted],
+        "drift": actual[drifted] - ledger[drifted],
+    }, columns=DRIFT_COLUMNS)
+
+    if has_baseline:
+        _advance_baseline(snap.watermark, snap.settled, snap.settled_sums[:2])
+
+    repaired = unrepairable = 0
+    if repair and not drift.empty:
+        settled_ledger = _lookup(settled_keys, settled_quantity, universe[drifted])
+        repaired, unrepairable = repair_drift(drift, settled_ledger, snap.settled)
+
+    return ReconcileResult(
+        watermark_from=snap.watermark or 0,
+        watermark_to=snap.settled,
+        has_baseline=has_baseline,
+        history_rows=snap.settled_sums[2] + snap.tail_sums[2],
+        pairs_checked=len(universe),
+        drift=drift,
+        repaired=repaired,
+        unrepairable=unrepairable,
+        seconds=time.monotonic() - started
+    )
+
+
+def _advance_baseline(watermark, settled, delta):
+    """Add the settled movements to the stored baseline; False if another run moved it first"""
+    if settled == watermark:
+        return True
+
+    with engine.begin() as conn:
+        if not conn.execute(ADVANCE_SQL, {"from": watermark, "to": settled}).rowcount:
+            return False
+        _write_batches(conn, BASELINE_DELTA_SQL, _keyed_params(*delta))
+
+    return True
+
+
+def repair_drift(drift, settled_ledger, settled):
+    """
+    Set the drifted inventory rows to the ledger's stock; returns
+    (repaired, unrepairable)
+
+    settled_ledger: the ledger's stock of each drift row at the settled
+    watermark. The rows are locked and every movement above that
+    watermark is read under the lock, including rows with a lower
+    history_id than the snapshot's newest that committed after it, so
+    a sale that ran meanwhile is neither lost nor counted twice.
+    """
+    pairs = [(int(p), int(l)) for p, l in zip(drift["product_id"], drift["location_id"])]
+    ledger = dict(zip(pairs, (int(q) for q in settled_ledger)))
+
+    with engine.connect().execution_options(isolation_level="READ COMMITTED") as conn:
+        with conn.begin():
+            locked = {(p, l): q for p, l, q in conn.execute(LOCK_SQL, {"pairs": pairs})}
+            later = {(p, l): int(q) for p, l, q in conn.execute(LATER_SQL, {"pairs": pairs, "settled": settled})}
+
+            fixes = []
+            unrepairable = 0
+            for pair in pairs:
+                expected = ledger[pair] + later.get(pair, 0)
+                if locked.get(pair, 0) == expected:
+                    continue
+                if expected < 0:
+                    unrepairable += 1
+                    continue
+                fixes.append({"product_id": pair[0], "location_id": pair[1], "quantity": expected})
+
+            if fixes:
+                conn.execute(REPAIR_SQL, fixes)
+
+    return len(fixes), unrepairable
+
+
+def rebase():
+    """
+    Accept the current inventory as the ledger's baseline (after stock
+    was loaded without history rows); returns the new watermark
+    """
+    snap = _read_snapshot(use_baseline=False, sum_settled=False)
+
+    # Stock at the settled watermark = stock now minus the unsettled tail
+    keys, quantity = _sum_by_key(snap.stock, (snap.tail_sums[0], -snap.tail_sums[1]))
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE inventory_reconcile_state SET watermark = NULL WHERE state_id = 1"))
+        conn.execute(text("DELETE FROM inventory_reconcile_baseline"))
+        _write_batches(conn, BASELINE_INSERT_SQL, _keyed_params(keys, quantity))
+        conn.execute(text(
+            "UPDATE inventory_reconcile_state SET watermark = :settled WHERE state_id = 1"
+        ), {"settled": snap.settled})
+
+    return snap.settled
+
+
+# =====================================================
+# SCHEMA UPGRADE
+# =====================================================
+
+def ensure_reconcile_schema():
+    """Create the baseline tables once per process"""
+    global _schema_ready
+
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        ensure_database_ready()
+
+        with engine.begin() as conn:
+            for ddl in RECONCILE_DDL:
+                conn.execute(text(ddl))
+
+        _schema_ready = True
@@ -0,0 +1,316 @@
+"""
+Inventory Availability Service
+Per-(product, location) stock held in NumPy arrays, kept current from
+inventory_history, with soft reservations for OPEN sales orders
+
+    on_hand[p, l]  stock per product row / location column
+    total[p]       on_hand summed over locations
+    reserved[p]    quantity held by OPEN orders
+    available(p) = total[p] - reserved[p]        (O(1), no DB read)
+
+Deltas are applied from inventory_history rows above a settled
+watermark. Rows newer than INVENTORY_SETTLE_SECONDS are re-read on every
+refresh (remembering the ids already applied), so a movement that took
+a lower history_id but committed late is still counted. A full reload
+every INVENTORY_RELOAD_SECONDS also picks up reservations made by other
+processes and repairs any drift.
+The trg_check_inventory_before_sale trigger stays the authoritative guard.
+"""
+
+import os
+import time
+import threading
+import uuid
+
+import numpy as np
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+
+INVENTORY_RELOAD_SECONDS = float(os.getenv("INVENTORY_RELOAD_SECONDS", "300"))
+INVENTORY_REFRESH_SECONDS = float(os.getenv("INVENTORY_REFRESH_SECONDS", "2"))
+# History rows younger than this may still have uncommitted lower ids
+INVENTORY_SETTLE_SECONDS = int(os.getenv("INVENTORY_SETTLE_SECONDS", "60"))
+
+# First history_id in the settle window
+UNSETTLED_SQL = text("""
+    SELECT MIN(history_id)
+    FROM inventory_history
+    WHERE created_at >= NOW() - INTERVAL :settle SECOND
+""")
+
+_service = None
+_service_lock = threading.Lock()
+
+
+class InventoryService:
+    """In-memory stock and reservation counters (thread-safe)"""
+
+    def __init__(self, reload_seconds=INVENTORY_RELOAD_SECONDS):
+        self.reload_seconds = reload_seconds
+        self._lock = threading.RLock()
+        self._product_index = {}
+        self._location_index = {}
+        self._on_hand = np.zeros((0, 0), dtype=np.int64)
+        self._total = np.zeros(0, dtype=np.int64)
+        self._reserved = np.zeros(0, dtype=np.int64)
+        self._reservations = {}     # order_id or pending token -> [(product_id, quantity)]
+        self._settled = 0           # every history row up to here is counted
+        self._applied = set()       # ids above _settled already counted
+        self._loaded_at = 0.0
+        self._refreshed_at = 0.0
+
+    # =====================================================
+    # LOADING
+    # =====================================================
+
+    def reload(self):
+        """Rebuild every array from inventory and OPEN orders"""
+        ensure_database_ready()
+
+        with engine.connect() as conn:
+            # One snapshot for stock, watermark and reservations
+            conn.exec_driver_sql("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+
+            top = conn.execute(text(
+                "SELECT COALESCE(MAX(history_id), 0) FROM inventory_history"
+            )).scalar()
+
+            # Rows in the settle window that the snapshot already counts
+            unsettled = conn.execute(UNSETTLED_SQL, {"settle": INVENTORY_SETTLE_SECONDS}).scalar()
+            settled = top if unsettled is None else min(unsettled - 1, top)
+            applied = {
+                row[0] for row in conn.execute(text("""
+                    SELECT history_id
+                    FROM inventory_history
+                    WHERE history_id > :settled AND history_id <= :top
+                """), {"settled": settled, "top": top})
+            }
+
+            stock = conn.execute(text(
+                "SELECT product_id, location_id, quantity FROM inventory"
+            )).fetchall()
+
+            products = [row[0] for row in conn.execute(text("SELECT product_id FROM products"))]
+            locations = [row[0] for row in conn.execute(text("SELECT location_id FROM locations"))]
+
+            open_items = conn.execute(text("""
+                SELECT soi.order_id, soi.product_id, SUM(soi.quantity)
+                FROM sales_orders so
+                JOIN sales_order_items soi ON soi.order_id = so.order_id
+                WHERE so.order_status = 'OPEN'
+                GROUP BY soi.order_id, soi.product_id
+            """)).fetchall()
+
+            conn.rollback()
+
+        product_index = {pid: i for i, pid in enumerate(products)}
+        location_index = {lid: i for i, lid in enumerate(locations)}
+
+        on_hand = np.zeros((len(products), len(locations)), dtype=np.int64)
+        if stock:
+            arr = np.array(
+                [(product_index[p], location_index[l], q) for p, l, q in stock
+                 if p in product_index and l in location_index],
+                dtype=np.int64
+            ).reshape(-1, 3)
+            on_hand[arr[:, 0], arr[:, 1]] = arr[:, 2]
+
+        reservations = {}
+        for order_id, product_id, quantity in open_items:
+            reservations.setdefault(order_id, []).append((product_id, int(quantity)))
+
+        with self._lock:
+            # Tokens reserved in-process whose order is not committed yet
+            for key, lines in self._reservations.items():
+                if isinstance(key, str):
+                    reservations[key] = lines
+
+            reserved = np.zeros(len(products), dtype=np.int64)
+            for lines in reservations.values():
+                for product_id, quantity in lines:
+                    row = product_index.get(product_id)
+                    if row is not None:
+                        reserved[row] += quantity
+
+            self._product_index = product_index
+            self._location_index = location_index
+            self._on_hand = on_hand
+            self._total = on_hand.sum(axis=1)
+            self._reserved = reserved
+            self._reservations = reservations
+            self._settled = settled
+            self._applied = applied
+            self._loaded_at = self._refreshed_at = time.monotonic()
+
+    def refresh(self, force=False):
+        """Apply committed inventory_history rows since the last load"""
+        now = time.monotonic()
+
+        with self._lock:
+            if not force and now - self._refreshed_at < INVENTORY_REFRESH_SECONDS:
+                return
+            if now - self._loaded_at > self.reload_seconds:
+                stale = True
+            else:
+                stale = False
+                self._refreshed_at = now
+            settled = self._settled
+
+        if stale:
+            self.reload()
+            return
+
+        with engine.connect() as conn:
+            changes = conn.execute(text("""
+                SELECT
+                    history_id,
+                    product_id,
+                    location_id,
+                    quantity_change,
+                    created_at >= NOW() - INTERVAL :settle SECOND AS recent
+                FROM inventory_history
+                WHERE history_id > :settled
+                ORDER BY history_id
+            """), {"settled": settled, "settle": INVENTORY_SETTLE_SECONDS}).fetchall()
+
+        if not changes:
+            return
+
+        with self._lock:
+            for history_id, product_id, location_id, quantity_change, _ in changes:
+                # Already counted (by an earlier refresh or a reload that ran meanwhile)
+                if history_id <= self._settled or history_id in self._applied:
+                    continue
+
+                p = self._product_index.get(product_id)
+                l = self._location_index.get(location_id)
+
+                # New product or location: arrays must be rebuilt
+                if p is None or l is None:
+                    break
+
+                self._on_hand[p, l] += quantity_change
+                self._total[p] += quantity_change
+                self._applied.add(history_id)
+            else:
+                # Move the settled watermark up to the settle window
+                recent = [row[0] for row in changes if row[4]]
+                settled = recent[0] - 1 if recent else changes[-1][0]
+                if settled > self._settled:
+                    self._settled = settled
+                    self._applied = {h for h in self._applied if h > settled}
+                return
+
+        self.reload()
+
+    # =====================================================
+    # QUERIES
+    # =====================================================
+
+    def on_hand(self, product_id, location_id=None):
+        """Physical stock for a product, optionally at one location"""
+        with self._lock:
+            p = self._product_index.get(product_id)
+            if p is None:
+                return 0
+            if location_id is None:
+                return int(self._total[p])
+            l = self._location_index.get(location_id)
+            return 0 if l is None else int(self._on_hand[p, l])
+
+    def available(self, product_id):
+        """Stock not held by OPEN orders"""
+        with self._lock:
+            p = self._product_index.get(product_id)
+            if p is None:
+                return 0
+            return int(self._total[p] - self._reserved[p])
+
+    def available_many(self, product_ids):
+        """Vectorised available() for a sequence of product ids"""
+        with self._lock:
+            rows = np.array([self._product_index.get(int(pid), -1) for pid in product_ids], dtype=np.int64)
+            result = np.zeros(len(rows), dtype=np.int64)
+            known = rows >= 0
+            result[known] = self._total[rows[known]] - self._reserved[rows[known]]
+            return result
+
+    # =====================================================
+    # RESERVATIONS
+    # =====================================================
+
+    def reserve(self, items):
+        """
+        Hold stock for a new order
+
+        items: {product_id: quantity}
+        Returns (token, shortfalls). On any shortfall nothing is held,
+        token is None and shortfalls lists (product_id, available).
+        """
+        with self._lock:
+            shortfalls = []
+            lines = []
+
+            for product_id, quantity in items.items():
+                product_id, quantity = int(product_id), int(quantity)
+                free = self.available(product_id)
+                if quantity > free:
+                    shortfalls.append((product_id, free))
+                else:
+                    lines.append((product_id, quantity))
+
+            if shortfalls:
+                return None, shortfalls
+
+            token = uuid.uuid4().hex
+            self._reservations[token] = lines
+            self._add_reserved(lines, 1)
+            return token, []
+
+    def assign(self, token, order_id):
+        """Re-key a reservation to the order it was created for"""
+        with self._lock:
+            lines = self._reservations.pop(token, None)
+            if lines is not None:
+                self._reservations[int(order_id)] = lines
+
+    def release(self, key):
+        """Drop a reservation (order confirmed, cancelled or failed)"""
+        with self._lock:
+            self._add_reserved(self._reservations.pop(key, []), -1)
+
+    def _add_reserved(self, lines, sign):
+        for product_id, quantity in lines:
+            p = self._product_index.get(product_id)
+            if p is not None:
+                self._reserved[p] += sign * quantity
+
+    def physical_shortfalls(self, items):
+        """
+        Lines that physical stock cannot cover right now: [(product_id, on_hand)]
+
+        Used when confirming an OPEN order; other orders' reservations are
+        soft and do not block it.
+        """
+        with self._lock:
+            return [
+                (int(product_id), self.on_hand(int(product_id)))
+                for product_id, quantity in items.items()
+                if quantity > self.on_hand(int(product_id))
+            ]
+
+
+def get_inventory_service():
+    """Process-wide service, loaded on first use; picks up new history on each call"""
+    global _service
+
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                service = InventoryService()
+                service.reload()
+                _service = service
+
+    _service.refresh()
+    return _service
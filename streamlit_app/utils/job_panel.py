@@ -0,0 +1,93 @@
+"""
+Job Panel
+Streamlit widgets for background jobs: a progress panel that polls the
+job runner from a fragment, so only the panel reruns while a job works
+
+Usage:
+    if st.button("Upload"):
+        st.session_state["upload_job"] = submit_job("upload_employees", {...})
+
+    if "upload_job" in st.session_state:
+        show_job(st.session_state["upload_job"], render_result=show_upload_result)
+"""
+
+import json
+import os
+
+import streamlit as st
+
+from utils.job_runner import ACTIVE_STATUSES, cancel_job, get_job, retry_job
+
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+
+def records_for_job(df):
+    """DataFrame rows as JSON-safe dicts (NaN -> None, datetimes -> YYYY-MM-DD)"""
+    df = df.copy()
+    for col in df.columns:
+        if str(df[col].dtype).startswith("datetime"):
+            df[col] = df[col].dt.strftime("%Y-%m-%d")
+    return json.loads(df.to_json(orient="records"))
+
+
+def show_job(job_id, render_result=None):
+    """
+    Show a job's progress while it runs and its outcome once finished
+
+    render_result: optional callable(job) that renders a succeeded job's result
+    """
+    job = get_job(job_id)
+    if job is None:
+        return None
+
+    if job["status"] in ACTIVE_STATUSES:
+        _poll_job(job_id)
+    else:
+        _render_finished(job, render_result)
+
+    return job
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def _poll_job(job_id):
+    job = get_job(job_id)
+
+    if job is None or job["status"] not in ACTIVE_STATUSES:
+        # Rerun the whole page once so the finished state renders outside the fragment
+        st.rerun()
+
+    label = job["label"] or job["kind"]
+    if job["status"] == "queued":
+        text = f"⏳ {label}: {job['message'] or 'Waiting for a worker'}"
+    else:
+        text = f"⚙️ {label}: {job['message'] or 'Running'}"
+
+    st.progress(job["progress"], text=text)
+
+    if job["cancel_requested"]:
+        st.caption("Cancelling...")
+    elif st.button("✖️ Cancel", key=f"job_cancel_{job_id}"):
+        cancel_job(job_id)
+        st.rerun(scope="fragment")
+
+
+def _render_finished(job, render_result):
+    label = job["label"] or job["kind"]
+
+    if job["status"] == "succeeded":
+        if render_result:
+            render_result(job)
+        else:
+            st.success(f"✅ {label} finished")
+        return
+
+    if job["status"] == "cancelled":
+        st.warning(f"⚠️ {label} was cancelled")
+    else:
+        st.error(f"❌ {label} failed")
+        with st.expander("Error details"):
+            st.code(job["error"] or "Unknown error")
+
+    if st.button("🔁 Retry", key=f"job_retry_{job['job_id']}"):
+        retry_job(job["job_id"])
+        st.rerun()
@@ -0,0 +1,486 @@
+"""
+Job Runner
+Local background job queue for long operations (database init, bulk
+uploads, exports, refreshes) so they run off the Streamlit script thread
+and survive the browser tab being closed
+
+    page  ->  submit_job()  ->  jobs (SQLite)  ->  worker threads  ->  JOB_HANDLERS[kind]
+    page  <-  get_job() polling  <-  progress / status / result
+
+Jobs live in a SQLite file next to the app, not in MySQL, so that the
+database initialization itself can run as a job. Each handler gets a
+JobContext and reports progress with ctx.progress(); cancellation is
+cooperative and takes effect at the next progress call. Failed jobs are
+retried up to max_attempts with a backoff.
+
+Usage:
+    @job_handler("refresh_totals")
+    def refresh_totals(ctx):
+        ...
+        ctx.progress(1, 1, "Done")
+        return {"ok": True}
+
+    job_id = submit_job("refresh_totals", label="Refresh report totals")
+    job = get_job(job_id)   # {"status": "running", "progress": 0.4, ...}
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+JOB_DB_PATH = Path(os.getenv("JOB_DB_PATH", BASE_DIR / ".cache" / "jobs.sqlite3"))
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", "2")))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "5"))
+# A running job whose heartbeat is older than this lost its worker process
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "60"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+JOB_KEEP_SECONDS = float(os.getenv("JOB_KEEP_SECONDS", str(7 * 24 * 3600)))
+
+# Modules that register handlers; imported by the workers before running jobs
+JOB_MODULES = ["utils.background_jobs"]
+
+ACTIVE_STATUSES = ("queued", "running")
+FINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+JOBS_DDL = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        label TEXT,
+        payload TEXT NOT NULL DEFAULT '{}',
+        status TEXT NOT NULL DEFAULT 'queued',
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        result TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL DEFAULT 1,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        owner TEXT,
+        created_at REAL NOT NULL,
+        run_after REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        heartbeat_at REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_after);
+    CREATE INDEX IF NOT EXISTS idx_jobs_kind ON jobs (kind, status);
+"""
+
+JOB_HANDLERS = {}
+
+# Identifies this process's workers in jobs.owner
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+_workers = []
+_workers_lock = threading.Lock()
+_wake_event = threading.Event()
+_stop_event = threading.Event()
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job has been cancelled"""
+
+
+# =====================================================
+# STORAGE
+# =====================================================
+
+@contextmanager
+def _connect():
+    """Short-lived SQLite connection in autocommit mode; use BEGIN IMMEDIATE to write atomically"""
+    ensure_job_schema()
+    conn = sqlite3.connect(JOB_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def ensure_job_schema():
+    """Create the job database once per process"""
+    global _schema_ready
+
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        JOB_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(JOB_DB_PATH, timeout=30, isolation_level=None)
+        try:
+            # WAL lets pages poll while a worker writes progress
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(JOBS_DDL)
+        finally:
+            conn.close()
+
+        _schema_ready = True
+
+
+def _row_to_job(row):
+    if row is None:
+        return None
+
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"] or "{}")
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+# =====================================================
+# PUBLIC API
+# =====================================================
+
+def job_handler(kind):
+    """Register `fn(ctx, **payload)` as the handler of `kind`; its return value must be JSON-serializable"""
+    def decorator(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def submit_job(kind, payload=None, label=None, max_attempts=1, unique=False):
+    """
+    Queue a job and return its id
+
+    unique: if a job of the same kind is already queued or running,
+            return that job's id instead of queueing another one
+    """
+    now = time.time()
+    payload_json = json.dumps(payload or {}, default=str)
+
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if unique:
+                existing = conn.execute(
+                    "SELECT job_id FROM jobs WHERE kind = ? AND status IN ('queued', 'running') "
+                    "ORDER BY job_id LIMIT 1",
+                    (kind,)
+                ).fetchone()
+                if existing:
+                    conn.execute("COMMIT")
+                    return existing["job_id"]
+
+            job_id = conn.execute(
+                "INSERT INTO jobs (kind, label, payload, max_attempts, created_at, run_after) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, label or kind, payload_json, max(1, int(max_attempts)), now, now)
+            ).lastrowid
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    start_job_workers()
+    _wake_event.set()
+    return job_id
+
+
+def get_job(job_id):
+    with _connect() as conn:
+        return _row_to_job(conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone())
+
+
+def find_active_job(kind):
+    """Oldest queued or running job of `kind`, or None"""
+    with _connect() as conn:
+        return _row_to_job(conn.execute(
+            "SELECT * FROM jobs WHERE kind = ? AND status IN ('queued', 'running') "
+            "ORDER BY job_id LIMIT 1",
+            (kind,)
+        ).fetchone())
+
+
+def list_jobs(kind=None, limit=20):
+    """Most recent jobs first"""
+    sql = "SELECT * FROM jobs"
+    params = []
+    if kind is not None:
+        sql += " WHERE kind = ?"
+        params.append(kind)
+    sql += " ORDER BY job_id DESC LIMIT ?"
+    params.append(limit)
+
+    with _connect() as conn:
+        return [_row_to_job(row) for row in conn.execute(sql, params).fetchall()]
+
+
+def cancel_job(job_id):
+    """Cancel a queued job now, or ask a running one to stop at its next progress call"""
+    now = time.time()
+
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ?, "
+            "message = 'Cancelled' WHERE job_id = ? AND status = 'queued'",
+            (now, job_id)
+        )
+        conn.execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status = 'running'",
+            (job_id,)
+        )
+        conn.execute("COMMIT")
+
+
+def retry_job(job_id):
+    """Queue a failed or cancelled job again with a fresh attempt budget"""
+    now = time.time()
+
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        updated = conn.execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, cancel_requested = 0, progress = 0, "
+            "message = NULL, error = NULL, result = NULL, owner = NULL, run_after = ?, "
+            "started_at = NULL, finished_at = NULL "
+            "WHERE job_id = ? AND status IN ('failed', 'cancelled')",
+            (now, job_id)
+        ).rowcount
+        conn.execute("COMMIT")
+
+    if updated:
+        start_job_workers()
+        _wake_event.set()
+
+    return bool(updated)
+
+
+def purge_jobs(max_age=JOB_KEEP_SECONDS):
+    """Delete finished jobs older than max_age seconds"""
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        removed = conn.execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND finished_at < ?",
+            (time.time() - max_age,)
+        ).rowcount
+        conn.execute("COMMIT")
+
+    return removed
+
+
+# =====================================================
+# EXECUTION
+# =====================================================
+
+class JobContext:
+    """Passed to handlers: progress reporting and cancellation checks"""
+
+    def __init__(self, job_id, payload):
+        self.job_id = job_id
+        self.payload = payload
+
+    def progress(self, done, total=None, message=None):
+        """Record progress (done/total, or a 0..1 fraction if total is None); raises JobCancelled if cancelled"""
+        if total:
+            fraction = done / total
+        else:
+            fraction = done if total is None else 0.0
+        fraction = min(max(float(fraction), 0.0), 1.0)
+
+        with _connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat_at = ? "
+                "WHERE job_id = ?",
+                (fraction, message, time.time(), self.job_id)
+            )
+            cancelled = conn.execute(
+                "SELECT cancel_requested FROM jobs WHERE job_id = ?", (self.job_id,)
+            ).fetchone()["cancel_requested"]
+            conn.execute("COMMIT")
+
+        if cancelled:
+            raise JobCancelled(f"Job {self.job_id} cancelled")
+
+    def check_cancelled(self):
+        with _connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (self.job_id,)).fetchone()
+        if row and row["cancel_requested"]:
+            raise JobCancelled(f"Job {self.job_id} cancelled")
+
+
+def _claim_next():
+    """Atomically move the next due job to running for this process"""
+    now = time.time()
+
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'queued' AND run_after <= ? ORDER BY job_id LIMIT 1",
+            (now,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+
+        conn.execute(
+            "UPDATE jobs SET status = 'running', owner = ?, attempts = attempts + 1, "
+            "started_at = ?, heartbeat_at = ?, error = NULL WHERE job_id = ?",
+            (OWNER, now, now, row["job_id"])
+        )
+        conn.execute("COMMIT")
+
+    job = _row_to_job(row)
+    job["attempts"] += 1
+    return job
+
+
+def _finish(job_id, status, result=None, error=None, message=None):
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, message = COALESCE(?, message), "
+            "progress = CASE WHEN ? = 'succeeded' THEN 1 ELSE progress END, "
+            "finished_at = ?, owner = NULL WHERE job_id = ?",
+            (status, json.dumps(result, default=str) if result is not None else None,
+             error, message, status, time.time(), job_id)
+        )
+        conn.execute("COMMIT")
+
+
+def _requeue(job_id, error, delay):
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', error = ?, owner = NULL, run_after = ?, "
+            "message = 'Waiting to retry' WHERE job_id = ?",
+            (error, time.time() + delay, job_id)
+        )
+        conn.execute("COMMIT")
+
+
+def _load_handler(kind):
+    if kind not in JOB_HANDLERS:
+        import importlib
+        for module in JOB_MODULES:
+            importlib.import_module(module)
+    return JOB_HANDLERS[kind]
+
+
+def run_job(job):
+    """Run one claimed job to completion and record its outcome"""
+    job_id = job["job_id"]
+
+    try:
+        handler = _load_handler(job["kind"])
+        result = handler(JobContext(job_id, job["payload"]), **job["payload"])
+        _finish(job_id, "succeeded", result=result, message="Done")
+    except JobCancelled:
+        _finish(job_id, "cancelled", message="Cancelled")
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        print(f"⚠️ Job {job_id} ({job['kind']}) failed: {error}")
+
+        if job["attempts"] < job["max_attempts"]:
+            _requeue(job_id, error, JOB_RETRY_BACKOFF * job["attempts"])
+        else:
+            _finish(job_id, "failed", error=error + "\n\n" + traceback.format_exc(limit=5), message="Failed")
+
+
+def _recover_stale():
+    """Requeue (or fail) running jobs whose worker stopped sending heartbeats"""
+    cutoff = time.time() - JOB_STALE_SECONDS
+
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET status = 'queued', owner = NULL, message = 'Worker lost; requeued' "
+            "WHERE status = 'running' AND heartbeat_at < ? AND attempts < max_attempts",
+            (cutoff,)
+        )
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', owner = NULL, finished_at = ?, "
+            "error = 'Worker lost', message = 'Failed' "
+            "WHERE status = 'running' AND heartbeat_at < ?",
+            (time.time(), cutoff)
+        )
+        conn.execute("COMMIT")
+
+
+def _heartbeat():
+    """Keep this process's running jobs fresh even when a handler step reports no progress"""
+    with _connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE status = 'running' AND owner = ?",
+            (time.time(), OWNER)
+        )
+        conn.execute("COMMIT")
+
+
+def _worker_loop():
+    while not _stop_event.is_set():
+        try:
+            job = _claim_next()
+        except Exception as e:
+            print(f"⚠️ Job claim error: {e}")
+            job = None
+
+        if job is None:
+            _wake_event.wait(JOB_POLL_INTERVAL)
+            _wake_event.clear()
+            continue
+
+        run_job(job)
+
+
+def _monitor_loop():
+    while not _stop_event.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            _heartbeat()
+            _recover_stale()
+        except Exception as e:
+            print(f"⚠️ Job monitor error: {e}")
+
+
+def start_job_workers():
+    """Start the worker and heartbeat threads once per process"""
+    if _workers:
+        return
+
+    with _workers_lock:
+        if _workers:
+            return
+
+        ensure_job_schema()
+        _stop_event.clear()
+
+        threads = [
+            threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+            for i in range(JOB_WORKERS)
+        ]
+        threads.append(threading.Thread(target=_monitor_loop, name="job-monitor", daemon=True))
+
+        for thread in threads:
+            thread.start()
+
+        _workers.extend(threads)
+
+
+def stop_job_workers(timeout=5):
+    """Stop the threads after their current job; unfinished jobs are recovered as stale"""
+    with _workers_lock:
+        _stop_event.set()
+        _wake_event.set()
+        for thread in _workers:
+            thread.join(timeout=timeout)
+        _workers.clear()
@@ -0,0 +1,81 @@
+"""
+Order Confirmation
+sp_confirm_sales_order behind the deadlock-aware transaction runner
+
+The procedure locks the order's inventory rows in (product_id,
+location_id) order before the sales_items triggers touch them; what
+contention is left (lock waits, the odd deadlock on shared counters) is
+retried by run_transaction_with_retry. Invoice lines are copied at the
+order lines' final_amount, so promotions priced at order entry (see
+utils/promotion_engine) carry over unchanged, and the new invoice is
+queued for delivery dispatch (see utils/fulfillment_queue).
+
+Usage:
+    sale_id = confirm_sales_order(order_id, payment_method_id)
+"""
+
+import threading
+
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+from utils.db_helper import run_transaction_with_retry
+
+# Present only in the current version of the procedure (lock ordering, copied amounts, queueing)
+CONFIRM_MARKERS = ("cur_lock_inventory", "priced_sale_id", "fulfillment_queue")
+
+_procedure_ready = False
+_procedure_lock = threading.Lock()
+
+
+def ensure_confirm_procedure():
+    """Replace an outdated sp_confirm_sales_order, once per process"""
+    global _procedure_ready
+
+    if _procedure_ready:
+        return
+
+    with _procedure_lock:
+        if _procedure_ready:
+            return
+
+        from config.init_db import SQL_DIR, replace_procedures
+        from utils.fulfillment_queue import ensure_fulfillment_schema
+
+        ensure_database_ready()
+        ensure_fulfillment_schema()
+
+        with engine.connect() as conn:
+            definition = conn.execute(text("""
+                SELECT routine_definition
+                FROM information_schema.routines
+                WHERE routine_schema = DATABASE()
+                  AND routine_type = 'PROCEDURE'
+                  AND routine_name = 'sp_confirm_sales_order'
+            """)).scalar()
+
+        if definition is None or not all(marker in definition for marker in CONFIRM_MARKERS):
+            for name in replace_procedures(SQL_DIR / "07_stored_procedures.sql", ["sp_confirm_sales_order"]):
+                print(f"🔁 Replaced procedure {name}")
+
+        _procedure_ready = True
+
+
+def confirm_sales_order(order_id, payment_method_id):
+    """Confirm an OPEN order and return the new invoice's sale_id"""
+    from utils.order_pricing import ensure_pricing_triggers
+
+    ensure_confirm_procedure()
+    ensure_pricing_triggers()
+
+    def confirm(db):
+        db.execute(text("CALL sp_confirm_sales_order(:oid, :pmid)"), {
+            "oid": int(order_id),
+            "pmid": int(payment_method_id)
+        })
+
+        return db.execute(text("""
+            SELECT sale_id FROM sales WHERE order_id = :oid AND sale_type = 'INVOICE'
+        """), {"oid": int(order_id)}).scalar()
+
+    return run_transaction_with_retry(confirm)
@@ -0,0 +1,225 @@
+"""
+Order Pricing
+Batch pricing and insert path for sales_order_items
+
+trg_calculate_order_item_amount prices one row at a time (a products
+lookup and a promotions lookup per line) and sp_add_sales_order_item is
+called once per line. insert_order_lines() instead prices every line of
+one or more orders with a single JSON_TABLE join against products and
+promotions, computes final_amount in Python with the trigger's exact
+DECIMAL rounding, and writes all rows in one multi-row INSERT with the
+pricing trigger (and the per-row order header update) switched off.
+
+    final_amount = ROUND((price * qty - discount) * 1.10, 0), floored at 0
+    discount     = ROUND(base * percent / 100, 2) if percent > 0
+                   else discount_value             if value > 0
+                   (ACTIVE promotions only)
+
+check_order_pricing_parity.py compares both paths on randomized lines.
+Order entry passes amounts from utils/promotion_engine instead, which
+adds campaign windows and BUY_X_GET_Y on top of the same rounding.
+
+Usage:
+    with engine.begin() as conn:
+        insert_order_lines(conn, [OrderLine(order_id, product_id, 2, promotion_id)])
+"""
+
+import json
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Optional
+
+from sqlalchemy import bindparam, text
+
+from config.session import engine, ensure_database_ready
+
+VAT_MULTIPLIER = Decimal("1.10")
+CENT = Decimal("0.01")
+UNIT = Decimal("1")
+
+# Trigger -> marker present only in the versions that honour pre-priced rows
+PRICED_TRIGGERS = {
+    "trg_calculate_order_item_amount": "order_items_priced",
+    "trg_order_header_after_item_insert": "order_items_priced",
+    "trg_calculate_sale_item_amount": "priced_sale_id",
+}
+
+# One row per input line, in input order
+PRICING_SQL = text("""
+    SELECT
+        jt.line_no,
+        p.unit_price,
+        pr.discount_percent,
+        pr.discount_value
+    FROM JSON_TABLE(
+        :lines, '$[*]' COLUMNS (
+            line_no FOR ORDINALITY,
+            product_id INT PATH '$.product_id',
+            promotion_id INT PATH '$.promotion_id'
+        )
+    ) jt
+    LEFT JOIN products p ON p.product_id = jt.product_id
+    LEFT JOIN promotions pr
+        ON pr.promotion_id = jt.promotion_id
+        AND pr.status = 'ACTIVE'
+    ORDER BY jt.line_no
+""")
+
+# PyMySQL's executemany rewrites this into a single multi-row INSERT
+INSERT_SQL = text("""
+    INSERT INTO sales_order_items (
+        order_id, product_id, quantity, applied_promotion_id, final_amount
+    )
+    VALUES (:order_id, :product_id, :quantity, :promotion_id, :final_amount)
+""")
+
+HEADER_SQL = text("""
+    UPDATE sales_orders
+    SET item_count = item_count + :items,
+        total_amount = total_amount + :amount
+    WHERE order_id = :order_id
+""")
+
+_triggers_ready = False
+_triggers_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class OrderLine:
+    order_id: int
+    product_id: int
+    quantity: int
+    promotion_id: Optional[int] = None
+
+
+def _decimal(value):
+    return Decimal(str(value)) if value is not None else Decimal(0)
+
+
+def line_amount(unit_price, quantity, discount_percent=None, discount_value=None):
+    """final_amount of one line, with the same rounding as trg_calculate_order_item_amount"""
+    # DECIMAL(12,2) variables round half away from zero on assignment
+    base = (_decimal(unit_price) * int(quantity)).quantize(CENT, ROUND_HALF_UP)
+    percent = _decimal(discount_percent)
+    value = _decimal(discount_value)
+
+    discount = Decimal(0)
+    if percent > 0:
+        discount = (base * percent / 100).quantize(CENT, ROUND_HALF_UP)
+    elif value > 0:
+        discount = value.quantize(CENT, ROUND_HALF_UP)
+
+    final = ((base - discount) * VAT_MULTIPLIER).quantize(UNIT, ROUND_HALF_UP)
+    return max(final, Decimal(0)).quantize(CENT)
+
+
+def price_lines(conn, lines):
+    """final_amount for each line (same order), from one join against products and promotions"""
+    if not lines:
+        return []
+
+    payload = json.dumps([
+        {"product_id": int(line.product_id), "promotion_id": line.promotion_id and int(line.promotion_id)}
+        for line in lines
+    ])
+    rows = conn.execute(PRICING_SQL, {"lines": payload}).fetchall()
+
+    missing = sorted({lines[row.line_no - 1].product_id for row in rows if row.unit_price is None})
+    if missing:
+        raise ValueError(f"Product not found or has no price: {', '.join(map(str, missing))}")
+
+    return [
+        line_amount(row.unit_price, line.quantity, row.discount_percent, row.discount_value)
+        for line, row in zip(lines, rows)
+    ]
+
+
+@contextmanager
+def order_items_priced(conn):
+    """Skip the per-row pricing and header triggers for statements run on `conn`"""
+    conn.execute(text("SET @order_items_priced = 1"))
+    try:
+        yield
+    finally:
+        conn.execute(text("SET @order_items_priced = 0"))
+
+
+def insert_order_lines(conn, lines, amounts=None):
+    """
+    Price and insert lines of one or more orders on the caller's transaction
+
+    `amounts` (one final_amount per line) skips the pricing join, e.g.
+    for baskets already priced by the promotion engine. Returns the
+    final_amount of each line. Audit rows are still written by
+    trg_audit_order_item_insert.
+    """
+    lines = list(lines)
+    if not lines:
+        return []
+
+    ensure_pricing_triggers()
+
+    if amounts is None:
+        amounts = price_lines(conn, lines)
+    elif len(amounts) != len(lines):
+        raise ValueError("One amount per order line is required")
+    amounts = list(amounts)
+
+    headers = defaultdict(lambda: [0, Decimal(0)])
+    for line, amount in zip(lines, amounts):
+        headers[line.order_id][0] += 1
+        headers[line.order_id][1] += amount
+
+    with order_items_priced(conn):
+        conn.execute(INSERT_SQL, [
+            {
+                "order_id": int(line.order_id),
+                "product_id": int(line.product_id),
+                "quantity": int(line.quantity),
+                "promotion_id": line.promotion_id and int(line.promotion_id),
+                "final_amount": amount,
+            }
+            for line, amount in zip(lines, amounts)
+        ])
+
+        conn.execute(HEADER_SQL, [
+            {"order_id": int(order_id), "items": items, "amount": amount}
+            for order_id, (items, amount) in headers.items()
+        ])
+
+    return amounts
+
+
+def ensure_pricing_triggers():
+    """Replace pricing / header triggers that predate pre-priced rows, once per process"""
+    global _triggers_ready
+
+    if _triggers_ready:
+        return
+
+    with _triggers_lock:
+        if _triggers_ready:
+            return
+
+        from config.init_db import SQL_DIR, replace_triggers
+
+        ensure_database_ready()
+
+        with engine.connect() as conn:
+            outdated = [
+                name for name, statement in conn.execute(text("""
+                    SELECT trigger_name, action_statement
+                    FROM information_schema.triggers
+                    WHERE trigger_schema = DATABASE()
+                      AND trigger_name IN :names
+                """).bindparams(bindparam("names", expanding=True)), {"names": list(PRICED_TRIGGERS)})
+                if PRICED_TRIGGERS[name] not in statement
+            ]
+
+        for name in replace_triggers(SQL_DIR / "04_triggers.sql", outdated):
+            print(f"🔁 Replaced trigger {name}")
+
+        _triggers_ready = True
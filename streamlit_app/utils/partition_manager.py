@@ -0,0 +1,443 @@
+"""
+Partition Manager
+Monthly RANGE partitioning, pre-creation and retention for the
+append-only fact tables (sales, sales_items, inventory_history, audit_logs)
+
+Layout per table:
+    PARTITION BY RANGE (TO_DAYS(<date_column>)) (
+        PARTITION p202401 VALUES LESS THAN (TO_DAYS('2024-02-01')),
+        ...
+        PARTITION pmax    VALUES LESS THAN MAXVALUE
+    )
+
+Foreign keys: MySQL does not allow foreign keys on partitioned tables or
+referencing them. convert_table() installs the trigger-based checks in
+sql/09_partition_integrity.sql, verifies they exist and only then drops
+the affected constraints; init_db and maintain() reinstall missing ones
+while any table is partitioned.
+
+Retention: DROP/EXCHANGE PARTITION bypasses those triggers, so a
+partition is only expired when no row outside it still references it
+(EXPIRY_CHECKS); otherwise expiry of that table stops there.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+from config.init_db import SQL_DIR, run_missing_triggers
+
+INTEGRITY_SQL = SQL_DIR / "09_partition_integrity.sql"
+
+PARTITION_NAME = re.compile(r"^p(\d{4})(\d{2})$")
+
+# Created from INTEGRITY_SQL; all must exist before any FK is dropped
+INTEGRITY_TRIGGERS = [
+    "trg_fk_sales_before_insert",
+    "trg_fk_sales_before_delete",
+    "trg_fk_sales_items_before_insert",
+    "trg_fk_deliveries_before_insert",
+    "trg_fk_inventory_history_before_insert",
+]
+
+
+@dataclass(frozen=True)
+class PartitionPolicy:
+    """How one table is partitioned and expired"""
+    table: str
+    date_column: str
+    id_column: str
+    retention_months: int = None   # None keeps every partition
+    premake_months: int = 3        # future partitions kept ahead of today
+    action: str = "archive"        # 'archive' (exchange out) or 'drop'
+
+
+# sales and sales_items must share a retention horizon so that no
+# invoice outlives (or is outlived by) its lines
+PARTITION_POLICIES = {
+    "sales": PartitionPolicy("sales", "sale_date", "sale_id", retention_months=36),
+    "sales_items": PartitionPolicy("sales_items", "sale_date", "sale_item_id", retention_months=36),
+    "inventory_history": PartitionPolicy("inventory_history", "created_at", "history_id", retention_months=24),
+    "audit_logs": PartitionPolicy("audit_logs", "changed_at", "log_id", retention_months=24),
+}
+
+
+# Rows that would be left pointing into an expired partition, per table.
+# {partition} is the partition being expired, :upper its exclusive bound.
+EXPIRY_CHECKS = {
+    "sales": [
+        ("deliveries.sale_id", """
+            SELECT COUNT(*)
+            FROM deliveries d
+            JOIN sales PARTITION ({partition}) s ON s.sale_id = d.sale_id
+        """),
+        ("fulfillment_queue.sale_id", """
+            SELECT COUNT(*)
+            FROM fulfillment_queue q
+            JOIN sales PARTITION ({partition}) s ON s.sale_id = q.sale_id
+        """),
+        ("sales_orders.sale_id", """
+            SELECT COUNT(*)
+            FROM sales_orders so
+            JOIN sales PARTITION ({partition}) s ON s.sale_id = so.sale_id
+        """),
+        # Returns in later months pointing at an invoice of this one
+        ("sales.parent_sale_id", """
+            SELECT COUNT(*)
+            FROM sales r
+            JOIN sales PARTITION ({partition}) s ON s.sale_id = r.parent_sale_id
+            WHERE r.sale_date >= :upper
+        """),
+    ],
+    # Lines go only once their invoice header has gone
+    "sales_items": [
+        ("sales.sale_id", """
+            SELECT COUNT(*)
+            FROM sales_items PARTITION ({partition}) si
+            JOIN sales s ON s.sale_id = si.sale_id
+        """),
+    ],
+}
+
+
+# =====================================================
+# MONTH HELPERS
+# =====================================================
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def add_months(d, months):
+    index = d.year * 12 + (d.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def partition_clause(month):
+    upper = add_months(month, 1)
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{upper.isoformat()}'))"
+
+
+# =====================================================
+# INSPECTION
+# =====================================================
+
+def get_partitions(conn, table):
+    """Return [(partition_name, rows)] in partition order; [] if not partitioned"""
+    rows = conn.execute(text("""
+        SELECT partition_name, table_rows
+        FROM information_schema.partitions
+        WHERE table_schema = DATABASE()
+          AND table_name = :t
+          AND partition_name IS NOT NULL
+        ORDER BY partition_ordinal_position
+    """), {"t": table}).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+
+def get_foreign_keys(conn, table):
+    """Foreign keys declared on `table` or referencing it: [(owner_table, constraint)]"""
+    rows = conn.execute(text("""
+        SELECT table_name, constraint_name
+        FROM information_schema.referential_constraints
+        WHERE constraint_schema = DATABASE()
+          AND (table_name = :t OR referenced_table_name = :t)
+    """), {"t": table}).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+
+def monthly_partitions(conn, table):
+    """Months that currently have a pYYYYMM partition"""
+    months = []
+    for name, _ in get_partitions(conn, table):
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return months
+
+
+def missing_integrity_triggers(conn):
+    """INTEGRITY_TRIGGERS not installed in the database"""
+    existing = {
+        row[0] for row in conn.execute(text("""
+            SELECT trigger_name
+            FROM information_schema.triggers
+            WHERE trigger_schema = DATABASE()
+        """))
+    }
+    return [name for name in INTEGRITY_TRIGGERS if name not in existing]
+
+
+def partitioned_tables(conn):
+    return [table for table in PARTITION_POLICIES if get_partitions(conn, table)]
+
+
+def install_integrity_triggers(force=False):
+    """
+    Install the missing trigger-based reference checks; raises if any is
+    still missing afterwards. Without force, only while a table is partitioned.
+    """
+    with engine.connect() as conn:
+        if not force and not partitioned_tables(conn):
+            return []
+
+    created = run_missing_triggers(INTEGRITY_SQL, INTEGRITY_TRIGGERS)
+    for name in created:
+        print(f"➕ Created trigger {name}")
+
+    with engine.connect() as conn:
+        missing = missing_integrity_triggers(conn)
+    if missing:
+        raise RuntimeError(f"Partition integrity triggers missing: {', '.join(missing)}")
+
+    return created
+
+
+# =====================================================
+# CONVERSION
+# =====================================================
+
+def _table_exists(conn, table):
+    return conn.execute(text("""
+        SELECT COUNT(*)
+        FROM information_schema.tables
+        WHERE table_schema = DATABASE()
+          AND table_name = :t
+    """), {"t": table}).scalar() > 0
+
+
+def _column_exists(conn, table, column):
+    return conn.execute(text("""
+        SELECT COUNT(*)
+        FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+          AND table_name = :t
+          AND column_name = :c
+    """), {"t": table, "c": column}).scalar() > 0
+
+
+def convert_table(policy, today=None):
+    """
+    Convert one table to monthly RANGE partitions (no-op if already partitioned)
+
+    Steps: integrity triggers -> drop FKs -> partition key in PK -> partition
+    """
+    today = today or date.today()
+
+    with engine.connect() as conn:
+        if get_partitions(conn, policy.table):
+            print(f"⏭️ {policy.table} already partitioned")
+            return False
+
+    # 1. Trigger-based reference checks go in (and are verified) before the FKs come out
+    install_integrity_triggers(force=True)
+
+    with engine.begin() as conn:
+        # 2. Drop foreign keys on or into this table
+        for owner, constraint in get_foreign_keys(conn, policy.table):
+            conn.execute(text(f"ALTER TABLE {owner} DROP FOREIGN KEY {constraint}"))
+            print(f"➖ Dropped {owner}.{constraint}")
+
+        # sales_items.sale_date is copied from the header for older databases
+        if policy.table == "sales_items" and not _column_exists(conn, "sales_items", "sale_date"):
+            conn.execute(text("""
+                ALTER TABLE sales_items
+                ADD COLUMN sale_date DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+            """))
+            conn.execute(text("""
+                UPDATE sales_items si
+                JOIN sales s ON s.sale_id = si.sale_id
+                SET si.sale_date = s.sale_date
+            """))
+
+        # 3. The partition column must be part of every unique key
+        conn.execute(text(f"""
+            UPDATE {policy.table}
+            SET {policy.date_column} = CURRENT_TIMESTAMP
+            WHERE {policy.date_column} IS NULL
+        """))
+        conn.execute(text(f"""
+            ALTER TABLE {policy.table}
+            MODIFY {policy.date_column} DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            DROP PRIMARY KEY,
+            ADD PRIMARY KEY ({policy.id_column}, {policy.date_column})
+        """))
+
+        # 4. One partition per month from the oldest row to today + premake
+        oldest = conn.execute(text(f"SELECT MIN({policy.date_column}) FROM {policy.table}")).scalar()
+        first = month_start(oldest.date() if oldest else today)
+        last = add_months(month_start(today), policy.premake_months)
+
+        clauses = []
+        month = first
+        while month <= last:
+            clauses.append(partition_clause(month))
+            month = add_months(month, 1)
+        clauses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+        conn.execute(text(f"""
+            ALTER TABLE {policy.table}
+            PARTITION BY RANGE (TO_DAYS({policy.date_column})) (
+                {", ".join(clauses)}
+            )
+        """))
+
+    print(f"✅ {policy.table}: {len(clauses)} partitions")
+    return True
+
+
+# =====================================================
+# MAINTENANCE
+# =====================================================
+
+def premake_partitions(policy, today=None):
+    """Split pmax so partitions exist up to today + premake_months"""
+    today = today or date.today()
+    target = add_months(month_start(today), policy.premake_months)
+
+    with engine.begin() as conn:
+        months = monthly_partitions(conn, policy.table)
+        if not months:
+            return []
+
+        new_months = []
+        month = add_months(max(months), 1)
+        while month <= target:
+            new_months.append(month)
+            month = add_months(month, 1)
+
+        if not new_months:
+            return []
+
+        clauses = [partition_clause(m) for m in new_months]
+        clauses.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+        conn.execute(text(f"""
+            ALTER TABLE {policy.table}
+            REORGANIZE PARTITION pmax INTO (
+                {", ".join(clauses)}
+            )
+        """))
+
+    names = [partition_name(m) for m in new_months]
+    print(f"➕ {policy.table}: created {', '.join(names)}")
+    return names
+
+
+def expire_partitions(policy, today=None, dry_run=False):
+    """
+    Archive or drop partitions older than the retention window
+
+    'archive' swaps the partition out into <table>_archive_<yyyymm> with
+    EXCHANGE PARTITION (metadata only) and then drops the empty partition.
+    A partition still referenced from outside (EXPIRY_CHECKS) is kept,
+    and so is every newer one.
+    """
+    if policy.retention_months is None:
+        return []
+
+    today = today or date.today()
+    cutoff = add_months(month_start(today), -policy.retention_months)
+    expired = []
+
+    with engine.begin() as conn:
+        months = monthly_partitions(conn, policy.table)
+
+        # Always keep at least one monthly partition in the table
+        for month in sorted(months)[:-1]:
+            if month >= cutoff:
+                break
+
+            name = partition_name(month)
+
+            blocking = expiry_blockers(conn, policy.table, month)
+            if blocking:
+                print(f"⚠️ {policy.table}.{name} kept: still referenced by "
+                      + ", ".join(f"{count:,} {label}" for label, count in blocking))
+                break
+
+            expired.append(name)
+
+            if dry_run:
+                continue
+
+            if policy.action == "archive":
+                archive = f"{policy.table}_archive_{name[1:]}"
+
+                # EXCHANGE swaps contents, so the archive must be new and empty
+                if _table_exists(conn, archive):
+                    print(f"⚠️ {archive} already exists - skipping {policy.table}.{name}")
+                    expired.pop()
+                    continue
+
+                conn.execute(text(f"CREATE TABLE {archive} LIKE {policy.table}"))
+                conn.execute(text(f"ALTER TABLE {archive} REMOVE PARTITIONING"))
+                conn.execute(text(f"""
+                    ALTER TABLE {policy.table}
+                    EXCHANGE PARTITION {name} WITH TABLE {archive}
+                """))
+                print(f"📦 {policy.table}.{name} -> {archive}")
+
+            conn.execute(text(f"ALTER TABLE {policy.table} DROP PARTITION {name}"))
+            print(f"🗑️ {policy.table}.{name} dropped")
+
+    return expired
+
+
+def expiry_blockers(conn, table, month):
+    """[(reference, rows)] still pointing into the partition of `month`"""
+    blocking = []
+    for label, sql in EXPIRY_CHECKS.get(table, []):
+        count = conn.execute(
+            text(sql.format(partition=partition_name(month))),
+            {"upper": add_months(month, 1)}
+        ).scalar()
+        if count:
+            blocking.append((label, count))
+    return blocking
+
+
+def maintain(tables=None, today=None, dry_run=False):
+    """Premake future partitions and apply retention for every partitioned table"""
+    ensure_database_ready()
+    report = {}
+
+    # The FKs of partitioned tables are gone; their checks must be in place
+    if not dry_run:
+        install_integrity_triggers()
+
+    for table in tables or PARTITION_POLICIES:
+        policy = PARTITION_POLICIES[table]
+
+        with engine.connect() as conn:
+            if not get_partitions(conn, table):
+                report[table] = {"partitioned": False}
+                continue
+
+        report[table] = {
+            "partitioned": True,
+            "created": [] if dry_run else premake_partitions(policy, today),
+            "expired": expire_partitions(policy, today, dry_run),
+        }
+
+    return report
+
+
+def convert_all(tables=None, today=None):
+    """Convert the configured tables; sales goes before sales_items"""
+    ensure_database_ready()
+    return {table: convert_table(PARTITION_POLICIES[table], today) for table in tables or PARTITION_POLICIES}
+
+
+def status(tables=None):
+    """Partition names and approximate row counts per table"""
+    ensure_database_ready()
+
+    with engine.connect() as conn:
+        return {table: get_partitions(conn, table) for table in tables or PARTITION_POLICIES}
@@ -0,0 +1,420 @@
+"""
+Promotion Engine
+Active promotion resolution and whole-basket pricing for sales orders
+
+A PromotionCatalog is an immutable snapshot of every promotion (with its
+campaign window) and every product price as NumPy arrays. Campaign
+validity goes through an elementary-interval index, so resolving the
+promotions live on a day is one searchsorted() instead of a status /
+date filter per lookup, and pricing a basket - or every line of every
+OPEN order - is a handful of array operations.
+
+Line semantics (per order):
+    BUY_X_GET_Y    each buy_quantity units of buy_product in the order make
+                   get_quantity units of get_product free, capped at the
+                   get_product units ordered (same product: a full set is
+                   buy + get units). The deal applies once per order when
+                   any of its lines carries the promotion.
+    PERCENT/FIXED  the trigger's discount, on the units still paid for
+    final_amount = ROUND((paid base - discount) * 1.10, 0), floored at 0
+Promotions that are EXPIRED or outside their campaign window price as no
+promotion. Without BUY_X_GET_Y and inside the windows the result equals
+utils/order_pricing.line_amount to the cent.
+
+The catalog is rebuilt when the products or promotions reference
+snapshot changes version (see utils/reference_data).
+
+Usage:
+    catalog = get_promotion_catalog()
+    promotions_df = catalog.active_promotions()
+    amounts = catalog.price_lines([OrderLine(order_id, product_id, 3, promotion_id)])
+"""
+
+import os
+import threading
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from config.session import engine, ensure_database_ready
+from utils.order_pricing import CENT, ensure_pricing_triggers
+from utils.reference_data import get_reference_store
+
+BUY_X_GET_Y = "BUY_X_GET_Y"
+
+# Open campaign bounds (day numbers); far enough apart that end + 1 cannot overflow
+OPEN_START = -(2 ** 40)
+OPEN_END = 2 ** 40
+
+# Reference snapshots whose versions key the catalog
+CATALOG_SOURCES = ("products", "promotions")
+
+# OPEN orders per repricing transaction
+REPRICE_BATCH_ORDERS = int(os.getenv("REPRICE_BATCH_ORDERS", "500"))
+
+PRODUCTS_SQL = text("""
+    SELECT product_id, unit_price
+    FROM products
+    WHERE unit_price IS NOT NULL
+    ORDER BY product_id
+""")
+
+PROMOTIONS_SQL = text("""
+    SELECT
+        p.promotion_id,
+        p.promotion_code,
+        p.rule_type,
+        p.status,
+        p.discount_percent,
+        p.discount_value,
+        p.buy_product_id,
+        p.buy_quantity,
+        p.get_product_id,
+        p.get_quantity,
+        pc.campaign_name,
+        pc.start_date,
+        pc.end_date
+    FROM promotions p
+    LEFT JOIN promotions_campaigns pc ON p.campaign_id = pc.campaign_id
+    ORDER BY p.promotion_id
+""")
+
+LOCK_ORDERS_SQL = text("""
+    SELECT order_id
+    FROM sales_orders
+    WHERE order_id IN :ids
+      AND order_status = 'OPEN'
+    ORDER BY order_id
+    FOR UPDATE
+""").bindparams(bindparam("ids", expanding=True))
+
+ORDER_LINES_SQL = text("""
+    SELECT
+        order_item_id,
+        order_id,
+        product_id,
+        quantity,
+        applied_promotion_id,
+        final_amount AS current_amount
+    FROM sales_order_items
+    WHERE order_id IN :ids
+    ORDER BY order_id, order_item_id
+""").bindparams(bindparam("ids", expanding=True))
+
+UPDATE_LINE_SQL = text("""
+    UPDATE sales_order_items
+    SET final_amount = :amount
+    WHERE order_item_id = :order_item_id
+""")
+
+UPDATE_HEADERS_SQL = text("""
+    UPDATE sales_orders so
+    JOIN (
+        SELECT order_id, SUM(final_amount) AS total_amount
+        FROM sales_order_items
+        WHERE order_id IN :ids
+        GROUP BY order_id
+    ) t ON t.order_id = so.order_id
+    SET so.total_amount = t.total_amount
+""").bindparams(bindparam("ids", expanding=True))
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def _day(on_date):
+    return (on_date or date.today()).toordinal()
+
+
+def _hundredths(values):
+    """DECIMAL(x,2) values as exact integer hundredths (NULL -> 0)"""
+    return np.array([int(Decimal(str(v)) * 100) if v is not None else 0 for v in values], dtype=np.int64)
+
+
+def _ints(values):
+    return np.array([int(v) if v is not None else 0 for v in values], dtype=np.int64)
+
+
+def _round_div(numerator, denominator):
+    """Non-negative integer division rounded half away from zero (MySQL DECIMAL rounding)"""
+    return (numerator + denominator // 2) // denominator
+
+
+def _lookup(sorted_ids, ids):
+    """Positions of ids in sorted_ids and whether each was found"""
+    if not len(sorted_ids):
+        return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=bool)
+
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return positions, sorted_ids[positions] == ids
+
+
+class PromotionIntervals:
+    """
+    Elementary-interval index over campaign windows
+
+    The sorted start / end+1 boundaries of all windows cut the day axis
+    into segments inside which the set of live promotions is constant; a
+    day's segment is one searchsorted() away and its mask is built once.
+    """
+
+    def __init__(self, start_days, end_days, live):
+        self.start_days = start_days
+        self.end_days = end_days
+        self.live = live
+        self.bounds = np.unique(np.concatenate([start_days, end_days + 1]))
+        # Segment i covers [bounds[i-1], bounds[i]); segment 0 precedes every window
+        self.lows = np.concatenate([[OPEN_START - 1], self.bounds])
+        self._masks = {}
+
+    def active(self, day):
+        """Boolean mask over the catalog's promotions live on a day number"""
+        segment = int(np.searchsorted(self.bounds, day, side="right"))
+        mask = self._masks.get(segment)
+        if mask is None:
+            low = self.lows[segment]
+            mask = self.live & (self.start_days <= low) & (self.end_days >= low)
+            mask.setflags(write=False)
+            self._masks[segment] = mask
+        return mask
+
+
+class PromotionCatalog:
+    """Immutable products / promotions snapshot with vectorized basket pricing"""
+
+    def __init__(self, key, products, promotions):
+        self.key = key
+
+        self.product_ids = _ints(row.product_id for row in products)
+        self.price_cents = _hundredths(row.unit_price for row in products)
+
+        self.promotions = pd.DataFrame(
+            [(row.promotion_id, row.promotion_code, row.rule_type, row.campaign_name) for row in promotions],
+            columns=["promotion_id", "promotion_code", "rule_type", "campaign_name"]
+        )
+        self.promotion_ids = _ints(row.promotion_id for row in promotions)
+        self.bogo = np.array([row.rule_type == BUY_X_GET_Y for row in promotions], dtype=bool)
+        self.percent = _hundredths(row.discount_percent for row in promotions)
+        self.value_cents = _hundredths(row.discount_value for row in promotions)
+        self.buy_product = _ints(row.buy_product_id for row in promotions)
+        self.buy_quantity = _ints(row.buy_quantity for row in promotions)
+        self.get_product = _ints(row.get_product_id for row in promotions)
+        self.get_quantity = _ints(row.get_quantity for row in promotions)
+
+        self.intervals = PromotionIntervals(
+            np.array([r.start_date.toordinal() if r.start_date else OPEN_START for r in promotions], dtype=np.int64),
+            np.array([r.end_date.toordinal() if r.end_date else OPEN_END for r in promotions], dtype=np.int64),
+            np.array([row.status == "ACTIVE" for row in promotions], dtype=bool),
+        )
+
+    def active_promotions(self, on_date=None):
+        """Promotions usable on a date (default today), ordered by code"""
+        mask = self.intervals.active(_day(on_date))
+        return self.promotions[mask].sort_values("promotion_code").reset_index(drop=True)
+
+    def price_lines(self, lines, on_date=None):
+        """final_amount (Decimal) of each OrderLine, same order; orders are told apart by order_id"""
+        lines = list(lines)
+        if not lines:
+            return []
+
+        final, _ = self._price(
+            _ints(line.order_id for line in lines),
+            _ints(line.product_id for line in lines),
+            _ints(line.quantity for line in lines),
+            _ints(line.promotion_id for line in lines),
+            _day(on_date),
+        )
+        return [Decimal(int(amount)).quantize(CENT) for amount in final]
+
+    def price_frame(self, lines, on_date=None):
+        """
+        Price a DataFrame of order_id / product_id / quantity /
+        applied_promotion_id rows; returns a copy with free_units and
+        final_amount
+        """
+        if lines.empty:
+            return lines.assign(free_units=pd.Series(dtype="int64"), final_amount=pd.Series(dtype="object"))
+
+        final, free = self._price(
+            _ints(lines["order_id"]),
+            _ints(lines["product_id"]),
+            _ints(lines["quantity"]),
+            _ints(None if pd.isna(v) else v for v in lines["applied_promotion_id"]),
+            _day(on_date),
+        )
+        return lines.assign(
+            free_units=free,
+            final_amount=[Decimal(int(amount)).quantize(CENT) for amount in final],
+        )
+
+    def _price(self, orders, products, quantities, promotion_ids, day):
+        """Final amounts in whole VND and free units per line"""
+        positions, found = _lookup(self.product_ids, products)
+        if not found.all():
+            missing = sorted(set(products[~found].tolist()))
+            raise ValueError(f"Product not found or has no price: {', '.join(map(str, missing))}")
+
+        price = self.price_cents[positions]
+
+        promo, live = _lookup(self.promotion_ids, promotion_ids)
+        percent = value = np.zeros(len(products), dtype=np.int64)
+        bogo = np.zeros(len(products), dtype=bool)
+
+        if len(self.promotion_ids):
+            live &= self.intervals.active(day)[promo]
+            bogo = live & self.bogo[promo]
+            simple = live & ~bogo
+            percent = np.where(simple, self.percent[promo], 0)
+            value = np.where(simple, self.value_cents[promo], 0)
+
+        free = self._free_units(orders, products, quantities, orders[bogo], promo[bogo])
+        paid = price * (quantities - free)
+
+        discount = np.where(
+            percent > 0,
+            _round_div(paid * percent, 10_000),
+            np.where(value > 0, value, 0)
+        )
+
+        # Cents * 1.10 -> whole VND
+        final = _round_div(np.maximum(paid - discount, 0) * 11, 1_000)
+        return final, free
+
+    def _free_units(self, orders, products, quantities, deal_orders, deal_promos):
+        """Units made free by the BUY_X_GET_Y deals of each order"""
+        free = np.zeros(len(orders), dtype=np.int64)
+        if not len(deal_promos):
+            return free
+
+        lines = pd.DataFrame({"order_id": orders, "product_id": products, "quantity": quantities})
+        ordered = lines.groupby(["order_id", "product_id"])["quantity"].sum()
+
+        deals = pd.DataFrame({"order_id": deal_orders, "promo": deal_promos}).drop_duplicates()
+        promo = deals["promo"].to_numpy()
+        deals = deals.assign(
+            buy_product=self.buy_product[promo],
+            buy_quantity=self.buy_quantity[promo],
+            get_product=self.get_product[promo],
+            get_quantity=self.get_quantity[promo],
+        )
+        deals = deals[(deals["buy_quantity"] > 0) & (deals["get_quantity"] > 0)]
+        if deals.empty:
+            return free
+
+        def ordered_units(product_col):
+            keys = pd.MultiIndex.from_arrays([deals["order_id"], deals[product_col]])
+            return ordered.reindex(keys, fill_value=0).to_numpy()
+
+        bought = ordered_units("buy_product")
+        available = ordered_units("get_product")
+        buy_qty = deals["buy_quantity"].to_numpy()
+        get_qty = deals["get_quantity"].to_numpy()
+
+        deals = deals.assign(free=np.where(
+            deals["buy_product"].to_numpy() == deals["get_product"].to_numpy(),
+            bought // (buy_qty + get_qty) * get_qty,
+            np.minimum(available, bought // buy_qty * get_qty)
+        ))
+        granted = deals.groupby(["order_id", "get_product"])["free"].sum()
+
+        # Hand the free units to the order's get_product lines in line order
+        line_keys = pd.MultiIndex.from_arrays([orders, products])
+        line_granted = granted.reindex(line_keys, fill_value=0).to_numpy()
+        before = lines.groupby(["order_id", "product_id"])["quantity"].cumsum().to_numpy() - quantities
+        return np.clip(line_granted - before, 0, quantities)
+
+
+def load_catalog(key=None):
+    ensure_database_ready()
+
+    with engine.connect() as conn:
+        products = conn.execute(PRODUCTS_SQL).fetchall()
+        promotions = conn.execute(PROMOTIONS_SQL).fetchall()
+
+    return PromotionCatalog(key, products, promotions)
+
+
+def get_promotion_catalog():
+    """Process-wide catalog, rebuilt when the products or promotions snapshot changes"""
+    global _catalog
+
+    store = get_reference_store()
+    for name in CATALOG_SOURCES:
+        # Runs the reference change probe when due
+        store.get(name)
+    versions = store.versions()
+    key = tuple(versions[name] for name in CATALOG_SOURCES)
+
+    catalog = _catalog
+    if catalog is None or catalog.key != key:
+        with _catalog_lock:
+            if _catalog is None or _catalog.key != key:
+                _catalog = load_catalog(key)
+            catalog = _catalog
+    return catalog
+
+
+# =====================================================
+# BATCH REPRICING
+# =====================================================
+
+def reprice_open_orders(on_date=None, progress=None):
+    """
+    Re-price the lines of every OPEN order against the promotions live on
+    a date (default today), e.g. after a campaign ends or a BUY_X_GET_Y
+    rule is added
+
+    Orders go REPRICE_BATCH_ORDERS at a time, each batch in its own
+    transaction with its orders locked so a concurrent confirmation
+    either sees the old amounts or waits for the new ones.
+    progress(done, total) is called between batches.
+    """
+    ensure_database_ready()
+    ensure_pricing_triggers()
+
+    catalog = get_promotion_catalog()
+
+    with engine.connect() as conn:
+        order_ids = [row[0] for row in conn.execute(text("""
+            SELECT order_id FROM sales_orders WHERE order_status = 'OPEN' ORDER BY order_id
+        """))]
+
+    orders_changed = 0
+    lines_changed = 0
+
+    for start in range(0, len(order_ids), REPRICE_BATCH_ORDERS):
+        if progress:
+            progress(start, len(order_ids))
+
+        with engine.begin() as conn:
+            locked = [row[0] for row in conn.execute(LOCK_ORDERS_SQL, {
+                "ids": order_ids[start:start + REPRICE_BATCH_ORDERS]
+            })]
+            if not locked:
+                continue
+
+            result = conn.execute(ORDER_LINES_SQL, {"ids": locked})
+            lines = pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+            priced = catalog.price_frame(lines, on_date)
+            changed = priced[priced["final_amount"] != priced["current_amount"]]
+            if changed.empty:
+                continue
+
+            conn.execute(UPDATE_LINE_SQL, [
+                {"order_item_id": int(row.order_item_id), "amount": row.final_amount}
+                for row in changed.itertuples(index=False)
+            ])
+            conn.execute(UPDATE_HEADERS_SQL, {"ids": [int(i) for i in changed["order_id"].unique()]})
+
+        orders_changed += changed["order_id"].nunique()
+        lines_changed += len(changed)
+
+    if progress:
+        progress(len(order_ids), len(order_ids))
+
+    return {"orders": len(order_ids), "orders_changed": orders_changed, "lines_changed": lines_changed}
@@ -0,0 +1,202 @@
+"""
+Query Metrics
+Counts the SQL statements each part of a page executes, per interaction
+
+Every statement run through the engine is counted against the scopes
+open on the current thread. app.py measures the whole page; sections
+declared with metered_fragment() are st.fragment's that measure
+themselves. A widget inside a fragment only reruns that fragment, so
+the log shows per interaction which sections ran and how many queries
+each one executed:
+
+    #12  page 📦 Products            9 queries   (product_list 3, inventory_table 3, low_stock 1)
+    #13  inventory_table             3 queries
+
+Statements run by other threads (background jobs, the audit writer)
+are not counted, except where the caller hands its scopes over:
+run_report_specs re-enters them on its query workers with
+carry_meters().
+
+Usage:
+    @metered_fragment("inventory_table")
+    def show_inventory_table():
+        ...
+
+    with measure(f"page {page}"):
+        products.show()
+    show_query_metrics()
+"""
+
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import streamlit as st
+from sqlalchemy import event
+
+from config.session import engine
+
+SHOW_QUERY_METRICS = os.getenv("SHOW_QUERY_METRICS", "1") == "1"
+QUERY_METRICS_PRINT = os.getenv("QUERY_METRICS_PRINT", "0") == "1"
+QUERY_METRICS_LOG_SIZE = int(os.getenv("QUERY_METRICS_LOG_SIZE", "20"))
+
+_local = threading.local()
+# Report workers add to the same meters as the script thread
+_count_lock = threading.Lock()
+
+
+@dataclass
+class QueryMeter:
+    """Statements executed while one scope was open"""
+    scope: str
+    queries: int = 0
+    sql_seconds: float = 0.0
+    seconds: float = 0.0
+    sections: list = field(default_factory=list)
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def caption(self):
+        return f"🔎 {self.scope}: {self.queries} queries · {self.sql_seconds * 1000:,.0f} ms SQL · {self.seconds * 1000:,.0f} ms total"
+
+
+def _open_meters():
+    return getattr(_local, "meters", ())
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _open_meters():
+        conn.info["query_metrics_started"] = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    meters = _open_meters()
+    if not meters:
+        return
+
+    started = conn.info.pop("query_metrics_started", None)
+    elapsed = time.perf_counter() - started if started is not None else 0.0
+
+    with _count_lock:
+        for meter in meters:
+            meter.queries += 1
+            meter.sql_seconds += elapsed
+
+
+# =====================================================
+# SCOPES
+# =====================================================
+
+@contextmanager
+def measure(scope):
+    """
+    Count the statements executed inside the block
+
+    Scopes nest: a statement counts for every open scope, and a scope
+    closed inside another one is listed as a section of it. The
+    outermost scope of a run is one interaction in the session's log.
+    """
+    meter = QueryMeter(scope)
+    parents = _open_meters()
+    _local.meters = parents + (meter,)
+
+    try:
+        yield meter
+    finally:
+        _local.meters = parents
+        meter.seconds = time.perf_counter() - meter._started
+
+        if parents:
+            parents[-1].sections.append(meter)
+        else:
+            _record(meter)
+
+
+def current_meters():
+    """Scopes open on this thread, to hand to a worker thread"""
+    return _open_meters()
+
+
+@contextmanager
+def carry_meters(meters):
+    """Count a worker thread's statements against scopes opened on another thread"""
+    previous = _open_meters()
+    _local.meters = tuple(meters)
+
+    try:
+        yield
+    finally:
+        _local.meters = previous
+
+
+def _record(meter):
+    """Append a finished interaction to the session's log"""
+    log = st.session_state.setdefault("query_metrics_log", deque(maxlen=QUERY_METRICS_LOG_SIZE))
+    number = st.session_state.get("query_metrics_count", 0) + 1
+    st.session_state["query_metrics_count"] = number
+    log.append((number, meter))
+
+    if QUERY_METRICS_PRINT:
+        sections = ", ".join(f"{s.scope} {s.queries}" for s in meter.sections)
+        print(f"🔎 #{number} {meter.scope}: {meter.queries} queries in {meter.seconds * 1000:,.0f} ms"
+              + (f" ({sections})" if sections else ""))
+
+
+def metered_fragment(scope, run_every=None):
+    """
+    st.fragment that measures itself
+
+    A widget inside the section reruns only this function; the caption
+    under it shows the queries of its last run.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def section(*args, **kwargs):
+            with measure(scope) as meter:
+                result = func(*args, **kwargs)
+
+            if SHOW_QUERY_METRICS:
+                st.caption(meter.caption())
+            return result
+
+        return st.fragment(section, run_every=run_every)
+
+    return decorator
+
+
+# =====================================================
+# PANEL
+# =====================================================
+
+def show_query_metrics():
+    """
+    Sidebar log of the last interactions and their query counts
+
+    Drawn on full reruns only; fragment reruns show up here on the next
+    one (their own caption is current).
+    """
+    if not SHOW_QUERY_METRICS:
+        return
+
+    log = st.session_state.get("query_metrics_log")
+    if not log:
+        return
+
+    with st.sidebar:
+        with st.expander("🔎 Queries per interaction", expanded=False):
+            rows = []
+            for number, meter in reversed(log):
+                rows.append({
+                    "#": number,
+                    "Ran": meter.scope,
+                    "Queries": meter.queries,
+                    "SQL ms": round(meter.sql_seconds * 1000),
+                    "Sections": ", ".join(f"{s.scope} {s.queries}" for s in meter.sections)
+                })
+
+            st.dataframe(rows, use_container_width=True, hide_index=True)
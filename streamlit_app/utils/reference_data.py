@@ -0,0 +1,324 @@
+"""
+Reference Data
+Process-wide, versioned snapshots of the small dimension tables behind
+the order-entry and dispatch dropdowns (employees, stores, products,
+promotions, payment methods, delivery vehicles and vendors)
+
+Each table is loaded once into an immutable ReferenceTable and carries a
+version. A version changes when
+    - a write path in this process calls invalidate_reference(name), or
+    - the probe (one UNION query, at most every REFERENCE_PROBE_SECONDS)
+      sees a different signature: COUNT / MAX(id) / MAX(last_modified)
+      where the table has last_modified, a CRC32 fold of the dropdown
+      columns where it does not
+so form reruns read memory only, and writes from other processes show up
+within one probe interval.
+
+Usage:
+    employees = get_reference("employees")
+    names = employees.labels(role=("Staff", "Manager"))
+    employee_id = employees.id_for(name)
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from types import MappingProxyType
+
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+
+REFERENCE_PROBE_SECONDS = float(os.getenv("REFERENCE_PROBE_SECONDS", "30"))
+
+
+@dataclass(frozen=True)
+class ReferenceSource:
+    """How to load one reference table and how to detect that it changed"""
+    load_sql: str
+    signature_sql: str
+    # Loaded rows depend on today's date (campaign windows)
+    daily: bool = False
+
+
+# Rows are (id, label, *extra columns); labels are what the dropdowns show
+REFERENCE_SOURCES = {
+    "employees": ReferenceSource(
+        load_sql="""
+            SELECT employee_id, CONCAT(first_name, ' ', last_name) AS employee_name, role
+            FROM employees
+            WHERE is_inactive = 0
+            ORDER BY first_name, last_name
+        """,
+        signature_sql="""
+            SELECT CONCAT_WS(':', COUNT(*), MAX(employee_id), MAX(last_modified)) FROM employees
+        """,
+    ),
+    "stores": ReferenceSource(
+        load_sql="""
+            SELECT location_id, location_name, region
+            FROM locations
+            WHERE location_type = 'STORE' AND close_date IS NULL
+            ORDER BY location_name
+        """,
+        signature_sql="""
+            SELECT CONCAT_WS(':', COUNT(*), BIT_XOR(CRC32(CONCAT_WS('|',
+                location_id, location_name, location_type, region, close_date))))
+            FROM locations
+        """,
+    ),
+    "products": ReferenceSource(
+        load_sql="""
+            SELECT product_id, product_name, unit_price
+            FROM products
+            WHERE status = 'ACTIVE'
+            ORDER BY product_name
+        """,
+        signature_sql="""
+            SELECT CONCAT_WS(':', COUNT(*), MAX(product_id), MAX(last_modified)) FROM products
+        """,
+    ),
+    "promotions": ReferenceSource(
+        load_sql="""
+            SELECT
+                p.promotion_id,
+                p.promotion_code,
+                p.discount_percent,
+                p.discount_value,
+                pc.campaign_name
+            FROM promotions p
+            LEFT JOIN promotions_campaigns pc ON p.campaign_id = pc.campaign_id
+            WHERE p.status = 'ACTIVE'
+              AND (pc.start_date IS NULL OR pc.start_date <= CURDATE())
+              AND (pc.end_date IS NULL OR pc.end_date >= CURDATE())
+            ORDER BY p.promotion_code
+        """,
+        signature_sql="""
+            SELECT CONCAT_WS(':',
+                (SELECT CONCAT_WS(':', COUNT(*), BIT_XOR(CRC32(CONCAT_WS('|',
+                    promotion_id, promotion_code, status, rule_type, discount_percent, discount_value,
+                    buy_product_id, buy_quantity, get_product_id, get_quantity, campaign_id))))
+                 FROM promotions),
+                (SELECT CONCAT_WS(':', COUNT(*), BIT_XOR(CRC32(CONCAT_WS('|',
+                    campaign_id, campaign_name, start_date, end_date))))
+                 FROM promotions_campaigns))
+        """,
+        daily=True,
+    ),
+    "payment_methods": ReferenceSource(
+        load_sql="""
+            SELECT payment_method_id, method_name
+            FROM payment_methods
+            ORDER BY method_name
+        """,
+        signature_sql="""
+            SELECT CONCAT_WS(':', COUNT(*), BIT_XOR(CRC32(CONCAT_WS('|', payment_method_id, method_name))))
+            FROM payment_methods
+        """,
+    ),
+    "delivery_vehicles": ReferenceSource(
+        load_sql="""
+            SELECT vehicle_id, plate_number, capacity
+            FROM delivery_vehicles
+            ORDER BY plate_number
+        """,
+        signature_sql="""
+            SELECT CONCAT_WS(':', COUNT(*), MAX(vehicle_id), MAX(last_modified)) FROM delivery_vehicles
+        """,
+    ),
+    "delivery_vendors": ReferenceSource(
+        load_sql="""
+            SELECT vendor_id, vendor_name
+            FROM delivery_vendors
+            ORDER BY vendor_name
+        """,
+        signature_sql="""
+            SELECT CONCAT_WS(':', COUNT(*), BIT_XOR(CRC32(CONCAT_WS('|', vendor_id, vendor_name))))
+            FROM delivery_vendors
+        """,
+    ),
+}
+
+_store = None
+_store_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ReferenceTable:
+    """Immutable snapshot of one reference table"""
+    name: str
+    version: int
+    columns: tuple
+    rows: tuple
+    loaded_on: date
+    _index: MappingProxyType = field(repr=False, compare=False)
+
+    @classmethod
+    def build(cls, name, version, columns, rows):
+        rows = tuple(tuple(row) for row in rows)
+        return cls(
+            name=name,
+            version=version,
+            columns=tuple(columns),
+            rows=rows,
+            loaded_on=date.today(),
+            _index=MappingProxyType({row[1]: row[0] for row in rows}),
+        )
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def empty(self):
+        return not self.rows
+
+    def _matching(self, filters):
+        if not filters:
+            return self.rows
+
+        positions = {self.columns.index(col): values for col, values in filters.items()}
+        return tuple(
+            row for row in self.rows
+            if all(row[pos] in (values if isinstance(values, (tuple, list, set)) else (values,))
+                   for pos, values in positions.items())
+        )
+
+    def labels(self, **filters):
+        """Dropdown labels, optionally filtered: labels(role=("Staff", "Manager"))"""
+        return [row[1] for row in self._matching(filters)]
+
+    def id_for(self, label):
+        return self._index.get(label)
+
+    def frame(self, **filters):
+        """A DataFrame copy of the (filtered) rows"""
+        import pandas as pd
+        return pd.DataFrame(list(self._matching(filters)), columns=list(self.columns))
+
+
+class ReferenceStore:
+    """
+    Versioned reference tables with a rate-limited change probe (thread-safe)
+
+    The store lock only guards the in-memory state. The probe runs on one
+    caller at a time while the others read the current snapshots, and a
+    reload only holds that table's load lock, so no dropdown waits on
+    another table's round trip.
+    """
+
+    def __init__(self, sources=REFERENCE_SOURCES, probe_seconds=REFERENCE_PROBE_SECONDS):
+        self.sources = sources
+        self.probe_seconds = probe_seconds
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in sources}
+        self._tables = {}
+        self._signatures = {}
+        self._versions = dict.fromkeys(sources, 0)
+        self._stale = set(sources)
+        self._probed_at = 0.0
+        self._probing = False
+
+    def get(self, name):
+        self._probe_if_due()
+
+        with self._lock:
+            table = self._tables.get(name)
+            if not self._needs_load(name, table):
+                return table
+
+        # Callers of the same table wait for one load; a local write
+        # still reads its own change
+        with self._load_locks[name]:
+            with self._lock:
+                table = self._tables.get(name)
+                if not self._needs_load(name, table):
+                    return table
+                # An invalidate() during the load marks it stale again
+                self._stale.discard(name)
+                version = self._versions[name]
+
+            try:
+                table = self._load(name, version)
+            except Exception:
+                with self._lock:
+                    self._stale.add(name)
+                raise
+
+            with self._lock:
+                self._tables[name] = table
+            return table
+
+    def invalidate(self, *names):
+        """Mark tables changed by a local write; they reload on next access"""
+        with self._lock:
+            for name in names or self.sources:
+                self._versions[name] += 1
+                self._stale.add(name)
+
+    def versions(self):
+        with self._lock:
+            return dict(self._versions)
+
+    def _needs_load(self, name, table):
+        """Caller holds self._lock"""
+        if table is None or name in self._stale:
+            return True
+        return self.sources[name].daily and table.loaded_on != date.today()
+
+    def _probe_if_due(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._probing or now - self._probed_at < self.probe_seconds:
+                return
+            self._probing = True
+
+        try:
+            ensure_database_ready()
+
+            sql = "\nUNION ALL\n".join(
+                f"SELECT '{name}' AS table_name, ({source.signature_sql.strip()}) AS signature"
+                for name, source in self.sources.items()
+            )
+            with engine.connect() as conn:
+                signatures = dict(conn.execute(text(sql)).fetchall())
+
+            with self._lock:
+                for name, signature in signatures.items():
+                    if name in self._signatures and self._signatures[name] != signature:
+                        self._versions[name] += 1
+                        self._stale.add(name)
+                    self._signatures[name] = signature
+
+                self._probed_at = now
+        finally:
+            with self._lock:
+                self._probing = False
+
+    def _load(self, name, version):
+        ensure_database_ready()
+
+        with engine.connect() as conn:
+            result = conn.execute(text(self.sources[name].load_sql))
+            return ReferenceTable.build(name, version, result.keys(), result.fetchall())
+
+
+def get_reference_store():
+    """Process-wide reference store"""
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReferenceStore()
+    return _store
+
+
+def get_reference(name):
+    return get_reference_store().get(name)
+
+
+def invalidate_reference(*names):
+    """Call after committing writes to reference tables (no names = all)"""
+    get_reference_store().invalidate(*names)
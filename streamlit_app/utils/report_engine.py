@@ -0,0 +1,164 @@
+"""
+Report Execution Engine
+Runs independent report queries in parallel, one connection per query
+"""
+
+import os
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import pandas as pd
+from sqlalchemy import text
+
+from config.session import get_db_connection
+from utils.query_metrics import carry_meters, current_meters
+
+# Upper bound on concurrent report queries for the whole process.
+# Every in-flight query holds its own MySQL connection (NullPool), so this
+# is also the maximum number of extra connections reports can open.
+REPORT_MAX_WORKERS = max(1, int(os.getenv("REPORT_MAX_WORKERS", "4")))
+
+NUMERIC_COLUMNS = {
+    'count', 'total_sales', 'revenue', 'total_spent', 'total_orders',
+    'loyalty_points', 'units_sold', 'total_quantity', 'total_revenue',
+    'unit_margin', 'total_margin', 'total_deliveries', 'successful_deliveries',
+    'success_rate', 'costs', 'gross_profit', 'customer_count', 'quantity_sold',
+    'contribution_percent', 'gross_margin', 'gross_margin_percent', 'bonus_amount',
+    'deliveries_count', 'success_count', 'failure_count', 'utilization_rate_percent',
+    'number_of_orders', 'number_of_returns', 'return_value', 'return_rate_percent',
+    'orders_handled', 'avg_order_value', 'deliveries_handled', 'delivery_success_rate',
+    'deliveries_per_vehicle', 'current_stock_quantity', 'total_movement', 'sales_volume',
+    'bonus_earned', 'deliveries_completed', 'net_sales', 'margin', 'order_count',
+    'total_order_value', 'total_value', 'usage_count', 'revenue_contribution',
+    'success_rate_percent', 'points_balance'
+}
+
+NUMERIC_HINTS = ['amount', 'price', 'cost', 'revenue', 'total', 'count', 'percent',
+                 'rate', 'margin', 'bonus', 'value', 'points', 'quantity']
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ReportSpec:
+    """A single report dataset: a name, its SQL and bind parameters"""
+    name: str
+    sql: str
+    params: dict = field(default_factory=dict)
+
+
+def execute_query_to_df(db, query, params=None):
+    """Helper function to execute query and return DataFrame with proper types"""
+    if params:
+        result = db.execute(query, params).fetchall()
+    else:
+        result = db.execute(query).fetchall()
+
+    if not result:
+        return pd.DataFrame()
+
+    # Get column names from result keys
+    columns = result[0]._fields if hasattr(result[0], '_fields') else result[0].keys()
+    df = pd.DataFrame(result, columns=columns)
+
+    # Convert numeric columns
+    for col in df.columns:
+        if col in NUMERIC_COLUMNS or any(x in col.lower() for x in NUMERIC_HINTS):
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    return df
+
+
+def _get_executor():
+    """Create the shared report thread pool on first use"""
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=REPORT_MAX_WORKERS,
+                    thread_name_prefix="report-query"
+                )
+    return _executor
+
+
+def _run_spec(spec, meters=()):
+    """Run one spec on its own connection, counted against the caller's query meters"""
+    with carry_meters(meters):
+        db = get_db_connection()
+        try:
+            return execute_query_to_df(db, text(spec.sql), spec.params or None)
+        finally:
+            db.close()
+
+
+def run_report_specs(specs, errors=None):
+    """
+    Fetch every spec concurrently and return {spec.name: DataFrame}
+
+    Queries are independent, so the wall time is roughly that of the
+    slowest one. The first failing query is re-raised after all
+    submitted queries have finished, so no connection is left open.
+    Pass an `errors` dict to collect failures per spec name instead;
+    the failed specs are then missing from the result.
+
+    Usage:
+        errors = {}
+        data = run_report_specs([
+            ReportSpec("payment", "SELECT * FROM vw_sales_by_payment_method"),
+            ReportSpec("trend", TREND_SQL, {"start": start, "end": end}),
+        ], errors=errors)
+        payment_df = data.get("payment")
+    """
+    specs = list(specs)
+
+    if not specs:
+        return {}
+
+    # A single query gains nothing from a worker thread
+    if len(specs) == 1:
+        try:
+            return {specs[0].name: _run_spec(specs[0], current_meters())}
+        except Exception as e:
+            if errors is None:
+                raise
+            errors[specs[0].name] = e
+            return {}
+
+    executor = _get_executor()
+    meters = current_meters()
+    futures = [(spec.name, executor.submit(_run_spec, spec, meters)) for spec in specs]
+
+    results = {}
+    first_error = None
+
+    for name, future in futures:
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            if errors is not None:
+                errors[name] = e
+            elif first_error is None:
+                first_error = e
+
+    if first_error is not None:
+        raise first_error
+
+    return results
+
+
+def shutdown_report_executor():
+    """Stop the report worker threads"""
+    global _executor
+
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+atexit.register(shutdown_report_executor)
@@ -0,0 +1,230 @@
+"""
+Report Export
+Streams a report query through a server-side cursor into CSV, Parquet or
+xlsx, CHUNK rows at a time, so memory stays bounded whatever the row count
+
+    spec (ReportSpec)  ->  stream_results cursor  ->  writer.write(chunk)  ->  file
+
+Finished files are cached under REPORT_EXPORT_DIR by a hash of the SQL,
+its parameters and the format, and reused for REPORT_EXPORT_TTL seconds.
+
+Usage:
+    path = export_report(spec, "parquet", progress=lambda rows: ...)
+"""
+
+import csv
+import hashlib
+import json
+import os
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+REPORT_EXPORT_DIR = Path(os.getenv("REPORT_EXPORT_DIR", BASE_DIR / ".cache" / "exports"))
+REPORT_EXPORT_TTL = float(os.getenv("REPORT_EXPORT_TTL", "600"))
+REPORT_EXPORT_CHUNK_ROWS = max(1, int(os.getenv("REPORT_EXPORT_CHUNK_ROWS", "50000")))
+
+# Excel's sheet limit, header row included
+XLSX_MAX_ROWS = 1_048_576
+
+# format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+# =====================================================
+# WRITERS
+# =====================================================
+
+class CsvExportWriter:
+    def __init__(self, path, columns):
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxExportWriter:
+    """openpyxl write-only workbook; rolls over to a new sheet at Excel's row limit"""
+
+    def __init__(self, path, columns):
+        from openpyxl import Workbook
+
+        self._path = path
+        self._columns = list(columns)
+        self._workbook = Workbook(write_only=True)
+        self._sheet = None
+        self._sheet_rows = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        index = len(self._workbook.worksheets) + 1
+        self._sheet = self._workbook.create_sheet(title="Report" if index == 1 else f"Report {index}")
+        self._sheet.append(self._columns)
+        self._sheet_rows = 1
+
+    def write(self, rows):
+        for row in rows:
+            if self._sheet_rows >= XLSX_MAX_ROWS:
+                self._new_sheet()
+            self._sheet.append(list(row))
+            self._sheet_rows += 1
+
+    def close(self):
+        self._workbook.save(self._path)
+
+
+class ParquetExportWriter:
+    """One row group per chunk; the first chunk fixes the schema"""
+
+    def __init__(self, path, columns):
+        self._path = path
+        self._columns = list(columns)
+        self._writer = None
+        self._schema = None
+
+    def _table(self, rows):
+        import pandas as pd
+        import pyarrow as pa
+
+        df = pd.DataFrame(rows, columns=self._columns)
+        for col in df.columns:
+            # PyMySQL returns DECIMAL as Decimal; Arrow would need a fixed precision per chunk
+            if df[col].dtype == object and df[col].map(lambda v: isinstance(v, Decimal)).any():
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+        return pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(self, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = self._table(rows)
+
+        if self._writer is None:
+            # All-NULL columns in the first chunk are typed as strings
+            self._schema = pa.schema([
+                field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                for field in table.schema
+            ]).remove_metadata()
+            self._writer = pq.ParquetWriter(self._path, self._schema)
+
+        self._writer.write_table(table.cast(self._schema, safe=False))
+
+    def close(self):
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            # No rows: still produce a readable file with the column names
+            import pyarrow as pa
+            pq.write_table(pa.table({col: pa.array([], pa.string()) for col in self._columns}), self._path)
+        else:
+            self._writer.close()
+
+
+WRITERS = {
+    "csv": CsvExportWriter,
+    "xlsx": XlsxExportWriter,
+    "parquet": ParquetExportWriter,
+}
+
+
+# =====================================================
+# EXPORT
+# =====================================================
+
+def export_key(spec, fmt):
+    """Cache key: hash of the normalised SQL, its parameters and the format"""
+    sql = " ".join(spec.sql.split())
+    params = json.dumps(spec.params or {}, sort_keys=True, default=str)
+    return hashlib.sha256(f"{fmt}\n{sql}\n{params}".encode("utf-8")).hexdigest()[:32]
+
+
+def export_path(spec, fmt):
+    extension = EXPORT_FORMATS[fmt][0]
+    return REPORT_EXPORT_DIR / f"{spec.name}_{export_key(spec, fmt)}.{extension}"
+
+
+def export_report(spec, fmt, progress=None, use_cache=True):
+    """
+    Write the full result of `spec` to a file and return its Path
+
+    progress: optional callable(rows_written) called per chunk. There is
+    no total: counting the rows first would run the query twice.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    path = export_path(spec, fmt)
+    if use_cache and path.exists() and time.time() - path.stat().st_mtime < REPORT_EXPORT_TTL:
+        return path
+
+    ensure_database_ready()
+    REPORT_EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    purge_exports()
+
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    writer = None
+    written = 0
+
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(text(spec.sql), spec.params or {})
+            writer = WRITERS[fmt](tmp, list(result.keys()))
+
+            for chunk in result.partitions(REPORT_EXPORT_CHUNK_ROWS):
+                writer.write(chunk)
+                written += len(chunk)
+                if progress:
+                    progress(written)
+
+        writer.close()
+        writer = None
+        os.replace(tmp, path)
+    finally:
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        if tmp.exists():
+            tmp.unlink()
+
+    return path
+
+
+def purge_exports(max_age=None):
+    """Delete cached exports older than max_age seconds (default REPORT_EXPORT_TTL)"""
+    max_age = REPORT_EXPORT_TTL if max_age is None else max_age
+    now = time.time()
+    removed = 0
+
+    if not REPORT_EXPORT_DIR.exists():
+        return 0
+
+    for path in REPORT_EXPORT_DIR.iterdir():
+        # Dot files are exports still being written
+        if path.name.startswith("."):
+            continue
+        try:
+            if path.is_file() and now - path.stat().st_mtime > max_age:
+                path.unlink()
+                removed += 1
+        except OSError:
+            # Being written or removed by another session
+            continue
+
+    return removed
@@ -0,0 +1,595 @@
+"""
+Report Queries
+Parameterized report query builders for the Reports page
+
+Every builder takes a ReportFilters (date range, region, store) and
+returns a ReportSpec whose WHERE clause applies the filters on the fact
+table's own columns, below the GROUP BY, so a "last 30 days, North
+region" report only reads that window. Unset filters add no predicate at
+all, which keeps the remaining ones sargable.
+
+Usage:
+    filters = ReportFilters(start_date=date(2025, 1, 1), region="North")
+    data = run_report_specs([delivery_volume_spec(filters), returns_spec(filters)])
+"""
+
+import threading
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+from utils.inventory_ledger import movement_tail_start
+from utils.job_runner import submit_job
+from utils.report_engine import ReportSpec
+from utils.report_totals import EMPLOYEE_LOCATION_SQL, PAYMENT_MIX_SQL, window_params
+
+# Indexes behind the filter columns; same definitions as sql/01_ddl.sql
+REPORT_INDEXES = {
+    "idx_sales_type_date": ("sales", "sale_type, sale_date"),
+    "idx_orders_location_date": ("sales_orders", "location_id, order_date"),
+    "idx_deliveries_created_status": ("deliveries", "created_at, delivery_status"),
+    "idx_locations_region": ("locations", "region"),
+}
+
+_indexes_ready = False
+_indexes_checked = False
+_indexes_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class ReportFilters:
+    """Report scope; dates are inclusive days, None means unbounded / all"""
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    region: Optional[str] = None
+    location_id: Optional[int] = None
+
+    def params(self):
+        return {
+            **window_params(self.start_date, self.end_date),
+            "region": self.region,
+            "location_id": self.location_id,
+        }
+
+    @property
+    def has_location(self):
+        return self.region is not None or self.location_id is not None
+
+    def cube_args(self):
+        """Keyword arguments for SalesCube.group_by()"""
+        if self.location_id is not None:
+            cube_filters = {"store": [self.location_id]}
+        elif self.region is not None:
+            cube_filters = {"region": [self.region]}
+        else:
+            cube_filters = None
+
+        return {"filters": cube_filters, "start_date": self.start_date, "end_date": self.end_date}
+
+
+# =====================================================
+# CLAUSE BUILDING
+# =====================================================
+
+def _conditions(filters, date_col=None, location_cols=()):
+    """Filter predicates on the given columns (only for the filters that are set)"""
+    conditions = []
+
+    if date_col and filters.start_date is not None:
+        conditions.append(f"{date_col} >= :start")
+    if date_col and filters.end_date is not None:
+        conditions.append(f"{date_col} < :end")
+
+    if location_cols and filters.location_id is not None:
+        conditions.append("(" + " OR ".join(f"{col} = :location_id" for col in location_cols) + ")")
+    elif location_cols and filters.region is not None:
+        region_locations = "SELECT location_id FROM locations WHERE region = :region"
+        conditions.append("(" + " OR ".join(f"{col} IN ({region_locations})" for col in location_cols) + ")")
+
+    return conditions
+
+
+def _where(*conditions):
+    conditions = [c for c in conditions if c]
+    return "WHERE " + "\n        AND ".join(conditions) if conditions else ""
+
+
+# =====================================================
+# SALES
+# =====================================================
+
+def sales_trend_spec(filters):
+    """Daily invoice count and revenue"""
+    join = "JOIN sales_orders so ON s.order_id = so.order_id" if filters.has_location else ""
+    where = _where(
+        "s.sale_type = 'INVOICE'",
+        *_conditions(filters, "s.sale_date", ["so.location_id"] if filters.has_location else ()),
+    )
+
+    return ReportSpec("sales_trend", f"""
+        SELECT
+            DATE(s.sale_date) AS date,
+            COUNT(*) AS transactions,
+            SUM(s.total_amount) AS revenue
+        FROM sales s
+        {join}
+        {where}
+        GROUP BY DATE(s.sale_date)
+        ORDER BY date
+    """, filters.params())
+
+
+def sales_lines_spec(filters):
+    """Every invoice line in scope (export only; no aggregation)"""
+    join = "JOIN sales_orders so ON s.order_id = so.order_id" if filters.has_location else ""
+    where = _where(
+        "si.sale_type = 'INVOICE'",
+        *_conditions(filters, "si.sale_date", ["so.location_id"] if filters.has_location else ()),
+    )
+
+    return ReportSpec("invoice_lines", f"""
+        SELECT
+            si.sale_item_id,
+            si.sale_id,
+            si.sale_date,
+            si.product_id,
+            p.product_name,
+            si.quantity,
+            si.final_amount
+        FROM sales_items si
+        JOIN products p ON si.product_id = p.product_id
+        JOIN sales s ON si.sale_id = s.sale_id
+        {join}
+        {where}
+    """, filters.params())
+
+
+def payment_mix_spec(filters):
+    """vw_sales_by_payment_method for the filter scope"""
+    if not filters.has_location:
+        return ReportSpec("payment", PAYMENT_MIX_SQL, window_params(filters.start_date, filters.end_date))
+
+    # Store scope: report_totals_daily has no location, so the
+    # denominator is the scope's own total
+    where = _where("s.sale_type = 'INVOICE'", *_conditions(filters, "s.sale_date", ["so.location_id"]))
+
+    return ReportSpec("payment", f"""
+        SELECT
+            pm.method_name,
+            COUNT(DISTINCT s.sale_id) AS number_of_orders,
+            SUM(s.total_amount) AS revenue,
+            ROUND(SUM(s.total_amount) / NULLIF(SUM(SUM(s.total_amount)) OVER (), 0) * 100, 2) AS contribution_percent
+        FROM sales s
+        JOIN sales_orders so ON s.order_id = so.order_id
+        JOIN payment_methods pm ON s.payment_method_id = pm.payment_method_id
+        {where}
+        GROUP BY pm.method_name
+    """, filters.params())
+
+
+def employee_performance_spec(filters, limit=10):
+    """vw_sales_employee_location_performance for the filter scope"""
+    if not filters.has_location:
+        return ReportSpec(
+            "emp_perf", EMPLOYEE_LOCATION_SQL,
+            window_params(filters.start_date, filters.end_date, limit=limit)
+        )
+
+    where = _where("s.sale_type = 'INVOICE'", *_conditions(filters, "s.sale_date", ["so.location_id"]))
+
+    return ReportSpec("emp_perf", f"""
+        SELECT
+            l.location_name AS store_name,
+            CONCAT(m.first_name, ' ', m.last_name) AS store_manager,
+            CONCAT(e.first_name, ' ', e.last_name) AS employee_name,
+            COUNT(DISTINCT so.order_id) AS orders_handled,
+            SUM(s.total_amount) AS total_sales,
+            ROUND(AVG(s.total_amount), 0) AS avg_order_value,
+            ROUND(SUM(s.total_amount) / NULLIF(SUM(SUM(s.total_amount)) OVER (), 0) * 100, 2) AS contribution_percent
+        FROM sales s
+        JOIN sales_orders so ON s.order_id = so.order_id
+        JOIN employees e ON so.employee_id = e.employee_id
+        JOIN locations l ON so.location_id = l.location_id
+        LEFT JOIN employees m ON l.store_manager_id = m.employee_id
+        {where}
+        GROUP BY store_name, store_manager, employee_name
+        ORDER BY total_sales DESC
+        LIMIT :limit
+    """, {**filters.params(), "limit": limit})
+
+
+def returns_spec(filters, limit=20):
+    """vw_sales_returns_analysis; the store is the original order's"""
+    join = "JOIN sales_orders so ON orig.order_id = so.order_id" if filters.has_location else ""
+    where = _where(
+        "s.sale_type = 'RETURN'",
+        *_conditions(filters, "s.sale_date", ["so.location_id"] if filters.has_location else ()),
+    )
+
+    return ReportSpec("returns", f"""
+        SELECT
+            s.sale_id AS return_sale_id,
+            s.parent_sale_id AS original_sale_id,
+            COUNT(si.sale_item_id) AS number_of_returns,
+            ABS(SUM(si.final_amount)) AS return_value,
+            ROUND(ABS(SUM(si.final_amount)) / NULLIF(orig.total_amount, 0) * 100, 2) AS return_rate_percent
+        FROM sales s
+        JOIN sales_items si ON s.sale_id = si.sale_id
+        JOIN sales orig ON s.parent_sale_id = orig.sale_id
+        {join}
+        {where}
+        GROUP BY s.sale_id, s.parent_sale_id, orig.total_amount
+        ORDER BY return_value DESC
+        LIMIT :limit
+    """, {**filters.params(), "limit": limit})
+
+
+def financial_monthly_spec(filters, since):
+    """Monthly revenue / cost / gross profit from `since` (a fixed 12-month view)"""
+    join = "JOIN sales_orders so ON s.order_id = so.order_id" if filters.has_location else ""
+    where = _where(
+        "s.sale_type = 'INVOICE'",
+        "s.sale_date >= :since",
+        "si.sale_date >= :since",
+        *_conditions(filters, None, ["so.location_id"] if filters.has_location else ()),
+    )
+
+    return ReportSpec("financial", f"""
+        SELECT
+            DATE_FORMAT(s.sale_date, '%Y-%m') AS month,
+            SUM(s.total_amount) AS revenue,
+            SUM(ABS(si.quantity) * p.cost) AS costs,
+            SUM(s.total_amount - ABS(si.quantity) * p.cost) AS gross_profit
+        FROM sales s
+        JOIN sales_items si ON s.sale_id = si.sale_id
+        JOIN products p ON si.product_id = p.product_id
+        {join}
+        {where}
+        GROUP BY DATE_FORMAT(s.sale_date, '%Y-%m')
+        ORDER BY month DESC
+        LIMIT 12
+    """, {**filters.params(), "since": since})
+
+
+def executive_kpi_spec(filters):
+    """vw_executive_kpi_overview per day within the filter scope"""
+    join = "JOIN sales_orders so ON s.order_id = so.order_id" if filters.has_location else ""
+    where = _where(
+        *_conditions(filters, "s.sale_date", ["so.location_id"] if filters.has_location else ()),
+        *_conditions(ReportFilters(filters.start_date, filters.end_date), "si.sale_date"),
+    )
+
+    return ReportSpec("kpi", f"""
+        SELECT
+            DATE(s.sale_date) AS period,
+            SUM(s.total_amount) AS net_sales,
+            ROUND(
+                (SUM(si.final_amount) - SUM(ABS(si.quantity) * p.cost))
+                / NULLIF(SUM(si.final_amount), 0) * 100, 2
+            ) AS gross_margin_percent,
+            ROUND(SUM(s.sale_type = 'RETURN') / NULLIF(COUNT(s.sale_id), 0) * 100, 2) AS return_rate_percent,
+            ROUND(SUM(d.delivery_status = 'DELIVERED') / NULLIF(COUNT(d.delivery_id), 0) * 100, 2) AS delivery_success_rate
+        FROM sales s
+        JOIN sales_items si ON s.sale_id = si.sale_id
+        JOIN products p ON si.product_id = p.product_id
+        LEFT JOIN deliveries d ON s.sale_id = d.sale_id
+        {join}
+        {where}
+        GROUP BY DATE(s.sale_date)
+        ORDER BY period DESC
+    """, filters.params())
+
+
+def order_status_spec(filters):
+    """Orders and value per status from the denormalized order headers"""
+    where = _where("so.item_count > 0", *_conditions(filters, "so.order_date", ["so.location_id"]))
+
+    return ReportSpec("orders", f"""
+        SELECT
+            so.order_status,
+            COUNT(*) AS order_count,
+            SUM(so.total_amount) AS total_value
+        FROM sales_orders so
+        {where}
+        GROUP BY so.order_status
+    """, filters.params())
+
+
+# =====================================================
+# CUSTOMERS
+# =====================================================
+
+def _customer_invoices_where(filters):
+    """WHERE for `sales s JOIN sales_orders so`: customer invoices in the filter scope"""
+    return _where(
+        "s.sale_type = 'INVOICE'",
+        "so.customer_id IS NOT NULL",
+        *_conditions(filters, "s.sale_date", ["so.location_id"] if filters.has_location else ()),
+    )
+
+
+def loyalty_distribution_spec(filters):
+    """vw_loyalty_level_distribution over the customers who bought in the filter scope"""
+    # No scope at all: every customer, as the view
+    if filters == ReportFilters():
+        return ReportSpec("loyalty", "SELECT * FROM vw_loyalty_level_distribution")
+
+    where = _customer_invoices_where(filters)
+
+    return ReportSpec("loyalty", f"""
+        SELECT
+            ll.level_name AS loyalty_tier,
+            COUNT(cl.customer_id) AS customer_count,
+            SUM(cl.loyalty_points) AS points_balance
+        FROM customer_loyalty cl
+        JOIN loyalty_levels ll ON cl.loyalty_id = ll.loyalty_id
+        WHERE cl.customer_id IN (
+            SELECT so.customer_id
+            FROM sales s
+            JOIN sales_orders so ON s.order_id = so.order_id
+            {where}
+        )
+        GROUP BY ll.level_name
+    """, filters.params())
+
+
+def top_customers_spec(filters, limit=20):
+    """Customers by invoiced amount in the filter scope; aggregated before the customer joins"""
+    where = _customer_invoices_where(filters)
+
+    return ReportSpec("top_customers", f"""
+        SELECT
+            c.customer_id,
+            CONCAT(c.first_name, ' ', c.last_name) AS name,
+            c.email,
+            cl.loyalty_points,
+            ll.level_name,
+            t.total_orders,
+            t.total_spent
+        FROM (
+            SELECT
+                so.customer_id,
+                COUNT(DISTINCT so.order_id) AS total_orders,
+                SUM(s.total_amount) AS total_spent
+            FROM sales s
+            JOIN sales_orders so ON s.order_id = so.order_id
+            {where}
+            GROUP BY so.customer_id
+            ORDER BY total_spent DESC
+            LIMIT :limit
+        ) t
+        JOIN customers c ON c.customer_id = t.customer_id
+        LEFT JOIN customer_loyalty cl ON c.customer_id = cl.customer_id
+        LEFT JOIN loyalty_levels ll ON cl.loyalty_id = ll.loyalty_id
+        ORDER BY t.total_spent DESC
+    """, {**filters.params(), "limit": limit})
+
+
+# =====================================================
+# DELIVERY
+# =====================================================
+
+DELIVERY_LOCATIONS = ["d.from_location_id", "d.to_location_id"]
+
+
+def delivery_volume_spec(filters):
+    """vw_delivery_volume_by_type"""
+    where = _where(*_conditions(filters, "d.created_at", DELIVERY_LOCATIONS))
+
+    return ReportSpec("volume", f"""
+        SELECT d.delivery_type, COUNT(d.delivery_id) AS number_of_deliveries
+        FROM deliveries d
+        {where}
+        GROUP BY d.delivery_type
+    """, filters.params())
+
+
+def delivery_vendor_spec(filters):
+    """vw_delivery_vendor_performance"""
+    where = _where(*_conditions(filters, "d.created_at", DELIVERY_LOCATIONS))
+
+    return ReportSpec("vendor", f"""
+        SELECT
+            v.vendor_name,
+            COUNT(d.delivery_id) AS deliveries_count,
+            SUM(d.delivery_status = 'DELIVERED') AS success_count,
+            SUM(d.delivery_status <> 'DELIVERED') AS failure_count,
+            ROUND(SUM(d.delivery_status = 'DELIVERED') / NULLIF(COUNT(d.delivery_id), 0) * 100, 2) AS success_rate_percent
+        FROM deliveries d
+        JOIN delivery_vendors v ON d.vendor_id = v.vendor_id
+        {where}
+        GROUP BY v.vendor_name
+        ORDER BY success_rate_percent DESC
+    """, filters.params())
+
+
+def delivery_staff_spec(filters, limit=15):
+    """vw_delivery_employee_performance"""
+    where = _where(*_conditions(filters, "d.created_at", DELIVERY_LOCATIONS))
+
+    return ReportSpec("staff", f"""
+        SELECT
+            CONCAT(e.first_name, ' ', e.last_name) AS delivery_staff,
+            COUNT(d.delivery_id) AS deliveries_handled,
+            ROUND(SUM(d.delivery_status = 'DELIVERED') / NULLIF(COUNT(d.delivery_id), 0) * 100, 2) AS delivery_success_rate
+        FROM deliveries d
+        JOIN employees e ON d.delivery_person_id = e.employee_id
+        {where}
+        GROUP BY delivery_staff
+        ORDER BY deliveries_handled DESC
+        LIMIT :limit
+    """, {**filters.params(), "limit": limit})
+
+
+def delivery_vehicle_spec(filters):
+    """vw_delivery_vehicle_utilization; utilization is relative to the scope's deliveries"""
+    where = _where(*_conditions(filters, "d.created_at", DELIVERY_LOCATIONS))
+
+    return ReportSpec("vehicle", f"""
+        SELECT
+            v.vehicle_id,
+            v.plate_number,
+            COUNT(d.delivery_id) AS deliveries_per_vehicle,
+            ROUND(COUNT(d.delivery_id) / NULLIF(MAX(t.scope_deliveries), 0) * 100, 2) AS utilization_rate_percent
+        FROM deliveries d
+        JOIN delivery_vehicles v ON d.vehicle_id = v.vehicle_id
+        CROSS JOIN (
+            SELECT COUNT(*) AS scope_deliveries
+            FROM deliveries d
+            {where}
+        ) t
+        {where}
+        GROUP BY v.vehicle_id, v.plate_number
+        ORDER BY deliveries_per_vehicle DESC
+    """, filters.params())
+
+
+# =====================================================
+# INVENTORY
+# =====================================================
+
+def inventory_status_spec(filters, limit=50):
+    """vw_inventory_current_status, lowest stock first (no date dimension)"""
+    where = _where(*_conditions(filters, None, ["i.location_id"]))
+
+    return ReportSpec("inventory", f"""
+        SELECT
+            p.product_name,
+            l.location_name,
+            i.quantity AS current_stock_quantity,
+            CASE WHEN i.quantity < 50 THEN 'LOW' ELSE 'NORMAL' END AS stock_status
+        FROM inventory i
+        JOIN products p ON i.product_id = p.product_id
+        JOIN locations l ON i.location_id = l.location_id
+        {where}
+        ORDER BY current_stock_quantity ASC
+        LIMIT :limit
+    """, {**filters.params(), "limit": limit})
+
+
+def inventory_movement_spec(filters):
+    """
+    Daily movement per change type: inventory_movement_daily for the
+    rolled-up days plus the raw inventory_history rows after them
+    """
+    tail_start = movement_tail_start()
+
+    rollup_where = _where(*_conditions(filters, "movement_day", ["location_id"]))
+    tail_conditions = _conditions(filters, "created_at", ["location_id"])
+    if tail_start is not None:
+        tail_conditions.insert(0, "created_at >= :tail_start")
+
+    return ReportSpec("movement", f"""
+        SELECT
+            change_type,
+            period,
+            SUM(total_movement) AS total_movement
+        FROM (
+            SELECT
+                change_type,
+                movement_day AS period,
+                SUM(total_quantity) AS total_movement
+            FROM inventory_movement_daily
+            {rollup_where}
+            GROUP BY change_type, movement_day
+            UNION ALL
+            SELECT
+                change_type,
+                DATE(created_at) AS period,
+                SUM(quantity_change) AS total_movement
+            FROM inventory_history
+            {_where(*tail_conditions)}
+            GROUP BY change_type, DATE(created_at)
+        ) m
+        GROUP BY change_type, period
+        ORDER BY period DESC
+    """, {**filters.params(), "tail_start": tail_start})
+
+
+# =====================================================
+# LOOKUPS & SCHEMA
+# =====================================================
+
+def get_report_stores(region=None):
+    """(location_id, location_name) of stores, optionally in one region"""
+    with engine.connect() as conn:
+        return [
+            tuple(row) for row in conn.execute(text("""
+                SELECT location_id, location_name
+                FROM locations
+                WHERE location_type = 'STORE'
+                  AND (:region IS NULL OR region = :region)
+                ORDER BY location_name
+            """), {"region": region})
+        ]
+
+
+def _missing_report_indexes(conn):
+    """REPORT_INDEXES names not in the database"""
+    existing = {
+        row[0] for row in conn.execute(text("""
+            SELECT DISTINCT index_name
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+        """))
+    }
+    return [name for name in REPORT_INDEXES if name not in existing]
+
+
+def ensure_report_indexes():
+    """
+    Add missing REPORT_INDEXES (databases created before them)
+
+    ALTER TABLE on the fact tables: run by the "report_indexes" job, not
+    by a page render.
+    """
+    global _indexes_ready
+
+    if _indexes_ready:
+        return
+
+    with _indexes_lock:
+        if _indexes_ready:
+            return
+
+        ensure_database_ready()
+
+        with engine.begin() as conn:
+            for name in _missing_report_indexes(conn):
+                table, columns = REPORT_INDEXES[name]
+                conn.execute(text(f"ALTER TABLE {table} ADD INDEX {name} ({columns})"))
+                print(f"➕ Created index {name}")
+
+        _indexes_ready = True
+
+
+def queue_report_indexes():
+    """Once per process: queue the "report_indexes" job if any REPORT_INDEXES is missing"""
+    global _indexes_checked, _indexes_ready
+
+    if _indexes_ready or _indexes_checked:
+        return
+
+    with _indexes_lock:
+        if _indexes_ready or _indexes_checked:
+            return
+
+        ensure_database_ready()
+
+        with engine.connect() as conn:
+            missing = _missing_report_indexes(conn)
+
+        if missing:
+            submit_job("report_indexes", label="Report indexes", unique=True)
+        else:
+            _indexes_ready = True
+        _indexes_checked = True
+
+
+def default_window(days=30):
+    """(start, end) of the last `days` days including today"""
+    today = date.today()
+    return today - timedelta(days=days - 1), today
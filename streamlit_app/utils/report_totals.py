@@ -0,0 +1,161 @@
+"""
+Report Totals
+Contribution-percent denominators read from report_totals_daily (kept
+current by the trg_totals_* triggers) instead of a scalar SUM over
+sales / sales_items in every view, plus date-windowed versions of the
+percentage views
+
+MySQL views cannot take parameters, so the windowed variants live here as
+report queries with :start / :end (half-open; NULL = unbounded). Their
+denominator sums only the report_totals_daily rows of the window.
+"""
+
+import threading
+from datetime import timedelta
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+
+TOTALS_TRIGGERS = [
+    "trg_totals_sales_after_insert",
+    "trg_totals_sales_after_update",
+    "trg_totals_items_after_insert",
+    "trg_totals_items_after_update",
+]
+
+# Same definition as sql/01_ddl.sql, for databases created before the totals
+TOTALS_DDL = """
+    CREATE TABLE IF NOT EXISTS report_totals_daily (
+        total_day DATE NOT NULL,
+        metric VARCHAR(30) NOT NULL,
+        slot TINYINT NOT NULL DEFAULT 0,
+        total_value DECIMAL(18,2) NOT NULL DEFAULT 0,
+        PRIMARY KEY (metric, total_day, slot)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# Windowed vw_sales_by_payment_method
+PAYMENT_MIX_SQL = """
+    SELECT
+        pm.method_name,
+        COUNT(DISTINCT s.sale_id) AS number_of_orders,
+        SUM(s.total_amount) AS revenue,
+        ROUND(SUM(s.total_amount) / NULLIF(MAX(t.grand_total), 0) * 100, 2) AS contribution_percent
+    FROM sales s
+    JOIN payment_methods pm ON s.payment_method_id = pm.payment_method_id
+    CROSS JOIN (
+        SELECT SUM(total_value) AS grand_total
+        FROM report_totals_daily
+        WHERE metric = 'invoice_amount'
+            AND (:start IS NULL OR total_day >= :start)
+            AND (:end IS NULL OR total_day < :end)
+    ) t
+    WHERE s.sale_type = 'INVOICE'
+        AND (:start IS NULL OR s.sale_date >= :start)
+        AND (:end IS NULL OR s.sale_date < :end)
+    GROUP BY pm.method_name
+"""
+
+# Windowed vw_sales_employee_location_performance
+EMPLOYEE_LOCATION_SQL = """
+    SELECT
+        l.location_name AS store_name,
+        CONCAT(m.first_name, ' ', m.last_name) AS store_manager,
+        CONCAT(e.first_name, ' ', e.last_name) AS employee_name,
+        COUNT(DISTINCT so.order_id) AS orders_handled,
+        SUM(s.total_amount) AS total_sales,
+        ROUND(AVG(s.total_amount), 0) AS avg_order_value,
+        ROUND(SUM(s.total_amount) / NULLIF(MAX(t.grand_total), 0) * 100, 2) AS contribution_percent
+    FROM sales s
+    JOIN sales_orders so ON s.order_id = so.order_id
+    JOIN employees e ON so.employee_id = e.employee_id
+    JOIN locations l ON so.location_id = l.location_id
+    LEFT JOIN employees m ON l.store_manager_id = m.employee_id
+    CROSS JOIN (
+        SELECT SUM(total_value) AS grand_total
+        FROM report_totals_daily
+        WHERE metric = 'invoice_amount'
+            AND (:start IS NULL OR total_day >= :start)
+            AND (:end IS NULL OR total_day < :end)
+    ) t
+    WHERE s.sale_type = 'INVOICE'
+        AND (:start IS NULL OR s.sale_date >= :start)
+        AND (:end IS NULL OR s.sale_date < :end)
+    GROUP BY store_name, store_manager, employee_name
+    ORDER BY total_sales DESC
+    LIMIT :limit
+"""
+
+# Windowed vw_promotion_effectiveness (sale_date prunes sales_items partitions)
+PROMOTION_SQL = """
+    SELECT
+        p.promotion_code,
+        p.rule_type,
+        COUNT(si.sale_item_id) AS usage_count,
+        SUM(si.final_amount) AS revenue_contribution,
+        ROUND(SUM(si.final_amount) / NULLIF(MAX(t.grand_total), 0) * 100, 2) AS contribution_percent
+    FROM promotions p
+    JOIN sales_items si ON p.promotion_id = si.applied_promotion_id
+    CROSS JOIN (
+        SELECT SUM(total_value) AS grand_total
+        FROM report_totals_daily
+        WHERE metric = 'item_amount'
+            AND (:start IS NULL OR total_day >= :start)
+            AND (:end IS NULL OR total_day < :end)
+    ) t
+    WHERE (:start IS NULL OR si.sale_date >= :start)
+        AND (:end IS NULL OR si.sale_date < :end)
+    GROUP BY p.promotion_code, p.rule_type
+    ORDER BY revenue_contribution DESC
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def window_params(start_date=None, end_date=None, **extra):
+    """Bind parameters for the windowed queries; both dates are inclusive days"""
+    return {
+        "start": start_date,
+        "end": end_date + timedelta(days=1) if end_date is not None else None,
+        **extra,
+    }
+
+
+def refresh_report_totals():
+    """Recompute report_totals_daily with sp_refresh_report_totals"""
+    ensure_database_ready()
+
+    with engine.begin() as conn:
+        conn.execute(text("CALL sp_refresh_report_totals()"))
+
+
+def ensure_report_totals_schema():
+    """Create report_totals_daily, its triggers, procedure and initial values once per process"""
+    global _schema_ready
+
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        from config.init_db import SQL_DIR, run_missing_procedures, run_missing_triggers
+
+        ensure_database_ready()
+
+        with engine.begin() as conn:
+            conn.execute(text(TOTALS_DDL))
+            empty = conn.execute(text("SELECT COUNT(*) FROM report_totals_daily")).scalar() == 0
+
+        for name in run_missing_triggers(SQL_DIR / "04_triggers.sql", TOTALS_TRIGGERS):
+            print(f"➕ Created trigger {name}")
+
+        for name in run_missing_procedures(SQL_DIR / "07_stored_procedures.sql", ["sp_refresh_report_totals"]):
+            print(f"➕ Created procedure {name}")
+
+        if empty:
+            refresh_report_totals()
+
+        _schema_ready = True
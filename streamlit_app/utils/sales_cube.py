@@ -0,0 +1,394 @@
+"""
+Sales Cube
+In-memory columnar cube over INVOICE sales_items for slice-and-dice reports
+
+Grain: one row per invoice line
+Dimensions (dictionary-encoded int32, -1 = unknown):
+    region, city, store, employee, product, class, payment  + date (days since epoch)
+Measures: revenue (final_amount), cost (|quantity| * product cost), quantity
+          margin = revenue - cost is derived at query time
+
+The cube is persisted as a compressed .npz snapshot and extended from
+sale_ids above the last one loaded; it is rebuilt from scratch every
+CUBE_REBUILD_SECONDS to pick up product cost changes and late commits.
+The rebuild runs on a background thread while the old cube keeps
+serving, and replaces it when done.
+
+Usage:
+    cube = get_sales_cube()
+    df = cube.group_by(["region", "store"], filters={"region": ["North"]})
+"""
+
+import os
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from config.session import engine, ensure_database_ready
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CUBE_SNAPSHOT_PATH = Path(os.getenv("CUBE_SNAPSHOT_PATH", BASE_DIR / ".cache" / "sales_cube.npz"))
+CUBE_REFRESH_SECONDS = float(os.getenv("CUBE_REFRESH_SECONDS", "30"))
+CUBE_REBUILD_SECONDS = float(os.getenv("CUBE_REBUILD_SECONDS", "3600"))
+CUBE_SNAPSHOT_SECONDS = float(os.getenv("CUBE_SNAPSHOT_SECONDS", "300"))
+CUBE_FETCH_SIZE = 50000
+
+EPOCH = date(1970, 1, 1)
+
+# name -> (key column, label column, key kind, output columns)
+DIMENSIONS = {
+    "region": ("region", "region", "str", ["region"]),
+    "city": ("city", "city", "str", ["city"]),
+    "store": ("location_id", "location_name", "int", ["location_id", "store_name"]),
+    "employee": ("employee_id", "employee_name", "int", ["employee_id", "employee_name"]),
+    "product": ("product_id", "product_name", "int", ["product_id", "product_name"]),
+    "class": ("class_id", "class_name", "int", ["class_id", "class_name"]),
+    "payment": ("payment_method_id", "method_name", "int", ["payment_method_id", "method_name"]),
+}
+
+MEASURES = ["revenue", "cost", "quantity"]
+
+FACT_SQL = text("""
+    SELECT
+        si.sale_id,
+        DATE(s.sale_date) AS sale_day,
+        l.region,
+        l.city,
+        so.location_id,
+        l.location_name,
+        so.employee_id,
+        CONCAT(e.first_name, ' ', e.last_name) AS employee_name,
+        si.product_id,
+        p.product_name,
+        p.class_id,
+        pc.class_name,
+        s.payment_method_id,
+        pm.method_name,
+        si.final_amount AS revenue,
+        ABS(si.quantity) * p.cost AS cost,
+        si.quantity
+    FROM sales_items si
+    JOIN sales s ON si.sale_id = s.sale_id
+    JOIN products p ON si.product_id = p.product_id
+    JOIN product_class pc ON p.class_id = pc.class_id
+    LEFT JOIN sales_orders so ON s.order_id = so.order_id
+    LEFT JOIN locations l ON so.location_id = l.location_id
+    LEFT JOIN employees e ON so.employee_id = e.employee_id
+    LEFT JOIN payment_methods pm ON s.payment_method_id = pm.payment_method_id
+    WHERE si.sale_type = 'INVOICE'
+      AND si.sale_id > :wm
+""")
+
+FACT_COLUMNS = [
+    "sale_id", "sale_day", "region", "city", "location_id", "location_name",
+    "employee_id", "employee_name", "product_id", "product_name", "class_id",
+    "class_name", "payment_method_id", "method_name", "revenue", "cost", "quantity",
+]
+
+_cube = None
+_cube_lock = threading.Lock()
+_rebuilding = False
+
+
+class Dimension:
+    """Append-only dictionary: key -> code, with a display label per code"""
+
+    def __init__(self, kind, keys=(), labels=()):
+        self.kind = kind
+        self.keys = list(keys)
+        self.labels = list(labels)
+        self.index = {k: i for i, k in enumerate(self.keys)}
+
+    def encode(self, keys, labels):
+        """Codes for a Series of keys (-1 where NULL); unseen keys are appended"""
+        present = keys.notna()
+        new = pd.DataFrame({"k": keys[present], "l": labels[present]})
+        new = new[~new["k"].isin(self.index)].drop_duplicates("k")
+
+        for k, l in zip(new["k"], new["l"]):
+            k = int(k) if self.kind == "int" else str(k)
+            self.index[k] = len(self.keys)
+            self.keys.append(k)
+            self.labels.append(l if l is not None else str(k))
+
+        return keys.map(self.index).fillna(-1).to_numpy(dtype=np.int32)
+
+    def arrays(self):
+        keys = np.array(self.keys, dtype=np.int64 if self.kind == "int" else np.str_)
+        return keys, np.array([str(l) for l in self.labels], dtype=np.str_)
+
+
+class SalesCube:
+    """Columnar invoice-line facts with vectorised group-by"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.dimensions = {name: Dimension(spec[2]) for name, spec in DIMENSIONS.items()}
+        self.codes = {name: np.zeros(0, dtype=np.int32) for name in DIMENSIONS}
+        self.day = np.zeros(0, dtype=np.int32)
+        self.measures = {m: np.zeros(0, dtype=np.float64) for m in MEASURES}
+        self.watermark = 0
+        self.built_at = 0.0
+        self.refreshed_at = 0.0
+        self.saved_at = 0.0
+
+    def __len__(self):
+        return len(self.day)
+
+    # =====================================================
+    # LOADING
+    # =====================================================
+
+    def _append(self, frame):
+        """Encode one chunk of FACT_SQL rows and append it"""
+        frame = pd.DataFrame(frame, columns=FACT_COLUMNS)
+        if frame.empty:
+            return
+
+        for name, (key_col, label_col, _, _) in DIMENSIONS.items():
+            encoded = self.dimensions[name].encode(frame[key_col], frame[label_col])
+            self.codes[name] = np.concatenate([self.codes[name], encoded])
+
+        days = (pd.to_datetime(frame["sale_day"]) - pd.Timestamp(EPOCH)).dt.days
+        self.day = np.concatenate([self.day, days.to_numpy(dtype=np.int32)])
+
+        for m in MEASURES:
+            values = pd.to_numeric(frame[m], errors="coerce").fillna(0).to_numpy(dtype=np.float64)
+            self.measures[m] = np.concatenate([self.measures[m], values])
+
+        self.watermark = max(self.watermark, int(frame["sale_id"].max()))
+
+    def load_new(self):
+        """Append invoice lines with sale_id above the watermark; returns rows added"""
+        ensure_database_ready()
+        before = len(self)
+
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(FACT_SQL, {"wm": self.watermark})
+            for chunk in result.partitions(CUBE_FETCH_SIZE):
+                with self._lock:
+                    self._append(chunk)
+
+        with self._lock:
+            self.refreshed_at = time.monotonic()
+        return len(self) - before
+
+    def refresh(self, force=False):
+        """Incremental load, throttled to CUBE_REFRESH_SECONDS"""
+        if not force and time.monotonic() - self.refreshed_at < CUBE_REFRESH_SECONDS:
+            return 0
+
+        added = self.load_new()
+        if added and time.monotonic() - self.saved_at > CUBE_SNAPSHOT_SECONDS:
+            self.save()
+        return added
+
+    # =====================================================
+    # SNAPSHOT
+    # =====================================================
+
+    def save(self, path=CUBE_SNAPSHOT_PATH):
+        """Write the cube as a compressed .npz (atomic replace)"""
+        with self._lock:
+            arrays = {"day": self.day, "watermark": np.array([self.watermark], dtype=np.int64)}
+            for name in DIMENSIONS:
+                keys, labels = self.dimensions[name].arrays()
+                arrays[f"code_{name}"] = self.codes[name]
+                arrays[f"keys_{name}"] = keys
+                arrays[f"labels_{name}"] = labels
+            for m in MEASURES:
+                arrays[f"measure_{m}"] = self.measures[m]
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Per-thread temp file: a background rebuild may save alongside a refresh
+        tmp = path.with_name(f"{path.stem}.{threading.get_ident()}.tmp.npz")
+        np.savez_compressed(tmp, **arrays)
+        os.replace(tmp, path)
+        self.saved_at = time.monotonic()
+
+    @classmethod
+    def from_snapshot(cls, path=CUBE_SNAPSHOT_PATH):
+        """Load a saved cube, or None if there is no usable snapshot"""
+        path = Path(path)
+        if not path.exists():
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                cube = cls()
+                for name, spec in DIMENSIONS.items():
+                    keys = data[f"keys_{name}"].tolist()
+                    labels = data[f"labels_{name}"].tolist()
+                    cube.dimensions[name] = Dimension(spec[2], keys, labels)
+                    cube.codes[name] = data[f"code_{name}"]
+                for m in MEASURES:
+                    cube.measures[m] = data[f"measure_{m}"]
+                cube.day = data["day"]
+                cube.watermark = int(data["watermark"][0])
+        except (OSError, KeyError, ValueError) as e:
+            print(f"⚠️ Ignoring sales cube snapshot: {e}")
+            return None
+
+        # Snapshot age is unknown; the next rebuild is one window from now
+        cube.built_at = cube.saved_at = time.monotonic()
+        return cube
+
+    # =====================================================
+    # QUERIES
+    # =====================================================
+
+    def _mask(self, filters, start_date, end_date):
+        mask = np.ones(len(self), dtype=bool)
+
+        if start_date is not None:
+            mask &= self.day >= (pd.Timestamp(start_date).date() - EPOCH).days
+        if end_date is not None:
+            mask &= self.day <= (pd.Timestamp(end_date).date() - EPOCH).days
+
+        for name, values in (filters or {}).items():
+            dim = self.dimensions[name]
+            wanted = [i for i, (k, l) in enumerate(zip(dim.keys, dim.labels)) if k in values or l in values]
+            mask &= np.isin(self.codes[name], np.array(wanted, dtype=np.int32))
+
+        return mask
+
+    def group_by(self, dims, filters=None, start_date=None, end_date=None, dropna=True):
+        """
+        Aggregate the measures over `dims` (one or more dimension names, or "date")
+
+        filters: {dimension: [keys or labels]}; dates are inclusive days.
+        Returns a DataFrame with each dimension's output columns plus
+        revenue, cost, quantity, gross_margin and gross_margin_percent.
+        """
+        with self._lock:
+            mask = self._mask(filters, start_date, end_date)
+
+            group_codes = []
+            for name in dims:
+                if name == "date":
+                    codes = self.day[mask].astype(np.int64)
+                else:
+                    codes = self.codes[name][mask].astype(np.int64)
+                group_codes.append(codes)
+
+            keep = np.ones(int(mask.sum()), dtype=bool)
+            if dropna:
+                for name, codes in zip(dims, group_codes):
+                    if name != "date":
+                        keep &= codes >= 0
+
+            group_codes = [codes[keep] for codes in group_codes]
+            values = {m: self.measures[m][mask][keep] for m in MEASURES}
+
+            # Collapse the group columns into one int64 key (mixed radix),
+            # so grouping is a 1-D unique + bincount
+            offsets, sizes = [], []
+            for name, codes in zip(dims, group_codes):
+                low = int(codes.min()) if len(codes) else 0
+                high = int(codes.max()) if len(codes) else 0
+                offsets.append(low)
+                sizes.append(high - low + 1)
+
+            combined = np.zeros(len(values["revenue"]), dtype=np.int64)
+            for codes, low, size in zip(group_codes, offsets, sizes):
+                combined = combined * size + (codes - low)
+
+            group_keys, inverse = np.unique(combined, return_inverse=True)
+            n_groups = len(group_keys)
+
+            uniques = []
+            remaining = group_keys
+            for low, size in zip(reversed(offsets), reversed(sizes)):
+                uniques.append(remaining % size + low)
+                remaining = remaining // size
+            uniques.reverse()
+
+            out = {}
+            for pos, name in enumerate(dims):
+                codes = uniques[pos]
+                if name == "date":
+                    out["date"] = pd.to_datetime(codes, unit="D").date
+                    continue
+
+                dim = self.dimensions[name]
+                keys = np.array(dim.keys + [None], dtype=object)
+                labels = np.array(dim.labels + [None], dtype=object)
+                columns = DIMENSIONS[name][3]
+                if len(columns) == 2:
+                    out[columns[0]] = keys[codes]
+                out[columns[-1]] = labels[codes]
+
+            for m in MEASURES:
+                out[m] = np.bincount(inverse, weights=values[m], minlength=n_groups)
+
+        df = pd.DataFrame(out)
+        df["gross_margin"] = df["revenue"] - df["cost"]
+        df["gross_margin_percent"] = (
+            df["gross_margin"] / df["revenue"].where(df["revenue"] != 0) * 100
+        ).round(2)
+        return df
+
+    def values(self, name):
+        """Labels of a dimension, e.g. for a filter widget"""
+        with self._lock:
+            return sorted(set(self.dimensions[name].labels))
+
+
+def build_sales_cube():
+    """Full rebuild from the database"""
+    cube = SalesCube()
+    cube.load_new()
+    cube.built_at = time.monotonic()
+    cube.save()
+    return cube
+
+
+def _rebuild_in_background(stale):
+    """Build a new cube off the lock and swap it in; `stale` serves meanwhile"""
+    global _cube, _rebuilding
+
+    try:
+        cube = build_sales_cube()
+    except Exception as e:
+        print(f"⚠️ Sales cube rebuild failed: {e}")
+        # Keep the old cube; try again one rebuild window later
+        stale.built_at = time.monotonic()
+        cube = None
+
+    with _cube_lock:
+        if cube is not None:
+            _cube = cube
+        _rebuilding = False
+
+
+def get_sales_cube():
+    """
+    Process-wide cube: snapshot or full load first, then incremental refresh
+
+    Only the very first load happens on the caller's thread; the periodic
+    rebuild runs on a background thread (one at a time).
+    """
+    global _cube, _rebuilding
+
+    with _cube_lock:
+        if _cube is None:
+            _cube = SalesCube.from_snapshot() or build_sales_cube()
+        elif not _rebuilding and time.monotonic() - _cube.built_at > CUBE_REBUILD_SECONDS:
+            _rebuilding = True
+            threading.Thread(
+                target=_rebuild_in_background,
+                args=(_cube,),
+                name="sales-cube-rebuild",
+                daemon=True
+            ).start()
+        cube = _cube
+
+    cube.refresh()
+    return cube
@@ -0,0 +1,99 @@
+"""
+Sales Returns
+Multi-line returns for one invoice through sp_process_return_lines
+
+sp_process_return handles one product per call: a five-item return made
+five RETURN sales, five RETURN deliveries and five rounds of per-row
+restock triggers. sp_process_return_lines validates every line against
+the invoice (sold minus already returned) in one query and writes one
+RETURN sale with all lines, one RETURN delivery, the sale total once and
+the restock as one inventory upsert + one inventory_history insert.
+Refunds are pro rata of what was paid for the line on the invoice.
+
+Usage:
+    return_sale_id = process_return(sale_id, [(product_id, 2), (other_id, 1)], payment_method_id)
+"""
+
+import json
+import threading
+
+from sqlalchemy import bindparam, text
+
+from config.session import engine, ensure_database_ready
+from utils.db_helper import run_transaction_with_retry
+
+# Trigger -> marker present only in the versions that leave returns of
+# sp_process_return_lines to the procedure
+RETURN_TRIGGERS = {
+    "trg_update_sales_total_after_insert": "return_sale_id",
+    "trg_update_inventory_after_sale": "return_sale_id",
+}
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_return_schema():
+    """Create sp_process_return_lines and replace outdated return triggers, once per process"""
+    global _schema_ready
+
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        from config.init_db import SQL_DIR, replace_triggers, run_missing_procedures
+        from utils.order_pricing import ensure_pricing_triggers
+
+        ensure_database_ready()
+        ensure_pricing_triggers()
+
+        with engine.connect() as conn:
+            outdated = [
+                name for name, statement in conn.execute(text("""
+                    SELECT trigger_name, action_statement
+                    FROM information_schema.triggers
+                    WHERE trigger_schema = DATABASE()
+                      AND trigger_name IN :names
+                """).bindparams(bindparam("names", expanding=True)), {"names": list(RETURN_TRIGGERS)})
+                if RETURN_TRIGGERS[name] not in statement
+            ]
+
+        for name in replace_triggers(SQL_DIR / "04_triggers.sql", outdated):
+            print(f"🔁 Replaced trigger {name}")
+
+        for name in run_missing_procedures(SQL_DIR / "07_stored_procedures.sql", ["sp_process_return_lines"]):
+            print(f"➕ Created procedure {name}")
+
+        _schema_ready = True
+
+
+def process_return(original_sale_id, lines, payment_method_id, return_location_id=None):
+    """
+    Return (product_id, quantity) lines of one invoice; returns the new
+    RETURN sale_id
+
+    return_location_id defaults to the invoice's store. Lines of the
+    same product are summed; an invalid line (not on the invoice, or more
+    than is left to return) rejects the whole return.
+    """
+    payload = json.dumps([
+        {"product_id": int(product_id), "quantity": int(quantity)}
+        for product_id, quantity in lines
+    ])
+    if payload == "[]":
+        raise ValueError("No return lines")
+
+    ensure_return_schema()
+
+    def run(db):
+        return db.execute(text("CALL sp_process_return_lines(:osid, :lines, :pmid, :rlid)"), {
+            "osid": int(original_sale_id),
+            "lines": payload,
+            "pmid": int(payment_method_id),
+            "rlid": int(return_location_id) if return_location_id is not None else None
+        }).scalar()
+
+    return run_transaction_with_retry(run)
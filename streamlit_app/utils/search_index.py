@@ -0,0 +1,506 @@
+"""
+Search Index
+Paged name / email / phone search for the list pages, instead of loading
+a whole table and filtering it with str.contains on every rerun
+
+Text is folded before matching: lower case, Vietnamese diacritics
+removed ("Đỗ Thị Ánh" -> "do thi anh"), punctuation -> spaces. A query
+matches a row when every query term is a substring of its folded text.
+
+Two backends:
+    memory    trigram inverted index over the rows of a ReferenceStore
+              snapshot (reloaded when its signature probe sees a change);
+              candidates = intersection of the terms' trigram postings,
+              then a substring check on the candidates only
+    fulltext  MATCH ... AGAINST on the ngram FULLTEXT index over the
+              table's search_text column, for FULLTEXT_SOURCES whose
+              table has grown past SEARCH_MEMORY_MAX_ROWS
+
+Databases created before the search_text columns get them from the
+"search_indexes" background job; until its index exists a source stays
+on the memory backend, so no search waits for the ALTER TABLE.
+
+Both return the ids of one page in the list's display order, so a page
+only loads its own rows.
+
+Usage:
+    result = search("employees", "nguyen van", filters={"role": "Staff"}, page=2)
+    rows = load_rows(result.ids)          # WHERE employee_id IN :ids
+
+    # Filter another query by the matches, uncapped
+    sql, params, expanding = search_condition("products", "ban", "i.product_id")
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy import bindparam, text
+
+from config.session import engine, ensure_database_ready
+from utils.job_runner import submit_job
+from utils.reference_data import ReferenceSource, ReferenceStore
+
+SEARCH_PROBE_SECONDS = float(os.getenv("SEARCH_PROBE_SECONDS", "30"))
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "50"))
+SEARCH_MEMORY_MAX_ROWS = int(os.getenv("SEARCH_MEMORY_MAX_ROWS", "100000"))
+
+NGRAM = 3
+
+# Rows are (id, label, *searched columns, *filter columns) in display order
+SEARCH_SOURCES = {
+    "products": ReferenceSource(
+        load_sql="""
+            SELECT p.product_id, p.product_name, p.status, pc.product_group, pc.class_name
+            FROM products p
+            JOIN product_class pc ON p.class_id = pc.class_id
+            ORDER BY p.product_id DESC
+        """,
+        signature_sql="""
+            SELECT CONCAT_WS(':',
+                (SELECT CONCAT_WS(':', COUNT(*), MAX(product_id), MAX(last_modified)) FROM products),
+                (SELECT BIT_XOR(CRC32(CONCAT_WS('|', class_id, class_name, product_group))) FROM product_class))
+        """,
+    ),
+    "employees": ReferenceSource(
+        load_sql="""
+            SELECT
+                employee_id,
+                CONCAT(first_name, ' ', last_name) AS full_name,
+                email,
+                phone,
+                role,
+                is_inactive
+            FROM employees
+            ORDER BY employee_id DESC
+        """,
+        signature_sql="""
+            SELECT CONCAT_WS(':', COUNT(*), MAX(employee_id), MAX(last_modified)) FROM employees
+        """,
+    ),
+    "users": ReferenceSource(
+        load_sql="""
+            SELECT user_id, username, email, is_active
+            FROM users
+            ORDER BY user_id DESC
+        """,
+        signature_sql="""
+            SELECT CONCAT_WS(':', COUNT(*), BIT_XOR(CRC32(CONCAT_WS('|', user_id, username, email, is_active))))
+            FROM users
+        """,
+    ),
+}
+
+# Searched columns per source; the remaining non-id columns are filters
+SEARCH_COLUMNS = {
+    "products": ("product_name",),
+    "employees": ("full_name", "email", "phone"),
+    "users": ("username", "email"),
+}
+
+
+@dataclass(frozen=True)
+class FulltextSource:
+    """How to page one source through its FULLTEXT index"""
+    table: str
+    index: str
+    search_text: str        # stored generated column; same definition as sql/01_ddl.sql
+    from_sql: str
+    id_column: str
+    match_column: str
+    order_by: str
+    filter_columns: dict    # filter name -> SQL column
+
+
+FULLTEXT_SOURCES = {
+    "products": FulltextSource(
+        table="products",
+        index="ft_products_search",
+        search_text="REPLACE(REPLACE(product_name, 'đ', 'd'), 'Đ', 'D')",
+        from_sql="products p JOIN product_class pc ON p.class_id = pc.class_id",
+        id_column="p.product_id",
+        match_column="p.search_text",
+        order_by="p.product_id DESC",
+        filter_columns={"status": "p.status", "product_group": "pc.product_group", "class_name": "pc.class_name"},
+    ),
+}
+
+# đ is a letter of its own, not d + a combining mark
+_FOLD_TABLE = str.maketrans({"đ": "d", "Đ": "d"})
+_NON_WORD = re.compile(r"[^0-9a-z]+")
+
+_store = None
+_store_lock = threading.Lock()
+_indexes = {}
+_indexes_lock = threading.Lock()
+_row_estimates = {}
+_fulltext_ready = set()
+_estimated_at = 0.0
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def fold(value):
+    """Lower case, no diacritics, words separated by single spaces"""
+    if value is None:
+        return ""
+    decomposed = unicodedata.normalize("NFD", str(value).translate(_FOLD_TABLE))
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", stripped.lower()).strip()
+
+
+@dataclass(frozen=True)
+class SearchPage:
+    """One page of matches, ids in display order"""
+    ids: list
+    total: int
+    page: int
+    page_size: int
+    backend: str
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // self.page_size))
+
+    @property
+    def first(self):
+        """1-based position of the page's first row (0 when nothing matched)"""
+        return (self.page - 1) * self.page_size + 1 if self.ids else 0
+
+
+# =====================================================
+# MEMORY BACKEND
+# =====================================================
+
+class NgramIndex:
+    """Trigram inverted index over one reference snapshot (immutable)"""
+
+    def __init__(self, table, search_columns):
+        self.table = table
+        self.ids = np.array([row[0] for row in table.rows], dtype=np.int64)
+
+        positions = [table.columns.index(col) for col in search_columns]
+        self.texts = [" ".join(fold(row[pos]) for pos in positions) for row in table.rows]
+
+        postings = {}
+        for doc, doc_text in enumerate(self.texts):
+            for gram in {doc_text[i:i + NGRAM] for i in range(len(doc_text) - NGRAM + 1)}:
+                postings.setdefault(gram, []).append(doc)
+        self.postings = {gram: np.array(docs, dtype=np.int32) for gram, docs in postings.items()}
+
+        self.filters = {
+            col: np.array([row[i] for row in table.rows], dtype=object)
+            for i, col in enumerate(table.columns)
+            if i > 0 and col not in search_columns
+        }
+
+    def _candidates(self, terms):
+        """Docs holding every trigram of every term of length >= NGRAM (None: no such term)"""
+        lists = [
+            self.postings.get(term[i:i + NGRAM], np.zeros(0, dtype=np.int32))
+            for term in terms if len(term) >= NGRAM
+            for i in range(len(term) - NGRAM + 1)
+        ]
+        if not lists:
+            return None
+
+        lists.sort(key=len)
+        docs = lists[0]
+        for postings in lists[1:]:
+            if not len(docs):
+                break
+            docs = np.intersect1d(docs, postings, assume_unique=True)
+        return docs
+
+    def match(self, query, filters=None):
+        """Ascending doc positions matching the query and the filters"""
+        terms = fold(query).split()
+
+        docs = self._candidates(terms)
+        if docs is None:
+            docs = np.arange(len(self.texts), dtype=np.int32)
+
+        if filters:
+            mask = np.ones(len(docs), dtype=bool)
+            for col, values in filters.items():
+                values = set(values) if isinstance(values, (tuple, list, set)) else {values}
+                column = self.filters[col][docs]
+                mask &= np.fromiter((v in values for v in column), dtype=bool, count=len(column))
+            docs = docs[mask]
+
+        # Trigrams can match out of order or across words: confirm the substrings
+        if terms:
+            texts = self.texts
+            docs = np.array([d for d in docs if all(term in texts[d] for term in terms)], dtype=np.int32)
+
+        return docs
+
+    def values(self, column):
+        """Distinct values of a filter column, sorted"""
+        return sorted({v for v in self.filters[column] if v is not None})
+
+
+def get_search_store():
+    """Process-wide store of the memory backend's snapshots"""
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReferenceStore(SEARCH_SOURCES, probe_seconds=SEARCH_PROBE_SECONDS)
+    return _store
+
+
+def get_search_index(name):
+    """NgramIndex of the current snapshot, rebuilt when the snapshot changes"""
+    table = get_search_store().get(name)
+
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None or index.table is not table:
+            index = NgramIndex(table, SEARCH_COLUMNS[name])
+            _indexes[name] = index
+        return index
+
+
+def invalidate_search(*names):
+    """Call after committing writes to searched tables (no names = all)"""
+    get_search_store().invalidate(*names)
+
+
+# =====================================================
+# FULLTEXT BACKEND
+# =====================================================
+
+def _fulltext_indexes(conn):
+    """Names of the FULLTEXT_SOURCES indexes that exist"""
+    return {
+        row[0] for row in conn.execute(text("""
+            SELECT DISTINCT index_name
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+              AND index_name IN :indexes
+        """).bindparams(bindparam("indexes", expanding=True)), {
+            "indexes": [source.index for source in FULLTEXT_SOURCES.values()]
+        })
+    }
+
+
+def ensure_search_schema():
+    """
+    Add the search_text columns and FULLTEXT indexes once per process
+
+    Rebuilds the table on a database created before them, which takes a
+    while on a large one: run by the "search_indexes" job, not by a search.
+    """
+    global _schema_ready
+
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+
+        ensure_database_ready()
+
+        with engine.begin() as conn:
+            existing = _fulltext_indexes(conn)
+            columns = {
+                (row[0], row[1]) for row in conn.execute(text("""
+                    SELECT table_name, column_name
+                    FROM information_schema.columns
+                    WHERE table_schema = DATABASE()
+                      AND column_name = 'search_text'
+                """))
+            }
+
+            for source in FULLTEXT_SOURCES.values():
+                if (source.table, "search_text") not in columns:
+                    conn.execute(text(
+                        f"ALTER TABLE {source.table} ADD COLUMN search_text VARCHAR(400) "
+                        f"GENERATED ALWAYS AS ({source.search_text}) STORED"
+                    ))
+                    print(f"➕ Created column {source.table}.search_text")
+                if source.index not in existing:
+                    conn.execute(text(
+                        f"ALTER TABLE {source.table} ADD FULLTEXT INDEX {source.index} (search_text) WITH PARSER ngram"
+                    ))
+                    print(f"➕ Created index {source.index}")
+
+        with _indexes_lock:
+            _fulltext_ready.update(source.index for source in FULLTEXT_SOURCES.values())
+        _schema_ready = True
+
+
+def _backend(name):
+    """
+    'fulltext' for FULLTEXT_SOURCES past SEARCH_MEMORY_MAX_ROWS, else 'memory'
+
+    A source past the limit whose index is missing stays on 'memory' and
+    queues the "search_indexes" job.
+    """
+    global _estimated_at
+
+    if name not in FULLTEXT_SOURCES:
+        return "memory"
+
+    source = FULLTEXT_SOURCES[name]
+    queue_indexes = False
+
+    with _indexes_lock:
+        now = time.monotonic()
+        if now - _estimated_at >= SEARCH_PROBE_SECONDS:
+            ensure_database_ready()
+            with engine.connect() as conn:
+                _row_estimates.update(conn.execute(text("""
+                    SELECT table_name, table_rows
+                    FROM information_schema.tables
+                    WHERE table_schema = DATABASE()
+                      AND table_name IN :tables
+                """).bindparams(bindparam("tables", expanding=True)), {
+                    "tables": [source.table for source in FULLTEXT_SOURCES.values()]
+                }).fetchall())
+                if not _schema_ready:
+                    _fulltext_ready.update(_fulltext_indexes(conn))
+            _estimated_at = now
+            # At most once per probe window; the job is unique while it runs
+            queue_indexes = True
+
+        rows = _row_estimates.get(source.table) or 0
+        ready = source.index in _fulltext_ready
+
+    if rows <= SEARCH_MEMORY_MAX_ROWS:
+        return "memory"
+
+    if not ready:
+        if queue_indexes:
+            submit_job("search_indexes", label="Search indexes", unique=True)
+        return "memory"
+
+    return "fulltext"
+
+
+def _boolean_query(terms):
+    """+"term" per term (ngram phrase); terms shorter than the ngram size become prefixes"""
+    return " ".join(f'+"{term}"' if len(term) >= 2 else f"+{term}*" for term in terms)
+
+
+def _fulltext_clause(source, terms, filters):
+    conditions = []
+    params = {}
+
+    if terms:
+        conditions.append(f"MATCH({source.match_column}) AGAINST (:q IN BOOLEAN MODE)")
+        params["q"] = _boolean_query(terms)
+
+    for i, (col, values) in enumerate((filters or {}).items()):
+        values = values if isinstance(values, (tuple, list, set)) else (values,)
+        conditions.append(f"{source.filter_columns[col]} IN :filter_{i}")
+        params[f"filter_{i}"] = list(values)
+
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, params
+
+
+def _bind(sql, params):
+    expanding = [bindparam(key, expanding=True) for key in params if key.startswith("filter_")]
+    return text(sql).bindparams(*expanding) if expanding else text(sql)
+
+
+def _fulltext_search(name, terms, filters, page, page_size):
+    source = FULLTEXT_SOURCES[name]
+    where, params = _fulltext_clause(source, terms, filters)
+
+    with engine.connect() as conn:
+        total = conn.execute(_bind(f"SELECT COUNT(*) FROM {source.from_sql} {where}", params), params).scalar()
+        page = min(page, max(1, -(-total // page_size)))
+        ids = [
+            row[0] for row in conn.execute(_bind(f"""
+                SELECT {source.id_column}
+                FROM {source.from_sql}
+                {where}
+                ORDER BY {source.order_by}
+                LIMIT :limit OFFSET :offset
+            """, params), {**params, "limit": page_size, "offset": (page - 1) * page_size})
+        ]
+
+    return SearchPage(ids, total, page, page_size, "fulltext")
+
+
+# =====================================================
+# API
+# =====================================================
+
+def search(name, query="", filters=None, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    One page of rows matching `query` and `filters`
+
+    filters: {filter column: value or tuple of values}. A page past the
+    last one returns the last page.
+    """
+    page = max(1, int(page))
+    filters = {col: values for col, values in (filters or {}).items() if values is not None}
+
+    if _backend(name) == "fulltext":
+        return _fulltext_search(name, fold(query).split(), filters, page, page_size)
+
+    index = get_search_index(name)
+    docs = index.match(query, filters)
+
+    total = len(docs)
+    page = min(page, max(1, -(-total // page_size)))
+    start = (page - 1) * page_size
+    ids = index.ids[docs[start:start + page_size]].tolist()
+
+    return SearchPage(ids, total, page, page_size, "memory")
+
+
+def search_condition(name, query, id_column):
+    """
+    (SQL condition, params, bindparams) matching `query`, for filtering
+    another query by the source's rows; None for an empty query
+
+    The match runs in the caller's statement, so nothing is capped: the
+    fulltext backend matches the source's search_text column (the query
+    must use the alias of FULLTEXT_SOURCES[name].from_sql), the memory
+    backend binds every matching id.
+
+    Usage:
+        match = search_condition("products", search, "i.product_id")
+        if match:
+            sql, match_params, expanding = match
+    """
+    terms = fold(query).split()
+    if not terms:
+        return None
+
+    if _backend(name) == "fulltext":
+        source = FULLTEXT_SOURCES[name]
+        return (
+            f"MATCH({source.match_column}) AGAINST (:search_q IN BOOLEAN MODE)",
+            {"search_q": _boolean_query(terms)},
+            [],
+        )
+
+    index = get_search_index(name)
+    ids = index.ids[index.match(query)].tolist()
+    return (
+        f"{id_column} IN :search_ids",
+        {"search_ids": ids or [None]},
+        [bindparam("search_ids", expanding=True)],
+    )
+
+
+def filter_values(name, column):
+    """Distinct values of a filter column of a memory-backed source"""
+    return get_search_index(name).values(column)
+
+
+def source_size(name):
+    """Rows in the source's current snapshot (memory backend)"""
+    return len(get_search_index(name).ids)
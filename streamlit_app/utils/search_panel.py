@@ -0,0 +1,61 @@
+"""
+Search Panel
+Paging widgets over utils.search_index for the list pages
+
+The page number lives in st.session_state[f"{key}_page"] and goes back
+to 1 whenever the query or the filters change.
+
+Usage:
+    result = paged_search("employee_list", "employees", search, {"role": role})
+    df = order_by_ids(load_rows(result.ids), result.ids, "employee_id")
+    ...
+    pager("employee_list", result, "employees")
+"""
+
+import streamlit as st
+
+from utils.search_index import SEARCH_PAGE_SIZE, search
+
+
+def current_page(key, *signature):
+    """Page number stored under `key`, back to 1 when the signature (query, filters) changed"""
+    page_key = f"{key}_page"
+
+    if st.session_state.get(f"{key}_signature") != signature:
+        st.session_state[f"{key}_signature"] = signature
+        st.session_state[page_key] = 1
+
+    return st.session_state.get(page_key, 1)
+
+
+def set_page(key, page):
+    """Store the page actually shown (it may have been clamped to the last one)"""
+    st.session_state[f"{key}_page"] = page
+
+
+def paged_search(key, name, query, filters=None, page_size=SEARCH_PAGE_SIZE):
+    """search() for the page stored under `key`"""
+    page = current_page(key, query or "", tuple(sorted((filters or {}).items())), page_size)
+
+    result = search(name, query, filters, page=page, page_size=page_size)
+    set_page(key, result.page)
+    return result
+
+
+def pager(key, result, noun="rows"):
+    """Page selector and 'showing a-b of n' caption"""
+    col1, col2 = st.columns([1, 4])
+
+    with col1:
+        st.number_input("Page", min_value=1, max_value=result.pages, step=1, key=f"{key}_page")
+
+    with col2:
+        st.write("")
+        last = result.first + len(result.ids) - 1 if result.ids else 0
+        st.caption(f"📊 Showing {result.first:,}-{last:,} of {result.total:,} {noun} (page {result.page} / {result.pages})")
+
+
+def order_by_ids(df, ids, id_column):
+    """Rows of `df` in the order of `ids` (the search's display order)"""
+    position = {value: i for i, value in enumerate(ids)}
+    return df.sort_values(id_column, key=lambda col: col.map(position)).reset_index(drop=True)
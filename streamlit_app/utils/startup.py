@@ -0,0 +1,88 @@
+"""
+Startup Helpers
+Lazy module loading and cold-start profiling marks
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+import types
+
+# Set VINRETAIL_STARTUP_PROFILE=1 to print profiling marks to the console
+PROFILE_ENABLED = os.getenv("VINRETAIL_STARTUP_PROFILE", "0") == "1"
+
+_PROCESS_START = time.perf_counter()
+_marks = {}    # label -> seconds, first occurrence only
+_marks_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_lazy_name"] = name
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self.__dict__["_lazy_name"])
+                    self.__dict__["_lazy_module"] = module
+                    mark(f"import {self.__dict__['_lazy_name']}", since=started)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_module(name):
+    """
+    Return `name` as a module whose import is deferred until first use
+
+    If the module has already been imported the real module is returned.
+
+    Usage:
+        px = lazy_module("plotly.express")
+        fig = px.bar(df, ...)  # plotly is imported here
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+def mark(label, since=None):
+    """
+    Record a profiling mark: seconds since process start, or since `since`
+
+    Only the first occurrence of a label is kept (the cold start); marks
+    hit again on every rerun do not grow the list.
+    """
+    now = time.perf_counter()
+    elapsed = now - (since if since is not None else _PROCESS_START)
+
+    with _marks_lock:
+        if label in _marks:
+            return elapsed
+        _marks[label] = elapsed
+
+    if PROFILE_ENABLED:
+        print(f"⏱️ {label}: {elapsed * 1000:.1f} ms")
+
+    return elapsed
+
+
+def get_marks():
+    """Return recorded profiling marks as a list of (label, seconds)"""
+    with _marks_lock:
+        return list(_marks.items())